@@ -9,6 +9,14 @@
 #
 # Hazen 05/14
 #
+# Actions that do not conflict with each other (see the resources
+# attribute in daveActions.py) are run at the same time.
+#
+# The run time and size estimates come from sequenceEstimator.py, which
+# learns the cost of each type of action from the actions that are run.
+#
+# Hazen 10/15
+#
 
 # Add current storm-control directory to sys.path
 import imp
@@ -32,7 +40,10 @@ import sc_library.hdebug as hdebug
 
 # General
 import notifications
+import runJournal
+import sequenceEstimator
 import sequenceGenerator
+import sequenceSimulator
 import sequenceViewer
 
 # Communication
@@ -47,13 +58,16 @@ import sc_library.parameters as params
 
 ## CommandEngine
 #
-# This class handles the execution of commands that can be given to Dave
+# This class handles the execution of commands that can be given to Dave.
+# More than one command can be running at the same time, Dave decides
+# which commands can be started (see Dave.startCommands).
 #
 class CommandEngine(QtCore.QObject):
-    done = QtCore.pyqtSignal()
+    done = QtCore.pyqtSignal(object)
+    measured = QtCore.pyqtSignal(object, float, object)
     paused = QtCore.pyqtSignal()
-    problem = QtCore.pyqtSignal(object)
-    warning = QtCore.pyqtSignal(object)
+    problem = QtCore.pyqtSignal(object, object)
+    warning = QtCore.pyqtSignal(object, object)
     dave_action = QtCore.pyqtSignal(object)
     
     ## __init__
@@ -64,7 +78,9 @@ class CommandEngine(QtCore.QObject):
         QtCore.QObject.__init__(self, parent)
 
         # Set defaults
-        self.command = None
+        self.journal = None
+        self.running_items = []
+        self.start_times = {}
         
         self.test_mode = False
         
@@ -80,71 +96,124 @@ class CommandEngine(QtCore.QObject):
     
     ## abort
     #
-    # Aborts the current action (if any).
+    # Aborts the running actions (if any).
     #
     @hdebug.debug
     def abort(self):
-        self.command.abort()
+        self.start_times = {} # Aborted actions are not measured.
+        for item in self.running_items[:]:
+            item.getDaveAction().abort()
 
-    ## startCommand
-    #
-    # Start a command or command sequence
+    ## getRunningItems
     #
-    # @param command The command (DaveAction) to start.
-    # @param test_mode (Optional) Run the command in test mode.
+    # @return A list of the DaveActionItems that are running.
     #
-    def startCommand(self, command, test_mode = False):
-        self.command = command
-
-        # Connect signals.
-        self.command.complete_signal.connect(self.handleActionComplete)
-        self.command.error_signal.connect(self.handleErrorSignal)
-        self.command.warning_signal.connect(self.handleWarningSignal)
-        
-        # Start command.
-        if (self.command.getActionType() == "hal"):
-            self.command.start(self.HALClient, test_mode)
-        elif (self.command.getActionType() == "kilroy"):
-            self.command.start(self.kilroyClient, test_mode)
-        elif (self.command.getActionType() == "dave"):
-            self.dave_action.emit(self.command.getMessage())
-        elif (self.command.getActionType() == "NA"):
-            self.command.start(False, test_mode)
-        else:
-            raise Exception("No TCPClient for " + self.command.getActionType())
+    def getRunningItems(self):
+        return self.running_items
 
     ## handleActionComplete
     #
-    # Handle the completion of the previous action
+    # Handle the completion of an action.
     #
-    def handleActionComplete(self, message):
-        self.command.cleanUp()
-        self.command.complete_signal.disconnect()
-        self.command.error_signal.disconnect()
-        self.command.warning_signal.disconnect()
+    # @param item The DaveActionItem of the action.
+    # @param message The TCP message from the action.
+    # @param journal_complete (Optional) Record the action as complete in the journal, this is False for actions that failed.
+    #
+    def handleActionComplete(self, item, message, journal_complete = True):
+        command = item.getDaveAction()
+        command.cleanUp()
+        command.complete_signal.disconnect()
+        command.error_signal.disconnect()
+        command.warning_signal.disconnect()
+        self.running_items.remove(item)
+
+        if journal_complete and (self.journal is not None) and not message.isTest():
+            self.journal.actionComplete(item.getIndex(), command, message)
+
+        # Report how long the action took if it completed normally.
+        start_time = self.start_times.pop(item.getIndex(), None)
+        if (start_time is not None) and not message.isTest() and not message.hasError():
+            if message.getResponse("aborted") is None:
+                self.measured.emit(item, time.time() - start_time, message)
 
         # Configure the command engine to pause after completion of the command sequence
-        if self.command.shouldPause() and not message.isTest():
-            self.should_pause = True
+        if command.shouldPause() and not message.isTest():
             self.paused.emit()
         
-        self.done.emit()
+        self.done.emit(item)
 
     ## handleErrorSignal
     #
     # Handle an error signal
     #
-    def handleErrorSignal(self, message):
-        self.problem.emit(message)
-        self.handleActionComplete(message)
+    # @param item The DaveActionItem of the action.
+    # @param message The TCP message from the action.
+    #
+    def handleErrorSignal(self, item, message):
+        if (self.journal is not None) and not message.isTest():
+            self.journal.actionProblem("error", item.getIndex(), item.getDaveAction(), message)
+        self.problem.emit(item, message)
+        self.handleActionComplete(item, message, journal_complete = False)
 
     ## handleWarningSignal
     #
     # Handle a warning signal
     #
-    def handleWarningSignal(self, message):
-        self.warning.emit(message)
-        self.handleActionComplete(message)
+    # @param item The DaveActionItem of the action.
+    # @param message The TCP message from the action.
+    #
+    def handleWarningSignal(self, item, message):
+        if (self.journal is not None) and not message.isTest():
+            self.journal.actionProblem("warning", item.getIndex(), item.getDaveAction(), message)
+        self.warning.emit(item, message)
+        self.handleActionComplete(item, message)
+
+    ## isBusy
+    #
+    # @return True/False if any actions are running.
+    #
+    def isBusy(self):
+        return (len(self.running_items) > 0)
+
+    ## setJournal
+    #
+    # @param journal A runJournal.RunJournal object to record the actions in, or None.
+    #
+    def setJournal(self, journal):
+        self.journal = journal
+
+    ## startCommand
+    #
+    # Start a command. Only one command at a time should use each of the
+    # TCP clients as the actions share the client's messageReceived signal.
+    #
+    # @param item The DaveActionItem of the command (DaveAction) to start.
+    # @param test_mode (Optional) Run the command in test mode.
+    #
+    def startCommand(self, item, test_mode = False):
+        command = item.getDaveAction()
+        self.running_items.append(item)
+        self.start_times[item.getIndex()] = time.time()
+        if (self.journal is not None) and not test_mode:
+            self.journal.actionStarted(item.getIndex(), command)
+
+        # Connect signals.
+        command.complete_signal.connect(lambda message, item = item: self.handleActionComplete(item, message))
+        command.error_signal.connect(lambda message, item = item: self.handleErrorSignal(item, message))
+        command.warning_signal.connect(lambda message, item = item: self.handleWarningSignal(item, message))
+        
+        # Start command.
+        if (command.getActionType() == "hal"):
+            command.start(self.HALClient, test_mode)
+        elif (command.getActionType() == "kilroy"):
+            command.start(self.kilroyClient, test_mode)
+        elif (command.getActionType() == "dave"):
+            self.dave_action.emit(command.getMessage())
+            command.completeAction(command.getMessage())
+        elif (command.getActionType() == "NA"):
+            command.start(False, test_mode)
+        else:
+            raise Exception("No TCPClient for " + command.getActionType())
 
 ## Dave
 #
@@ -164,9 +233,16 @@ class Dave(QtGui.QMainWindow):
         QtGui.QMainWindow.__init__(self, parent)
         
         # General.
+        self.data_directory = parameters.get("directory")
         self.directory = ""
+        self.free_space = None
+        self.journal = None
         self.notifier = notifications.Notifier("", "", "", "")
+        self.recipe_parser = None
+        self.resume_index = None
         self.running = False
+        self.schedule_again = False
+        self.scheduling = False
         self.settings = QtCore.QSettings("Zhuang Lab", "dave")
         self.sequence_filename = ""
         self.sequence_validated = False
@@ -174,6 +250,17 @@ class Dave(QtGui.QMainWindow):
         self.skip_warning = False
         self.needs_hal = False
         self.needs_kilroy = False
+        self.sequence_loader = None
+        self.stop_tcp = False
+        self.waiting_for_commands = False
+
+        # Sequence simulator (optional).
+        self.simulator = None
+        if parameters.get("simulator_config", ""):
+            self.simulator = sequenceSimulator.loadSimulator(parameters.get("simulator_config"))
+
+        # The costs of the actions measured in previous runs.
+        self.cost_cache = sequenceEstimator.CostCache(parameters.get("directory") + "dave_costs.json")
 
         # UI setup.
         self.ui = daveUi.Ui_MainWindow()
@@ -237,11 +324,55 @@ class Dave(QtGui.QMainWindow):
         # Command engine.
         self.command_engine = CommandEngine()
         self.command_engine.done.connect(self.handleDone)
+        self.command_engine.measured.connect(self.handleMeasured)
         self.command_engine.problem.connect(self.handleProblem)
         self.command_engine.paused.connect(self.handlePauseFromCommandEngine)
         self.command_engine.warning.connect(self.handleWarning)
         self.command_engine.dave_action.connect(self.handleDaveAction)
 
+        # While running, the estimates are refreshed with what has been learned
+        # about the costs of the actions and the free disk space is checked
+        # periodically rather than after every action.
+        self.estimates_timer = QtCore.QTimer(self)
+        self.estimates_timer.setInterval(30000)
+        self.estimates_timer.timeout.connect(self.handleEstimatesTimer)
+        self.estimates_timer.start()
+
+    ## checkJournal
+    #
+    # Check if the last run of the current sequence finished and
+    # offer to resume it if it did not.
+    #
+    @hdebug.debug
+    def checkJournal(self):
+        journal_run = runJournal.readJournal(runJournal.journalName(self.sequence_filename))
+        if (journal_run is None) or not journal_run.needsResume():
+            return
+
+        dave_actions = self.ui.commandSequenceTreeView.getDaveActions()
+        if not journal_run.matches(dave_actions):
+            print "The journal does not match the sequence, the previous run cannot be resumed."
+            return
+
+        first_incomplete = journal_run.getFirstIncomplete()
+        if (first_incomplete >= len(dave_actions)):
+            return
+
+        messageBox = QtGui.QMessageBox(parent = self)
+        messageBox.setWindowTitle("Resume?")
+        box_text = "The last run of this sequence did not finish, "
+        box_text += str(len(journal_run.completed)) + " of " + str(len(dave_actions)) + " actions were completed.\n"
+        box_text += "Resume from command " + str(first_incomplete) + ": " + dave_actions[first_incomplete].getDescriptor() + "?"
+        messageBox.setText(box_text)
+        messageBox.setStandardButtons(QtGui.QMessageBox.No |
+                                      QtGui.QMessageBox.Yes)
+        messageBox.setDefaultButton(QtGui.QMessageBox.Yes)
+        button_ID = messageBox.exec_()
+        if (button_ID == QtGui.QMessageBox.Yes):
+            self.resume_index = self.ui.commandSequenceTreeView.resumeRun(journal_run.completed)
+            self.updateRunStatusDisplay()
+            self.updateEstimates()
+
     ## cleanUp
     #
     # Saves (most of) the notification settings at program exit.
@@ -252,6 +383,23 @@ class Dave(QtGui.QMainWindow):
         for [object, name] in self.noti_settings:
             self.settings.setValue(name, object.text())
 
+        self.cost_cache.save()
+
+        # The run did not finish, so the journal does not get an end record.
+        self.closeJournal(None)
+
+    ## closeJournal
+    #
+    # @param aborted True/False if the run was aborted, None if the run did not end.
+    #
+    def closeJournal(self, aborted):
+        if self.journal is not None:
+            if aborted is not None:
+                self.journal.endRun(aborted)
+            self.journal.close()
+            self.journal = None
+            self.command_engine.setJournal(None)
+
     ## closeEvent
     #
     # Handles the PyQt close event.
@@ -311,13 +459,13 @@ class Dave(QtGui.QMainWindow):
                 print abort_text
                 self.ui.commandSequenceTreeView.abort()
 
-                # Set flag to signal reset to handleDone when called.
-                if (self.running):
+                # The run finishes once the running actions have been aborted.
+                if self.command_engine.isBusy():
                     self.command_engine.abort()
 
                 # Paused
                 else:
-                    self.handleDone()
+                    self.scheduleCommands()
 
             # Cancel button or window closed event
             else: 
@@ -329,10 +477,10 @@ class Dave(QtGui.QMainWindow):
             self.sequence_validated = False
             self.ui.commandSequenceTreeView.setTestMode(False)
             
-            if (self.running):
+            if self.command_engine.isBusy():
                 self.command_engine.abort()
             else:
-                self.handleDone()
+                self.scheduleCommands()
 
     ## handleDaveAction
     #
@@ -342,7 +490,6 @@ class Dave(QtGui.QMainWindow):
     def handleDaveAction(self, message):
         if (message.getType() == "Clear Warnings"):
             self.handleClearWarnings(False) #The boolean is a dummy variable
-            self.command_engine.handleActionComplete(message) # Send message back to command engine to signal completion
         else:
             pass # No other options currently        
         
@@ -380,6 +527,7 @@ class Dave(QtGui.QMainWindow):
         button_ID = messageBox.exec_()
 
         if (button_ID == QtGui.QMessageBox.Ok):
+            self.resume_index = None
             self.ui.commandSequenceTreeView.setCurrentAction(item)    
         else:
             pass
@@ -416,54 +564,18 @@ class Dave(QtGui.QMainWindow):
 
     ## handleDone
     #
-    # Handles completion of the current command engine.  
+    # Handles completion of an action by the command engine.
+    #
+    # @param item The DaveActionItem of the action.
     #
     @hdebug.debug
-    def handleDone(self):
+    def handleDone(self, item):
         # Handle updating usage information if in test mode
         if self.test_mode:
-            self.ui.commandSequenceTreeView.updateEstimates()
-
-        # Increment command to the next valid command / action.
-        next_command = self.ui.commandSequenceTreeView.getNextItem()
-
-        # Handle last command in list.
-        if next_command is None:
-            self.ui.runButton.setText("Start")
-            self.ui.runButton.setEnabled(True)
-            self.ui.abortButton.setEnabled(False)
-            self.ui.validateSequenceButton.setEnabled(True)
-            self.ui.commandSequenceTreeView.resetItemIndex()
-            
-            self.running = False
-            if self.test_mode:
-                self.sequence_validated = True
-                self.test_mode = False
-                self.ui.commandSequenceTreeView.setTestMode(False)
-                self.updateEstimates()
+            self.ui.commandSequenceTreeView.updateEstimates(item)
 
-            # Stop TCP communication
-            if self.needs_hal:
-                self.command_engine.HALClient.stopCommunication()
-            if self.needs_kilroy:
-                self.command_engine.kilroyClient.stopCommunication()
-
-        # Continue with next command.
-        else: 
-            
-            # Update time remaining time estimate.
-            est_time = self.ui.commandSequenceTreeView.getRemainingTime()
-            self.ui.remainingLabel.setText("Time Remaining: " + str(datetime.timedelta(seconds = est_time))[0:8])
-
-            # Check for requested pause.
-            if self.running: 
-                self.command_engine.startCommand(next_command.getDaveAction(), 
-                                                 self.test_mode)
-            else: 
-                self.handlePause()
-
-        # Update progress bar and current command display.
-        self.updateRunStatusDisplay()
+        self.ui.commandSequenceTreeView.setItemDone(item)
+        self.scheduleCommands()
 
     ## handleDropXML
     #
@@ -474,6 +586,16 @@ class Dave(QtGui.QMainWindow):
     def handleDragDropFile(self, file_path):
         self.newSequence(file_path)
         
+    ## handleEstimatesTimer
+    #
+    # Handles the estimates timer.
+    #
+    def handleEstimatesTimer(self):
+        if self.running:
+            self.ui.commandSequenceTreeView.refreshEstimates()
+            self.updateFreeSpace()
+            self.updateRemainingEstimates()
+
     ## handleGenerateXML
     #
     # Handles Generate from Recipe XML
@@ -504,6 +626,68 @@ class Dave(QtGui.QMainWindow):
                     self.directory = os.path.dirname(recipe_xml_file)
                     self.newSequence(generated_xml_file)
 
+    ## handleLoaderError
+    #
+    # @param message_str The error message from the sequence loader.
+    #
+    @hdebug.debug
+    def handleLoaderError(self, message_str):
+        QtGui.QMessageBox.information(self,
+                                      "Error Loading Sequence",
+                                      message_str)
+
+    ## handleLoaderFinished
+    #
+    # The sequence has been completely loaded.
+    #
+    @hdebug.debug
+    def handleLoaderFinished(self):
+        self.recipe_parser = None
+        self.sequence_loader = None
+        self.ui.progressBar.setMaximum(self.ui.commandSequenceTreeView.getNumberItems())
+        if not self.running:
+            self.ui.validateSequenceButton.setEnabled(True)
+            if (self.journal is None):
+                self.checkJournal()
+        self.updateEstimates()
+        if self.waiting_for_commands:
+            self.scheduleCommands()
+
+    ## handleLoaderProgress
+    #
+    # More of the sequence has been loaded.
+    #
+    # @param number_items The number of items that have been loaded.
+    #
+    def handleLoaderProgress(self, number_items):
+        self.ui.progressBar.setMaximum(number_items)
+        if self.ui.commandSequenceTreeView.isLoading():
+            self.updateLoadingEstimates()
+
+        # Start any additional TCP communication that the new commands need.
+        if self.running:
+            types = self.ui.commandSequenceTreeView.getActionTypes()
+            if ("hal" in types) and not self.needs_hal:
+                self.needs_hal = True
+                self.command_engine.HALClient.startCommunication()
+            if ("kilroy" in types) and not self.needs_kilroy:
+                self.needs_kilroy = True
+                self.command_engine.kilroyClient.startCommunication()
+
+        if self.waiting_for_commands:
+            self.scheduleCommands()
+
+    ## handleMeasured
+    #
+    # Handles the measured cost of an action from the command engine.
+    #
+    # @param item The DaveActionItem of the action.
+    # @param duration How long the action took in seconds.
+    # @param message The TCP message from the action.
+    #
+    def handleMeasured(self, item, duration, message):
+        self.ui.commandSequenceTreeView.addMeasurement(item, duration, message.getResponse("disk_usage"))
+
     ## handleNewSequenceFile
     #
     # Opens the dialog box that lets the user specify a sequence file.
@@ -543,6 +727,7 @@ class Dave(QtGui.QMainWindow):
     def handlePause(self):
         self.running = False
         print "\7\7" # Provide audible acknowledgement of pause.
+        self.cost_cache.save()
 
         # Update run button text and status.
         self.ui.runButton.setEnabled(True)
@@ -564,26 +749,23 @@ class Dave(QtGui.QMainWindow):
     # Handles the problem signal from the movie engine. Notifies the operator by e-mail if requested.
     # Displays a dialog box describing the problem.
     #
+    # @param item The DaveActionItem of the action that had the problem.
     # @param message The problem message from the movie engine.
     # @param message_str A informative string regarding the error. Defaults to False.
     #
     @hdebug.debug
-    def handleProblem(self, message, message_str = False):
-        current_item = self.ui.commandSequenceTreeView.getCurrentItem()
+    def handleProblem(self, item, message, message_str = False):
         # Compose message string.
         if not message_str:
-            message_str = current_item.getDaveAction().getDescriptor() + "\n" + message.getErrorMessage()
+            message_str = item.getDaveAction().getDescriptor() + "\n" + message.getErrorMessage()
 
         if not self.test_mode:
 
             # Pause Dave.
             self.handlePause()
 
-            # Stop TCP communication.
-            if self.needs_hal:
-                self.command_engine.HALClient.stopCommunication()
-            if self.needs_kilroy:
-                self.command_engine.kilroyClient.stopCommunication()
+            # Stop TCP communication (once any other running actions have finished).
+            self.stopTCP()
             
             # Display errors.
             if (self.ui.errorMsgCheckBox.isChecked()):
@@ -594,7 +776,7 @@ class Dave(QtGui.QMainWindow):
                                           message_str)
 
         else: # Test mode
-            self.ui.commandSequenceTreeView.setCurrentItemValid(False)
+            self.ui.commandSequenceTreeView.setItemValid(item, False)
             message_str += "\nSuppress remaining warnings?"
             if not self.skip_warning:
                 messageBox = QtGui.QMessageBox(parent = self)
@@ -608,7 +790,7 @@ class Dave(QtGui.QMainWindow):
                 if button_ID == QtGui.QMessageBox.YesToAll:
                     self.skip_warning = True # Skip additional warnings
 
-            print "Invalid command: " + current_item.getDaveAction().getDescriptor()
+            print "Invalid command: " + item.getDaveAction().getDescriptor()
 
     ## handleRunButton
     #
@@ -657,14 +839,14 @@ class Dave(QtGui.QMainWindow):
 
             # Start TCP communication
             self.validateAndStartTCP()
+            self.openJournal()
             
             self.ui.runButton.setText("Pause")
             self.ui.abortButton.setEnabled(True)
             self.ui.validateSequenceButton.setEnabled(False)
             self.running = True
             self.updateRunStatusDisplay()
-            self.command_engine.startCommand(self.ui.commandSequenceTreeView.getCurrentItem().getDaveAction(),
-                                             self.test_mode)
+            self.scheduleCommands()
 
     ## handleSendTestEmail
     #
@@ -685,10 +867,15 @@ class Dave(QtGui.QMainWindow):
     @hdebug.debug
     def handleValidateCommandSequence(self, boolean):
 
+        # Simulate first, this may be all that is necessary.
+        if (self.simulator is not None) and self.simulateSequence():
+            return
+
         # Start Test Run
         if self.validateAndStartTCP():
 
             # Configure UI
+            self.resume_index = None
             self.running = True
             self.test_mode = True
             self.ui.runButton.setEnabled(False)
@@ -696,8 +883,9 @@ class Dave(QtGui.QMainWindow):
             self.ui.validateSequenceButton.setEnabled(False)
             self.skip_warning = False
             
-            # Reset command properties.
-            self.ui.commandSequenceTreeView.setAllValid(True)
+            # Reset command properties (these were already set if we simulated).
+            if self.simulator is None:
+                self.ui.commandSequenceTreeView.setAllValid(True)
             
             # Place commandSequence into test mode.
             self.ui.commandSequenceTreeView.resetItemIndex()
@@ -705,8 +893,7 @@ class Dave(QtGui.QMainWindow):
             self.ui.commandSequenceTreeView.setTestMode(True)
 
             # Send first command.
-            self.command_engine.startCommand(self.ui.commandSequenceTreeView.getCurrentItem().getDaveAction(),
-                                             self.test_mode)
+            self.scheduleCommands()
 
         # Mark all commands as invalid
         else: 
@@ -716,21 +903,21 @@ class Dave(QtGui.QMainWindow):
     ## handleWarning
     #
     # Handles the warning signal from the command engine and determines if Dave should pause
+    # @param item The DaveActionItem of the action that generated the warning.
     # @param message The warning message from the movie engine.
     #
     @hdebug.debug
-    def handleWarning(self, message):
+    def handleWarning(self, item, message):
         # Determine if Dave is in test mode, and use handleProblem if it is
         if self.test_mode:
-            self.handleProblem(message)
+            self.handleProblem(item, message)
         else:
             # Get information on the item that generated the warning
-            current_item = self.ui.commandSequenceTreeView.getCurrentItem()
-            message_str = current_item.getDaveAction().getDescriptor() + "\n" + message.getErrorMessage()
+            message_str = item.getDaveAction().getDescriptor() + "\n" + message.getErrorMessage()
             
             # Generate a warning
             num_warnings = self.ui.currentWarnings.count()
-            self.ui.currentWarnings.addWarning(current_item,
+            self.ui.currentWarnings.addWarning(item,
                                                message_str = message_str,
                                                descriptor = "Warning " + str(num_warnings+1))
 
@@ -741,7 +928,7 @@ class Dave(QtGui.QMainWindow):
                 print message_str
                 
                 # Handle problem and specify the message
-                self.handleProblem(message, message_str = message_str)
+                self.handleProblem(item, message, message_str = message_str)
             else:
                 pass
                 # Nothing needs to be done here, Dave should continue running.
@@ -761,19 +948,39 @@ class Dave(QtGui.QMainWindow):
         if not self.running:
             model = False
             no_error = True
+            recipe_parser = None
             try:
                 model = sequenceViewer.parseSequenceFile(sequence_filename)
 
             except:
                 try:
-                    generated_xml_file = sequenceGenerator.generate(self, sequence_filename)
-                    model = sequenceViewer.parseSequenceFile(generated_xml_file)
+                    # Recipes are expanded (and saved) while Dave loads them.
+                    recipe_parser = sequenceGenerator.stream(self, sequence_filename)
+                    if recipe_parser is not None:
+                        model = sequenceViewer.DaveSequenceModel()
+                    else:
+                        generated_xml_file = sequenceGenerator.generate(self, sequence_filename)
+                        model = sequenceViewer.parseSequenceFile(generated_xml_file)
                 except:         
                     QtGui.QMessageBox.information(self,
                                                   "Error Loading Sequence",
                                                   traceback.format_exc())
                     no_error = False
             if no_error:
+                model.setEstimator(sequenceEstimator.SequenceEstimator(self.cost_cache, self.simulator))
+                self.closeJournal(None)
+                self.resume_index = None
+                if self.sequence_loader is not None:
+                    self.sequence_loader.stop()
+                    self.sequence_loader = None
+                self.recipe_parser = recipe_parser
+                if recipe_parser is not None:
+                    self.sequence_loader = sequenceViewer.SequenceLoader(model,
+                                                                         recipe_parser.streamDavePrimitives(),
+                                                                         parent = self)
+                    self.sequence_loader.error.connect(self.handleLoaderError)
+                    self.sequence_loader.finished.connect(self.handleLoaderFinished)
+                    self.sequence_loader.progress.connect(self.handleLoaderProgress)
                 self.ui.commandSequenceTreeView.setModel(model)
                 self.ui.commandSequenceTreeView.setTestMode(False)
                 self.skip_warning = False #Enable warnings for invalid commands
@@ -786,7 +993,145 @@ class Dave(QtGui.QMainWindow):
                 self.ui.runButton.setEnabled(True)
                 self.ui.runButton.setText("Start")
                 self.ui.abortButton.setEnabled(False)
-                self.ui.validateSequenceButton.setEnabled(True)
+                self.ui.validateSequenceButton.setEnabled(self.sequence_loader is None)
+                if self.sequence_loader is None:
+                    self.checkJournal()
+
+                # Start loading once the (empty) model is in place, the loader
+                # keeps reading until the stream is exhausted.
+                else:
+                    self.sequence_loader.start()
+
+    ## scheduleCommands
+    #
+    # Start the commands that can run now. This can be called again while
+    # it is running, as commands that complete immediately (i.e. in test
+    # mode) call handleDone, in which case it just makes another pass.
+    #
+    def scheduleCommands(self):
+        if self.scheduling:
+            self.schedule_again = True
+            return
+
+        self.scheduling = True
+        try:
+            self.schedule_again = True
+            while self.schedule_again:
+                self.schedule_again = False
+                self.startCommands()
+        finally:
+            self.scheduling = False
+
+    ## simulateSequence
+    #
+    # Dry-run the current sequence with the simulator. Commands that the
+    # simulator could not decide about are left to be validated by HAL
+    # and Kilroy in test mode.
+    #
+    # @return True/False if the sequence was completely validated by the simulator.
+    #
+    @hdebug.debug
+    def simulateSequence(self):
+        report = self.simulator.simulate(self.ui.commandSequenceTreeView.getDaveActions())
+        remaining = self.ui.commandSequenceTreeView.applySimulation(report)
+        self.ui.statusbar.showMessage(report.summary().replace("\n", ", "))
+
+        errors = report.getErrors()
+        if (len(errors) > 0):
+            message_str = str(len(errors)) + " invalid commands:\n"
+            for step in errors[:10]:
+                message_str += step.action.getDescriptor() + "\n  " + step.error + "\n"
+            if (len(errors) > 10):
+                message_str += "..."
+            QtGui.QMessageBox.information(self,
+                                          "Invalid Commands",
+                                          message_str)
+
+        if (remaining == 0):
+            self.sequence_validated = True
+            self.updateEstimates()
+            return True
+        else:
+            return False
+
+    ## startCommands
+    #
+    # Start all of the commands that do not conflict with the commands
+    # that are running. In test mode commands are run one at a time. If
+    # nothing is running this also handles the end of the run and pauses.
+    #
+    def startCommands(self):
+        view = self.ui.commandSequenceTreeView
+        self.waiting_for_commands = False
+
+        # Start commands.
+        if self.running:
+            max_items = None
+            if self.test_mode:
+                max_items = 1 - len(self.command_engine.getRunningItems())
+            if (max_items is None) or (max_items > 0):
+                for item in view.getReadyItems(max_items):
+                    if not self.running:
+                        break
+                    view.setItemStarted(item)
+                    self.command_engine.startCommand(item, self.test_mode)
+
+        # Wait for the running commands.
+        if self.command_engine.isBusy():
+            self.updateRemainingEstimates()
+            self.updateRunStatusDisplay()
+            return
+
+        if self.stop_tcp:
+            self.stopTCP()
+
+        # Wait for the sequence loader if the next command has not been loaded yet.
+        if not view.haveRemainingItems() and view.isLoading():
+            self.waiting_for_commands = True
+            return
+
+        # Handle the end of the run.
+        if not view.haveRemainingItems():
+            self.closeJournal(view.isAborted())
+            self.cost_cache.save()
+            self.ui.runButton.setText("Start")
+            self.ui.runButton.setEnabled(True)
+            self.ui.abortButton.setEnabled(False)
+            self.ui.validateSequenceButton.setEnabled(True)
+            view.resetItemIndex()
+            
+            self.running = False
+            if self.test_mode:
+                self.sequence_validated = True
+                self.test_mode = False
+                view.setTestMode(False)
+                self.updateEstimates()
+
+            # Stop TCP communication
+            self.stopTCP()
+
+        # Handle a requested pause.
+        elif not self.running:
+            self.handlePause()
+
+        # Update progress bar and current command display.
+        self.updateRunStatusDisplay()
+
+    ## stopTCP
+    #
+    # Stop TCP communication. This waits until none of the
+    # actions that are using the TCP clients are running.
+    #
+    def stopTCP(self):
+        if self.command_engine.isBusy():
+            self.stop_tcp = True
+            return
+
+        self.stop_tcp = False
+        if self.needs_hal:
+            self.command_engine.HALClient.stopCommunication()
+        if self.needs_kilroy:
+            self.command_engine.kilroyClient.stopCommunication()
 
     ## updateEstimates
     #
@@ -794,16 +1139,58 @@ class Dave(QtGui.QMainWindow):
     #
     @hdebug.debug
     def updateEstimates(self):
+        self.ui.commandSequenceTreeView.refreshEstimates()
+        self.updateFreeSpace()
         [est_time, est_space] = self.ui.commandSequenceTreeView.getEstimates()
             
         self.ui.timeLabel.setText("Run Duration: " + str(datetime.timedelta(seconds=est_time))[0:8])
-        self.ui.remainingLabel.setText("Time Remaining: " + str(datetime.timedelta(seconds=est_time))[0:8])
-        if est_space/2**10 < 1.0: # Less than GB
-            self.ui.spaceLabel.setText("Run Size: {0:.2f} MB ".format(est_space))
-        elif est_space/2**20 < 1.0: # Less than TB
-            self.ui.spaceLabel.setText("Run Size: {0:.2f} GB ".format(est_space/2**10))
-        else: # Bigger than 1 TB
-            self.ui.spaceLabel.setText("Run Size: {0:.2f} TB ".format(est_space/2**20))
+        self.updateRemainingEstimates()
+
+    ## updateFreeSpace
+    #
+    # Check how much space is free on the disk that HAL is saving to.
+    #
+    def updateFreeSpace(self):
+        directory = self.ui.commandSequenceTreeView.getDirectory()
+        if directory is None:
+            directory = self.data_directory
+        self.free_space = sequenceEstimator.freeDiskSpace(directory)
+
+    ## updateLoadingEstimates
+    #
+    # While a recipe is being streamed the sequence is not complete, so this
+    # shows the totals that the recipe parser has counted so far instead.
+    #
+    def updateLoadingEstimates(self):
+        [n_actions, n_frames, delay] = self.recipe_parser.getEstimates()
+        self.ui.timeLabel.setText("Run Duration: loading, " + str(n_actions) + " actions, " + str(n_frames) + " frames, " + str(datetime.timedelta(seconds=int(delay))) + " of delays so far")
+
+    ## updateRemainingEstimates
+    #
+    # Update the time remaining, the expected end time and how much disk
+    # space will be left at the end of the run. This uses the running
+    # totals of the estimates and the last free disk space measurement.
+    #
+    def updateRemainingEstimates(self):
+        view = self.ui.commandSequenceTreeView
+
+        [est_time, est_space] = view.getEstimates()
+        end_time = datetime.datetime.now() + datetime.timedelta(seconds = est_time)
+        if (end_time.date() == datetime.date.today()):
+            end_str = end_time.strftime("%H:%M")
+        else:
+            end_str = end_time.strftime("%a %H:%M")
+        self.ui.remainingLabel.setText("Time Remaining: " + str(datetime.timedelta(seconds = est_time))[0:8] + " (ends " + end_str + ")")
+
+        space_str = "Run Size: " + sequenceEstimator.formatSize(est_space)
+        if self.free_space is not None:
+            margin = self.free_space - view.getRemainingSize()
+            space_str += ", Free After Run: " + sequenceEstimator.formatSize(margin)
+            if (margin < 0.0):
+                self.ui.spaceLabel.setStyleSheet("QLabel { color: red }")
+            else:
+                self.ui.spaceLabel.setStyleSheet("QLabel { color: black }")
+        self.ui.spaceLabel.setText(space_str)
 
     ## updateRunStatusDisplay
     #
@@ -848,6 +1235,29 @@ class Dave(QtGui.QMainWindow):
                                              err_message)
         return tcp_ready
 
+    ## openJournal
+    #
+    # Start journaling a run, or a resumed run. Nothing is done if the
+    # journal is already open as this is a run that was paused.
+    #
+    def openJournal(self):
+        if self.journal is not None:
+            return
+
+        try:
+            self.journal = runJournal.RunJournal(runJournal.journalName(self.sequence_filename))
+        except IOError:
+            print "Could not open the run journal, this run cannot be resumed."
+            hdebug.logText(traceback.format_exc())
+            return
+
+        if self.resume_index is not None:
+            self.journal.resumeRun(self.resume_index)
+        else:
+            self.journal.startRun(self.sequence_filename, self.ui.commandSequenceTreeView.getNumberItems())
+        self.resume_index = None
+        self.command_engine.setJournal(self.journal)
+
     ## quit
     #
     # Handles the quit file action.
@@ -9,12 +9,22 @@
 #
 # Hazen 09/14
 #
+# Actions can declare the resources that they use with a "resources"
+# attribute, e.g. <DAMoveStage resources="stage">. Actions that do not
+# conflict can then run at the same time. Actions that do not declare
+# their resources wait for all the earlier actions to finish.
+#
+# Hazen 10/15
+#
 
 from xml.etree import ElementTree
 from PyQt4 import QtCore
 
 import sc_library.tcpMessage as tcpMessage
 
+# The resources that an action can declare that it uses.
+resource_names = ["dave", "focus", "hal", "kilroy", "stage"]
+
 ## addField
 #
 # @param block A ElementTree node.
@@ -26,6 +36,72 @@ def addField(block, name, value):
     field.set("type", str(type(value).__name__))
     field.text = str(value)
 
+## estimateRunTime
+#
+# Estimate how long it will take to run a list of actions, allowing for
+# actions that run at the same time. An action starts when all the
+# earlier actions that it conflicts with have finished.
+#
+# @param actions A list of [DaveAction, duration] pairs in sequence order.
+#
+# @return The estimated run time.
+#
+def estimateRunTime(actions):
+    estimator = RunTimeEstimator()
+    for [action, duration] in actions:
+        estimator.addAction(action, duration)
+    return estimator.getRunTime()
+
+## RunTimeEstimator
+#
+# Estimates the run time of a list of actions as they are added (see
+# estimateRunTime()). The increase in the run time due to each action
+# is returned so that the caller can keep a running total of the time
+# left as the actions finish.
+#
+class RunTimeEstimator(object):
+
+    ## __init__
+    #
+    def __init__(self):
+        self.end_time = 0
+        self.exclusive_end_time = 0
+        self.resource_end_times = {}
+
+    ## addAction
+    #
+    # @param action The DaveAction, this is after all the actions that have been added.
+    # @param duration The duration of the action.
+    #
+    # @return How much the action increases the run time.
+    #
+    def addAction(self, action, duration):
+        resources = action.getResources()
+        if resources is None:
+            start_time = self.end_time
+        else:
+            start_time = self.exclusive_end_time
+            for resource in resources:
+                start_time = max(start_time, self.resource_end_times.get(resource, 0))
+
+        action_end_time = start_time + duration
+        if resources is None:
+            self.exclusive_end_time = action_end_time
+        else:
+            for resource in resources:
+                self.resource_end_times[resource] = action_end_time
+
+        last_end_time = self.end_time
+        self.end_time = max(self.end_time, action_end_time)
+        return self.end_time - last_end_time
+
+    ## getRunTime
+    #
+    # @return The estimated run time of the actions that have been added.
+    #
+    def getRunTime(self):
+        return self.end_time
+
 ## DaveAction
 #
 # The base class for a dave action (DA for short).
@@ -52,6 +128,8 @@ class DaveAction(QtCore.QObject):
         self.id = None
         self.tcp_client = None
         self.message = None
+        self.resources = None
+        self.state_setting = False   # The action changes the state of HAL, etc., i.e. the parameters.
         self.valid = True
 
         # Define pause behaviors
@@ -167,7 +245,9 @@ class DaveAction(QtCore.QObject):
             for key in sorted(mdict):
                 data.append([key, mdict[key]])
 
-            # Add disk usage and duration
+            # Add resources, disk usage and duration
+            if self.resources is not None:
+                data.append(["resources", ", ".join(self.resources)])
             if not (self.disk_usage == 0):
                 data.append(["disk usage (kb)", self.disk_usage])
             if not (self.duration == 0):
@@ -184,6 +264,13 @@ class DaveAction(QtCore.QObject):
     def getMessage(self):
         return self.message
 
+    ## getResources
+    #
+    # @return A list of the resources that the action uses, or None if the action needs exclusive access.
+    #
+    def getResources(self):
+        return self.resources
+
     ## getUsage
     #
     # @return Disk usage.
@@ -225,6 +312,16 @@ class DaveAction(QtCore.QObject):
         self.message.setError(True, error_str)
         self.completeActionWithError(self.message)
 
+    ## isStateSetting
+    #
+    # When a run is resumed the last state setting action of each
+    # type before the resume point is run again.
+    #
+    # @return True/False if the action changes the state of HAL, etc.
+    #
+    def isStateSetting(self):
+        return self.state_setting
+
     ## isValid
     #
     # @return True/False is the command is valid.
@@ -256,6 +353,28 @@ class DaveAction(QtCore.QObject):
     def setDuration(self, duration):
         self.duration = duration
 
+    ## setResources
+    #
+    # Actions that communicate with HAL or Kilroy always use that program
+    # as only one message at a time can be sent on each TCP connection.
+    #
+    # @param resources A comma separated string of resource names (i.e. "kilroy, stage"), or None for exclusive access.
+    #
+    def setResources(self, resources):
+        if resources is None:
+            self.resources = None
+            return
+
+        self.resources = []
+        for resource in resources.split(","):
+            resource = resource.strip()
+            if not (resource in resource_names):
+                raise Exception(resource + " is not a valid resource for " + str(type(self)))
+            if not (resource in self.resources):
+                self.resources.append(resource)
+        if (self.action_type in resource_names) and not (self.action_type in self.resources):
+            self.resources.append(self.action_type)
+
     ## setup
     #
     # Perform post creation initialization.
@@ -610,6 +729,15 @@ class DAMoveStage(DaveAction):
         DaveAction.__init__(self)
 
         self.action_type = "hal"
+        self.state_setting = True
+
+    ## abort
+    #
+    # Ask Hal to stop the stage, the move is complete when Hal responds.
+    #
+    def abort(self):
+        stop_message = tcpMessage.TCPMessage(message_type = "Abort Movie")
+        self.tcp_client.sendMessage(stop_message)
 
     ## createETree
     #
@@ -774,6 +902,7 @@ class DASetDirectory(DaveAction):
         DaveAction.__init__(self)
 
         self.action_type = "hal"
+        self.state_setting = True
 
     ## createETree
     #
@@ -822,6 +951,7 @@ class DASetFocusLockTarget(DaveAction):
         DaveAction.__init__(self)
 
         self.action_type = "hal"
+        self.state_setting = True
 
     ## createETree
     #
@@ -867,6 +997,7 @@ class DASetParameters(DaveAction):
         DaveAction.__init__(self)
 
         self.action_type = "hal"
+        self.state_setting = True
 
     ## createETree
     #
@@ -919,6 +1050,7 @@ class DASetProgression(DaveAction):
         DaveAction.__init__(self)
 
         self.action_type = "hal"
+        self.state_setting = True
 
     ## createETree
     #
@@ -998,6 +1130,9 @@ class DATakeMovie(DaveAction):
         DaveAction.__init__(self)
 
         self.action_type = "hal"
+
+        # The first test of a movie in a directory also measures how fast HAL can save to the disk.
+        self.lost_message_delay = 10000
         self.properties = {"name" : None,
                            "length" : None,
                            "min_spots" : None,
@@ -1068,7 +1203,14 @@ class DATakeMovie(DaveAction):
             err_str = str(found_spots) + " found molecules is less than the target: "
             err_str += str(self.min_spots)
             message.setError(True, err_str)
-        DaveAction.handleReply(self,message)                
+
+        # HAL measured the disk and it may not be fast enough.
+        disk_warning = message.getResponse("disk_warning")
+        if (disk_warning is not None) and not message.hasError():
+            message.setError(True, disk_warning)
+            DaveAction.handleReply(self, message, warning = True)
+        else:
+            DaveAction.handleReply(self,message)
 
     ## setup
     #
@@ -0,0 +1,178 @@
+#!/usr/bin/python
+#
+## @file
+#
+# A scripted stand-in for the HAL TCP server, for testing Dave without
+# a microscope. Messages are received and answered in the same way as
+# HAL, one JSON TCPMessage per line, but what happens to each message
+# is decided by a script. The script is a list with one entry for each
+# message that is received:
+#
+#   "complete" - Reply to the message.
+#   "error"    - Reply to the message with an error.
+#   "crash"    - Close the connection without replying and stop the server.
+#   a number   - Wait this many seconds, then reply to the message.
+#
+# Messages after the end of the script are replied to.
+#
+# Hazen 10/15
+#
+
+# Add current storm-control directory to sys.path
+import imp
+imp.load_source("setPath", "../sc_library/setPath.py")
+
+import socket
+import threading
+import time
+
+import sc_library.tcpMessage as tcpMessage
+
+
+## HALStandIn
+#
+# The server runs in its own thread and accepts one connection at a
+# time, like HAL.
+#
+class HALStandIn(threading.Thread):
+
+    ## __init__
+    #
+    # @param script (Optional) A list of what to do with each message, defaults to replying to all of them.
+    # @param port (Optional) The TCP/IP port to listen on, defaults to HAL's port (9000).
+    #
+    def __init__(self, script = None, port = 9000):
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+        self.connection = None
+        self.lock = threading.Lock()
+        self.received = []
+        self.running = True
+        self.script = []
+        if script is not None:
+            self.script = list(script)
+
+        # Listen now so that clients can connect as soon as this returns.
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.server.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server.bind(("127.0.0.1", port))
+        self.server.listen(1)
+        self.server.settimeout(0.1)
+
+    ## getReceived
+    #
+    # @return A list of the types of the messages that were received.
+    #
+    def getReceived(self):
+        self.lock.acquire()
+        received = self.received[:]
+        self.lock.release()
+        return received
+
+    ## handleConnection
+    #
+    # Answer the messages from a client until it disconnects.
+    #
+    # @param connection The socket of the client.
+    #
+    def handleConnection(self, connection):
+        fp = connection.makefile("r")
+        while self.running:
+            line = fp.readline()
+            if (len(line) == 0):
+                break
+            message = tcpMessage.TCPMessage.fromJSON(line)
+
+            self.lock.acquire()
+            self.received.append(message.getType())
+            action = "complete"
+            if (len(self.script) > 0):
+                action = self.script.pop(0)
+            self.lock.release()
+
+            if (action == "crash"):
+                self.running = False
+                break
+            elif (action == "error"):
+                message.setError(True, "HAL stand-in error")
+            elif not isinstance(action, basestring):
+                time.sleep(action)
+
+            connection.sendall(message.toJSON() + "\n")
+        fp.close()
+
+    ## run
+    #
+    def run(self):
+        while self.running:
+            try:
+                connection = self.server.accept()[0]
+            except socket.timeout:
+                continue
+            except socket.error:
+                break
+
+            connection.settimeout(None)
+            self.connection = connection
+            try:
+                self.handleConnection(connection)
+            except socket.error:
+                pass
+            connection.close()
+            self.connection = None
+        self.server.close()
+
+    ## stop
+    #
+    # Stop the server and wait for the thread to finish.
+    #
+    def stop(self):
+        self.running = False
+        if self.connection is not None:
+            try:
+                self.connection.shutdown(socket.SHUT_RDWR)
+            except socket.error:
+                pass
+        self.join()
+
+
+#
+# Testing
+#
+
+if __name__ == "__main__":
+    hal = HALStandIn()
+    hal.start()
+    print "HAL stand-in listening on port 9000, ctrl-c to stop."
+    try:
+        while hal.isAlive():
+            time.sleep(0.5)
+    except KeyboardInterrupt:
+        pass
+    hal.stop()
+
+
+#
+# The MIT License
+#
+# Copyright (c) 2015 Zhuang Lab, Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
@@ -0,0 +1,251 @@
+#!/usr/bin/python
+#
+## @file
+#
+# An append-only journal of a Dave run. Each line is a JSON record of
+# an event, i.e. the start or completion of an action, a warning or an
+# error. The file is synced after every record so that if Dave, HAL or
+# the computer crashes the journal can be used to resume the run from
+# the first action that did not complete.
+#
+# Hazen 10/15
+#
+
+import json
+import os
+import time
+
+
+## journalName
+#
+# @param sequence_filename The name of the sequence (or recipe) file.
+#
+# @return The name of the journal file for this sequence.
+#
+def journalName(sequence_filename):
+    return sequence_filename + ".journal"
+
+## readJournal
+#
+# Read the most recent run from a journal file. Incomplete records (i.e.
+# the last line if Dave crashed while writing it) are ignored.
+#
+# @param filename The name of the journal file.
+#
+# @return A JournalRun object, or None if the file does not exist or does not contain a run.
+#
+def readJournal(filename):
+    if not os.path.exists(filename):
+        return None
+
+    journal_run = None
+    with open(filename) as fp:
+        for line in fp:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if (record.get("event") == "run"):
+                journal_run = JournalRun(record)
+            elif journal_run is not None:
+                journal_run.addRecord(record)
+    return journal_run
+
+
+## JournalRun
+#
+# The information about a run that is recorded in a journal.
+#
+class JournalRun(object):
+
+    ## __init__
+    #
+    # @param record The "run" record that starts the run.
+    #
+    def __init__(self, record):
+        self.completed = set()
+        self.descriptors = {}
+        self.finished = False
+        self.n_actions = record.get("n_actions")
+        self.sequence = record.get("sequence")
+        self.start_time = record.get("time")
+        self.warnings = []
+
+    ## addRecord
+    #
+    # @param record A (dictionary) record from the journal.
+    #
+    def addRecord(self, record):
+        event = record.get("event")
+        if (event == "complete"):
+            self.completed.add(record["index"])
+            self.descriptors[record["index"]] = record["descriptor"]
+        elif (event == "end"):
+            self.finished = True
+        elif (event == "error"):
+            # An action that failed has to be run again.
+            self.completed.discard(record["index"])
+            self.warnings.append(record)
+        elif (event == "warning"):
+            self.warnings.append(record)
+
+    ## getFirstIncomplete
+    #
+    # @return The index of the first action that did not complete.
+    #
+    def getFirstIncomplete(self):
+        index = 0
+        while (index in self.completed):
+            index += 1
+        return index
+
+    ## matches
+    #
+    # Check that the sequence has not changed since the journal was written.
+    # The number of actions is not checked as this is not known at the
+    # start of the run if the sequence is still being generated.
+    #
+    # @param dave_actions The list of DaveActions in the sequence.
+    #
+    # @return True/False if the completed actions match the actions in the sequence.
+    #
+    def matches(self, dave_actions):
+        for index in self.completed:
+            if (index >= len(dave_actions)) or (dave_actions[index].getDescriptor() != self.descriptors[index]):
+                return False
+        return True
+
+    ## needsResume
+    #
+    # @return True/False if the run did not finish but completed at least one action.
+    #
+    def needsResume(self):
+        return (not self.finished) and (len(self.completed) > 0)
+
+
+## RunJournal
+#
+# Writes the journal of a run.
+#
+class RunJournal(object):
+
+    ## __init__
+    #
+    # @param filename The name of the journal file, new records are appended to this file.
+    #
+    def __init__(self, filename):
+        self.filename = filename
+        self.fp = open(filename, "a+")
+
+        # Start on a new line if the last record is incomplete.
+        self.fp.seek(0, 2)
+        if (self.fp.tell() > 0):
+            self.fp.seek(-1, 2)
+            last = self.fp.read(1)
+            self.fp.seek(0, 2)
+            if (last != "\n"):
+                self.fp.write("\n")
+
+    ## actionComplete
+    #
+    # @param index The index of the action in the sequence.
+    # @param dave_action The DaveAction.
+    # @param message The TCP message that the action received as a reply.
+    #
+    def actionComplete(self, index, dave_action, message):
+        self.write({"event" : "complete",
+                    "index" : index,
+                    "descriptor" : dave_action.getDescriptor(),
+                    "response" : message.response})
+
+    ## actionProblem
+    #
+    # @param event Either "warning" or "error".
+    # @param index The index of the action in the sequence.
+    # @param dave_action The DaveAction.
+    # @param message The TCP message that the action received as a reply.
+    #
+    def actionProblem(self, event, index, dave_action, message):
+        self.write({"event" : event,
+                    "index" : index,
+                    "descriptor" : dave_action.getDescriptor(),
+                    "message" : message.getErrorMessage()})
+
+    ## actionStarted
+    #
+    # The message data is recorded as this includes the names of the files that the action creates.
+    #
+    # @param index The index of the action in the sequence.
+    # @param dave_action The DaveAction.
+    #
+    def actionStarted(self, index, dave_action):
+        self.write({"event" : "start",
+                    "index" : index,
+                    "descriptor" : dave_action.getDescriptor(),
+                    "data" : dave_action.getMessage().getMessageData()})
+
+    ## close
+    #
+    def close(self):
+        self.fp.close()
+
+    ## endRun
+    #
+    # @param aborted True/False if the run was aborted.
+    #
+    def endRun(self, aborted):
+        self.write({"event" : "end",
+                    "aborted" : aborted})
+
+    ## resumeRun
+    #
+    # @param index The index of the first action that did not complete.
+    #
+    def resumeRun(self, index):
+        self.write({"event" : "resume",
+                    "index" : index})
+
+    ## startRun
+    #
+    # @param sequence The name of the sequence file.
+    # @param n_actions The number of actions in the sequence.
+    #
+    def startRun(self, sequence, n_actions):
+        self.write({"event" : "run",
+                    "sequence" : sequence,
+                    "n_actions" : n_actions})
+
+    ## write
+    #
+    # @param record A dictionary, this is written as a single line of JSON.
+    #
+    def write(self, record):
+        record["time"] = time.time()
+        self.fp.write(json.dumps(record) + "\n")
+        self.fp.flush()
+        os.fsync(self.fp.fileno())
+
+
+#
+# The MIT License
+#
+# Copyright (c) 2015 Zhuang Lab, Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
@@ -0,0 +1,369 @@
+#!/usr/bin/python
+#
+## @file
+#
+# Fast estimates of how long a sequence will take and how much disk
+# space it will use. The estimate for each action comes from (in order
+# of preference):
+#
+#  1. The cost of the same kind of action measured in previous (real)
+#     runs. These are saved in a JSON file so that they are kept from
+#     one session to the next.
+#  2. The values from validating the sequence (in test mode or with
+#     the simulator).
+#  3. The simulator models, i.e. movie durations from the number of
+#     frames and the cycle time & frame size in the parameters files.
+#
+# The models are run once for each action when it is added, so the
+# estimates of sequences that are streamed in are updated as each
+# action arrives and do not need any TCP communication.
+#
+# Hazen 10/15
+#
+
+import json
+import math
+import os
+import sys
+
+import sequenceSimulator
+
+
+## costKey
+#
+# Actions with the same key are assumed to have the same cost for the
+# same size, i.e. movies with the same parameters and number of frames.
+#
+# @param message The TCPMessage of the action.
+# @param state The SimulatorState before the action.
+#
+# @return [key, size], key is None for actions whose cost should not be learned.
+#
+def costKey(message, state):
+    m_type = message.getType()
+    if (m_type == "Take Movie"):
+        parameters = message.getData("parameters")
+        if parameters is None:
+            parameters = state.parameters
+        return [m_type + " " + str(parameters), float(message.getData("length"))]
+
+    elif (m_type == "Kilroy Protocol"):
+        return [m_type + " " + str(message.getData("name")), 0.0]
+
+    elif (m_type == "Move Stage"):
+        x = message.getData("stage_x")
+        y = message.getData("stage_y")
+        if (state.stage_x is None) or (x is None) or (y is None):
+            return [None, 0.0]
+        return [m_type, math.sqrt((x - state.stage_x)**2 + (y - state.stage_y)**2)]
+
+    # The duration of these is set by the user.
+    elif (m_type == "Delay") or (m_type == "Pause"):
+        return [None, 0.0]
+
+    else:
+        return [m_type, 0.0]
+
+## formatSize
+#
+# @param mega_bytes A size in MB.
+#
+# @return The size as a string in MB, GB or TB.
+#
+def formatSize(mega_bytes):
+    if (abs(mega_bytes)/2**10 < 1.0):
+        return "{0:.2f} MB".format(mega_bytes)
+    elif (abs(mega_bytes)/2**20 < 1.0):
+        return "{0:.2f} GB".format(mega_bytes/2**10)
+    else:
+        return "{0:.2f} TB".format(mega_bytes/2**20)
+
+## freeDiskSpace
+#
+# @param directory A directory.
+#
+# @return The free space (in MB) on the disk that contains the directory, or None if this is not known.
+#
+def freeDiskSpace(directory):
+    if (directory is None) or not os.path.isdir(directory):
+        return None
+    if (sys.platform == "win32"):
+        import ctypes
+        free_bytes = ctypes.c_ulonglong(0)
+        if not ctypes.windll.kernel32.GetDiskFreeSpaceExW(ctypes.c_wchar_p(unicode(directory)), None, None, ctypes.pointer(free_bytes)):
+            return None
+        return free_bytes.value * 1.0/2**20
+    else:
+        stats = os.statvfs(directory)
+        return stats.f_bavail * stats.f_frsize * 1.0/2**20
+
+
+## ActionEstimate
+#
+# The (state dependent) information about an action that the estimator needs.
+#
+class ActionEstimate(object):
+
+    ## __init__
+    #
+    # @param key The cost key of the action.
+    # @param size The size of the action, i.e. the number of frames in a movie.
+    # @param directory The directory that HAL will save in when the action is run.
+    # @param step The SimulatorStep of the action.
+    #
+    def __init__(self, key, size, directory, step):
+        self.directory = directory
+        self.key = key
+        self.model_disk_usage = None
+        self.model_duration = None
+        self.size = size
+        if step.isDecided() or (step.duration > 0.0):
+            self.model_disk_usage = step.disk_usage
+            self.model_duration = step.duration
+
+
+## CostCache
+#
+# The costs (duration and disk usage) of actions measured in real runs.
+#
+class CostCache(object):
+
+    ## __init__
+    #
+    # @param filename (Optional) The JSON file to load the costs from and save them in, defaults to None.
+    #
+    def __init__(self, filename = None):
+        self.changed = False
+        self.costs = {}
+        self.filename = filename
+
+        if (self.filename is not None) and os.path.exists(self.filename):
+            try:
+                with open(self.filename) as fp:
+                    for key, [duration, disk_usage] in json.load(fp).items():
+                        self.costs[key] = [CostModel(duration), CostModel(disk_usage)]
+            except (IOError, TypeError, ValueError):
+                print "Could not load the action costs from", self.filename
+                self.costs = {}
+
+    ## addMeasurement
+    #
+    # @param key The cost key of the action.
+    # @param size The size of the action.
+    # @param duration The measured duration in seconds.
+    # @param disk_usage The measured disk usage in MB, None if this was not measured.
+    #
+    def addMeasurement(self, key, size, duration, disk_usage):
+        if not (key in self.costs):
+            self.costs[key] = [CostModel(), CostModel()]
+        self.costs[key][0].addMeasurement(size, duration)
+        if disk_usage is not None:
+            self.costs[key][1].addMeasurement(size, disk_usage)
+        self.changed = True
+
+    ## getDiskUsage
+    #
+    # @param key The cost key of the action.
+    # @param size The size of the action.
+    #
+    # @return The expected disk usage in MB, or None if this has not been measured.
+    #
+    def getDiskUsage(self, key, size):
+        if key in self.costs:
+            return self.costs[key][1].predict(size)
+
+    ## getDuration
+    #
+    # @param key The cost key of the action.
+    # @param size The size of the action.
+    #
+    # @return The expected duration in seconds, or None if this has not been measured.
+    #
+    def getDuration(self, key, size):
+        if key in self.costs:
+            return self.costs[key][0].predict(size)
+
+    ## save
+    #
+    # Save the costs, if they have changed since they were loaded.
+    #
+    def save(self):
+        if (self.filename is None) or not self.changed:
+            return
+        costs = {}
+        for key in self.costs:
+            costs[key] = map(lambda x: x.getSums(), self.costs[key])
+        try:
+            with open(self.filename, "w") as fp:
+                json.dump(costs, fp)
+            self.changed = False
+        except IOError:
+            print "Could not save the action costs in", self.filename
+
+
+## CostModel
+#
+# A (weighted) least squares fit of cost = a + b * size. Older
+# measurements are given less weight, so the model follows changes
+# to the setup, i.e. a new camera.
+#
+class CostModel(object):
+
+    decay = 0.95    # The weight of the previous measurements relative to a new measurement.
+
+    ## __init__
+    #
+    # @param sums (Optional) The sums from a previous session, defaults to None.
+    #
+    def __init__(self, sums = None):
+        if sums is None:
+            sums = [0.0, 0.0, 0.0, 0.0, 0.0]
+        [self.n, self.sx, self.sy, self.sxx, self.sxy] = sums
+
+    ## addMeasurement
+    #
+    # @param x The size.
+    # @param y The cost.
+    #
+    def addMeasurement(self, x, y):
+        self.n = self.decay * self.n + 1.0
+        self.sx = self.decay * self.sx + x
+        self.sy = self.decay * self.sy + y
+        self.sxx = self.decay * self.sxx + x * x
+        self.sxy = self.decay * self.sxy + x * y
+
+    ## getSums
+    #
+    # @return [n, sum x, sum y, sum x * x, sum x * y].
+    #
+    def getSums(self):
+        return [self.n, self.sx, self.sy, self.sxx, self.sxy]
+
+    ## predict
+    #
+    # If all the measurements were for the same size then the cost is
+    # assumed to be proportional to the size.
+    #
+    # @param x The size.
+    #
+    # @return The expected cost, or None if there are no measurements.
+    #
+    def predict(self, x):
+        if (self.n == 0.0):
+            return None
+        mean_x = self.sx/self.n
+        mean_y = self.sy/self.n
+        var_x = self.sxx/self.n - mean_x * mean_x
+        if (var_x > 1.0e-6 * (1.0 + mean_x * mean_x)):
+            slope = (self.sxy/self.n - mean_x * mean_y)/var_x
+            return max(0.0, mean_y + slope * (x - mean_x))
+        elif (mean_x > 0.0):
+            return mean_y * x/mean_x
+        else:
+            return mean_y
+
+
+## SequenceEstimator
+#
+# Estimates the duration and disk usage of the actions in a sequence.
+#
+class SequenceEstimator(object):
+
+    ## __init__
+    #
+    # @param cost_cache A CostCache object.
+    # @param simulator (Optional) A sequenceSimulator.SequenceSimulator object, defaults to the default models.
+    #
+    def __init__(self, cost_cache, simulator = None):
+        self.cost_cache = cost_cache
+        self.estimates = []
+        self.simulator = simulator
+        self.state = sequenceSimulator.SimulatorState()
+
+        if self.simulator is None:
+            self.simulator = sequenceSimulator.SequenceSimulator([sequenceSimulator.HALModel(),
+                                                                  sequenceSimulator.FocusLockModel(),
+                                                                  sequenceSimulator.StageModel()])
+
+    ## addAction
+    #
+    # Actions must be added in sequence order.
+    #
+    # @param dave_action A DaveAction.
+    #
+    def addAction(self, dave_action):
+        [key, size] = costKey(dave_action.getMessage(), self.state)
+        step = self.simulator.simulateAction(dave_action, self.state)
+        self.estimates.append(ActionEstimate(key, size, self.state.directory, step))
+
+    ## addMeasurement
+    #
+    # @param index The index of the action in the sequence.
+    # @param duration The measured duration in seconds.
+    # @param disk_usage The measured disk usage in MB, None if this was not measured.
+    #
+    def addMeasurement(self, index, duration, disk_usage):
+        estimate = self.estimates[index]
+        if estimate.key is not None:
+            self.cost_cache.addMeasurement(estimate.key, estimate.size, duration, disk_usage)
+
+    ## getDirectory
+    #
+    # @param index The index of an action in the sequence.
+    #
+    # @return The directory that HAL will save in when the action is run, None if this is not known.
+    #
+    def getDirectory(self, index):
+        if (len(self.estimates) > 0):
+            return self.estimates[min(index, len(self.estimates) - 1)].directory
+
+    ## getEstimates
+    #
+    # @param index The index of the action in the sequence.
+    # @param dave_action The DaveAction.
+    #
+    # @return [disk usage, duration] estimates for the action.
+    #
+    def getEstimates(self, index, dave_action):
+        estimate = self.estimates[index]
+
+        disk_usage = None
+        duration = None
+        if estimate.key is not None:
+            disk_usage = self.cost_cache.getDiskUsage(estimate.key, estimate.size)
+            duration = self.cost_cache.getDuration(estimate.key, estimate.size)
+
+        if disk_usage is None:
+            disk_usage = dave_action.getUsage()
+            if (disk_usage == 0) and (estimate.model_disk_usage is not None):
+                disk_usage = estimate.model_disk_usage
+        if duration is None:
+            duration = dave_action.getDuration()
+            if (duration == 0) and (estimate.model_duration is not None):
+                duration = estimate.model_duration
+        return [disk_usage, duration]
+
+
+#
+# The MIT License
+#
+# Copyright (c) 2015 Zhuang Lab, Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
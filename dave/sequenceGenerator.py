@@ -56,3 +56,22 @@ def generate(parent, xml_file):
     else:
         return None
 
+## stream
+#
+# Only version 2 XML recipes can be streamed. The [path, node] pairs of the
+# sequence are streamed with the parser's streamDavePrimitives() method.
+#
+# @param parent The PyQt parent to use when displaying a dialog box.
+# @param xml_file The input xml file
+#
+# @return A v2Generator.XMLRecipeParser that is ready to stream or None if the recipe cannot be streamed.
+#
+def stream(parent, xml_file):
+    root_element = ElementTree.parse(xml_file).getroot().tag
+    if (root_element == "recipe"):
+        xml_parser = v2Generator.XMLRecipeParser(xml_filename = xml_file,
+                                                 verbose = False)
+        if xml_parser.loadRecipe():
+            return xml_parser
+    return None
+
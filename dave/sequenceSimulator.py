@@ -0,0 +1,688 @@
+#!/usr/bin/python
+#
+## @file
+#
+# Dry-runs a list of DaveActions in-process using simple models of
+# HAL, the focus lock, the stage and Kilroy. This is much faster
+# than validating a sequence by sending every command to the other
+# programs in test mode. Commands that the models cannot decide
+# about (for example parameters files that the simulator was not
+# told about) are marked as undecided so that Dave can validate
+# just these over TCP.
+#
+# The simulator is configured with a XML file like this:
+#
+# <simulator>
+#   <hal filetype=".dax" parameters_directory="C:/hal/settings/">
+#     <parameters name="0" seconds_per_frame="0.0167" bytes_per_frame="524288"/>
+#     <parameters name="storm.xml" seconds_per_frame="0.0167" bytes_per_frame="524288"/>
+#   </hal>
+#   <focus_lock min_target="-100.0" max_target="100.0" find_sum_time="5.0" check_focus_time="1.0"/>
+#   <stage x_min="-10000.0" x_max="10000.0" y_min="-10000.0" y_max="10000.0" speed="1000.0" settle_time="0.5"/>
+#   <kilroy config="../fluidics/default_config.xml" valve_latency="1.0" pump_latency="0.1"/>
+# </simulator>
+#
+# Durations are in seconds and disk usage is in MB (as reported by HAL).
+# The Kilroy latencies are how long the valves take to move and how long
+# the pump takes to respond to a command, Kilroy measures these when it
+# runs protocols.
+#
+# Parameters that are not listed in the configuration file are looked
+# for in parameters_directory. The movie timing from these files is only
+# an estimate (the camera decides the actual cycle time), so movies that
+# use them are still validated by HAL.
+#
+# Hazen 10/15
+#
+
+import math
+import os
+import sys
+
+from xml.etree import ElementTree
+from PyQt4 import QtCore
+
+import daveActions
+import fluidics.kilroyCompiler as kilroyCompiler
+
+
+## SimulatorStep
+#
+# The result of simulating a single DaveAction.
+#
+class SimulatorStep(object):
+
+    ## __init__
+    #
+    # @param action The DaveAction that was simulated.
+    #
+    def __init__(self, action):
+        self.action = action
+        self.decided = True
+        self.disk_usage = 0.0
+        self.duration = 0.0
+        self.error = None
+
+    ## isDecided
+    #
+    # @return True/False if one of the models was able to decide about the action.
+    #
+    def isDecided(self):
+        return self.decided
+
+    ## isValid
+    #
+    # @return True/False if the action is valid (undecided actions are considered valid).
+    #
+    def isValid(self):
+        return (self.error is None)
+
+    ## setError
+    #
+    # @param error_message A string describing the problem.
+    #
+    def setError(self, error_message):
+        self.error = error_message
+
+    ## setUndecided
+    #
+    # Mark this step as one that needs to be validated by the real program.
+    #
+    def setUndecided(self):
+        self.decided = False
+
+
+## SimulatorState
+#
+# The state of the (simulated) setup as the sequence progresses.
+#
+class SimulatorState(object):
+
+    ## __init__
+    #
+    def __init__(self):
+        self.directory = None
+        self.lock_target = None
+        self.parameters = None
+        self.stage_x = None
+        self.stage_y = None
+
+
+## DeviceModel
+#
+# The base class for device models. Sub-classes should specify which
+# message types they handle and implement simulate().
+#
+class DeviceModel(object):
+
+    message_types = []
+
+    ## handles
+    #
+    # @param message_type The type of a TCPMessage.
+    #
+    # @return True/False if this model handles messages of this type.
+    #
+    def handles(self, message_type):
+        return (message_type in self.message_types)
+
+    ## simulate
+    #
+    # Update step with the duration, disk usage and any errors for the
+    # message. If the model cannot decide then call step.setUndecided().
+    #
+    # @param message The TCPMessage associated with the action.
+    # @param step A SimulatorStep object.
+    # @param state A SimulatorState object.
+    #
+    def simulate(self, message, step, state):
+        step.setUndecided()
+
+
+## DaveModel
+#
+# Handles the actions that Dave does itself.
+#
+class DaveModel(DeviceModel):
+
+    message_types = ["Clear Warnings", "Delay", "Pause"]
+
+    ## simulate
+    #
+    # @param message The TCPMessage associated with the action.
+    # @param step A SimulatorStep object.
+    # @param state A SimulatorState object.
+    #
+    def simulate(self, message, step, state):
+        if (message.getType() == "Delay"):
+            step.duration = 0.001 * float(message.getData("delay"))
+
+
+## FocusLockModel
+#
+# A model of the focus lock.
+#
+class FocusLockModel(DeviceModel):
+
+    message_types = ["Check Focus Lock", "Find Optimal Sum", "Find Sum", "Recenter Piezo", "Set Lock Target"]
+
+    ## __init__
+    #
+    # @param node (Optional) A "focus_lock" ElementTree node, defaults to None.
+    #
+    def __init__(self, node = None):
+        self.check_focus_time = 1.0
+        self.find_sum_time = 5.0
+        self.max_target = None
+        self.min_target = None
+        self.recenter_time = 1.0
+        if node is not None:
+            self.check_focus_time = float(node.get("check_focus_time", self.check_focus_time))
+            self.find_sum_time = float(node.get("find_sum_time", self.find_sum_time))
+            self.recenter_time = float(node.get("recenter_time", self.recenter_time))
+            if node.get("max_target") is not None:
+                self.max_target = float(node.get("max_target"))
+            if node.get("min_target") is not None:
+                self.min_target = float(node.get("min_target"))
+
+    ## simulate
+    #
+    # @param message The TCPMessage associated with the action.
+    # @param step A SimulatorStep object.
+    # @param state A SimulatorState object.
+    #
+    def simulate(self, message, step, state):
+        m_type = message.getType()
+        if (m_type == "Check Focus Lock"):
+            step.duration = self.check_focus_time + 0.1 * float(message.getData("num_focus_checks"))
+        elif (m_type == "Find Optimal Sum") or (m_type == "Find Sum"):
+            step.duration = self.find_sum_time
+        elif (m_type == "Recenter Piezo"):
+            step.duration = self.recenter_time
+        elif (m_type == "Set Lock Target"):
+            target = message.getData("lock_target")
+            if (self.min_target is not None) and (target < self.min_target):
+                step.setError("Lock target " + str(target) + " is less than the minimum " + str(self.min_target))
+            elif (self.max_target is not None) and (target > self.max_target):
+                step.setError("Lock target " + str(target) + " is greater than the maximum " + str(self.max_target))
+            else:
+                state.lock_target = target
+
+
+## HALModel
+#
+# A model of HAL (directories, parameters, progressions and movies).
+#
+class HALModel(DeviceModel):
+
+    message_types = ["Set Directory", "Set Parameters", "Set Progression", "Take Movie"]
+
+    ## __init__
+    #
+    # @param node (Optional) A "hal" ElementTree node, defaults to None.
+    #
+    def __init__(self, node = None):
+        self.filetype = ".dax"
+        self.parameters = {}
+        self.parameters_directory = ""
+        self.parameters_files = {}
+        if node is not None:
+            self.filetype = node.get("filetype", self.filetype)
+            self.parameters_directory = node.get("parameters_directory", self.parameters_directory)
+            for p_node in node.findall("parameters"):
+                self.parameters[p_node.get("name")] = [float(p_node.get("seconds_per_frame")),
+                                                       float(p_node.get("bytes_per_frame"))]
+
+    ## getTiming
+    #
+    # @param name The name of the parameters.
+    #
+    # @return [seconds per frame, bytes per frame, decided] or None if the timing is not known.
+    #
+    def getTiming(self, name):
+        if name in self.parameters:
+            return self.parameters[name] + [True]
+
+        # Parameters files are only read once.
+        if not (name in self.parameters_files):
+            self.parameters_files[name] = None
+            for filename in [name, os.path.join(self.parameters_directory, name)]:
+                if os.path.isfile(filename):
+                    self.parameters_files[name] = loadParametersTiming(filename)
+                    break
+        if self.parameters_files[name] is not None:
+            return self.parameters_files[name] + [False]
+
+    ## simulate
+    #
+    # @param message The TCPMessage associated with the action.
+    # @param step A SimulatorStep object.
+    # @param state A SimulatorState object.
+    #
+    def simulate(self, message, step, state):
+        m_type = message.getType()
+
+        if (m_type == "Set Directory"):
+            directory = message.getData("directory")
+            if not os.path.isdir(directory):
+                step.setError(str(directory) + " is an invalid directory")
+            else:
+                state.directory = directory
+
+        elif (m_type == "Set Parameters"):
+            name = str(message.getData("parameters"))
+            state.parameters = name
+            if not (name in self.parameters):
+                step.setUndecided()
+
+        elif (m_type == "Set Progression"):
+            filename = message.getData("filename")
+            if (filename is not None) and not os.path.exists(filename):
+                step.setError(str(filename) + " does not exist")
+
+        elif (m_type == "Take Movie"):
+            length = message.getData("length")
+            if (length is None) or (length < 1):
+                step.setError(str(length) + " is an invalid movie length")
+                return
+
+            # The movie can specify its own directory.
+            directory = state.directory
+            if message.getData("directory") is not None:
+                directory = message.getData("directory")
+
+            if (message.getData("overwrite") == False) and (directory is not None):
+                file_path = os.path.join(directory, message.getData("name") + self.filetype)
+                if os.path.exists(file_path):
+                    step.setError(file_path + " will be overwritten")
+                    return
+
+            if message.getData("parameters") is not None:
+                state.parameters = str(message.getData("parameters"))
+
+            timing = None
+            if state.parameters is not None:
+                timing = self.getTiming(state.parameters)
+            if timing is None:
+                step.setUndecided()
+            else:
+                [seconds_per_frame, bytes_per_frame, decided] = timing
+                step.duration = length * seconds_per_frame
+                step.disk_usage = length * bytes_per_frame * 1.0/2**20
+                if not decided:
+                    step.setUndecided()
+
+
+## KilroyModel
+#
+# A model of Kilroy, the protocols are compiled from the Kilroy configuration file
+# and their durations are estimated using the (measured) latencies of the valves
+# and the pump.
+#
+class KilroyModel(DeviceModel):
+
+    message_types = ["Kilroy Protocol"]
+
+    ## __init__
+    #
+    # @param node (Optional) A "kilroy" ElementTree node, defaults to None.
+    # @param directory (Optional) The directory relative to which the Kilroy configuration file is located.
+    #
+    def __init__(self, node = None, directory = ""):
+        self.latencies = None
+        self.protocols = None
+        if (node is not None) and (node.get("config") is not None):
+            self.protocols = loadKilroyProtocols(os.path.join(directory, node.get("config")))
+            latencies = {}
+            for device in ["pump", "valve"]:
+                if node.get(device + "_latency") is not None:
+                    latencies[device] = float(node.get(device + "_latency"))
+            self.latencies = kilroyCompiler.DeviceLatencies(latencies)
+
+    ## simulate
+    #
+    # @param message The TCPMessage associated with the action.
+    # @param step A SimulatorStep object.
+    # @param state A SimulatorState object.
+    #
+    def simulate(self, message, step, state):
+        if self.protocols is None:
+            step.setUndecided()
+            return
+
+        name = message.getData("name")
+        if not (name in self.protocols):
+            step.setError("Invalid Kilroy Protocol")
+        elif not self.protocols[name].isValid():
+            step.setError("Invalid Kilroy Protocol, " + self.protocols[name].getErrors()[0])
+        else:
+            step.duration = self.protocols[name].estimateTime(self.latencies)
+
+
+## StageModel
+#
+# A model of the stage.
+#
+class StageModel(DeviceModel):
+
+    message_types = ["Get Stage Position", "Move Stage"]
+
+    ## __init__
+    #
+    # @param node (Optional) A "stage" ElementTree node, defaults to None.
+    #
+    def __init__(self, node = None):
+        self.limits = [None, None, None, None]
+        self.settle_time = 1.0
+        self.speed = None
+        if node is not None:
+            for i, name in enumerate(["x_min", "x_max", "y_min", "y_max"]):
+                if node.get(name) is not None:
+                    self.limits[i] = float(node.get(name))
+            self.settle_time = float(node.get("settle_time", self.settle_time))
+            if node.get("speed") is not None:
+                self.speed = float(node.get("speed"))
+
+    ## simulate
+    #
+    # @param message The TCPMessage associated with the action.
+    # @param step A SimulatorStep object.
+    # @param state A SimulatorState object.
+    #
+    def simulate(self, message, step, state):
+        if (message.getType() != "Move Stage"):
+            return
+
+        x = message.getData("stage_x")
+        y = message.getData("stage_y")
+        if (x is None) or (y is None):
+            step.setError("Invalid positions")
+            return
+
+        [x_min, x_max, y_min, y_max] = self.limits
+        if ((x_min is not None) and (x < x_min)) or ((x_max is not None) and (x > x_max)):
+            step.setError("Stage x position " + str(x) + " is out of range")
+            return
+        if ((y_min is not None) and (y < y_min)) or ((y_max is not None) and (y > y_max)):
+            step.setError("Stage y position " + str(y) + " is out of range")
+            return
+
+        step.duration = self.settle_time
+        if (self.speed is not None) and (state.stage_x is not None):
+            dx = x - state.stage_x
+            dy = y - state.stage_y
+            step.duration += math.sqrt(dx*dx + dy*dy)/self.speed
+        state.stage_x = x
+        state.stage_y = y
+
+
+## SimulatorReport
+#
+# The results of simulating a sequence.
+#
+class SimulatorReport(object):
+
+    ## __init__
+    #
+    # @param steps A list of SimulatorStep objects.
+    #
+    def __init__(self, steps):
+        self.steps = steps
+
+    ## getDiskUsage
+    #
+    # @return The total disk usage (in MB) of the valid steps.
+    #
+    def getDiskUsage(self):
+        return sum(map(lambda x: x.disk_usage, self.getValid()))
+
+    ## getDuration
+    #
+    # @return The total duration (in seconds) of the valid steps, allowing for steps that run at the same time.
+    #
+    def getDuration(self):
+        return daveActions.estimateRunTime(map(lambda x: [x.action, x.duration], self.getValid()))
+
+    ## getErrors
+    #
+    # @return A list of the steps that had errors.
+    #
+    def getErrors(self):
+        return filter(lambda x: not x.isValid(), self.steps)
+
+    ## getSteps
+    #
+    # @return A list of all the SimulatorStep objects.
+    #
+    def getSteps(self):
+        return self.steps
+
+    ## getUndecided
+    #
+    # @return A list of the steps that need to be checked by the real programs.
+    #
+    def getUndecided(self):
+        return filter(lambda x: not x.isDecided(), self.steps)
+
+    ## getValid
+    #
+    # @return A list of the steps that did not have errors.
+    #
+    def getValid(self):
+        return filter(lambda x: x.isValid(), self.steps)
+
+    ## summary
+    #
+    # @param verbose (Optional) Include information about every step, defaults to False.
+    #
+    # @return A string summarizing the report.
+    #
+    def summary(self, verbose = False):
+        text = ""
+        if verbose:
+            for i, step in enumerate(self.steps):
+                text += "{0:d} {1:s}: {2:.2f}s, {3:.2f}MB".format(i, step.action.getDescriptor(), step.duration, step.disk_usage)
+                if not step.isDecided():
+                    text += " (undecided)"
+                if not step.isValid():
+                    text += " error: " + step.error
+                text += "\n"
+        text += str(len(self.steps)) + " actions, "
+        text += str(len(self.getErrors())) + " errors, "
+        text += str(len(self.getUndecided())) + " undecided\n"
+        text += "Duration: {0:.1f}s, Disk usage: {1:.1f}MB".format(self.getDuration(), self.getDiskUsage())
+        return text
+
+
+## SequenceSimulator
+#
+# Simulates a list of DaveActions.
+#
+class SequenceSimulator(object):
+
+    ## __init__
+    #
+    # @param models (Optional) A list of DeviceModel objects, defaults to None.
+    #
+    def __init__(self, models = None):
+        self.models = [DaveModel()]
+        if models is not None:
+            self.models.extend(models)
+
+    ## addModel
+    #
+    # @param model A DeviceModel object.
+    #
+    def addModel(self, model):
+        self.models.append(model)
+
+    ## simulate
+    #
+    # @param dave_actions A list of DaveActions.
+    #
+    # @return A SimulatorReport object.
+    #
+    def simulate(self, dave_actions):
+        state = SimulatorState()
+        steps = []
+        for action in dave_actions:
+            steps.append(self.simulateAction(action, state))
+        return SimulatorReport(steps)
+
+    ## simulateAction
+    #
+    # @param action A DaveAction.
+    # @param state The SimulatorState before the action, this is updated.
+    #
+    # @return A SimulatorStep object.
+    #
+    def simulateAction(self, action, state):
+        step = SimulatorStep(action)
+        message = action.getMessage()
+        for model in self.models:
+            if model.handles(message.getType()):
+                model.simulate(message, step, state)
+                break
+        else:
+            step.setUndecided()
+        return step
+
+
+## loadKilroyProtocols
+#
+# Compile the protocols in a Kilroy configuration file.
+#
+# @param xml_file The Kilroy configuration file.
+#
+# @return A dictionary of kilroyCompiler.CompiledProtocol objects keyed by protocol name.
+#
+def loadKilroyProtocols(xml_file):
+    protocols = {}
+    for protocol in kilroyCompiler.loadProtocols(xml_file):
+        protocols[protocol.getName()] = protocol
+    return protocols
+
+## loadParametersTiming
+#
+# Get the movie timing from a HAL parameters file. The cycle time is
+# used if HAL saved it in the file, otherwise the exposure time.
+#
+# @param xml_file The HAL parameters file.
+#
+# @return [seconds per frame, bytes per frame] or None if the file does not have this information.
+#
+def loadParametersTiming(xml_file):
+    try:
+        xml = ElementTree.parse(xml_file).getroot()
+    except ElementTree.ParseError:
+        return None
+
+    camera = xml.find("camera1")
+    if camera is None:
+        return None
+
+    def getValue(node, name):
+        if (node.find(name) is not None):
+            try:
+                return float(node.find(name).text)
+            except (TypeError, ValueError):
+                return None
+
+    seconds_per_frame = getValue(xml, "seconds_per_frame")
+    for name in ["cycle_value", "exposure_time"]:
+        if seconds_per_frame is None:
+            seconds_per_frame = getValue(camera, name)
+
+    bytes_per_frame = getValue(camera, "bytes_per_frame")
+    if bytes_per_frame is None:
+        size = map(lambda x: getValue(camera, x), ["x_start", "x_end", "x_bin", "y_start", "y_end", "y_bin"])
+        if not (None in size):
+            [x_start, x_end, x_bin, y_start, y_end, y_bin] = size
+            bytes_per_frame = 2 * int((x_end - x_start + 1)/x_bin) * int((y_end - y_start + 1)/y_bin)
+
+    if (seconds_per_frame is None) or (bytes_per_frame is None):
+        return None
+    return [seconds_per_frame, bytes_per_frame]
+
+## loadSimulator
+#
+# Create a SequenceSimulator from a simulator configuration file.
+#
+# @param xml_file The simulator configuration file.
+#
+# @return A SequenceSimulator object.
+#
+def loadSimulator(xml_file):
+    directory = os.path.dirname(xml_file)
+    xml = ElementTree.parse(xml_file).getroot()
+    simulator = SequenceSimulator()
+    simulator.addModel(HALModel(xml.find("hal")))
+    simulator.addModel(FocusLockModel(xml.find("focus_lock")))
+    simulator.addModel(StageModel(xml.find("stage")))
+    simulator.addModel(KilroyModel(xml.find("kilroy"), directory))
+    return simulator
+
+## parseSequenceActions
+#
+# Create a list of DaveActions from a sequence file without creating
+# any of the Qt items that the sequence viewer uses.
+#
+# @param xml_file The sequence xml file.
+#
+# @return A list of DaveActions.
+#
+def parseSequenceActions(xml_file):
+    dave_actions = []
+
+    def recursiveParse(xml_branch):
+        for node in xml_branch:
+            if (node.tag == "branch"):
+                recursiveParse(node)
+            else:
+                dave_action = getattr(daveActions, node.tag)()
+                dave_action.setup(node)
+                dave_action.setResources(node.get("resources"))
+                dave_actions.append(dave_action)
+
+    recursiveParse(ElementTree.parse(xml_file).getroot())
+    return dave_actions
+
+
+#
+# Testing
+#
+if __name__ == "__main__":
+
+    if (len(sys.argv) != 3):
+        print "usage: <simulator xml> <sequence xml>"
+        exit()
+
+    app = QtCore.QCoreApplication(sys.argv)
+    simulator = loadSimulator(sys.argv[1])
+    report = simulator.simulate(parseSequenceActions(sys.argv[2]))
+    print report.summary(verbose = True)
+
+
+#
+# The MIT License
+#
+# Copyright (c) 2015 Zhuang Lab, Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
@@ -6,20 +6,31 @@
 #
 # Hazen 06/14
 #
+# Actions that do not conflict (see daveActions.DaveAction.setResources)
+# can be run at the same time, so the model keeps track of which actions
+# are running and which have finished.
+#
+# The model is a QAbstractItemModel backed by the list of actions, so
+# Qt only asks for the text, etc. of the rows that are visible. The
+# actions are grouped by branch (or recipe loop), and the group of the
+# current action is expanded while the others are collapsed.
+#
+# Hazen 10/15
+#
 
+import traceback
 from xml.etree import ElementTree
 from PyQt4 import QtCore, QtGui
 
 import daveActions
 
 
-DaveActionType = QtGui.QStandardItem.UserType
-
-## DaveActionStandardItem
+## DaveActionItem
 #
-# A QStandardItem specialized to hold a DaveAction.
+# Holds a DaveAction and its state in the run. This is a node in the
+# tree of a DaveSequenceModel.
 #
-class DaveActionStandardItem(QtGui.QStandardItem):
+class DaveActionItem(object):
 
     ## __init__
     #
@@ -29,10 +40,20 @@ class DaveActionStandardItem(QtGui.QStandardItem):
         dave_action_class = getattr(daveActions, node.tag)
         self.dave_action = dave_action_class()
         self.dave_action.setup(node)
+        self.dave_action.setResources(node.get("resources"))
+        self.cost = [0, 0]
+        self.index = None
+        self.parent = None
+        self.row = 0
+        self.state = "pending"
         self.valid = True
 
-        QtGui.QStandardItem.__init__(self, self.dave_action.getDescriptor())
-        self.setFlags(QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsEnabled)
+    ## getCost
+    #
+    # @return [disk usage, run time] that the item adds to the estimates of the run (see DaveSequenceModel.addItemEstimates()).
+    #
+    def getCost(self):
+        return self.cost
 
     ## getDaveAction
     #
@@ -48,6 +69,65 @@ class DaveActionStandardItem(QtGui.QStandardItem):
     def getDaveActionID(self):
         return self.dave_action.getID()
 
+    ## getIndex
+    #
+    # @return The index of this item in the sequence.
+    #
+    def getIndex(self):
+        return self.index
+
+    ## getParent
+    #
+    # @return The DaveGroupItem that contains this item.
+    #
+    def getParent(self):
+        return self.parent
+
+    ## getParentName
+    #
+    # @return The name of the group that contains this item, an empty string if it is not in a group.
+    #
+    def getParentName(self):
+        if (self.parent is None) or (self.parent.getParent() is None):
+            return ""
+        else:
+            return self.parent.getName()
+
+    ## getRow
+    #
+    # @return The row of this item in its group.
+    #
+    def getRow(self):
+        return self.row
+
+    ## getText
+    #
+    # @return The text to display for this item.
+    #
+    def getText(self):
+        return self.dave_action.getDescriptor()
+
+    ## isDone
+    #
+    # @return True/False if the action has finished.
+    #
+    def isDone(self):
+        return (self.state == "done")
+
+    ## isPending
+    #
+    # @return True/False if the action has not been started yet.
+    #
+    def isPending(self):
+        return (self.state == "pending")
+
+    ## isRunning
+    #
+    # @return True/False if the action is running.
+    #
+    def isRunning(self):
+        return (self.state == "running")
+
     ## isValid
     #
     # @return True/False if the command is valid.
@@ -55,6 +135,37 @@ class DaveActionStandardItem(QtGui.QStandardItem):
     def isValid(self):
         return self.valid
 
+    ## setCost
+    #
+    # @param disk_usage The disk usage that the item adds to the estimates of the run.
+    # @param run_time The time that the item adds to the estimates of the run.
+    #
+    def setCost(self, disk_usage, run_time):
+        self.cost = [disk_usage, run_time]
+
+    ## setIndex
+    #
+    # @param index The index of this item in the sequence.
+    #
+    def setIndex(self, index):
+        self.index = index
+
+    ## setParent
+    #
+    # @param parent The DaveGroupItem that contains this item.
+    # @param row The row of this item in the group.
+    #
+    def setParent(self, parent, row):
+        self.parent = parent
+        self.row = row
+
+    ## setState
+    #
+    # @param state One of "pending", "running" or "done".
+    #
+    def setState(self, state):
+        self.state = state
+
     ## setUsageEstimates
     #
     # @param disk_usage The estimated disk_usage for the action
@@ -70,28 +181,86 @@ class DaveActionStandardItem(QtGui.QStandardItem):
     #
     def setValid(self, valid):
         self.valid = valid
-        if self.valid:
-            self.setBackground(QtGui.QBrush(QtGui.QColor(255,255,255)))
-        else:
-            self.setBackground(QtGui.QBrush(QtGui.QColor(255,200,200)))
 
-    ## type
+
+## DaveGroupItem
+#
+# A group of DaveActionItems (and other groups), i.e. a branch of a
+# sequence or a loop of a recipe.
+#
+class DaveGroupItem(object):
+
+    ## __init__
     #
-    # @return The type of the object (an int).
+    # @param name The name of the group.
     #
-    def type(self):
-        return DaveActionType
+    def __init__(self, name):
+        self.children = []
+        self.name = name
+        self.parent = None
+        self.row = 0
 
-    ## getParentName
+    ## addChild
     #
-    # @return The display text of any associated parent
+    # @param child A DaveActionItem or DaveGroupItem.
     #
-    def getParentName(self):
-        parent = self.parent()
-        if parent == 0: # No parent
-            return ""
-        else:
-            return str(parent.text())
+    def addChild(self, child):
+        child.setParent(self, len(self.children))
+        self.children.append(child)
+
+    ## getChild
+    #
+    # @param row The row of the child.
+    #
+    # @return The child in this row.
+    #
+    def getChild(self, row):
+        return self.children[row]
+
+    ## getName
+    #
+    # @return The name of the group.
+    #
+    def getName(self):
+        return self.name
+
+    ## getNumberChildren
+    #
+    # @return The number of children that the group has.
+    #
+    def getNumberChildren(self):
+        return len(self.children)
+
+    ## getParent
+    #
+    # @return The DaveGroupItem that contains this group, None for the root group.
+    #
+    def getParent(self):
+        return self.parent
+
+    ## getRow
+    #
+    # @return The row of this group in its parent.
+    #
+    def getRow(self):
+        return self.row
+
+    ## getText
+    #
+    # @return The text to display for this group.
+    #
+    def getText(self):
+        return self.name
+
+    ## setParent
+    #
+    # @param parent The DaveGroupItem that contains this group.
+    # @param row The row of this group in the parent.
+    #
+    def setParent(self, parent, row):
+        self.parent = parent
+        self.row = row
+
 
 ## DaveCommandTreeViewer
 #
@@ -109,6 +278,7 @@ class DaveCommandTreeViewer(QtGui.QTreeView):
         QtGui.QTreeView.__init__(self, parent)
 
         self.aborted = False
+        self.current_group = None
         self.dv_model = None
 
         self.setSelectionBehavior(QtGui.QAbstractItemView.SelectRows)
@@ -126,6 +296,28 @@ class DaveCommandTreeViewer(QtGui.QTreeView):
         self.reset()
         self.aborted = True
 
+    ## addMeasurement
+    #
+    # @param an_item The DaveActionItem that was run.
+    # @param duration How long the action took in seconds.
+    # @param disk_usage How much disk space the action used in MB, None if this is not known.
+    #
+    def addMeasurement(self, an_item, duration, disk_usage):
+        if self.dv_model is not None:
+            self.dv_model.addMeasurement(an_item, duration, disk_usage)
+
+    ## applySimulation
+    #
+    # @param report A sequenceSimulator.SimulatorReport for the full list of actions.
+    #
+    # @return The number of actions that still need to be validated.
+    #
+    def applySimulation(self, report):
+        if self.dv_model is not None:
+            return self.dv_model.applySimulation(report)
+        else:
+            return 0
+
     ## getActionTypes
     #
     # @return A list of DaveAction types (i.e. "hal" or "kilroy").
@@ -148,38 +340,39 @@ class DaveCommandTreeViewer(QtGui.QTreeView):
 
     ## getCurrentItem
     #
-    # @return The current DaveActionStandardItem or None if there are no items.
+    # @return The current DaveActionItem or None if there are no items.
     #
     def getCurrentItem(self):
         if self.dv_model is not None:
             return self.dv_model.getCurrentItem()
 
-    ## getEstimates
+    ## getDaveActions
     #
-    # @return [time, space] estimates for the run.
+    # @return A list of all the DaveActions.
     #
-    def getEstimates(self):
+    def getDaveActions(self):
         if self.dv_model is not None:
-            return [self.dv_model.getRemainingTime(), self.dv_model.getRunSize()]
+            return self.dv_model.getDaveActions()
         else:
-            return [0, 0]
+            return []
 
-    ## getNextItem
-    #
-    # @param (Optional) skip_invalid True/False to skip invalid commands. Defaults to True.
+    ## getDirectory
     #
-    # @return The next DaveActionStandardItem or None if there are no more items.
+    # @return The directory that HAL is (or will be) saving in, None if this is not known.
     #
-    def getNextItem(self, skip_invalid = True):
-        if self.aborted:
-            self.aborted = False
-            return None
+    def getDirectory(self):
+        if self.dv_model is not None:
+            return self.dv_model.getDirectory()
 
+    ## getEstimates
+    #
+    # @return [time, space] estimates for the run.
+    #
+    def getEstimates(self):
         if self.dv_model is not None:
-            dave_action_si = self.dv_model.getNextItem(skip_invalid)
-            if dave_action_si is not None:
-                self.viewportUpdate()
-                return dave_action_si
+            return [self.dv_model.getRemainingTime(), self.dv_model.getRunSize()]
+        else:
+            return [0, 0]
 
     ## getNumberItems
     #
@@ -191,25 +384,57 @@ class DaveCommandTreeViewer(QtGui.QTreeView):
         else:
             return 1
 
+    ## getReadyItems
+    #
+    # @param max_items (Optional) The maximum number of items to return, defaults to None (no maximum).
+    #
+    # @return A list of the DaveActionItems that can be started now.
+    #
+    def getReadyItems(self, max_items = None):
+        if (self.dv_model is not None) and not self.aborted:
+            return self.dv_model.getReadyItems(max_items)
+        else:
+            return []
+
+    ## getRemainingSize
+    #
+    # @return The estimated disk usage of the rest of the experiment.
+    #
+    def getRemainingSize(self):
+        if self.dv_model is not None:
+            return self.dv_model.getRemainingSize()
+        else:
+            return 0
+
     ## getRemainingTime
     #
     # @return The estimated time left in the experiment.
     #
     def getRemainingTime(self):
         if self.dv_model is not None:
-            return self.dv_model.getRemainingTime(self.dv_model.getCurrentIndex())
+            return self.dv_model.getRemainingTime()
         else:
             return 0
 
+    ## getRunningItems
+    #
+    # @return A list of the DaveActionItems that are running.
+    #
+    def getRunningItems(self):
+        if self.dv_model is not None:
+            return self.dv_model.getRunningItems()
+        else:
+            return []
+
     ## handleClick
     #
     # @param model_index The QModelIndex of the item that was clicked.
     #
     def handleClick(self, model_index):
         if self.dv_model is not None:
-            qt_item = self.dv_model.itemFromIndex(model_index)
-            if (qt_item.type() == DaveActionType):
-                self.update.emit(qt_item.getDaveAction().getLongDescriptor())
+            an_item = self.dv_model.itemFromIndex(model_index)
+            if isinstance(an_item, DaveActionItem):
+                self.update.emit(an_item.getDaveAction().getLongDescriptor())
 
     ## handleDoubleClick
     #
@@ -217,9 +442,9 @@ class DaveCommandTreeViewer(QtGui.QTreeView):
     #
     def handleDoubleClick(self, model_index):
         if self.dv_model is not None:
-            qt_item = self.dv_model.itemFromIndex(model_index)
-            if (qt_item.type() == DaveActionType):
-                self.double_clicked.emit(qt_item)
+            an_item = self.dv_model.itemFromIndex(model_index)
+            if isinstance(an_item, DaveActionItem):
+                self.double_clicked.emit(an_item)
     
     ## haveNextItem
     #
@@ -231,6 +456,23 @@ class DaveCommandTreeViewer(QtGui.QTreeView):
         else:
             return False
 
+    ## haveRemainingItems
+    #
+    # @return True/False if there are (valid) items that have not been run yet.
+    #
+    def haveRemainingItems(self):
+        if (self.dv_model is not None) and not self.aborted:
+            return self.dv_model.haveRemainingItems()
+        else:
+            return False
+
+    ## isAborted
+    #
+    # @return True/False if the run was aborted.
+    #
+    def isAborted(self):
+        return self.aborted
+
     ## isAllValid
     #
     # @return True/False if all the items are valid.
@@ -241,9 +483,20 @@ class DaveCommandTreeViewer(QtGui.QTreeView):
         else:
             return True
 
+    ## isLoading
+    #
+    # @return True/False if the model is still being loaded (and we have not been aborted).
+    #
+    def isLoading(self):
+        if (self.dv_model is not None) and not self.aborted:
+            return self.dv_model.isLoading()
+        else:
+            return False
+
     ## paintEvent
     #
-    # Draw the tree with a rectangle around the current action.
+    # Draw the tree with a rectangle around the current action and
+    # any other actions that are running.
     #
     # @param p_event A QPaintEvent object
     #
@@ -251,31 +504,56 @@ class DaveCommandTreeViewer(QtGui.QTreeView):
         QtGui.QTreeView.paintEvent(self, p_event)
 
         if self.dv_model is not None:
-            cur_item = self.dv_model.getCurrentItem()
-            qt_model_index = self.dv_model.indexFromItem(cur_item)
-            v_rect = self.visualRect(qt_model_index)
-            while (v_rect.width() == 0) and (cur_item.parent() is not None):
-                cur_item = cur_item.parent()
+            painter = QtGui.QPainter(self.viewport())
+            painter.setPen(QtGui.QColor(100,0,0))
+            items = self.dv_model.getRunningItems()
+            if (len(items) == 0):
+                items = [self.dv_model.getCurrentItem()]
+            for cur_item in items:
                 qt_model_index = self.dv_model.indexFromItem(cur_item)
                 v_rect = self.visualRect(qt_model_index)
-            if (v_rect.width() != 0):
-                select_rect = QtCore.QRect(0, 
-                                           v_rect.top(),
-                                           v_rect.right(),
-                                           v_rect.height())
-                painter = QtGui.QPainter(self.viewport())
-                painter.setPen(QtGui.QColor(100,0,0))
-                painter.drawRect(select_rect)
+                while (v_rect.width() == 0) and (cur_item.getParent() is not None):
+                    cur_item = cur_item.getParent()
+                    qt_model_index = self.dv_model.indexFromItem(cur_item)
+                    v_rect = self.visualRect(qt_model_index)
+                if (v_rect.width() != 0):
+                    select_rect = QtCore.QRect(0, 
+                                               v_rect.top(),
+                                               v_rect.right(),
+                                               v_rect.height())
+                    painter.drawRect(select_rect)
+
+    ## refreshEstimates
+    #
+    # Recalculate the estimates (see DaveSequenceModel.refreshEstimates()).
+    #
+    def refreshEstimates(self):
+        if self.dv_model is not None:
+            self.dv_model.refreshEstimates()
 
     ## resetItemIndex
     #
     # Reset to the first DaveAction.
     #
     def resetItemIndex(self):
+        self.aborted = False
         if self.dv_model is not None:
             self.dv_model.resetItemIndex()
             self.viewportUpdate()
 
+    ## resumeRun
+    #
+    # @param completed A set of the indices of the actions that were completed.
+    #
+    # @return The index of the first action that was not completed.
+    #
+    def resumeRun(self, completed):
+        self.aborted = False
+        if self.dv_model is not None:
+            index = self.dv_model.resumeRun(completed)
+            self.viewportUpdate()
+            return index
+
     ## setAllValid
     #
     # @param valid True/False Sets the valid status of all the items.
@@ -286,33 +564,53 @@ class DaveCommandTreeViewer(QtGui.QTreeView):
 
     ## setCurrentAction
     #
-    # @param an_action The DaveActionStandardItem to use as the current item.
+    # @param an_action The DaveActionItem to use as the current item.
     #
     def setCurrentAction(self, an_item):
         if self.dv_model is not None:
             self.dv_model.setCurrentAction(an_item)
             self.viewportUpdate()
 
-    ## setCurrentItemValidity
+    ## setItemDone
     #
-    # @param is_valid True/False determines the validity of the currentItem(s)
+    # @param an_item The DaveActionItem that has finished.
     #
-    def setCurrentItemValid(self, is_valid):
+    def setItemDone(self, an_item):
         if self.dv_model is not None:
-            self.dv_model.setCurrentItemValid(is_valid)
+            self.dv_model.setItemDone(an_item)
+            self.viewportUpdate()
+
+    ## setItemStarted
+    #
+    # @param an_item The DaveActionItem that has been started.
+    #
+    def setItemStarted(self, an_item):
+        if self.dv_model is not None:
+            self.dv_model.setItemStarted(an_item)
+            self.viewport().update()
+
+    ## setItemValid
+    #
+    # @param an_item A DaveActionItem.
+    # @param is_valid True/False determines the validity of the item(s)
+    #
+    def setItemValid(self, an_item, is_valid):
+        if self.dv_model is not None:
+            self.dv_model.setItemValid(an_item, is_valid)
 
     ## setModel
     #
-    # @param qt_model The DaveStandardItemModel associated with the tree.
+    # @param qt_model The DaveSequenceModel associated with the tree.
     #
     def setModel(self, dv_model):
+        self.current_group = None
         self.dv_model = dv_model
         QtGui.QTreeView.setModel(self, self.dv_model)
         self.viewportUpdate()
 
     ## setTestMode
     #
-    # @param test_mode True/False sets the test mode of the DaveStandardItemModel.
+    # @param test_mode True/False sets the test mode of the DaveSequenceModel.
     #
     def setTestMode(self, test_mode):
         if self.dv_model is not None:
@@ -320,71 +618,292 @@ class DaveCommandTreeViewer(QtGui.QTreeView):
 
     ## updateEstimates
     #
-    def updateEstimates(self):
+    # @param an_item The DaveActionItem that was tested.
+    #
+    def updateEstimates(self, an_item):
         if self.dv_model is not None:
-            self.dv_model.updateEstimates()
+            self.dv_model.updateEstimates(an_item)
         
     ## viewportUpdate
     #
-    # Update the viewport.
+    # Update the viewport. Scrolling to the current item expands its group,
+    # the group of the previous current item is collapsed so that the tree
+    # does not grow as the run progresses.
     #
     def viewportUpdate(self):
         item = self.dv_model.getCurrentItem()
+        group = self.dv_model.getTopGroup(item)
+        if (self.current_group is not None) and (self.current_group is not group):
+            self.collapse(self.dv_model.indexFromItem(self.current_group))
+        self.current_group = group
         self.scrollTo(self.dv_model.indexFromItem(item))
         self.viewport().update()
         self.update.emit(item.getDaveAction().getLongDescriptor())
 
 
-## DaveStandardItemModel
+## DaveSequenceModel
 #
-# A QStandardItemModel specialized for Dave.
+# The (tree) model of a sequence for Qt and the state of the run.
 #
-class DaveStandardItemModel(QtGui.QStandardItemModel):
+class DaveSequenceModel(QtCore.QAbstractItemModel):
 
     ## __init__
     #
     def __init__(self):
-        QtGui.QStandardItemModel.__init__(self)
-
-        self.dave_action_index = 0
-        self.dave_actions_cur = []   # The active list of DaveActionStandardItems
-        self.dave_actions_all = []   # The full list of DaveActionStandardItems
+        QtCore.QAbstractItemModel.__init__(self)
+
+        self.dave_action_index = 0   # The first action that has not finished
+        self.dave_actions_all = []   # The full list of DaveActionItems
+        self.dave_actions_cur = self.dave_actions_all # The active list of DaveActionItems
+        self.dave_actions_cur_positions = None # The positions of the items in the active list if it is not the full list
+
+        # The items in the active list are counted as their state and
+        # validity change, so that the run does not have to search for
+        # the items that are left.
+        self.number_invalid = 0      # The number of invalid items
+        self.number_remaining = 0    # The number of valid items that have not been started (after the current item)
         
         # Lists for fast validation.
         self.dave_actions_test = []  # A list of actions to validate
         self.dave_actions_test_dict = dict() # A dictionary of test ids and lists of actions that have these
+        self.dave_actions_test_pending = None # The actions that still need validation after a simulation
 
+        self.action_types = []       # The types of all the actions
+        self.estimator = None        # A sequenceEstimator.SequenceEstimator
+        self.loading = False
+        self.lookahead = 100         # How far past the current action to look for actions to start
+        self.root = DaveGroupItem("")
         self.test_mode = False
 
+        # For adding nodes while streaming.
+        self.branch_stack = []
+
+        # The estimates of the run are cached and updated as the items finish.
+        self.estimates_stale = True  # The cached estimates need to be recalculated
+        self.remaining_size = 0      # The disk usage of the valid items that have not finished
+        self.remaining_time = 0      # The run time of the valid items that have not finished
+        self.run_size = 0            # The disk usage of all the valid items
+        self.run_time_estimator = None # A daveActions.RunTimeEstimator of the valid items that have not finished
+
+    ## addChild
+    #
+    # @param group The DaveGroupItem to add the child to.
+    # @param child A DaveActionItem or DaveGroupItem.
+    #
+    def addChild(self, group, child):
+        row = group.getNumberChildren()
+        self.beginInsertRows(self.indexFromItem(group), row, row)
+        group.addChild(child)
+        self.endInsertRows()
+
+    ## addGroup
+    #
+    # @param group The DaveGroupItem to add the new group to.
+    # @param name The name of the new group.
+    #
+    # @return The new DaveGroupItem.
+    #
+    def addGroup(self, group, name):
+        new_group = DaveGroupItem(name)
+        self.addChild(group, new_group)
+        return new_group
+
     ## addItem
     #
-    # @param dave_action_si A DaveActionStandardItem.
+    # @param dave_action_si A DaveActionItem.
+    # @param group (Optional) The DaveGroupItem to add the item to, defaults to the root group.
     #
-    def addItem(self, dave_action_si):
+    def addItem(self, dave_action_si, group = None):
+        if group is None:
+            group = self.root
+        dave_action_si.setIndex(len(self.dave_actions_all))
         self.dave_actions_all.append(dave_action_si)
-        self.dave_actions_cur.append(dave_action_si) # Build current actions simultaneously
+        if (self.dave_actions_cur is self.dave_actions_all):
+            self.countItem(dave_action_si, dave_action_si.getIndex(), 1)
+        self.addChild(group, dave_action_si)
+        if self.estimator is not None:
+            self.estimator.addAction(dave_action_si.getDaveAction())
+
+        action_type = dave_action_si.getDaveAction().getActionType()
+        if not (action_type in self.action_types):
+            self.action_types.append(action_type)
+
+        # Add the item to the cached estimates.
+        if (self.dave_actions_cur is self.dave_actions_all) and not self.estimates_stale:
+            self.addItemEstimates(dave_action_si)
+        else:
+            self.estimates_stale = True
         
         # Check if action requires validation
         action_id = dave_action_si.getDaveAction().getID()
         if action_id is not None:
-            # Check for existing id
-            is_present = False
-            for id_value in self.dave_actions_test_dict.keys():
-                if action_id == id_value:
-                    is_present = True
 
             # Add to list if the id is not currently on the id list
-            if not is_present:
+            if not (action_id in self.dave_actions_test_dict):
                 self.dave_actions_test.append(dave_action_si)
                 self.dave_actions_test_dict[action_id] = [dave_action_si] # Start list
             else: # Add to current list of actions with the same id
                 self.dave_actions_test_dict[action_id].append(dave_action_si)
+
+    ## addItemEstimates
+    #
+    # Add an item to the cached estimates. The items must be added in sequence order.
+    #
+    # @param an_item A DaveActionItem.
+    #
+    def addItemEstimates(self, an_item):
+        disk_usage = 0
+        run_time = 0
+        if an_item.isValid():
+            [disk_usage, duration] = self.getUsageEstimates(an_item)
+            self.run_size += disk_usage
+            if not an_item.isDone():
+                run_time = self.run_time_estimator.addAction(an_item.getDaveAction(), duration)
+                self.remaining_size += disk_usage
+                self.remaining_time += run_time
+        an_item.setCost(disk_usage, run_time)
+
+    ## addNode
+    #
+    # Add a node from a stream of [path, node] pairs (see
+    # v2Generator.XMLRecipeParser.iterDavePrimitives()).
+    #
+    # @param path A list of the [name, id] pairs of the loops that the node is in.
+    # @param node A branch or DaveAction XML node.
+    #
+    def addNode(self, path, node):
+
+        # Leave branches that the node is not in.
+        n_same = 0
+        while (n_same < len(self.branch_stack)) and (n_same < len(path)) and (self.branch_stack[n_same][0] == path[n_same]):
+            n_same += 1
+        self.branch_stack = self.branch_stack[:n_same]
+
+        # Create new branches.
+        for i in range(n_same, len(path)):
+            if (i > 0):
+                parent = self.addGroup(self.branch_stack[-1][1], path[i][0])
+            else:
+                parent = self.addGroup(self.root, path[i][0])
+            self.branch_stack.append([path[i], parent])
+
+        if (len(self.branch_stack) > 0):
+            model_branch = self.branch_stack[-1][1]
+        else:
+            model_branch = self.root
+
+        temp = ElementTree.Element("temp")
+        temp.append(node)
+        recursiveParse(self, model_branch, temp)
         
+    ## addMeasurement
+    #
+    # @param an_item The DaveActionItem that was run.
+    # @param duration How long the action took in seconds.
+    # @param disk_usage How much disk space the action used in MB, None if this is not known.
+    #
+    def addMeasurement(self, an_item, duration, disk_usage):
+        if self.estimator is not None:
+            self.estimator.addMeasurement(an_item.getIndex(), duration, disk_usage)
+
+    ## applySimulation
+    #
+    # Apply the results of simulating the sequence. The valid status and usage
+    # estimates of the actions that the simulator could decide about are updated,
+    # and the actions to validate in test mode are reduced to those it could not.
+    #
+    # @param report A sequenceSimulator.SimulatorReport for the full list of actions.
+    #
+    # @return The number of actions that still need to be validated.
+    #
+    def applySimulation(self, report):
+        self.estimates_stale = True
+        undecided_ids = []
+        for [item, step] in zip(self.dave_actions_all, report.getSteps()):
+            item.setValid(step.isValid())
+            if step.isDecided():
+                item.setUsageEstimates(step.disk_usage, step.duration)
+            elif (item.getDaveActionID() is not None) and not (item.getDaveActionID() in undecided_ids):
+                undecided_ids.append(item.getDaveActionID())
+        pending = filter(lambda x: (x.getDaveActionID() in undecided_ids), self.dave_actions_test)
+        self.updateItemCounts()
+        self.itemsChanged()
+
+        # Only keep the pending list if there is something left to test,
+        # it is cleared again when test mode is turned off.
+        if (len(pending) > 0):
+            self.dave_actions_test_pending = pending
+        else:
+            self.dave_actions_test_pending = None
+        return len(pending)
+
+    ## columnCount
+    #
+    # @param parent (Optional) A QModelIndex.
+    #
+    # @return The number of columns.
+    #
+    def columnCount(self, parent = QtCore.QModelIndex()):
+        return 1
+
+    ## countItem
+    #
+    # Add an item in the active list to (or remove it from) the item counts.
+    #
+    # @param an_item A DaveActionItem.
+    # @param position The position of the item in the active list.
+    # @param sign 1 to add the item, -1 to remove it.
+    #
+    def countItem(self, an_item, position, sign):
+        if not an_item.isValid():
+            self.number_invalid += sign
+        elif an_item.isPending() and (position >= self.dave_action_index):
+            self.number_remaining += sign
+
+    ## data
+    #
+    # This is only called for the rows that are visible.
+    #
+    # @param index A QModelIndex.
+    # @param role (Optional) The Qt.ItemDataRole, defaults to Qt.DisplayRole.
+    #
+    # @return A QVariant.
+    #
+    def data(self, index, role = QtCore.Qt.DisplayRole):
+        if not index.isValid():
+            return QtCore.QVariant()
+
+        an_item = index.internalPointer()
+        if (role == QtCore.Qt.DisplayRole):
+            return QtCore.QVariant(an_item.getText())
+        elif isinstance(an_item, DaveActionItem):
+            if (role == QtCore.Qt.BackgroundRole) and not an_item.isValid():
+                return QtCore.QVariant(QtGui.QColor(255,200,200))
+            if (role == QtCore.Qt.ForegroundRole) and an_item.isDone():
+                return QtCore.QVariant(QtGui.QColor(120,120,120))
+        return QtCore.QVariant()
+
+    ## flags
+    #
+    # @param index A QModelIndex.
+    #
+    # @return The Qt.ItemFlags of the item.
+    #
+    def flags(self, index):
+        if not index.isValid():
+            return QtCore.Qt.NoItemFlags
+        if isinstance(index.internalPointer(), DaveActionItem):
+            return QtCore.Qt.ItemIsSelectable | QtCore.Qt.ItemIsEnabled
+        else:
+            return QtCore.Qt.ItemIsEnabled
+
     ## getActionTypes
     #
     # @return A list of DaveAction types (i.e. "hal" or "kilroy").
     #
     def getActionTypes(self):
+        if not self.test_mode:
+            return self.action_types
         types = []
         for item in self.dave_actions_cur:
             type = item.getDaveAction().getActionType()
@@ -401,29 +920,37 @@ class DaveStandardItemModel(QtGui.QStandardItemModel):
 
     ## getCurrentItem
     #
-    # @return The current DaveActionStandardItem.
+    # @return The current DaveActionItem (the last item once they have all finished).
     #
     def getCurrentItem(self):
-        return self.dave_actions_cur[self.dave_action_index]
+        return self.dave_actions_cur[min(self.dave_action_index, len(self.dave_actions_cur) - 1)]
 
-    ## getNextItem
+    ## getCurrentPosition
     #
-    # @param skip_invalid True/False to skip invalid commands.
+    # @param an_item A DaveActionItem.
     #
-    # @return The next DaveActionStandardItem or none if there are no more items.
+    # @return The position of the item in the active list, None if it is not in the list.
     #
-    def getNextItem(self, skip_invalid):
-        self.dave_action_index += 1
+    def getCurrentPosition(self, an_item):
+        if (self.dave_actions_cur is self.dave_actions_all):
+            return an_item.getIndex()
+        else:
+            return self.dave_actions_cur_positions.get(an_item)
 
-        # If requested, skip over invalid commands.
-        if skip_invalid:
-            while (self.dave_action_index < len(self.dave_actions_cur)) and (not self.dave_actions_cur[self.dave_action_index].isValid()):
-                self.dave_action_index += 1
+    ## getDaveActions
+    #
+    # @return A list of all the DaveActions.
+    #
+    def getDaveActions(self):
+        return map(lambda x: x.getDaveAction(), self.dave_actions_all)
 
-        if (self.dave_action_index >= len(self.dave_actions_cur)):
-            return None
-        else:
-            return self.dave_actions_cur[self.dave_action_index]
+    ## getDirectory
+    #
+    # @return The directory that HAL will be saving in when the current item is run, None if this is not known.
+    #
+    def getDirectory(self):
+        if (self.estimator is not None) and (len(self.dave_actions_cur) > 0):
+            return self.estimator.getDirectory(self.getCurrentItem().getIndex())
 
     ## getNumberItems
     #
@@ -432,32 +959,109 @@ class DaveStandardItemModel(QtGui.QStandardItemModel):
     def getNumberItems(self):
         return len(self.dave_actions_cur)
 
-    ## getRemainingTime
+    ## getReadyItems
     #
-    # @param start (Optional) The index of the command to start at, defaults to 0.
+    # An action can be started if it does not conflict with any of the
+    # earlier actions that have not finished. Invalid actions are skipped.
     #
-    # @return An estimate of how much time is left in the run.
+    # @param max_items The maximum number of items to return, None for no maximum.
+    #
+    # @return A list of the DaveActionItems that can be started now.
     #
-    def getRemainingTime(self, start = 0):
-        est_time = 0
-        i = start
-        while (i < len(self.dave_actions_cur)):
+    def getReadyItems(self, max_items):
+        ready = []
+        blocked = []        # Resources used by earlier actions that have not finished.
+        exclusive = False   # An earlier action that has not finished needs exclusive access.
+        n_unfinished = 0
+        i = self.dave_action_index
+        while (i < len(self.dave_actions_cur)) and (n_unfinished < self.lookahead) and not exclusive:
+            if (max_items is not None) and (len(ready) >= max_items):
+                break
             item = self.dave_actions_cur[i]
-            if item.isValid():
-                est_time += item.getDaveAction().getDuration()
             i += 1
-        return est_time
+            if item.isDone() or (item.isPending() and not item.isValid()):
+                continue
+
+            n_unfinished += 1
+            resources = item.getDaveAction().getResources()
+            if item.isPending():
+                if resources is None:
+                    conflict = (n_unfinished > 1)
+                else:
+                    conflict = (len(filter(lambda x: x in blocked, resources)) > 0)
+                if not conflict:
+                    ready.append(item)
+
+            if resources is None:
+                exclusive = True
+            else:
+                blocked.extend(resources)
+        return ready
+
+    ## getRemainingSize
+    #
+    # @return An estimate of the disk usage of the actions that have not finished.
+    #
+    def getRemainingSize(self):
+        self.updateCachedEstimates()
+        return max(0, self.remaining_size)
+
+    ## getRemainingTime
+    #
+    # @return An estimate of how much time is left in the run.
+    #
+    def getRemainingTime(self):
+        self.updateCachedEstimates()
+        return max(0, self.remaining_time)
+
+    ## getRoot
+    #
+    # @return The root DaveGroupItem.
+    #
+    def getRoot(self):
+        return self.root
+
+    ## getRunningItems
+    #
+    # @return A list of the DaveActionItems that are running.
+    #
+    def getRunningItems(self):
+        start = self.dave_action_index
+        return filter(lambda x: x.isRunning(), self.dave_actions_cur[start:start + self.lookahead])
 
     ## getRunSize
     #
     # @return An estimate of the run size.
     #
     def getRunSize(self):
-        est_space = 0
-        for item in self.dave_actions_cur:
-            if item.isValid():
-                est_space += item.getDaveAction().getUsage()
-        return est_space
+        self.updateCachedEstimates()
+        return self.run_size
+
+    ## getTopGroup
+    #
+    # @param an_item A DaveActionItem.
+    #
+    # @return The top level DaveGroupItem that contains the item, None if it is not in a group.
+    #
+    def getTopGroup(self, an_item):
+        group = an_item.getParent()
+        if (group is None) or (group is self.root):
+            return None
+        while (group.getParent() is not self.root):
+            group = group.getParent()
+        return group
+
+    ## getUsageEstimates
+    #
+    # @param an_item A DaveActionItem.
+    #
+    # @return [disk usage, duration] estimates for the item.
+    #
+    def getUsageEstimates(self, an_item):
+        if self.estimator is not None:
+            return self.estimator.getEstimates(an_item.getIndex(), an_item.getDaveAction())
+        else:
+            return [an_item.getDaveAction().getUsage(), an_item.getDaveAction().getDuration()]
 
     ## haveNextItem
     #
@@ -469,90 +1073,332 @@ class DaveStandardItemModel(QtGui.QStandardItemModel):
         else:
             return True
 
+    ## haveRemainingItems
+    #
+    # @return True/False if there are valid items that have not been started.
+    #
+    def haveRemainingItems(self):
+        return (self.number_remaining > 0)
+
+    ## index
+    #
+    # @param row The row of the item in its parent.
+    # @param column The column of the item.
+    # @param parent (Optional) The QModelIndex of the parent.
+    #
+    # @return The QModelIndex of the item.
+    #
+    def index(self, row, column, parent = QtCore.QModelIndex()):
+        group = self.root
+        if parent.isValid():
+            group = parent.internalPointer()
+        if (column != 0) or (row < 0) or not isinstance(group, DaveGroupItem) or (row >= group.getNumberChildren()):
+            return QtCore.QModelIndex()
+        return self.createIndex(row, column, group.getChild(row))
+
+    ## indexFromItem
+    #
+    # @param an_item A DaveActionItem or DaveGroupItem.
+    #
+    # @return The QModelIndex of the item.
+    #
+    def indexFromItem(self, an_item):
+        if (an_item is None) or (an_item is self.root):
+            return QtCore.QModelIndex()
+        return self.createIndex(an_item.getRow(), 0, an_item)
+
     ## isAllValid
     #
     # @return True/False if all the items are valid.
     #
     def isAllValid(self):
-        all_valid = True
-        for item in self.dave_actions_cur:
-            if not item.isValid():
-                all_valid = False
-        return all_valid
+        return (self.number_invalid == 0)
+
+    ## isLoading
+    #
+    # @return True/False if the model is still being loaded.
+    #
+    def isLoading(self):
+        return self.loading
+
+    ## itemChanged
+    #
+    # Tell the views that an item has changed.
+    #
+    # @param an_item A DaveActionItem.
+    #
+    def itemChanged(self, an_item):
+        index = self.indexFromItem(an_item)
+        self.dataChanged.emit(index, index)
+
+    ## itemFromIndex
+    #
+    # @param index A QModelIndex.
+    #
+    # @return The DaveActionItem or DaveGroupItem at this index, None if the index is not valid.
+    #
+    def itemFromIndex(self, index):
+        if index.isValid():
+            return index.internalPointer()
+
+    ## itemsChanged
+    #
+    # Tell the views that (potentially) all of the items have changed.
+    #
+    def itemsChanged(self):
+        n_rows = self.root.getNumberChildren()
+        if (n_rows > 0):
+            self.dataChanged.emit(self.index(0, 0), self.index(n_rows - 1, 0))
+
+    ## parent
+    #
+    # @param index (Optional) A QModelIndex, if this is not specified then this returns the QObject parent.
+    #
+    # @return The QModelIndex of the parent of the item.
+    #
+    def parent(self, index = None):
+        if index is None:
+            return QtCore.QAbstractItemModel.parent(self)
+        if not index.isValid():
+            return QtCore.QModelIndex()
+        return self.indexFromItem(index.internalPointer().getParent())
+
+    ## refreshEstimates
+    #
+    # The cached estimates are only updated as items are added and finish,
+    # this makes them use what has been learned about the cost of the
+    # actions since they were calculated, i.e. from measurements or testing.
+    #
+    def refreshEstimates(self):
+        self.estimates_stale = True
 
     ## resetItemIndex
     #
-    # Reset to the first DaveActionStandardItem.
+    # Reset to the first DaveActionItem.
     #
     def resetItemIndex(self):
         self.dave_action_index = 0
+        self.resetItemStates()
+
+    ## resetItemStates
+    #
+    # Mark all the items as not started.
+    #
+    def resetItemStates(self):
+        self.estimates_stale = True
+        for item in self.dave_actions_all:
+            item.setState("pending")
+        self.updateItemCounts()
+        self.itemsChanged()
+
+    ## resumeRun
+    #
+    # Set up to resume a run that did not finish. The completed actions
+    # are marked as done, except for the last state setting action of
+    # each type (i.e. DASetParameters) before each action that was not
+    # completed. These are run again so that HAL, etc. are in the same
+    # state as they would have been for the actions that are run.
+    #
+    # @param completed A set of the indices of the actions that were completed.
+    #
+    # @return The index of the first action that was not completed.
+    #
+    def resumeRun(self, completed):
+        self.estimates_stale = True
+        first_incomplete = len(self.dave_actions_all)
+        last_state_setting = {}
+        for item in self.dave_actions_all:
+            dave_action = item.getDaveAction()
+            if (item.getIndex() in completed):
+                item.setState("done")
+            else:
+                item.setState("pending")
+                first_incomplete = min(first_incomplete, item.getIndex())
+                for state_item in last_state_setting.values():
+                    state_item.setState("pending")
+            if dave_action.isStateSetting():
+                last_state_setting[type(dave_action).__name__] = item
+
+        self.dave_action_index = 0
+        self.updateItemIndex()
+        self.updateItemCounts()
+        self.itemsChanged()
+        return first_incomplete
+
+    ## rowCount
+    #
+    # @param parent (Optional) The QModelIndex of the parent.
+    #
+    # @return The number of children that the parent has.
+    #
+    def rowCount(self, parent = QtCore.QModelIndex()):
+        if (parent.column() > 0):
+            return 0
+        group = self.root
+        if parent.isValid():
+            group = parent.internalPointer()
+        if isinstance(group, DaveGroupItem):
+            return group.getNumberChildren()
+        else:
+            return 0
 
     ## setAllValid
     #
     # @param valid True/False Sets the valid status of all the items.
     #
     def setAllValid(self, valid):
+        self.estimates_stale = True
         for item in self.dave_actions_all:
             item.setValid(valid)
+        self.updateItemCounts()
+        self.itemsChanged()
 
     ## setCurrentItem
     #
-    # @param an_item The desired DaveActionStandardItem.
+    # @param an_item The desired DaveActionItem.
     #
     def setCurrentAction(self, an_item):
         self.dave_action_index = 0
-        for i in range(len(self.dave_actions_cur)):
-            if (self.dave_actions_cur[i] == an_item):
-                self.dave_action_index = i
-                break
-        else:
+        self.resetItemStates()
+        position = self.getCurrentPosition(an_item)
+        if position is None:
             print "item not found!"
+            return
+        self.dave_action_index = position
+        self.updateItemCounts()
+
+    ## setEstimator
+    #
+    # @param estimator A sequenceEstimator.SequenceEstimator for the items in this model.
+    #
+    def setEstimator(self, estimator):
+        self.estimates_stale = True
+        self.estimator = estimator
+        for item in self.dave_actions_all:
+            self.estimator.addAction(item.getDaveAction())
 
-    ## setCurrentItemValid
+    ## setItemDone
     #
-    # @param is_Valid True/False determines the validity of the currentItem(s)
+    # Mark an item as finished and move the current item to the
+    # first valid item that has not finished.
     #
-    def setCurrentItemValid(self, is_valid):
+    # @param an_item A DaveActionItem.
+    #
+    def setItemDone(self, an_item):
+        if not self.estimates_stale and not an_item.isDone():
+            [disk_usage, run_time] = an_item.getCost()
+            self.remaining_size -= disk_usage
+            self.remaining_time -= run_time
+        self.setItemStatus(an_item, state = "done")
+        self.itemChanged(an_item)
+        self.updateItemIndex()
+
+    ## setItemStarted
+    #
+    # @param an_item A DaveActionItem.
+    #
+    def setItemStarted(self, an_item):
+        self.setItemStatus(an_item, state = "running")
+        self.itemChanged(an_item)
+
+    ## setItemValid
+    #
+    # @param an_item A DaveActionItem.
+    # @param is_valid True/False determines the validity of the item(s)
+    #
+    def setItemValid(self, an_item, is_valid):
+        self.estimates_stale = True
         if self.test_mode:
             # Find current id
-            current_item = self.dave_actions_cur[self.dave_action_index]
-            current_action = current_item.getDaveAction()
-            current_id = current_action.getID()
+            current_id = an_item.getDaveActionID()
 
             print current_id, is_valid
             
             # Change validity of all actions that have this id
             for item in self.dave_actions_test_dict[current_id]:
-                item.setValid(is_valid)
+                self.setItemStatus(item, valid = is_valid)
+                self.itemChanged(item)
                 
         else: # Not used
-            item = self.dave_actions_cur[self.dave_action_index]
-            item.setValid(is_valid)
+            self.setItemStatus(an_item, valid = is_valid)
+            self.itemChanged(an_item)
                     
+    ## setItemStatus
+    #
+    # Change the state and / or the validity of an item and update the item counts.
+    #
+    # @param an_item A DaveActionItem.
+    # @param state (Optional) The new state of the item.
+    # @param valid (Optional) The new validity of the item.
+    #
+    def setItemStatus(self, an_item, state = None, valid = None):
+        position = self.getCurrentPosition(an_item)
+        if position is not None:
+            self.countItem(an_item, position, -1)
+        if state is not None:
+            an_item.setState(state)
+        if valid is not None:
+            an_item.setValid(valid)
+        if position is not None:
+            self.countItem(an_item, position, 1)
+
     ## setTestMode
     #
     # @param test_mode True/False sets the test mode.
     #
     def setTestMode(self, test_mode):
+        self.estimates_stale = True
         if self.test_mode:
             if not test_mode: # Toggle off test mode
                 self.test_mode = False
                 self.dave_actions_cur = self.dave_actions_all # Recover full list
+                self.dave_actions_cur_positions = None
+                self.dave_actions_test_pending = None
                 self.resetItemIndex()
         else:
             if test_mode:
                 self.test_mode = True
-                self.dave_actions_cur = self.dave_actions_test # Set to test list
+                if self.dave_actions_test_pending is not None:
+                    self.dave_actions_cur = self.dave_actions_test_pending # Only what the simulator could not decide
+                else:
+                    self.dave_actions_cur = self.dave_actions_test # Set to test list
+                self.dave_actions_cur_positions = dict(map(lambda x: [x[1], x[0]], enumerate(self.dave_actions_cur)))
                 self.resetItemIndex()
 
+    ## setLoading
+    #
+    # @param loading True/False if the model is still being loaded.
+    #
+    def setLoading(self, loading):
+        self.loading = loading
+        if not loading:
+            self.branch_stack = []
+
+    ## updateCachedEstimates
+    #
+    # Recalculate the cached estimates if they are stale.
+    #
+    def updateCachedEstimates(self):
+        if self.estimates_stale:
+            self.remaining_size = 0
+            self.remaining_time = 0
+            self.run_size = 0
+            self.run_time_estimator = daveActions.RunTimeEstimator()
+            for item in self.dave_actions_cur:
+                self.addItemEstimates(item)
+            self.estimates_stale = False
+
     ## updateEstimates
     #
-    def updateEstimates(self):
+    # The cached estimates of the run are not changed (see refreshEstimates()).
+    #
+    # @param an_item The DaveActionItem that was tested.
+    #
+    def updateEstimates(self, an_item):
         if self.test_mode: # Only needed in test mode
 
             # Find current id and the current disk usage and duration.
-            current_item = self.dave_actions_cur[self.dave_action_index]
-            current_action = current_item.getDaveAction()
+            current_action = an_item.getDaveAction()
             current_id = current_action.getID()
             disk_usage = current_action.getUsage()
             duration = current_action.getDuration()
@@ -561,24 +1407,114 @@ class DaveStandardItemModel(QtGui.QStandardItemModel):
             for item in self.dave_actions_test_dict[current_id]:
                 item.setUsageEstimates(disk_usage, duration)
 
+    ## updateItemCounts
+    #
+    # Count the invalid and the remaining items in the active list.
+    #
+    def updateItemCounts(self):
+        self.number_invalid = 0
+        self.number_remaining = 0
+        for [i, item] in enumerate(self.dave_actions_cur):
+            self.countItem(item, i, 1)
+
+    ## updateItemIndex
+    #
+    # Move the current item to the first valid item that has not finished. The
+    # items that are passed are not counted as remaining so the counts do not
+    # change.
+    #
+    def updateItemIndex(self):
+        while (self.dave_action_index < len(self.dave_actions_cur)):
+            item = self.dave_actions_cur[self.dave_action_index]
+            if item.isDone() or (item.isPending() and not item.isValid()):
+                self.dave_action_index += 1
+            else:
+                break
+
+
+## SequenceLoader
+#
+# Fills a DaveSequenceModel from a stream of [path, node] pairs in
+# the background (using the event loop), so that the sequence can be
+# used before all of it has been generated.
+#
+class SequenceLoader(QtCore.QObject):
+    error = QtCore.pyqtSignal(str)
+    finished = QtCore.pyqtSignal()
+    progress = QtCore.pyqtSignal(int)
+
+    ## __init__
+    #
+    # @param model A DaveSequenceModel.
+    # @param node_stream An iterator of [path, node] pairs.
+    # @param chunk_size (Optional) The number of nodes to add per pass, defaults to 100.
+    # @param parent (Optional) The PyQt parent of this object.
+    #
+    def __init__(self, model, node_stream, chunk_size = 100, parent = None):
+        QtCore.QObject.__init__(self, parent)
+        self.chunk_size = chunk_size
+        self.model = model
+        self.node_stream = node_stream
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.setInterval(0)
+        self.timer.timeout.connect(self.handleTimer)
+
+    ## handleTimer
+    #
+    # Add the next chunk of nodes to the model.
+    #
+    def handleTimer(self):
+        try:
+            for i in range(self.chunk_size):
+                [path, node] = self.node_stream.next()
+                self.model.addNode(path, node)
+        except StopIteration:
+            self.stop()
+            self.progress.emit(self.model.getNumberItems())
+            self.finished.emit()
+            return
+        except:
+            self.stop()
+            self.error.emit(traceback.format_exc())
+            self.finished.emit()
+            return
+        self.progress.emit(self.model.getNumberItems())
+
+    ## start
+    #
+    # The first chunk is loaded immediately so that the model is not empty.
+    #
+    def start(self):
+        self.model.setLoading(True)
+        self.timer.start()
+        self.handleTimer()
+
+    ## stop
+    #
+    def stop(self):
+        self.timer.stop()
+        self.model.setLoading(False)
+
+
 ## parseSequenceFile
 #
 # @param xml_file The xml_file to parse to create the command sequence.
 #
-# @return A DaveStandardItemModel object for using in a DaveCommandTreeViewer.
+# @return A DaveSequenceModel object for using in a DaveCommandTreeViewer.
 #
 def parseSequenceFile(xml_file):
-    model = DaveStandardItemModel()
+    model = DaveSequenceModel()
     xml = ElementTree.parse(xml_file).getroot()
-    recursiveParse(model, model, xml)
+    recursiveParse(model, model.getRoot(), xml)
     return model
 
 ## recursiveParse
 #
 # Recursively parse the XML tree.
 #
-# @param model The root DaveStandardItemModel.
-# @param model_branch_model A branch of a DaveStandardItemModel.
+# @param model The DaveSequenceModel.
+# @param model_branch The DaveGroupItem to add the actions to.
 # @param xml_branch The current xml branch
 # 
 def recursiveParse(model, model_branch, xml_branch):
@@ -586,16 +1522,12 @@ def recursiveParse(model, model_branch, xml_branch):
 
         # Everything is either a branch.
         if (node.tag == "branch"):
-            parent = QtGui.QStandardItem(node.get("name", "NA"))
-            parent.setFlags(QtCore.Qt.ItemIsEnabled)
-            model_branch.appendRow(parent)
+            parent = model.addGroup(model_branch, node.get("name", "NA"))
             recursiveParse(model, parent, node)
 
         # Or a leaf (DaveAction).
         else:
-            action = DaveActionStandardItem(node)
-            model.addItem(action)
-            model_branch.appendRow(action)
+            model.addItem(DaveActionItem(node), model_branch)
 
 #
 # The MIT License
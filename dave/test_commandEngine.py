@@ -0,0 +1,190 @@
+#!/usr/bin/python
+#
+## @file
+#
+# Tests of running, crashing and resuming a sequence with the command
+# engine, using halStandIn.py in place of HAL. Run from the dave
+# directory (HAL must not be running as the stand-in uses its port):
+#
+# python -m unittest test_commandEngine
+#
+# Hazen 10/15
+#
+
+# Add current storm-control directory to sys.path
+import imp
+imp.load_source("setPath", "../sc_library/setPath.py")
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from xml.etree import ElementTree
+
+from PyQt4 import QtCore
+
+import dave
+import halStandIn
+import runJournal
+import sequenceViewer
+
+app = QtCore.QCoreApplication.instance()
+if app is None:
+    app = QtCore.QCoreApplication(sys.argv)
+
+# The sequence, movie_0 is taken with the parameters 1 and the other movies with the parameters 2.
+sequence_xml = """<sequence>
+  <DASetParameters><parameters type="int">1</parameters></DASetParameters>
+  <DATakeMovie><name>movie_0</name><length>10</length></DATakeMovie>
+  <DASetParameters><parameters type="int">2</parameters></DASetParameters>
+  <DATakeMovie><name>movie_1</name><length>10</length></DATakeMovie>
+  <DATakeMovie><name>movie_2</name><length>10</length></DATakeMovie>
+  <DATakeMovie><name>movie_3</name><length>10</length></DATakeMovie>
+</sequence>"""
+
+
+## CommandEngineTestCase
+#
+class CommandEngineTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = runJournal.journalName(os.path.join(self.directory, "sequence.xml"))
+        self.engine = dave.CommandEngine()
+        self.hal = None
+
+    def tearDown(self):
+        self.engine.HALClient.stopCommunication()
+        if self.hal is not None:
+            self.hal.stop()
+        shutil.rmtree(self.directory)
+
+    ## newModel
+    #
+    # @return A DaveSequenceModel of the sequence.
+    #
+    def newModel(self):
+        model = sequenceViewer.DaveSequenceModel()
+        for node in ElementTree.fromstring(sequence_xml):
+            model.addItem(sequenceViewer.DaveActionItem(node))
+        return model
+
+    ## runSequence
+    #
+    # Run the pending actions one at a time, journaling them, until they
+    # have all been run or the stand-in HAL crashes.
+    #
+    # @param model A DaveSequenceModel.
+    # @param script The script for the stand-in HAL.
+    # @param resume_index (Optional) The index that the run resumes from, None for a new run.
+    #
+    def runSequence(self, model, script, resume_index = None):
+        self.hal = halStandIn.HALStandIn(script)
+        self.hal.start()
+        self.assertTrue(self.engine.HALClient.startCommunication())
+
+        journal = runJournal.RunJournal(self.filename)
+        if resume_index is None:
+            journal.startRun(self.filename, model.getNumberItems())
+        else:
+            journal.resumeRun(resume_index)
+        self.engine.setJournal(journal)
+
+        pending = filter(lambda x: x.isPending(), model.dave_actions_all)
+        loop = QtCore.QEventLoop()
+
+        def startNext(item = None):
+            if (len(pending) > 0):
+                self.engine.startCommand(pending.pop(0))
+            else:
+                loop.quit()
+
+        self.engine.done.connect(startNext)
+        self.engine.HALClient.comLostConnection.connect(loop.quit)
+        QtCore.QTimer.singleShot(0, startNext)
+        QtCore.QTimer.singleShot(5000, loop.quit)
+        loop.exec_()
+        self.engine.done.disconnect()
+        self.engine.HALClient.comLostConnection.disconnect()
+
+        self.engine.setJournal(None)
+        if (len(pending) == 0) and not self.engine.isBusy():
+            journal.endRun(False)
+        journal.close()
+
+        self.hal.stop()
+        return runJournal.readJournal(self.filename)
+
+    def test_crash(self):
+        journal_run = self.runSequence(self.newModel(), ["complete", "complete", "complete", "crash"])
+        self.assertEqual(len(self.hal.getReceived()), 4)
+        self.assertEqual(journal_run.completed, set([0, 1, 2]))
+        self.assertEqual(journal_run.getFirstIncomplete(), 3)
+        self.assertTrue(journal_run.needsResume())
+
+    def test_error(self):
+        journal_run = self.runSequence(self.newModel(), ["complete", "error"])
+        self.assertEqual(len(self.hal.getReceived()), 6)
+        self.assertEqual(journal_run.completed, set([0, 2, 3, 4, 5]))
+        self.assertEqual(journal_run.getFirstIncomplete(), 1)
+        self.assertTrue(journal_run.finished)
+
+    def test_resume_after_crash(self):
+        journal_run = self.runSequence(self.newModel(), ["complete", "complete", "complete", "complete", "crash"])
+        self.assertTrue(journal_run.needsResume())
+
+        # The movies that were taken are skipped, but the parameters are set again.
+        model = self.newModel()
+        self.assertTrue(journal_run.matches(model.getDaveActions()))
+        resume_index = model.resumeRun(journal_run.completed)
+        self.assertEqual(resume_index, 4)
+
+        journal_run = self.runSequence(model, [], resume_index)
+        self.assertEqual(self.hal.getReceived(), ["Set Parameters", "Take Movie", "Take Movie"])
+        self.assertEqual(journal_run.completed, set(range(6)))
+        self.assertFalse(journal_run.needsResume())
+
+    def test_resume_after_error(self):
+        self.runSequence(self.newModel(), ["complete", "error", "complete", "complete", "crash"])
+        journal_run = runJournal.readJournal(self.filename)
+        self.assertEqual(journal_run.completed, set([0, 2, 3]))
+
+        # The movies that failed or were not taken are taken again, with their parameters.
+        model = self.newModel()
+        resume_index = model.resumeRun(journal_run.completed)
+        self.assertEqual(resume_index, 1)
+        self.assertEqual(map(lambda x: x.isPending(), model.dave_actions_all), [True, True, True, False, True, True])
+
+        journal_run = self.runSequence(model, [], resume_index)
+        self.assertEqual(self.hal.getReceived(), ["Set Parameters", "Take Movie", "Set Parameters", "Take Movie", "Take Movie"])
+        self.assertEqual(journal_run.completed, set(range(6)))
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
+#
+# The MIT License
+#
+# Copyright (c) 2015 Zhuang Lab, Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
@@ -0,0 +1,167 @@
+#!/usr/bin/python
+#
+## @file
+#
+# Tests of reading back the journal of a run that crashed, had
+# errors or was resumed. Run from the dave directory:
+#
+# python -m unittest test_runJournal
+#
+# Hazen 10/15
+#
+
+# Add current storm-control directory to sys.path
+import imp
+imp.load_source("setPath", "../sc_library/setPath.py")
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import runJournal
+
+import sc_library.tcpMessage as tcpMessage
+
+
+## JournalAction
+#
+# The parts of a DaveAction that the journal uses.
+#
+class JournalAction(object):
+
+    def __init__(self, name):
+        self.message = tcpMessage.TCPMessage(message_type = "Take Movie",
+                                             message_data = {"name" : name})
+        self.name = name
+
+    def getDescriptor(self):
+        return "take movie " + self.name
+
+    def getMessage(self):
+        return self.message
+
+
+## RunJournalTestCase
+#
+class RunJournalTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = runJournal.journalName(os.path.join(self.directory, "sequence.xml"))
+        self.actions = map(lambda x: JournalAction("movie_" + str(x)), range(5))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    ## runActions
+    #
+    # @param journal A RunJournal.
+    # @param results A list of [index, "complete" / "warning" / "error"] pairs.
+    #
+    def runActions(self, journal, results):
+        for [index, result] in results:
+            action = self.actions[index]
+            journal.actionStarted(index, action)
+            message = action.getMessage()
+            if (result == "complete"):
+                journal.actionComplete(index, action, message)
+            else:
+                message.setError(True, "a problem")
+                journal.actionProblem(result, index, action, message)
+                if (result == "warning"):
+                    journal.actionComplete(index, action, message)
+
+    def test_crash(self):
+        journal = runJournal.RunJournal(self.filename)
+        journal.startRun("sequence.xml", 5)
+        self.runActions(journal, [[0, "complete"], [1, "complete"]])
+        journal.actionStarted(2, self.actions[2])
+
+        # Crash while writing a record.
+        journal.fp.write('{"event" : "complete", "ind')
+        journal.close()
+
+        journal_run = runJournal.readJournal(self.filename)
+        self.assertEqual(journal_run.completed, set([0, 1]))
+        self.assertEqual(journal_run.getFirstIncomplete(), 2)
+        self.assertTrue(journal_run.needsResume())
+        self.assertTrue(journal_run.matches(self.actions))
+
+    def test_error_is_not_completed(self):
+        journal = runJournal.RunJournal(self.filename)
+        journal.startRun("sequence.xml", 5)
+        self.runActions(journal, [[0, "complete"], [1, "error"], [2, "warning"], [3, "complete"]])
+        journal.close()
+
+        journal_run = runJournal.readJournal(self.filename)
+        self.assertEqual(journal_run.completed, set([0, 2, 3]))
+        self.assertEqual(journal_run.getFirstIncomplete(), 1)
+        self.assertEqual(map(lambda x: x["event"], journal_run.warnings), ["error", "warning"])
+        self.assertTrue(journal_run.needsResume())
+
+    def test_resume(self):
+        journal = runJournal.RunJournal(self.filename)
+        journal.startRun("sequence.xml", 5)
+        self.runActions(journal, [[0, "complete"], [1, "error"], [2, "complete"]])
+        journal.close()
+
+        # The action that failed is run again when the run is resumed.
+        journal = runJournal.RunJournal(self.filename)
+        journal.resumeRun(runJournal.readJournal(self.filename).getFirstIncomplete())
+        self.runActions(journal, [[1, "complete"], [3, "complete"], [4, "complete"]])
+        journal.endRun(False)
+        journal.close()
+
+        journal_run = runJournal.readJournal(self.filename)
+        self.assertEqual(journal_run.completed, set(range(5)))
+        self.assertFalse(journal_run.needsResume())
+
+    def test_new_run(self):
+        journal = runJournal.RunJournal(self.filename)
+        journal.startRun("sequence.xml", 5)
+        self.runActions(journal, [[0, "complete"], [1, "complete"]])
+        journal.startRun("sequence.xml", 5)
+        journal.close()
+
+        journal_run = runJournal.readJournal(self.filename)
+        self.assertEqual(len(journal_run.completed), 0)
+        self.assertFalse(journal_run.needsResume())
+
+    def test_sequence_changed(self):
+        journal = runJournal.RunJournal(self.filename)
+        journal.startRun("sequence.xml", 5)
+        self.runActions(journal, [[0, "complete"], [1, "complete"]])
+        journal.close()
+
+        self.actions[1] = JournalAction("another_movie")
+        self.assertFalse(runJournal.readJournal(self.filename).matches(self.actions))
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
+#
+# The MIT License
+#
+# Copyright (c) 2015 Zhuang Lab, Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
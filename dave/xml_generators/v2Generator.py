@@ -16,7 +16,7 @@
 # 
 import os, sys
 from xml.etree import ElementTree
-from xml.dom import minidom
+from xml.sax import saxutils
 from PyQt4 import QtCore, QtGui
 import xml_generators.nodeToDict as nodeToDict
 import traceback
@@ -57,13 +57,14 @@ class XMLRecipeParser(QtGui.QWidget):
        
         self.loop_variables = []
         self.loop_variable_names = []
+        self.loop_values = []
         self.loop_iterator = []
 
-        self.flat_sequence = []
-        self.flat_sequence_xml = []
         self.xml_sequence_file_path = output_filename
-        
-        self.da_primitives_xml = []
+
+        # The estimates are filled in as the recipe is expanded.
+        self.estimates = [0, 0, 0.0]
+        self.estimates_complete = False
 
         # A convenient list of dave actions required for parsing a <movie> tag
         self.movie_da_actions = [daveActions.DAMoveStage(),
@@ -78,112 +79,98 @@ class XMLRecipeParser(QtGui.QWidget):
                                  daveActions.DAPause(),
                                  daveActions.DATakeMovie()]
 
-    ## convertToDaveXMLPrimitives
-    #
-    # @param primitives_xml The element tree that will contain dave primitives
-    # @param flat_sequence The element tree that contains a flat sequence of higher order commands, e.g. <movie>
-    #
-    def convertToDaveXMLPrimitives(self, primitives_xml, flat_sequence):
-        if self.verbose:
-            print "---------------------------------------------------------"
-            print "Converting to Dave Primitives"
-        
-        # Loop over all children
-        for child in flat_sequence:
-            if child.tag == "branch": # Generate block and call recursively to handle elements in blocks
-                branch = ElementTree.SubElement(primitives_xml, "branch")
-                branch.attrib["name"] = child.attrib["name"]
-                self.convertToDaveXMLPrimitives(branch, child)
-            
-            elif child.tag == "movie": # Handle <movie> tag
-                movie_block = ElementTree.SubElement(primitives_xml, "branch")
-                name = child.find("name")
-
-                # Determine name.
-                if name is not None:
-                    movie_block.set("name", name.text)
-                else:
-                    movie_block.set("name", "No Name Provided")
-
-                # Determine dictionary
-                movie_dict = nodeToDict.movieNodeToDict(child)
-                for action in self.movie_da_actions:
-                    new_node = action.createETree(movie_dict)
-                    if new_node is not None:
-                        movie_block.append(new_node)
-            
-            elif child.tag == "valve_protocol": # Handle <valve_protocol> tag
-                new_node = daveActions.DAValveProtocol().createETree({"name": child.text})
-                if new_node is not None:
-                    primitives_xml.append(new_node)
-
-            elif child.tag == "change_directory": # Handle change_directory tag
-                new_node = daveActions.DASetDirectory().createETree({"directory": child.text})
-                if new_node is not None:
-                    primitives_xml.append(new_node)
-
-            elif child.tag == "clear_warnings": # Handle the clear_warnings tag
-                new_node = daveActions.DAClearWarnings().createETree({})
-                if new_node is not None:
-                    primitives_xml.append(new_node)
-            else:
-                pass
-                ## Eventually display an unknown tag error. For now ignore
-
     ## copyChildren
     #
     # Handles copying children of the specified parent to the new_parent specifically handling <loop> and <variable_entry> tags
     #
     # @param parent The element tree to be copied
     # @param new_parent The element tree that will contain the flat sequence
+    # @param loop_iterator (Optional) The current loop iterator values, defaults to self.loop_iterator
     #       
-    def copyChildren(self, parent, new_parent):
+    def copyChildren(self, parent, new_parent, loop_iterator = None):
+        if loop_iterator is None:
+            loop_iterator = self.loop_iterator
         for child in parent:
             if child.tag == "loop":
-                self.handleLoop(child, new_parent)
+                self.handleLoop(child, new_parent, loop_iterator)
             elif child.tag == "variable_entry":
-                self.handleVariableEntry(child, new_parent)
+                self.handleVariableEntry(child, new_parent, loop_iterator)
             elif child.attrib.get("increment") == "Yes":
                 new_child = ElementTree.SubElement(new_parent, child.tag, child.attrib)
                 if child.text == None: new_child.text = ""
                 else:
                     new_child.text = str(child.text)
-                    for [loop_ID, loop_iterator] in enumerate(self.loop_iterator):
-                        pad_length = len(str(len(self.loop_variables[loop_ID])))
-                        if loop_iterator >= 0:
-                            new_child.text += "_" + str(loop_iterator).zfill(pad_length)
+                    for [loop_ID, an_iterator] in enumerate(loop_iterator):
+                        pad_length = len(str(len(self.loop_values[loop_ID])))
+                        if an_iterator >= 0:
+                            new_child.text += "_" + str(an_iterator).zfill(pad_length)
                 
                 if child.tail == None: new_child.tail = ""
                 else: new_child.tail = str(child.tail)
                 del new_child.attrib["increment"]
-                self.copyChildren(child, new_child)
+                self.copyChildren(child, new_child, loop_iterator)
             else:
                 new_child = ElementTree.SubElement(new_parent, child.tag, child.attrib)
                 if child.text == None: new_child.text = ""
                 else: new_child.text = str(child.text)
                 if child.tail == None: new_child.tail = ""
                 else: new_child.tail = str(child.tail)
-                self.copyChildren(child, new_child)
+                self.copyChildren(child, new_child, loop_iterator)
 
         return new_parent
 
+    ## getEstimates
+    #
+    # The number of Dave actions, movie frames and the total delay in the
+    # recipe. These are counted as the recipe is expanded, so while it is
+    # being streamed they only include the part that has been expanded so far.
+    #
+    # @return [number of actions, number of frames, delay in seconds]
+    #
+    def getEstimates(self):
+        return self.estimates[:]
+
+    ## getLoopValue
+    #
+    # Position file values are stored as [x, y] strings and only converted
+    # to elements when they are needed.
+    #
+    # @param loop_ID The index of the loop variable.
+    # @param index The index of the value.
+    #
+    # @return The <value> element.
+    #
+    def getLoopValue(self, loop_ID, index):
+        value = self.loop_values[loop_ID][index]
+        if ElementTree.iselement(value):
+            return value
+
+        new_value = ElementTree.Element("value")
+        new_value.text = "\n"
+        x_child = ElementTree.SubElement(new_value, "stage_x")
+        x_child.text = value[0]
+        y_child = ElementTree.SubElement(new_value, "stage_y")
+        y_child.text = value[1]
+        return new_value
+
     ## handleLoop
     #
     # Handles iteration of loop variables and naming of branches corresponding to loops
     #
     # @param loop The element whos children should be copied and replicated
     # @param new_parent The element tree that will contain the flat sequence
+    # @param loop_iterator The current loop iterator values.
     #             
-    def handleLoop(self, loop, new_parent):
+    def handleLoop(self, loop, new_parent, loop_iterator):
         loop_name = loop.attrib["name"]
         loop_ID = self.loop_variable_names.index(loop_name)
         loop_block = ElementTree.Element("branch")
         loop_block.attrib["name"] = loop_name
-        for local_iterator in range(len(self.loop_variables[loop_ID])):
-            self.loop_iterator[loop_ID] = local_iterator # Store iterator for updating names
-            self.copyChildren(loop, loop_block)
+        for local_iterator in range(len(self.loop_values[loop_ID])):
+            loop_iterator[loop_ID] = local_iterator # Store iterator for updating names
+            self.copyChildren(loop, loop_block, loop_iterator)
         new_parent.append(loop_block)
-        self.loop_iterator[loop_ID] = -1
+        loop_iterator[loop_ID] = -1
 
     ## handleVariableEntry
     #
@@ -191,18 +178,148 @@ class XMLRecipeParser(QtGui.QWidget):
     #
     # @param child The variable entry node
     # @param new_parent The element tree that will contain the flat sequence
+    # @param loop_iterator The current loop iterator values.
     #
-    def handleVariableEntry(self, child, new_parent):
+    def handleVariableEntry(self, child, new_parent, loop_iterator):
         variable_name = child.attrib["name"]
         loop_ID = self.loop_variable_names.index(variable_name)
 
-        variable_entry = self.loop_variables[loop_ID][self.loop_iterator[loop_ID]]
+        variable_entry = self.getLoopValue(loop_ID, loop_iterator[loop_ID])
 
         # Add a tail to the last child for a pretty final xml file
         last_child = variable_entry[-1]
         last_child.tail = "\n"
         
-        self.copyChildren(variable_entry, new_parent)
+        self.copyChildren(variable_entry, new_parent, loop_iterator)
+
+    ## isEstimateComplete
+    #
+    # @return True/False if the estimates include the whole recipe.
+    #
+    def isEstimateComplete(self):
+        return self.estimates_complete
+
+    ## iterDavePrimitives
+    #
+    # A generator that yields the Dave action primitives of the recipe one at
+    # a time, so that nothing larger than a single <movie> is ever expanded
+    # in memory. Each primitive is either a Dave action element or a branch
+    # element (a movie) containing Dave action elements.
+    #
+    # The path is a list of [loop name, loop instance] pairs for the
+    # loops (and branches) that the primitive is in.
+    #
+    # @return A generator of [path, element] pairs.
+    #
+    def iterDavePrimitives(self):
+        self.estimates = [0, 0, 0.0]
+        self.estimates_complete = False
+        branch_count = [0]
+        for [path, child] in self.iterFlatSequence():
+            for elt in self.iterElementPrimitives(path, child, branch_count):
+                yield elt
+        self.estimates_complete = True
+
+    ## iterElementPrimitives
+    #
+    # Converts a single element of the flat sequence to Dave action primitives.
+    # Branches (which include loops that were nested inside other elements)
+    # are descended into.
+    #
+    # @param path The current loop path.
+    # @param child The element.
+    # @param branch_count A one element list used to give each branch a unique id.
+    #
+    # @return A generator of [path, element] pairs.
+    #
+    def iterElementPrimitives(self, path, child, branch_count):
+        if child.tag == "branch": # Handle <branch> tag
+            # Negative ids so that these do not collide with the loop ids.
+            branch_count[0] -= 1
+            branch_path = path + [[child.get("name", "NA"), branch_count[0]]]
+            for branch_child in child:
+                for elt in self.iterElementPrimitives(branch_path, branch_child, branch_count):
+                    yield elt
+
+        elif child.tag == "movie": # Handle <movie> tag
+
+            movie_block = ElementTree.Element("branch")
+            name = child.find("name")
+
+            # Determine name.
+            if name is not None:
+                movie_block.set("name", name.text)
+            else:
+                movie_block.set("name", "No Name Provided")
+
+            # Determine dictionary
+            movie_dict = nodeToDict.movieNodeToDict(child)
+            for action in self.movie_da_actions:
+                new_node = action.createETree(movie_dict)
+                if new_node is not None:
+                    movie_block.append(new_node)
+            self.estimates[0] += len(movie_block)
+            if isinstance(movie_dict.get("length"), int):
+                self.estimates[1] += movie_dict["length"]
+            if isinstance(movie_dict.get("delay"), int):
+                self.estimates[2] += 0.001 * movie_dict["delay"]
+            yield [path, movie_block]
+
+        else:
+            new_node = None
+            if child.tag == "valve_protocol": # Handle <valve_protocol> tag
+                new_node = daveActions.DAValveProtocol().createETree({"name": child.text})
+            elif child.tag == "change_directory": # Handle change_directory tag
+                new_node = daveActions.DASetDirectory().createETree({"directory": child.text})
+            elif child.tag == "clear_warnings": # Handle the clear_warnings tag
+                new_node = daveActions.DAClearWarnings().createETree({})
+            if new_node is not None:
+                self.estimates[0] += 1
+                yield [path, new_node]
+
+    ## iterFlatChildren
+    #
+    # A generator version of copyChildren() for the command sequence level. This
+    # expands loops and variable entries and yields the resulting commands one
+    # at a time.
+    #
+    # @param parent The element whose children should be expanded.
+    # @param path The current loop path.
+    # @param loop_iterator The current loop iterator values.
+    # @param loop_count A one element list used to give each loop instance a unique id.
+    #
+    # @return A generator of [path, element] pairs.
+    #
+    def iterFlatChildren(self, parent, path, loop_iterator, loop_count):
+        for child in parent:
+            if child.tag == "loop":
+                loop_name = child.attrib["name"]
+                loop_ID = self.loop_variable_names.index(loop_name)
+                loop_count[0] += 1
+                loop_path = path + [[loop_name, loop_count[0]]]
+                for local_iterator in range(len(self.loop_values[loop_ID])):
+                    loop_iterator[loop_ID] = local_iterator
+                    for elt in self.iterFlatChildren(child, loop_path, loop_iterator, loop_count):
+                        yield elt
+                loop_iterator[loop_ID] = -1
+            else:
+                holder = ElementTree.Element("holder")
+                temp = ElementTree.Element("temp")
+                temp.append(child)
+                self.copyChildren(temp, holder, loop_iterator)
+                for new_child in holder:
+                    yield [path, new_child]
+
+    ## iterFlatSequence
+    #
+    # @return A generator of the [path, element] pairs of the flat command sequence.
+    #
+    def iterFlatSequence(self):
+        loop_iterator = map(lambda x: -1, self.loop_variable_names)
+        loop_count = [0]
+        for command_sequence in self.command_sequences:
+            for elt in self.iterFlatChildren(command_sequence, [], loop_iterator, loop_count):
+                yield elt
         
     ## loadXML
     #
@@ -240,6 +357,8 @@ class XMLRecipeParser(QtGui.QWidget):
         
         # Expand out loop variables
         for loop in self.loop_variables:
+            loop_values = filter(lambda x: (x.tag != "file_path"), list(loop))
+            self.loop_values.append(loop_values)
             path_to_xml = ""
             file_path_elements = loop.findall("file_path")
             for file_path_element in file_path_elements:
@@ -259,29 +378,18 @@ class XMLRecipeParser(QtGui.QWidget):
                                                                             header = window_header,
                                                                             file_types = "Position Files (*.xml *.txt)")
 
-                # Check if the file contains flat position data
+                # Check if the file contains flat position data. These are kept
+                # as strings and only converted to elements as needed.
                 if loop_variable_xml == None and os.path.isfile(path_to_loop_variable_xml):
-                    new_loop_variable = ElementTree.Element("variable_entry")
-                    loop_variable_xml = ElementTree.ElementTree(new_loop_variable)
                     pos_fp = open(path_to_loop_variable_xml, "r")
-                    # Convert position data to elements
-                    while True:
-                        line = pos_fp.readline()
-                        if not line: break
-                        [x, y] = line.split(",")
-                        new_value = ElementTree.SubElement(new_loop_variable, "value")
-                        new_value.text = "\n"
+                    for line in pos_fp:
+                        if (len(line.strip()) > 0):
+                            loop_values.append(line.split(","))
+                    pos_fp.close()
 
-                        x_child = ElementTree.SubElement(new_value, "stage_x")
-                        x_child.text = x
+                elif loop_variable_xml is not None:
+                    loop_values.extend(list(loop_variable_xml.getroot()))
 
-                        y_child = ElementTree.SubElement(new_value, "stage_y")
-                        y_child.text = y
-
-                loop_variables = loop_variable_xml.getroot()
-
-                for loop_variable in loop_variables:
-                    loop.append(loop_variable)
                 if self.verbose:
                     print "Extracted loop variables from " + path_to_loop_variable_xml
 
@@ -323,6 +431,18 @@ class XMLRecipeParser(QtGui.QWidget):
     # Parse the XML recipe file.
     #
     def parseXMLRecipe(self):
+        self.prepareRecipe()
+
+        # Expand the recipe and save the dave primitives.
+        for elt in self.streamDavePrimitives():
+            pass
+
+    ## prepareRecipe
+    #
+    # Parse the major components of the recipe file, load the loop
+    # variables and replace the items. The recipe is not expanded.
+    #
+    def prepareRecipe(self):
         # Parse major components of recipe file
         for child in self.main_element:
             if child.tag == "command_sequence":
@@ -341,21 +461,26 @@ class XMLRecipeParser(QtGui.QWidget):
         for command_sequence in self.command_sequences:
             command_sequence = self.replaceItems(command_sequence)
 
-        # Create flat command sequence and convert to new xml element tree
-        self.flat_sequence = ElementTree.Element("sequence")
-        self.flat_sequence.text = "\n" # Clean up display
-
-        # Fill sequence from command sequence elements
-        for command_sequence in self.command_sequences:
-            self.copyChildren(command_sequence, self.flat_sequence)
+    ## loadRecipe
+    #
+    # Load and prepare a recipe file for streaming with streamDavePrimitives().
+    #
+    # @param xml_file_path (Optional) Path to the xml file.
+    #
+    # @return True/False if the recipe was loaded.
+    #
+    def loadRecipe(self, xml_file_path = ""):
+        if not xml_file_path == "":
+            self.xml_filename = xml_file_path
 
-        # Create Dave action primitives
-        self.da_primitives_xml = ElementTree.Element("sequence")
-        self.da_primitives_xml.text = "\n"
-        self.convertToDaveXMLPrimitives(self.da_primitives_xml, self.flat_sequence)
+        xml, self.xml_filename = self.loadXML(self.xml_filename, header = "Open Sequence Recipe File")
+        if (xml == None) or not (xml.getroot().tag == "recipe"):
+            return False
 
-        # Save dave primitives
-        self.saveDavePrimitives()
+        self.directory = os.path.dirname(os.path.abspath(self.xml_filename))
+        self.main_element = xml.getroot()
+        self.prepareRecipe()
+        return True
 
     ## parseXMLExperiment
     #
@@ -406,22 +531,59 @@ class XMLRecipeParser(QtGui.QWidget):
     # Save the final dave primitives sequence.
     #
     def saveDavePrimitives(self):
+        for elt in self.streamDavePrimitives():
+            pass
+
+    ## streamDavePrimitives
+    #
+    # A generator that yields the Dave action primitives (as iterDavePrimitives()) and
+    # writes them to the sequence file as they are produced.
+    #
+    # @return A generator of [path, element] pairs.
+    #
+    def streamDavePrimitives(self):
         if self.xml_sequence_file_path == "":
             self.xml_sequence_file_path = str(QtGui.QFileDialog.getSaveFileName(self,
                                                                                  "Save XML Sequence",
                                                                                  self.directory,
                                                                                  "*.xml"))
+        out_fp = None
         try:
             out_fp = open(self.xml_sequence_file_path, "w")
-            rough_string = ElementTree.tostring(self.da_primitives_xml, 'utf-8')        
-            reparsed = minidom.parseString(rough_string)
-            out_fp.write(reparsed.toprettyxml(indent="  ", encoding = "ISO-8859-1"))
-            out_fp.close()
-            self.wrote_XML = True
+            out_fp.write("<?xml version=\"1.0\" encoding=\"ISO-8859-1\"?>\n<sequence>\n")
         except:
             QtGui.QMessageBox.information(self,"Error",
                                           "Error saving xml file")
             self.xml_sequence_file_path = ""
+            out_fp = None
+
+        cur_path = []
+        for [path, node] in self.iterDavePrimitives():
+            if out_fp is not None:
+
+                # Close branches that we have left.
+                n_same = 0
+                while (n_same < len(cur_path)) and (n_same < len(path)) and (cur_path[n_same] == path[n_same]):
+                    n_same += 1
+                for i in range(len(cur_path) - n_same):
+                    out_fp.write("  " * (len(cur_path) - i) + "</branch>\n")
+
+                # Open new branches.
+                for i in range(n_same, len(path)):
+                    out_fp.write("  " * (i + 1) + "<branch name=" + saxutils.quoteattr(path[i][0]) + ">\n")
+                cur_path = path
+
+                indent(node, len(path) + 1)
+                out_fp.write("  " * (len(path) + 1) + ElementTree.tostring(node))
+
+            yield [path, node]
+
+        if out_fp is not None:
+            for i in range(len(cur_path)):
+                out_fp.write("  " * (len(cur_path) - i) + "</branch>\n")
+            out_fp.write("</sequence>\n")
+            out_fp.close()
+            self.wrote_XML = True
 
     ## writtenXMLPath
     #
@@ -431,6 +593,28 @@ class XMLRecipeParser(QtGui.QWidget):
         return self.xml_sequence_file_path
 
 
+## indent
+#
+# Pretty print helper, sets the text and tail of the elements of a
+# tree so that it will be indented properly when written.
+#
+# @param elt The ElementTree element.
+# @param level The indentation level of the element.
+#
+def indent(elt, level):
+    spacing = "\n" + "  " * level
+    if (len(elt) > 0):
+        if not elt.text or not elt.text.strip():
+            elt.text = spacing + "  "
+        for child in elt:
+            indent(child, level + 1)
+            child.tail = spacing + "  "
+        child.tail = spacing
+    elif elt.text is not None:
+        elt.text = elt.text.strip()
+    elt.tail = "\n"
+
+
 # ----------------------------------------------------------------------------------------
 # Stand Alone Test Class
 # ----------------------------------------------------------------------------------------
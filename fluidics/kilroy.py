@@ -18,6 +18,7 @@ from PyQt4 import QtCore, QtGui
 from valves.valveChain import ValveChain
 from pumps.pumpControl import PumpControl
 from kilroyProtocols import KilroyProtocols
+from kilroyCompiler import DeviceLatencies
 from sc_library.tcpServer import TCPServer
 import sc_library.parameters as params
 
@@ -38,6 +39,10 @@ class Kilroy(QtGui.QMainWindow):
             self.num_simulated_valves = 0
         else:
             self.num_simulated_valves = parameters.get("num_simulated_valves")
+        if not hasattr(parameters, "simulated_valve_move_time"):
+            self.simulated_valve_move_time = 0.0
+        else:
+            self.simulated_valve_move_time = parameters.get("simulated_valve_move_time")
         if not hasattr(parameters, "protocols_file"):
             self.protocols_file = "default_config.xml"
         else:
@@ -52,19 +57,27 @@ class Kilroy(QtGui.QMainWindow):
             self.simulate_pump = parameters.get("simulate_pump")
 
         # Define additional internal attributes
+        self.completed_message = None # A completed protocol message waiting for the valves and the pump
+        self.latencies = DeviceLatencies() # Measured device latencies for protocol time estimates
         self.received_message = None
         
         # Create ValveChain instance
         self.valveChain = ValveChain(com_port = self.valve_com_port,
                                      num_simulated_valves = self.num_simulated_valves,
+                                     simulated_move_time = self.simulated_valve_move_time,
                                      verbose = self.verbose)
+        self.valveChain.move_time_signal.connect(self.handleValveMoveTime)
+        self.valveChain.moves_complete_signal.connect(self.handleDevicesDone)
 
         # Create PumpControl instance
         self.pumpControl = PumpControl(parameters = parameters)
+        self.pumpControl.command_time_signal.connect(self.handlePumpCommandTime)
+        self.pumpControl.commands_complete_signal.connect(self.handleDevicesDone)
                                        
         # Create KilroyProtocols instance and connect signals
         self.kilroyProtocols = KilroyProtocols(protocol_xml_path = self.protocols_file,
                                                command_xml_path = self.commands_file,
+                                               ports_per_valve = self.valveChain.getPortsPerValve(),
                                                verbose = self.verbose)
 
         self.kilroyProtocols.command_ready_signal.connect(self.sendCommand)
@@ -103,6 +116,14 @@ class Kilroy(QtGui.QMainWindow):
         self.mainLayout.addWidget(self.pumpControl.mainWidget, 0, 4, 2, 1)
         #self.mainLayout.addWidget(self.tcpServer.mainWidget, 2, 2, 1, 4)
 
+    # ----------------------------------------------------------------------------------------
+    # Send the completed protocol message that was waiting for the valves and the pump
+    # ----------------------------------------------------------------------------------------
+    def handleDevicesDone(self):
+        if (self.completed_message is not None) and not self.valveChain.isMoving() and not self.pumpControl.isBusy():
+            self.tcpServer.sendMessage(self.completed_message)
+            self.completed_message = None
+
     # ----------------------------------------------------------------------------------------
     # Redirect protocol status change from kilroyProtocols to valveChain
     # ----------------------------------------------------------------------------------------
@@ -119,10 +140,18 @@ class Kilroy(QtGui.QMainWindow):
     # Handle a protocol complete signal from the valve protocols
     # ----------------------------------------------------------------------------------------
     def handleProtocolComplete(self, message):
-        # If the protocol was sent by TCP pass on the complete signal
+        # If the protocol was sent by TCP pass on the complete signal, once the valves and
+        # the pump are done
         if (self.received_message is not None) and self.received_message.getID() == message.getID():
-            self.tcpServer.sendMessage(message)
             self.received_message = None # Reset the received_message
+            self.completed_message = message
+            self.handleDevicesDone()
+
+    # ----------------------------------------------------------------------------------------
+    # Record how long the pump took to respond to a command
+    # ----------------------------------------------------------------------------------------
+    def handlePumpCommandTime(self, command_time):
+        self.latencies.addMeasurement("pump", command_time)
 
     # ----------------------------------------------------------------------------------------
     # Handle protocol request sent via TCP server
@@ -136,7 +165,7 @@ class Kilroy(QtGui.QMainWindow):
             message.setError(True, "Invalid Kilroy Protocol")
             self.tcpServer.sendMessage(message)
         elif message.isTest():
-            required_time = self.kilroyProtocols.requiredTime(message.getData("name"))
+            required_time = self.kilroyProtocols.requiredTime(message.getData("name"), self.latencies)
             message.addResponse("duration", required_time)
             self.tcpServer.sendMessage(message)
         else: # Valid, non-test message                                    
@@ -145,6 +174,12 @@ class Kilroy(QtGui.QMainWindow):
             # Start the protocol
             self.kilroyProtocols.startProtocolRemotely(message)
             
+    # ----------------------------------------------------------------------------------------
+    # Record how long the valves took to move
+    # ----------------------------------------------------------------------------------------
+    def handleValveMoveTime(self, move_time):
+        self.latencies.addMeasurement("valve", move_time)
+
     # ----------------------------------------------------------------------------------------
     # Redirect commands from kilroy protocol class to valves or pump
     # ----------------------------------------------------------------------------------------
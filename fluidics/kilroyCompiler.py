@@ -0,0 +1,473 @@
+#!/usr/bin/python
+# ----------------------------------------------------------------------------------------
+# Compiles Kilroy protocols into a flat timeline of valve and pump operations when the
+# configuration is loaded. The valve and port of every valve command and the speed of
+# every pump command are checked once here, so running a protocol does not need to look
+# anything up, and a protocol with a bad command is rejected before it is started.
+#
+# The time that a protocol takes is estimated from the step durations and the measured
+# latencies of the devices, i.e. how long the valves take to rotate and how long the pump
+# takes to respond to a command. The valves and the pump are run by their own threads,
+# so a protocol only waits for them at the end. The protocols can also be run against a
+# simulated valve chain and pump, in accelerated time, to check them without any hardware.
+#
+# This does not use Qt so that Dave can use it to estimate the protocol durations.
+#
+# Usage:
+#   python kilroyCompiler.py config.xml [time scale]
+# ----------------------------------------------------------------------------------------
+# Hazen
+# 10/15
+# ----------------------------------------------------------------------------------------
+
+# ----------------------------------------------------------------------------------------
+# Import
+# ----------------------------------------------------------------------------------------
+import sys
+import time
+import xml.etree.ElementTree as elementTree
+
+# Device latencies (in seconds) to use until they have been measured.
+default_latencies = {"pump" : 0.1,
+                     "valve" : 1.0}
+
+# The largest number of ports on a Hamilton MVP valve.
+default_ports_per_valve = 8
+
+# The pump speed range (in rpm).
+max_pump_speed = 48.0
+min_pump_speed = 0.0
+
+# ----------------------------------------------------------------------------------------
+# Check a [direction, speed, ramp profile or None] pump command, speeds outside of the
+# pump range are errors. Returns a list of the problems with the command.
+# ----------------------------------------------------------------------------------------
+def checkPumpCommand(command_name, pump_command):
+    speeds = [pump_command[1]]
+    if (len(pump_command) > 2) and (pump_command[2] is not None):
+        speeds += map(lambda x: x[1], pump_command[2])
+    for speed in speeds:
+        if (speed < min_pump_speed) or (speed > max_pump_speed):
+            return [command_name + " has a speed outside of the pump range"]
+    return []
+
+# ----------------------------------------------------------------------------------------
+# Compile a protocol
+#   protocol_commands - a list of [instrument type, command name] pairs
+#   protocol_durations - a list of step durations in seconds
+#   valve_commands - a dictionary of valve port lists keyed by command name
+#   pump_commands - a dictionary of [direction, speed, ramp profile or None] keyed by command name
+#   ports_per_valve - the number of ports on each valve, this also sets the number of valves
+# ----------------------------------------------------------------------------------------
+def compileProtocol(name, protocol_commands, protocol_durations, valve_commands, pump_commands, ports_per_valve):
+    protocol = CompiledProtocol(name)
+    for [command, duration] in zip(protocol_commands, protocol_durations):
+        [device, command_name] = command
+        if (duration < 0):
+            protocol.addError(command_name + " has a negative duration")
+
+        if (device == "valve"):
+            if not (command_name in valve_commands):
+                protocol.addError("Unknown valve command: " + str(command_name))
+                continue
+            port_IDs = valve_commands[command_name]
+            for valve_ID, port_ID in enumerate(port_IDs):
+                if (port_ID < 0):
+                    continue
+                if (valve_ID >= len(ports_per_valve)):
+                    protocol.addError(command_name + " uses valve " + str(valve_ID + 1) + " which does not exist")
+                elif (port_ID >= ports_per_valve[valve_ID]):
+                    protocol.addError(command_name + " uses port " + str(port_ID + 1) + " of valve " + str(valve_ID + 1) + " which does not exist")
+            protocol.addOperation(device, command_name, port_IDs, duration)
+
+        elif (device == "pump"):
+            if not (command_name in pump_commands):
+                protocol.addError("Unknown pump command: " + str(command_name))
+                continue
+            pump_command = pump_commands[command_name]
+            for error in checkPumpCommand(command_name, pump_command):
+                protocol.addError(error)
+            protocol.addOperation(device, command_name, pump_command, duration)
+
+        else:
+            protocol.addError("Unknown command tag: " + str(device))
+
+    return protocol
+
+# ----------------------------------------------------------------------------------------
+# Load and compile all of the protocols in a Kilroy configuration file
+# ----------------------------------------------------------------------------------------
+def loadProtocols(xml_file_path, ports_per_valve = None):
+    kilroy_configuration = elementTree.parse(xml_file_path).getroot()
+
+    # Valve commands, valve and port IDs in the file start at 1.
+    num_valves = int(kilroy_configuration.get("num_valves", 0))
+    valve_commands = {}
+    for valve_command in kilroy_configuration.findall("valve_commands"):
+        for command in valve_command.findall("valve_cmd"):
+            port_IDs = [-1] * num_valves
+            for valve_pos in command.findall("valve_pos"):
+                valve_ID = int(valve_pos.get("valve_ID")) - 1
+                while (valve_ID >= len(port_IDs)):
+                    port_IDs.append(-1)
+                port_IDs[valve_ID] = int(valve_pos.get("port_ID")) - 1
+            valve_commands[command.get("name")] = port_IDs
+
+    # Pump commands.
+    pump_commands = {}
+    for pump_command in kilroy_configuration.findall("pump_commands"):
+        for command in pump_command.findall("pump_cmd"):
+            pump_commands[command.get("name")] = parsePumpCommand(command)
+
+    if ports_per_valve is None:
+        ports_per_valve = [default_ports_per_valve] * num_valves
+
+    # Protocols.
+    protocols = []
+    for kilroy_protocols in kilroy_configuration.findall("kilroy_protocols"):
+        for protocol in kilroy_protocols.findall("protocol"):
+            protocol_commands = []
+            protocol_durations = []
+            for command in protocol:
+                protocol_commands.append([command.tag, command.text])
+                protocol_durations.append(float(command.get("duration")))
+            protocols.append(compileProtocol(protocol.get("name"),
+                                             protocol_commands,
+                                             protocol_durations,
+                                             valve_commands,
+                                             pump_commands,
+                                             ports_per_valve))
+    return protocols
+
+# ----------------------------------------------------------------------------------------
+# Parse a pump_cmd XML element into a [direction, speed, ramp profile or None] pump
+# command. Kilroy and Dave both use this so that they agree on what a command does. A
+# (flow) speed outside of the pump range is a flag for stopped flow. The ramp speeds are
+# not changed, speeds outside of the pump range are errors (see checkPumpCommand()).
+# ----------------------------------------------------------------------------------------
+def parsePumpCommand(command):
+    direction = "Stopped"
+    profile = None
+    speed = 0.0
+    for pump_config in command.findall("pump_config"):
+        speed = float(pump_config.get("speed"))
+        direction = {"Forward": "Forward", "Reverse": "Reverse"}.get(pump_config.get("direction"), "Stopped")
+        if (speed < min_pump_speed) or (speed > max_pump_speed):
+            speed = 0.0
+            direction = "Stopped"
+        for ramp in pump_config.findall("ramp"):
+            if profile is None:
+                profile = []
+            profile.append([float(ramp.get("time")), float(ramp.get("speed"))])
+    if profile is not None:
+        profile.sort()
+    return [direction, speed, profile]
+
+# ----------------------------------------------------------------------------------------
+# CompiledProtocol Class Definition
+# ----------------------------------------------------------------------------------------
+class CompiledProtocol():
+    def __init__(self, name):
+        self.errors = []
+        self.name = name
+        self.operations = []
+        self.total_time = 0.0
+
+    # ------------------------------------------------------------------------------------
+    # Record a problem with the protocol
+    # ------------------------------------------------------------------------------------
+    def addError(self, error):
+        self.errors.append(error)
+
+    # ------------------------------------------------------------------------------------
+    # Add an operation to the end of the timeline
+    # ------------------------------------------------------------------------------------
+    def addOperation(self, device, command_name, data, duration):
+        self.operations.append(ProtocolOperation(device, command_name, data, duration, self.total_time))
+        self.total_time += duration
+
+    # ------------------------------------------------------------------------------------
+    # Estimate how long the protocol will take. The valves and the pump are controlled by
+    # their own threads, so they only matter if they are still busy when the protocol
+    # would otherwise have finished.
+    # ------------------------------------------------------------------------------------
+    def estimateTime(self, latencies = None):
+        if latencies is None:
+            latencies = DeviceLatencies()
+        elapsed = 0.0
+        devices_done = 0.0
+        for operation in self.operations:
+            devices_done = max(devices_done, elapsed + latencies.getLatency(operation.device))
+            elapsed += operation.duration
+        return max(elapsed, devices_done)
+
+    # ------------------------------------------------------------------------------------
+    # Return the problems with the protocol
+    # ------------------------------------------------------------------------------------
+    def getErrors(self):
+        return self.errors
+
+    # ------------------------------------------------------------------------------------
+    # Return the protocol name
+    # ------------------------------------------------------------------------------------
+    def getName(self):
+        return self.name
+
+    # ------------------------------------------------------------------------------------
+    # Return the number of operations in the protocol
+    # ------------------------------------------------------------------------------------
+    def getNumOperations(self):
+        return len(self.operations)
+
+    # ------------------------------------------------------------------------------------
+    # Return an operation
+    # ------------------------------------------------------------------------------------
+    def getOperation(self, operation_ID):
+        return self.operations[operation_ID]
+
+    # ------------------------------------------------------------------------------------
+    # Return the sum of the step durations, ignoring the devices
+    # ------------------------------------------------------------------------------------
+    def getTotalTime(self):
+        return self.total_time
+
+    # ------------------------------------------------------------------------------------
+    # Is the protocol free of errors?
+    # ------------------------------------------------------------------------------------
+    def isValid(self):
+        return (len(self.errors) == 0)
+
+# ----------------------------------------------------------------------------------------
+# DeviceLatencies Class Definition: a moving average of the measured device latencies
+# ----------------------------------------------------------------------------------------
+class DeviceLatencies():
+    def __init__(self, latencies = None, weight = 0.2):
+        self.latencies = dict(default_latencies)
+        if latencies is not None:
+            self.latencies.update(latencies)
+        self.measured = {}
+        self.weight = weight # The weight of a new measurement in the average
+
+    # ------------------------------------------------------------------------------------
+    # Add a measurement, the first measurement replaces the default
+    # ------------------------------------------------------------------------------------
+    def addMeasurement(self, device, latency):
+        if not (device in self.measured):
+            self.latencies[device] = latency
+            self.measured[device] = 1
+        else:
+            self.latencies[device] += self.weight * (latency - self.latencies[device])
+            self.measured[device] += 1
+
+    # ------------------------------------------------------------------------------------
+    # Return the latency of a device in seconds
+    # ------------------------------------------------------------------------------------
+    def getLatency(self, device):
+        return self.latencies.get(device, 0.0)
+
+    # ------------------------------------------------------------------------------------
+    # Return the number of measurements of a device
+    # ------------------------------------------------------------------------------------
+    def getNumMeasurements(self, device):
+        return self.measured.get(device, 0)
+
+# ----------------------------------------------------------------------------------------
+# ProtocolOperation Class Definition: one step of a compiled protocol
+# ----------------------------------------------------------------------------------------
+class ProtocolOperation():
+    def __init__(self, device, command_name, data, duration, start_time):
+        self.command_name = command_name
+        self.data = data             # Port IDs for a valve, [direction, speed] for a pump
+        self.device = device         # "valve" or "pump"
+        self.duration = duration     # Seconds to wait before the next operation
+        self.start_time = start_time # Seconds from the start of the protocol (ignoring the devices)
+
+    # ------------------------------------------------------------------------------------
+    # Return the command in the form that the valve chain or pump expects
+    # ------------------------------------------------------------------------------------
+    def getCommand(self):
+        return [self.device, self.data]
+
+    # ------------------------------------------------------------------------------------
+    # Return a description of the operation
+    # ------------------------------------------------------------------------------------
+    def getDescriptor(self):
+        return self.device + ": " + self.command_name + ": " + str(self.duration) + " s"
+
+# ----------------------------------------------------------------------------------------
+# ProtocolSimulator Class Definition: runs compiled protocols against a simulated valve
+# chain and pump. Time is simulated, time_scale sets how much faster than real time the
+# protocol runs (0 is as fast as possible).
+# ----------------------------------------------------------------------------------------
+class ProtocolSimulator():
+    def __init__(self, num_valves, latencies = None, time_scale = 0.0, verbose = False):
+        if latencies is None:
+            latencies = DeviceLatencies()
+        self.latencies = latencies
+        self.log = []
+        self.pump = SimulatedPump()
+        self.time = 0.0
+        self.time_scale = time_scale
+        self.valve_chain = SimulatedValveChain(num_valves)
+        self.verbose = verbose
+
+    # ------------------------------------------------------------------------------------
+    # Advance the simulated time
+    # ------------------------------------------------------------------------------------
+    def advance(self, delta_time):
+        if (delta_time > 0.0):
+            if (self.time_scale > 0.0):
+                time.sleep(delta_time/self.time_scale)
+            self.time += delta_time
+
+    # ------------------------------------------------------------------------------------
+    # Return a list of [time, text] records from the last run
+    # ------------------------------------------------------------------------------------
+    def getLog(self):
+        return self.log
+
+    # ------------------------------------------------------------------------------------
+    # Record an event
+    # ------------------------------------------------------------------------------------
+    def record(self, text):
+        self.log.append([self.time, text])
+        if self.verbose:
+            print "{0:8.2f} s  {1:s}".format(self.time, text)
+
+    # ------------------------------------------------------------------------------------
+    # Run a protocol, returns how long it took in (simulated) seconds
+    # ------------------------------------------------------------------------------------
+    def run(self, protocol):
+        self.log = []
+        self.time = 0.0
+        self.record("Starting " + protocol.getName())
+        for operation_ID in range(protocol.getNumOperations()):
+            operation = protocol.getOperation(operation_ID)
+            self.record(operation.getDescriptor())
+            if (operation.device == "valve"):
+                self.valve_chain.changePorts(operation.data, self.time, self.latencies.getLatency("valve"))
+            else:
+                self.pump.setFlow(operation.data, self.time, self.latencies.getLatency("pump"))
+            self.advance(operation.duration)
+
+        # Wait for the valves and the pump.
+        self.advance(max(self.valve_chain.doneTime(), self.pump.doneTime()) - self.time)
+        self.record("Finished " + protocol.getName() + ", valves " + str(self.valve_chain.getPorts()) + ", pump " + str(self.pump.getStatus()))
+        return self.time
+
+# ----------------------------------------------------------------------------------------
+# SimulatedPump Class Definition
+# ----------------------------------------------------------------------------------------
+class SimulatedPump():
+    def __init__(self):
+        self.direction = "Stopped"
+        self.done_time = 0.0
+        self.speed = 0.0
+
+    # ------------------------------------------------------------------------------------
+    # Return the time at which the pump will have responded to the last command
+    # ------------------------------------------------------------------------------------
+    def doneTime(self):
+        return self.done_time
+
+    # ------------------------------------------------------------------------------------
+    # Return [direction, speed]
+    # ------------------------------------------------------------------------------------
+    def getStatus(self):
+        return [self.direction, self.speed]
+
+    # ------------------------------------------------------------------------------------
+    # Set the flow from a [direction, speed, ramp profile] pump command, a speed of 0
+    # stops the pump. Ramps end at the last speed of the profile.
+    # ------------------------------------------------------------------------------------
+    def setFlow(self, command, current_time, response_time):
+        [direction, speed] = command[:2]
+        if (len(command) > 2) and (command[2] is not None):
+            speed = command[2][-1][1]
+        self.done_time = current_time + response_time
+        if (speed <= min_pump_speed):
+            self.direction = "Stopped"
+            self.speed = 0.0
+        else:
+            self.direction = direction
+            self.speed = speed
+
+# ----------------------------------------------------------------------------------------
+# SimulatedValveChain Class Definition
+# ----------------------------------------------------------------------------------------
+class SimulatedValveChain():
+    def __init__(self, num_valves):
+        self.done_times = [0.0] * num_valves
+        self.ports = [0] * num_valves
+
+    # ------------------------------------------------------------------------------------
+    # Start moving the valves, port_IDs of -1 mean 'do not change port'
+    # ------------------------------------------------------------------------------------
+    def changePorts(self, port_IDs, current_time, move_time):
+        for valve_ID, port_ID in enumerate(port_IDs):
+            if (port_ID >= 0) and (valve_ID < len(self.ports)):
+                if (port_ID != self.ports[valve_ID]):
+                    self.done_times[valve_ID] = current_time + move_time
+                self.ports[valve_ID] = port_ID
+
+    # ------------------------------------------------------------------------------------
+    # Return the time at which all the valves will have stopped moving
+    # ------------------------------------------------------------------------------------
+    def doneTime(self):
+        if (len(self.done_times) > 0):
+            return max(self.done_times)
+        return 0.0
+
+    # ------------------------------------------------------------------------------------
+    # Return the current ports (starting at 1)
+    # ------------------------------------------------------------------------------------
+    def getPorts(self):
+        return map(lambda x: x + 1, self.ports)
+
+# ----------------------------------------------------------------------------------------
+# Test/Demo: compile the protocols in a configuration file and run them in simulation
+# ----------------------------------------------------------------------------------------
+if __name__ == "__main__":
+    if (len(sys.argv) < 2):
+        print "usage: kilroyCompiler.py config.xml [time scale]"
+        exit()
+
+    time_scale = 0.0
+    if (len(sys.argv) > 2):
+        time_scale = float(sys.argv[2])
+
+    num_valves = int(elementTree.parse(sys.argv[1]).getroot().get("num_valves", 0))
+    simulator = ProtocolSimulator(num_valves, time_scale = time_scale, verbose = True)
+    for protocol in loadProtocols(sys.argv[1]):
+        print protocol.getName()
+        if not protocol.isValid():
+            for error in protocol.getErrors():
+                print "  Error: " + error
+            continue
+        print "  Estimated time: {0:.1f} s".format(protocol.estimateTime())
+        simulator.run(protocol)
+        print ""
+
+#
+# The MIT License
+#
+# Copyright (c) 2015 Zhuang Lab, Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
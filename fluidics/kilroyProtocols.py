@@ -17,6 +17,7 @@ import sys
 import os
 import xml.etree.ElementTree as elementTree
 from PyQt4 import QtCore, QtGui
+import kilroyCompiler
 from valves.valveCommands import ValveCommands
 from pumps.pumpCommands import PumpCommands
 
@@ -33,11 +34,14 @@ class KilroyProtocols(QtGui.QMainWindow):
     def __init__(self,
                  protocol_xml_path = "default_config.xml",
                  command_xml_path = "default_config.xml",
+                 ports_per_valve = None,
                  verbose = False):
         super(KilroyProtocols, self).__init__()
 
         # Initialize internal attributes
         self.verbose = verbose
+        self.ports_per_valve = ports_per_valve # None is the default for a Hamilton MVP
+        self.compiled_protocols = []
         self.protocol_xml_path = protocol_xml_path
         self.command_xml_path = command_xml_path
         self.protocol_names = []
@@ -88,11 +92,9 @@ class KilroyProtocols(QtGui.QMainWindow):
         status = self.status
         protocol_ID = self.status[0]
         command_ID = self.status[1] + 1
-        if command_ID < len(self.protocol_commands[protocol_ID]):
-            command_name = self.protocol_commands[protocol_ID][command_ID]
-            command_duration = self.protocol_durations[protocol_ID][command_ID]
+        if command_ID < self.compiled_protocols[protocol_ID].getNumOperations():
             self.status = [protocol_ID, command_ID]
-            self.issueCommand(command_name, command_duration)
+            self.issueOperation(self.compiled_protocols[protocol_ID].getOperation(command_ID))
 
             self.elapsed_timer.start()
 
@@ -108,6 +110,33 @@ class KilroyProtocols(QtGui.QMainWindow):
         if self.verbose: print "Closing valve protocols"
         self.valveCommands.close()
         
+    # ------------------------------------------------------------------------------------
+    # Compile the protocols into timelines of valve and pump operations
+    # ------------------------------------------------------------------------------------
+    def compileProtocols(self):
+        valve_commands = {}
+        for command_name in self.valveCommands.getCommandNames():
+            valve_commands[command_name] = self.valveCommands.getCommandByName(command_name)
+        pump_commands = {}
+        for command_name in self.pumpCommands.getCommandNames():
+            pump_commands[command_name] = self.pumpCommands.getCommandByName(command_name)
+
+        ports_per_valve = self.ports_per_valve
+        if ports_per_valve is None:
+            ports_per_valve = [kilroyCompiler.default_ports_per_valve] * self.valveCommands.num_valves
+
+        self.compiled_protocols = []
+        for protocol_ID in range(self.num_protocols):
+            protocol = kilroyCompiler.compileProtocol(self.protocol_names[protocol_ID],
+                                                      self.protocol_commands[protocol_ID],
+                                                      self.protocol_durations[protocol_ID],
+                                                      valve_commands,
+                                                      pump_commands,
+                                                      ports_per_valve)
+            for error in protocol.getErrors():
+                print "Error in " + protocol.getName() + ": " + error
+            self.compiled_protocols.append(protocol)
+
     # ------------------------------------------------------------------------------------
     # Create display and control widgets
     # ------------------------------------------------------------------------------------                                                
@@ -205,7 +234,12 @@ class KilroyProtocols(QtGui.QMainWindow):
     # ------------------------------------------------------------------------------------                       
     def issueCommand(self, command_data, command_duration=-1):
         if command_data[0] == "pump":
-            self.issued_command = ["pump", self.pumpCommands.getCommandByName(command_data[1])]
+            pump_command = self.pumpCommands.getCommandByName(command_data[1])
+            errors = kilroyCompiler.checkPumpCommand(command_data[1], pump_command)
+            if (len(errors) > 0):
+                print "Did not issue pump command: " + ", ".join(errors)
+                return
+            self.issued_command = ["pump", pump_command]
         elif command_data[0] == "valve":
             self.issued_command = ["valve", self.valveCommands.getCommandByName(command_data[1])]
         if self.verbose:
@@ -219,6 +253,18 @@ class KilroyProtocols(QtGui.QMainWindow):
         if command_duration >= 0:
             self.protocol_timer.start(command_duration*1000)
 
+    # ------------------------------------------------------------------------------------
+    # Issue an operation of a compiled protocol
+    # ------------------------------------------------------------------------------------
+    def issueOperation(self, operation):
+        self.issued_command = operation.getCommand()
+        if self.verbose:
+            print "Issued " + operation.getDescriptor()
+
+        self.command_ready_signal.emit()
+
+        self.protocol_timer.start(operation.duration*1000)
+
     # ------------------------------------------------------------------------------------
     # Handle Issue Command Request from Pump Commands
     # ------------------------------------------------------------------------------------                       
@@ -236,12 +282,16 @@ class KilroyProtocols(QtGui.QMainWindow):
     # ------------------------------------------------------------------------------------                       
     def isValidProtocol(self, protocol_name):
         try:
-            self.protocol_names.index(protocol_name)
-            return True
+            protocol_ID = self.protocol_names.index(protocol_name)
         except ValueError:
             if self.verbose:
                 print protocol_name + " is not a valid protocol"
             return False
+        if not self.compiled_protocols[protocol_ID].isValid():
+            if self.verbose:
+                print protocol_name + " has errors: " + ", ".join(self.compiled_protocols[protocol_ID].getErrors())
+            return False
+        return True
 
     # ------------------------------------------------------------------------------------
     # Check to see if protocol name is in the list of protocols
@@ -340,6 +390,9 @@ class KilroyProtocols(QtGui.QMainWindow):
         # Record number of configs
         self.num_protocols = len(self.protocol_names)
 
+        # Compile
+        self.compileProtocols()
+
     # ------------------------------------------------------------------------------------
     # Display loaded protocols
     # ------------------------------------------------------------------------------------                                                
@@ -352,15 +405,18 @@ class KilroyProtocols(QtGui.QMainWindow):
                 textString += str(self.protocol_durations[protocol_ID][command_ID]) + " s"
                 print textString
     # ------------------------------------------------------------------------------------
-    # Display loaded protocols
+    # Estimate how long a protocol will take, latencies is a kilroyCompiler.DeviceLatencies
     # ------------------------------------------------------------------------------------                                                
-    def requiredTime(self, protocol_name):
+    def requiredTime(self, protocol_name, latencies = None):
         protocol_ID = self.protocol_names.index(protocol_name)
-        total_time = 0.0
-        for time in self.protocol_durations[protocol_ID]:
-            total_time += time
+        return self.compiled_protocols[protocol_ID].estimateTime(latencies)
 
-        return total_time
+    # ------------------------------------------------------------------------------------
+    # Set the number of ports on each valve of the chain and recompile the protocols
+    # ------------------------------------------------------------------------------------                                                
+    def setPortsPerValve(self, ports_per_valve):
+        self.ports_per_valve = ports_per_valve
+        self.compileProtocols()
         
     # ------------------------------------------------------------------------------------
     # Initialize and start a protocol and issue first command
@@ -374,10 +430,13 @@ class KilroyProtocols(QtGui.QMainWindow):
     # ------------------------------------------------------------------------------------
     def startProtocol(self):
         protocol_ID = self.protocolListWidget.currentRow()
-        
-        # Get first command in protocol
-        command_data = self.protocol_commands[protocol_ID][0]
-        command_duration = self.protocol_durations[protocol_ID][0]
+        if (self.compiled_protocols[protocol_ID].getNumOperations() == 0) or not self.compiled_protocols[protocol_ID].isValid():
+            print "Cannot start " + self.protocol_names[protocol_ID]
+            for error in self.compiled_protocols[protocol_ID].getErrors():
+                print "    " + error
+            self.completed_protocol_signal.emit(self.received_message)
+            self.received_message = None
+            return
 
         # Set protocol status: [protocol_ID, command_ID]
         self.status = [protocol_ID, 0]
@@ -386,8 +445,8 @@ class KilroyProtocols(QtGui.QMainWindow):
         if self.verbose:
             print "Starting " + self.protocol_names[protocol_ID]
 
-        # Issue command signal
-        self.issueCommand(command_data, command_duration)
+        # Issue the first operation
+        self.issueOperation(self.compiled_protocols[protocol_ID].getOperation(0))
         
         # Start elapsed time timer
         self.elapsed_timer.start()
@@ -1,6 +1,20 @@
 #!/usr/bin/python
 # ----------------------------------------------------------------------------------------
 # A class to load and parse predefined pump commands. 
+#
+# A command can also ramp the flow rate, i.e.
+#
+#  <pump_cmd name = "Ramp Up">
+#    <pump_config speed = "10.0" direction = "Forward">
+#      <ramp time = "0.0" speed = "2.0"></ramp>
+#      <ramp time = "5.0" speed = "5.0"></ramp>
+#      <ramp time = "10.0" speed = "10.0"></ramp>
+#    </pump_config>
+#  </pump_cmd>
+#
+# The speed is set to each ramp speed at the ramp time (in seconds from the start of the
+# command). Commands are parsed and checked by kilroyCompiler, a command with a ramp
+# speed outside of the pump range is reported and cannot be issued.
 # ----------------------------------------------------------------------------------------
 # Jeff Moffitt
 # 2/16/14
@@ -14,6 +28,7 @@ import sys
 import os
 import xml.etree.ElementTree as elementTree
 from PyQt4 import QtCore, QtGui
+import kilroyCompiler
 
 # ----------------------------------------------------------------------------------------
 # PumpCommands Class Definition
@@ -171,16 +186,12 @@ class PumpCommands(QtGui.QMainWindow):
         for pump_command in self.kilroy_configuration.findall("pump_commands"):
             command_list = pump_command.findall("pump_cmd")
             for command in command_list:
-                for pump_config in command.findall("pump_config"):
-                    speed = float(pump_config.get("speed"))
-                    direction = pump_config.get("direction")
-                    if speed < 0.00 or speed > 48.0:
-                        speed = 0.0
-                        direction = "Stopped" # Flag for stopped flow
-                    direction = {"Forward": "Forward", "Reverse": "Reverse"}.get(direction, "Stopped")
+                pump_command = kilroyCompiler.parsePumpCommand(command)
+                for error in kilroyCompiler.checkPumpCommand(command.get("name"), pump_command):
+                    print "Error: " + error
                     
                 # Add command
-                self.commands.append([direction, speed])
+                self.commands.append(pump_command)
                 self.command_names.append(command.get("name"))
 
         # Record number of configs
@@ -197,6 +208,8 @@ class PumpCommands(QtGui.QMainWindow):
             speed = self.commands[command_ID][1]
             text_string = "    " + "Flow Direction: " + direction + "\n"
             text_string += "    " + "Speed: " + str(speed) +"\n"
+            if self.commands[command_ID][2] is not None:
+                text_string += "    " + "Ramp: " + str(self.commands[command_ID][2]) + "\n"
             print text_string
 
     # ------------------------------------------------------------------------------------
@@ -231,6 +244,9 @@ class PumpCommands(QtGui.QMainWindow):
         text_string = current_command_name + "\n"
         text_string += "Flow Direction: " + current_command[0] + "\n"
         text_string += "Flow Speed: " + str(current_command[1]) + "\n"
+        if current_command[2] is not None:
+            for [ramp_time, ramp_speed] in current_command[2]:
+                text_string += "    " + str(ramp_time) + " s: " + str(ramp_speed) + "\n"
         self.currentCommandLabel.setText(text_string)
 
     # ------------------------------------------------------------------------------------
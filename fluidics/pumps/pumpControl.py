@@ -1,6 +1,10 @@
 #!/usr/bin/python
 # ----------------------------------------------------------------------------------------
 # pumpControl: A wrapper class for the a generic pump
+#
+# All communication with the pump happens on a PumpThread. The display is updated as
+# soon as a command is given (assuming it will work), and then corrected if the status
+# that the thread reports is different.
 # ----------------------------------------------------------------------------------------
 # Jeff Moffitt
 # 2/15/14
@@ -12,13 +16,16 @@
 # ----------------------------------------------------------------------------------------
 import serial
 import sys
-import time
 from PyQt4 import QtCore, QtGui
+from pumpThread import PumpThread
 
 # ----------------------------------------------------------------------------------------
 # PumpControl Class Definition
 # ----------------------------------------------------------------------------------------
 class PumpControl(QtGui.QWidget):
+    command_time_signal = QtCore.pyqtSignal(float) # How long (in seconds) the pump took to respond to a command
+    commands_complete_signal = QtCore.pyqtSignal() # All the commands have been sent to the pump
+
     def __init__(self,
                  parameters = False,
                  parent = None):
@@ -46,19 +53,22 @@ class PumpControl(QtGui.QWidget):
 
         # Create GUI Elements
         self.createGUI()
-        self.pollPumpStatus()
-        
-        # Define timer for periodic polling of pump status
-        self.status_timer = QtCore.QTimer()        
-        self.status_timer.setInterval(self.status_repeat_time)
-        self.status_timer.timeout.connect(self.pollPumpStatus)
-        self.status_timer.start()
+
+        # Create thread for all communication with the pump, the thread polls the
+        # pump status and only sends it when it changes.
+        self.pump_thread = PumpThread(self.pump, status_poll_time = self.status_repeat_time)
+        self.pump_thread.command_time_signal.connect(self.command_time_signal)
+        self.pump_thread.commands_complete_signal.connect(self.commands_complete_signal)
+        self.pump_thread.error_signal.connect(self.handlePumpError)
+        self.pump_thread.status_signal.connect(self.updateStatus)
+        self.pump_thread.start()
 
     # ------------------------------------------------------------------------------------
     # Close class
     # ------------------------------------------------------------------------------------
     def close(self):
         if self.verbose: "Print closing pump"
+        self.pump_thread.stop()
         self.pump.close()
 
     # ------------------------------------------------------------------------------------
@@ -144,7 +154,7 @@ class PumpControl(QtGui.QWidget):
         self.pump_identification_label.setText(self.pump.identification)
         
         # Flow status
-        if status[0] == "Flowing":
+        if status[0] in ["Flowing", "Ramping"]:
             self.flow_status_display.setText(status[2])
             self.flow_status_display.setStyleSheet("QLabel { color: green}")
             self.stop_flow_button.setEnabled(True)
@@ -164,38 +174,71 @@ class PumpControl(QtGui.QWidget):
         self.speed_display.setText("%0.2f" % status[1] + " " + self.speed_units)
             
     # ----------------------------------------------------------------------------------------
-    # Poll Pump Status
+    # Request the pump status, the display is updated if it has changed
     # ----------------------------------------------------------------------------------------
     def pollPumpStatus(self):
-        self.updateStatus(self.pump.getStatus())
+        self.pump_thread.requestStatus()
 
     # ----------------------------------------------------------------------------------------
     # Handle Change Flow Request
     # ----------------------------------------------------------------------------------------
     def handleStartFlow(self):
-        self.pump.startFlow(float(self.speed_control_entry_box.displayText()),
-                            direction = self.direction_control.currentText())
-        time.sleep(0.1)
-        self.pollPumpStatus()
+        self.startFlow(float(self.speed_control_entry_box.displayText()),
+                       str(self.direction_control.currentText()))
         
     # ----------------------------------------------------------------------------------------
     # Handle Change Flow Request
     # ----------------------------------------------------------------------------------------
     def handleStopFlow(self):
-        self.pump.stopFlow()
-        time.sleep(0.1)
+        self.stopFlow()
+
+    # ----------------------------------------------------------------------------------------
+    # Handle an error in the communication with the pump, the display may now be wrong
+    # so the pump status is requested again
+    # ----------------------------------------------------------------------------------------
+    def handlePumpError(self, error_message):
+        print error_message
         self.pollPumpStatus()
 
     # ------------------------------------------------------------------------------------
-    # Change pump based on sent command: [direction, speed]
+    # Are there pump commands that have not been sent yet?
+    # ------------------------------------------------------------------------------------          
+    def isBusy(self):
+        return self.pump_thread.isBusy()
+
+    # ------------------------------------------------------------------------------------
+    # Ramp the flow rate, profile is a list of [time, speed] points
+    # ------------------------------------------------------------------------------------          
+    def rampFlow(self, profile, direction = "Forward"):
+        self.updateStatus(["Ramping", profile[0][1], direction])
+        self.pump_thread.rampFlow(profile, direction)
+
+    # ------------------------------------------------------------------------------------
+    # Change pump based on sent command: [direction, speed, (optional) ramp profile]
     # ------------------------------------------------------------------------------------          
     def receiveCommand(self, command):
         speed = command[1]
         direction = command[0]
-        if speed < 0.01:
-            self.pump.stopFlow()
+        if (len(command) > 2) and (command[2] is not None):
+            self.rampFlow(command[2], direction)
+        elif speed < 0.01:
+            self.stopFlow()
         else:
-            self.pump.startFlow(speed, direction)
+            self.startFlow(speed, direction)
+
+    # ------------------------------------------------------------------------------------
+    # Start the flow
+    # ------------------------------------------------------------------------------------          
+    def startFlow(self, speed, direction = "Forward"):
+        self.updateStatus(["Flowing", speed, direction])
+        self.pump_thread.startFlow(speed, direction)
+
+    # ------------------------------------------------------------------------------------
+    # Stop the flow
+    # ------------------------------------------------------------------------------------          
+    def stopFlow(self):
+        self.updateStatus(["Stopped", 0.0])
+        self.pump_thread.stopFlow()
 
     # ------------------------------------------------------------------------------------
     # Determine Enabled State
@@ -0,0 +1,244 @@
+#!/usr/bin/python
+# ----------------------------------------------------------------------------------------
+# A thread that handles all communication with the pump so that the (slow) serial
+# communication never blocks the Kilroy UI. Commands are queued, and as only the last
+# flow command matters a new flow command replaces any that have not been sent yet.
+# The pump status is polled (slowly) by this thread and is only sent to the UI when it
+# changes, or after a command so that the UI can correct its (optimistic) display.
+#
+# Flow rate ramps are a list of [time, speed] points, the speed is set at each time
+# (in seconds from the start of the ramp). If the pump can run a ramp itself (it has
+# a rampFlow() method) the ramp is sent to the pump, otherwise the thread sets the
+# speed at each point. The thread is busy until the last point of the ramp.
+#
+# Errors in the communication with the pump are reported with the error signal, they
+# do not stop the thread.
+# ----------------------------------------------------------------------------------------
+# Hazen
+# 10/15
+# ----------------------------------------------------------------------------------------
+
+# ----------------------------------------------------------------------------------------
+# Import
+# ----------------------------------------------------------------------------------------
+import time
+from PyQt4 import QtCore
+
+# ----------------------------------------------------------------------------------------
+# PumpThread Class Definition
+# ----------------------------------------------------------------------------------------
+class PumpThread(QtCore.QThread):
+    command_time_signal = QtCore.pyqtSignal(float) # How long (in seconds) the pump took to respond to a command
+    commands_complete_signal = QtCore.pyqtSignal() # All the queued commands have been sent and any ramp has finished
+    error_signal = QtCore.pyqtSignal(str) # A description of a pump communication error
+    status_signal = QtCore.pyqtSignal(object) # The pump status, only sent when it changes
+
+    def __init__(self,
+                 pump,
+                 status_poll_time = 2000,
+                 parent = None):
+
+        # Initialize parent class
+        QtCore.QThread.__init__(self, parent)
+
+        # Define local attributes
+        self.busy = False
+        self.commands = []
+        self.last_poll = 0.0
+        self.pump = pump
+        self.ramp = None # [start time, [[time, speed], ..], direction, index of the next point, ramp is run by the pump]
+        self.running = True
+        self.status = None
+        self.status_poll_time = status_poll_time # Time between status polls in milliseconds
+
+        self.mutex = QtCore.QMutex()
+        self.wait_condition = QtCore.QWaitCondition()
+
+    # ------------------------------------------------------------------------------------
+    # Handle a command
+    # ------------------------------------------------------------------------------------
+    def handleCommand(self, command):
+        if (command[0] == "status"):
+            return
+
+        start_time = time.time()
+        self.setRamp(None)
+        try:
+            if (command[0] == "flow"):
+                self.pump.startFlow(command[1], direction = command[2])
+            elif (command[0] == "ramp"):
+                on_pump = hasattr(self.pump, "rampFlow")
+                if on_pump:
+                    self.pump.rampFlow(command[1], direction = command[2])
+                self.setRamp([start_time, command[1], command[2], 0, on_pump])
+                self.updateRamp()
+            elif (command[0] == "stop"):
+                self.pump.stopFlow()
+        except Exception as exception:
+            self.setRamp(None)
+            self.error_signal.emit("Pump " + command[0] + " command failed: " + str(exception))
+            return
+        self.command_time_signal.emit(time.time() - start_time)
+
+    # ------------------------------------------------------------------------------------
+    # Are there commands that have not been sent yet, or a ramp that has not finished?
+    # ------------------------------------------------------------------------------------
+    def isBusy(self):
+        self.mutex.lock()
+        is_busy = self.busy or (len(self.commands) > 0) or (self.ramp is not None)
+        self.mutex.unlock()
+        return is_busy
+
+    # ------------------------------------------------------------------------------------
+    # Add a command to the queue, this replaces any flow commands that have not been sent
+    # ------------------------------------------------------------------------------------
+    def queueCommand(self, command):
+        self.mutex.lock()
+        if (command[0] != "status"):
+            self.commands = filter(lambda x: (x[0] == "status"), self.commands)
+        self.commands.append(command)
+        self.wait_condition.wakeAll()
+        self.mutex.unlock()
+
+    # ------------------------------------------------------------------------------------
+    # Queue a ramp of the flow rate, profile is a list of [time, speed] points
+    # ------------------------------------------------------------------------------------
+    def rampFlow(self, profile, direction = "Forward"):
+        self.queueCommand(["ramp", sorted(profile), direction])
+
+    # ------------------------------------------------------------------------------------
+    # Queue a request for the pump status
+    # ------------------------------------------------------------------------------------
+    def requestStatus(self):
+        self.queueCommand(["status"])
+
+    # ------------------------------------------------------------------------------------
+    # Thread loop: wait for commands, the next ramp point or the next status poll
+    # ------------------------------------------------------------------------------------
+    def run(self):
+        self.updateStatus()
+        while self.running:
+            self.mutex.lock()
+            if (len(self.commands) == 0):
+                wait_time = self.last_poll + 0.001 * self.status_poll_time - time.time()
+                if self.ramp is not None:
+                    [start_time, profile, direction, index] = self.ramp[:4]
+                    wait_time = min(wait_time, start_time + profile[index][0] - time.time())
+                if (wait_time > 0.0):
+                    self.wait_condition.wait(self.mutex, int(1000.0 * wait_time) + 1)
+            commands = self.commands
+            self.commands = []
+            self.busy = (len(commands) > 0)
+            self.mutex.unlock()
+
+            if not self.running:
+                break
+
+            for command in commands:
+                self.handleCommand(command)
+
+            ramp_done = False
+            if self.ramp is not None:
+                self.updateRamp()
+                ramp_done = (self.ramp is None)
+
+            if (len(commands) > 0) or ramp_done or (time.time() >= self.last_poll + 0.001 * self.status_poll_time):
+                self.updateStatus(force = ((len(commands) > 0) or ramp_done))
+
+            if (len(commands) > 0) or ramp_done:
+                self.mutex.lock()
+                self.busy = False
+                self.mutex.unlock()
+                if not self.isBusy():
+                    self.commands_complete_signal.emit()
+
+    # ------------------------------------------------------------------------------------
+    # Set (or clear) the ramp, this is locked as isBusy() is called from other threads
+    # ------------------------------------------------------------------------------------
+    def setRamp(self, ramp):
+        self.mutex.lock()
+        self.ramp = ramp
+        self.mutex.unlock()
+
+    # ------------------------------------------------------------------------------------
+    # Queue a flow command
+    # ------------------------------------------------------------------------------------
+    def startFlow(self, speed, direction = "Forward"):
+        self.queueCommand(["flow", speed, direction])
+
+    # ------------------------------------------------------------------------------------
+    # Stop the thread
+    # ------------------------------------------------------------------------------------
+    def stop(self):
+        self.mutex.lock()
+        self.running = False
+        self.wait_condition.wakeAll()
+        self.mutex.unlock()
+        self.wait()
+
+    # ------------------------------------------------------------------------------------
+    # Queue a stop flow command
+    # ------------------------------------------------------------------------------------
+    def stopFlow(self):
+        self.queueCommand(["stop"])
+
+    # ------------------------------------------------------------------------------------
+    # Set the speed for the ramp points that are due, unless the pump is running the ramp
+    # ------------------------------------------------------------------------------------
+    def updateRamp(self):
+        [start_time, profile, direction, index, on_pump] = self.ramp
+        speed = None
+        while (index < len(profile)) and (time.time() >= start_time + profile[index][0]):
+            speed = profile[index][1]
+            index += 1
+        if (index < len(profile)):
+            self.ramp[3] = index
+        else:
+            self.setRamp(None)
+        if (speed is not None) and not on_pump:
+            try:
+                if (speed > 0.0):
+                    self.pump.startFlow(speed, direction = direction)
+                else:
+                    self.pump.stopFlow()
+            except Exception as exception:
+                self.setRamp(None)
+                self.error_signal.emit("Pump ramp failed: " + str(exception))
+
+    # ------------------------------------------------------------------------------------
+    # Get the pump status and send it if it has changed (or force is True)
+    # ------------------------------------------------------------------------------------
+    def updateStatus(self, force = False):
+        self.last_poll = time.time()
+        try:
+            status = self.pump.getStatus()
+        except Exception as exception:
+            self.error_signal.emit("Pump status request failed: " + str(exception))
+            return
+        if force or (status != self.status):
+            self.status = status
+            self.status_signal.emit(status)
+
+#
+# The MIT License
+#
+# Copyright (c) 2015 Zhuang Lab, Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
@@ -0,0 +1,121 @@
+#!/usr/bin/python
+# ----------------------------------------------------------------------------------------
+# A simulated pump for testing Kilroy without any hardware. Commands take
+# simulated_pump_latency seconds (the time a real pump takes to respond over the serial
+# port) and flow rate ramps are run by the (simulated) pump itself.
+#
+# To use it set the Kilroy pump_class parameter to pumps.simulatedPump.
+# ----------------------------------------------------------------------------------------
+# Hazen
+# 10/15
+# ----------------------------------------------------------------------------------------
+
+# ----------------------------------------------------------------------------------------
+# Import
+# ----------------------------------------------------------------------------------------
+import time
+
+# ----------------------------------------------------------------------------------------
+# SimulatedPump Class Definition
+# ----------------------------------------------------------------------------------------
+class APump():
+    def __init__(self,
+                 parameters = False):
+
+        # Define attributes
+        self.latency = parameters.get("simulated_pump_latency", 0.1)
+        self.verbose = parameters.get("verbose", True)
+
+        # Define initial pump status
+        self.direction = "Forward"
+        self.identification = "Simulated Pump"
+        self.ramp = None # [start time, [[time, speed], ..]]
+        self.speed = 0.0
+
+        print "Simulating a pump"
+
+    # ------------------------------------------------------------------------------------
+    # Close
+    # ------------------------------------------------------------------------------------
+    def close(self):
+        print "Closed simulated pump"
+
+    # ------------------------------------------------------------------------------------
+    # Return the status of the pump
+    # ------------------------------------------------------------------------------------
+    def getStatus(self):
+        time.sleep(self.latency)
+        speed = self.getSpeed()
+        if (speed > 0.0):
+            flow_status = "Flowing"
+        else:
+            flow_status = "Stopped"
+        return (flow_status, speed, self.direction, "Remote", "Disabled", "No Error")
+
+    # ------------------------------------------------------------------------------------
+    # Return the current speed, following the ramp if there is one
+    # ------------------------------------------------------------------------------------
+    def getSpeed(self):
+        if self.ramp is not None:
+            [start_time, profile] = self.ramp
+            elapsed = time.time() - start_time
+            for [point_time, speed] in profile:
+                if (elapsed >= point_time):
+                    self.speed = speed
+            if (elapsed >= profile[-1][0]):
+                self.ramp = None
+        return self.speed
+
+    # ------------------------------------------------------------------------------------
+    # Start a flow rate ramp, profile is a list of [time, speed] points
+    # ------------------------------------------------------------------------------------
+    def rampFlow(self, profile, direction = "Forward"):
+        time.sleep(self.latency)
+        if self.verbose: print "Starting ramp " + str(profile)
+        self.direction = direction
+        self.ramp = [time.time(), profile]
+
+    # ------------------------------------------------------------------------------------
+    # Start pump
+    # ------------------------------------------------------------------------------------
+    def startFlow(self, speed, direction = "Forward"):
+        time.sleep(self.latency)
+        if self.verbose: print "Starting pump " + str(speed) + " " + direction
+        self.direction = direction
+        self.ramp = None
+        self.speed = speed
+        return True
+
+    # ------------------------------------------------------------------------------------
+    # Stop Pump
+    # ------------------------------------------------------------------------------------
+    def stopFlow(self):
+        time.sleep(self.latency)
+        if self.verbose: print "Stopping pump"
+        self.ramp = None
+        self.speed = 0.0
+        return True
+
+#
+# The MIT License
+#
+# Copyright (c) 2015 Zhuang Lab, Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
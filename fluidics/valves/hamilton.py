@@ -21,12 +21,15 @@ class HamiltonMVP():
     def __init__(self,
                  com_port = 2,
                  num_simulated_valves = 0,
+                 simulated_move_time = 0.0,
                  verbose = False):
 
         # Define attributes
         self.com_port = com_port
         self.verbose = verbose
         self.num_simulated_valves = num_simulated_valves
+        self.simulated_move_time = simulated_move_time # Seconds per simulated port change
+        self.simulated_move_done = []
 
         # Determine simulation mode
         self.simulate = (self.num_simulated_valves > 0)
@@ -132,6 +135,7 @@ class HamiltonMVP():
                 self.valve_configs.append(self.howIsValveConfigured(valve_ID))
                 self.max_ports_per_valve.append(self.numPortsPerConfiguration(self.howIsValveConfigured(valve_ID)))
                 self.current_port.append(0)
+                self.simulated_move_done.append(0.0)
             self.num_valves = self.num_simulated_valves
             print "Created " + str(self.num_simulated_valves) + " simulated Hamilton MVP valves"
             return True
@@ -158,13 +162,30 @@ class HamiltonMVP():
                 self.current_port[valve_ID] = port_ID
 
             if wait_until_done:
-                self.waitUntilNotMoving()
+                self.waitUntilNotMoving(valve_ID)
                 
             return response[1]
         else: ## simulation code
             self.current_port[valve_ID] = port_ID
+            self.simulated_move_done[valve_ID] = time.time() + self.simulated_move_time
             return True
 
+    # ------------------------------------------------------------------------------------
+    # Change Port Position of Multiple Valves: All the move commands are sent before 
+    # any of the valves have finished moving so the valves move concurrently. 
+    # port_IDs of -1 mean 'do not change port'
+    # ------------------------------------------------------------------------------------ 
+    def changePorts(self, port_IDs, directions = None):
+        moved = []
+        for valve_ID, port_ID in enumerate(port_IDs):
+            if port_ID >= 0:
+                direction = 0
+                if directions is not None:
+                    direction = directions[valve_ID]
+                if self.changePort(valve_ID, port_ID, direction = direction):
+                    moved.append(valve_ID)
+        return moved
+
     # ------------------------------------------------------------------------------------
     # Close Serial Port
     # ------------------------------------------------------------------------------------ 
@@ -292,7 +313,7 @@ class HamiltonMVP():
                                               default = "Unknown response")
             return response[0]
         else: ## simulation code
-            return ("Y", True, "Simulation")
+            return (time.time() >= self.simulated_move_done[valve_ID])
 
     # ------------------------------------------------------------------------------------
     # Poll Overload Status of Valve
@@ -344,10 +365,19 @@ class HamiltonMVP():
                 "4 ports": 4}.get(configuration_string, 0)
     
     # ------------------------------------------------------------------------------------
-    # Read from Serial Port
+    # Read from Serial Port: Returns as soon as the end of the response arrives rather
+    # than waiting for the serial port to time out. Valves that do not respond (or
+    # responses that are not terminated) still time out.
     # ------------------------------------------------------------------------------------
     def read(self):
-        response = self.serial.read(self.read_length)
+        response = self.serial.read(1)
+        while (len(response) > 0) and (len(response) < self.read_length):
+            if response[-1] in ["\r", self.carriage_return]:
+                break
+            data = self.serial.read(max(1, self.serial.inWaiting()))
+            if (len(data) == 0):
+                break
+            response += data
         if self.verbose:
             print "Received: " + str((response, ""))
         return response
@@ -361,6 +391,8 @@ class HamiltonMVP():
         self.num_valves = 0
         self.valve_configs = []
         self.max_ports_per_valve = []
+        self.current_port = []
+        self.simulated_move_done = []
 
         # Configure Device
         self.autoAddress()
@@ -369,7 +401,7 @@ class HamiltonMVP():
     # ------------------------------------------------------------------------------------
     # Halt Hamilton Class Until Movement is Finished
     # ------------------------------------------------------------------------------------
-    def waitUntilNotMoving(self, valve_ID, pause_time = 1):
+    def waitUntilNotMoving(self, valve_ID, pause_time = 0.05):
         doneMoving = False
         while not doneMoving:
             doneMoving = self.isMovementFinished(valve_ID)
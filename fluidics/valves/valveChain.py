@@ -16,15 +16,20 @@ import sys
 from PyQt4 import QtCore, QtGui
 from qtValveControl import QtValveControl
 from hamilton import HamiltonMVP
+from valveThread import ValveThread
 
 # ----------------------------------------------------------------------------------------
 # ValveChain Class Definition
 # ----------------------------------------------------------------------------------------
 class ValveChain(QtGui.QWidget):
+    move_time_signal = QtCore.pyqtSignal(float) # How long (in seconds) the last move took
+    moves_complete_signal = QtCore.pyqtSignal() # All the valves have stopped moving
+
     def __init__(self,
                  parent = None,
                  com_port = 2,
                  num_simulated_valves = 0,
+                 simulated_move_time = 0.0,
                  verbose = False
                  ):
 
@@ -34,12 +39,12 @@ class ValveChain(QtGui.QWidget):
         # Define local attributes
         self.com_port = com_port
         self.verbose = verbose
-        self.poll_time = 2000
 
         # Create instance of Hamilton class
         if num_simulated_valves > 0:
             self.valve_chain = HamiltonMVP(com_port = 0,
                                            num_simulated_valves = num_simulated_valves,
+                                           simulated_move_time = simulated_move_time,
                                            verbose = self.verbose)
         else:
             self.valve_chain = HamiltonMVP(com_port = self.com_port,
@@ -53,11 +58,13 @@ class ValveChain(QtGui.QWidget):
         # Create GUI
         self.createGUI() # Widgets created here
 
-        # Define timer for periodic polling of valve status
-        self.valve_poll_timer = QtCore.QTimer()        
-        self.valve_poll_timer.setInterval(self.poll_time)
-        self.valve_poll_timer.timeout.connect(self.pollValveStatus)
-        self.valve_poll_timer.start()
+        # Create thread for all further communication with the valves. The valve
+        # status display is updated by the thread as the valves move.
+        self.valve_thread = ValveThread(self.valve_chain)
+        self.valve_thread.status_signal.connect(self.handleValveStatus)
+        self.valve_thread.move_time_signal.connect(self.move_time_signal)
+        self.valve_thread.moves_complete_signal.connect(self.moves_complete_signal)
+        self.valve_thread.start()
 
     # ------------------------------------------------------------------------------------
     # Change specified valve position
@@ -65,25 +72,35 @@ class ValveChain(QtGui.QWidget):
     def changeValvePosition(self, valve_ID, port_ID = None):
         if port_ID == None:
             port_ID = self.valve_widgets[valve_ID].getPortIndex()
-        rotation_direction = self.valve_widgets[valve_ID].getDesiredRotationIndex()
+
+        port_IDs = [-1] * self.num_valves
+        port_IDs[valve_ID] = port_ID
+        self.changeValvePositions(port_IDs)
+
+    # ------------------------------------------------------------------------------------
+    # Change the position of all the valves at once, -1 is a flag for 'do not change port'
+    # ------------------------------------------------------------------------------------
+    def changeValvePositions(self, port_IDs):
+        rotation_directions = []
+        for valve_ID in range(self.num_valves):
+            rotation_directions.append(self.valve_widgets[valve_ID].getDesiredRotationIndex())
 
         if self.verbose:
-            text_string = "Changing Valve " + str(valve_ID)
-            text_string += " Port " + str(port_ID)
-            text_string += " Direction " + str(rotation_direction)
-            print text_string 
-        
-        self.valve_chain.changePort(valve_ID = valve_ID,
-                                    port_ID = port_ID,
-                                    direction = rotation_direction)
-        # Update valve display
-        self.pollValveStatus()
+            for valve_ID, port_ID in enumerate(port_IDs):
+                if port_ID >= 0:
+                    text_string = "Changing Valve " + str(valve_ID)
+                    text_string += " Port " + str(port_ID)
+                    text_string += " Direction " + str(rotation_directions[valve_ID])
+                    print text_string 
+
+        self.valve_thread.changePorts(port_IDs, rotation_directions)
 
     # ------------------------------------------------------------------------------------
     # Close class
     # ------------------------------------------------------------------------------------
     def close(self):
         if self.verbose: "Print closing valve chain"
+        self.valve_thread.stop()
         self.valve_chain.close()
 
     # ------------------------------------------------------------------------------------
@@ -123,6 +140,19 @@ class ValveChain(QtGui.QWidget):
         self.menu_names = ["Valve"]
         self.menu_items = [[self.valve_reset_action]]
 
+    # ------------------------------------------------------------------------------------
+    # Return the number of ports on each valve
+    # ------------------------------------------------------------------------------------
+    def getPortsPerValve(self):
+        return list(self.valve_chain.max_ports_per_valve)
+
+    # ------------------------------------------------------------------------------------
+    # Update the valve status display, called by the valve thread
+    # ------------------------------------------------------------------------------------
+    def handleValveStatus(self, valve_ID, status):
+        if valve_ID < len(self.valve_widgets):
+            self.valve_widgets[valve_ID].setStatus(status)
+
     # ------------------------------------------------------------------------------------
     # Determine number of valves
     # ------------------------------------------------------------------------------------
@@ -130,25 +160,22 @@ class ValveChain(QtGui.QWidget):
         return self.valve_chain.howManyValves
 
     # ------------------------------------------------------------------------------------
-    # Update valve status display with the current status each valve in the chain
+    # Are any of the valves moving?
     # ------------------------------------------------------------------------------------
-    def pollValveStatus(self):
-        for valve_ID in range(self.num_valves):
-            self.valve_widgets[valve_ID].setStatus(self.valve_chain.getStatus(valve_ID))
+    def isMoving(self):
+        return self.valve_thread.isMoving()
 
     # ------------------------------------------------------------------------------------
     # Change port status based on external command
     # ------------------------------------------------------------------------------------          
     def receiveCommand(self, command):
-        for valve_ID, port_ID in enumerate(command):
-            if port_ID >= 0: # -1 is a flag for 'do not change port'
-                self.changeValvePosition(valve_ID, port_ID)
+        self.changeValvePositions(command[:self.num_valves])
 
     # ------------------------------------------------------------------------------------
     # Reinitialize the valve chain
     # ------------------------------------------------------------------------------------          
     def reinitializeChain(self):
-        self.valve_chain.resetChain()
+        self.valve_thread.resetChain()
 
     # ------------------------------------------------------------------------------------
     # Set enabled status for display items
@@ -165,9 +192,10 @@ class StandAlone(QtGui.QMainWindow):
         super(StandAlone, self).__init__(parent)
 
         # scroll area widget contents - layout
-        self.valve_chain = ValveChain(COM_port = 2,
+        self.valve_chain = ValveChain(com_port = 2,
                                       verbose = True,
-                                      num_simulated_valves = 2)
+                                      num_simulated_valves = 2,
+                                      simulated_move_time = 1.0)
         
         # central widget
         self.centralWidget = QtGui.QWidget()
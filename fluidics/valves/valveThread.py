@@ -0,0 +1,187 @@
+#!/usr/bin/python
+# ----------------------------------------------------------------------------------------
+# A thread that handles all communication with the Hamilton MVP valve chain so that
+# the (slow) serial communication never blocks the Kilroy UI. Port changes for all the
+# valves are issued at once and only the valves that are moving are polled until they
+# have finished.
+# ----------------------------------------------------------------------------------------
+# Hazen
+# 10/15
+# ----------------------------------------------------------------------------------------
+
+# ----------------------------------------------------------------------------------------
+# Import
+# ----------------------------------------------------------------------------------------
+import time
+from PyQt4 import QtCore
+
+# ----------------------------------------------------------------------------------------
+# ValveThread Class Definition
+# ----------------------------------------------------------------------------------------
+class ValveThread(QtCore.QThread):
+    move_time_signal = QtCore.pyqtSignal(float) # How long (in seconds) the last move took
+    moves_complete_signal = QtCore.pyqtSignal() # All the valves have stopped moving
+    status_signal = QtCore.pyqtSignal(int, object) # Valve ID, (port name, moving?)
+
+    def __init__(self,
+                 valve_chain,
+                 poll_time = 50,
+                 parent = None):
+
+        # Initialize parent class
+        QtCore.QThread.__init__(self, parent)
+
+        # Define local attributes
+        self.busy = False
+        self.commands = []
+        self.move_start_time = None
+        self.moving = []
+        self.poll_time = poll_time # Time between movement polls in milliseconds
+        self.running = True
+        self.valve_chain = valve_chain
+
+        self.mutex = QtCore.QMutex()
+        self.wait_condition = QtCore.QWaitCondition()
+
+    # ------------------------------------------------------------------------------------
+    # Queue a port change for all the valves, port_IDs of -1 mean 'do not change port'
+    # ------------------------------------------------------------------------------------
+    def changePorts(self, port_IDs, directions = None):
+        self.queueCommand(["move", list(port_IDs), directions])
+
+    # ------------------------------------------------------------------------------------
+    # Is any valve still moving (or about to move)?
+    # ------------------------------------------------------------------------------------
+    def isMoving(self):
+        self.mutex.lock()
+        is_moving = self.busy or (len(self.moving) > 0) or (len(self.commands) > 0)
+        self.mutex.unlock()
+        return is_moving
+
+    # ------------------------------------------------------------------------------------
+    # Handle a move command
+    # ------------------------------------------------------------------------------------
+    def move(self, port_IDs, directions):
+        moved = self.valve_chain.changePorts(port_IDs, directions)
+        if (len(moved) > 0):
+            self.move_start_time = time.time()
+        for valve_ID in moved:
+            self.mutex.lock()
+            if not (valve_ID in self.moving):
+                self.moving.append(valve_ID)
+            self.mutex.unlock()
+            self.status_signal.emit(valve_ID, (self.valve_chain.whereIsValve(valve_ID), True))
+
+    # ------------------------------------------------------------------------------------
+    # Poll the valves that are moving
+    # ------------------------------------------------------------------------------------
+    def pollMoving(self):
+        self.mutex.lock()
+        moving = list(self.moving)
+        self.mutex.unlock()
+
+        for valve_ID in moving:
+            if self.valve_chain.isMovementFinished(valve_ID):
+                self.mutex.lock()
+                self.moving.remove(valve_ID)
+                self.mutex.unlock()
+                self.status_signal.emit(valve_ID, (self.valve_chain.whereIsValve(valve_ID), False))
+
+        if (len(self.moving) == 0):
+            if self.move_start_time is not None:
+                self.move_time_signal.emit(time.time() - self.move_start_time)
+                self.move_start_time = None
+            self.moves_complete_signal.emit()
+
+    # ------------------------------------------------------------------------------------
+    # Add a command to the queue
+    # ------------------------------------------------------------------------------------
+    def queueCommand(self, command):
+        self.mutex.lock()
+        self.commands.append(command)
+        self.wait_condition.wakeAll()
+        self.mutex.unlock()
+
+    # ------------------------------------------------------------------------------------
+    # Queue a reset of the valve chain
+    # ------------------------------------------------------------------------------------
+    def resetChain(self):
+        self.queueCommand(["reset"])
+
+    # ------------------------------------------------------------------------------------
+    # Thread loop: wait for commands, or for the next poll if any valves are moving
+    # ------------------------------------------------------------------------------------
+    def run(self):
+        while self.running:
+            self.mutex.lock()
+            if (len(self.commands) == 0):
+                if (len(self.moving) > 0):
+                    self.wait_condition.wait(self.mutex, self.poll_time)
+                else:
+                    self.wait_condition.wait(self.mutex)
+            commands = self.commands
+            self.commands = []
+            self.busy = (len(commands) > 0)
+            self.mutex.unlock()
+
+            if not self.running:
+                break
+
+            for command in commands:
+                if (command[0] == "move"):
+                    self.move(command[1], command[2])
+                elif (command[0] == "reset"):
+                    self.move_start_time = None
+                    self.mutex.lock()
+                    self.moving = []
+                    self.mutex.unlock()
+                    self.valve_chain.resetChain()
+                    for valve_ID in range(self.valve_chain.howManyValves()):
+                        self.status_signal.emit(valve_ID, self.valve_chain.getStatus(valve_ID))
+
+            # The valves that were moved are in self.moving now, so we are no longer busy.
+            self.mutex.lock()
+            self.busy = False
+            is_moving = (len(self.moving) > 0)
+            self.mutex.unlock()
+
+            if is_moving:
+                self.pollMoving()
+
+            # Commands that did not move any valves are also complete.
+            elif (len(commands) > 0):
+                self.moves_complete_signal.emit()
+
+    # ------------------------------------------------------------------------------------
+    # Stop the thread
+    # ------------------------------------------------------------------------------------
+    def stop(self):
+        self.mutex.lock()
+        self.running = False
+        self.wait_condition.wakeAll()
+        self.mutex.unlock()
+        self.wait()
+
+#
+# The MIT License
+#
+# Copyright (c) 2015 Zhuang Lab, Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
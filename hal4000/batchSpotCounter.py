@@ -0,0 +1,281 @@
+#!/usr/bin/python
+#
+## @file
+#
+# Headless spot counting of saved movies. The frames of each movie
+# are split into blocks which are analyzed in parallel by a pool of
+# processes. The results for each movie are saved in a binary file
+# (movie_name + "_spots.bin") with the following layout:
+#
+#   header      "4siiiii" - "SPOT", version, finder id, # frames, image x, image y.
+#   counts      int32 x # frames - The number of spots in each frame.
+#   locations   (fr int32, x float32, y float32) x total spots - In frame order.
+#
+# Usage:
+#   python batchSpotCounter.py <finder (lmm, median or log)> <threshold> <movie> [<movie> ...]
+#
+# Hazen 10/15
+#
+
+# Add current storm-control directory to sys.path
+import imp
+imp.load_source("setPath", "../sc_library/setPath.py")
+
+import multiprocessing
+import numpy
+import os
+import struct
+import sys
+import time
+
+import objectFinder.finderBackends as finderBackends
+import sc_library.datareader as datareader
+import sc_library.parameters as params
+
+header_format = "4siiiii"
+header_size = struct.calcsize(header_format)
+
+# Module level state of the worker processes.
+finder = None
+movies = {}
+
+
+## spotDataType
+#
+# @return A numpy data type for the spot locations.
+#
+def spotDataType():
+    return numpy.dtype([('fr', numpy.int32),
+                        ('x', numpy.float32),
+                        ('y', numpy.float32)])
+
+## analyzeBlock
+#
+# Find the spots in a block of frames. This is run in the worker processes.
+#
+# @param args [movie name, first frame, last frame (exclusive)].
+#
+# @return [movie name, first frame, counts, locations].
+#
+def analyzeBlock(args):
+    [movie_name, first, last] = args
+    if not (movie_name in movies):
+        movies[movie_name] = datareader.reader(movie_name)
+    data_file = movies[movie_name]
+
+    counts = numpy.zeros(last - first, dtype = numpy.int32)
+    locations = []
+    for i in range(first, last):
+
+        [image, image_x, image_y] = loadFrame(data_file, i)
+        [x, y, spots] = finder.findObjects(image, image_x, image_y)
+        counts[i - first] = spots
+        if (spots > 0) and (x.size > 0):
+            locs = numpy.zeros(spots, dtype = spotDataType())
+            locs['fr'] = i
+            locs['x'] = x[:spots]
+            locs['y'] = y[:spots]
+            locations.append(locs)
+
+    if (len(locations) > 0):
+        locations = numpy.concatenate(locations)
+    else:
+        locations = numpy.zeros(0, dtype = spotDataType())
+    return [movie_name, first, counts, locations]
+
+## initializeWorker
+#
+# Create the object finder in a worker process.
+#
+# @param finder_name The name of the object finder.
+# @param threshold The object finder threshold.
+#
+def initializeWorker(finder_name, threshold):
+    global finder
+    parameters = params.StormXMLObject([])
+    parameters.set("log_threshold", threshold)
+    parameters.set("threshold", threshold)
+    finder = finderBackends.createFinder(finder_name, parameters)
+
+## loadFrame
+#
+# The readers return the transpose of the frame as it came from the camera,
+# this undoes the transpose so that the object finders see the same data as
+# they do when the spot counter is running in HAL.
+#
+# @param data_file A datareader.DataReader object.
+# @param frame_number The frame to load.
+#
+# @return [frame (as numpy.uint16), image x, image y].
+#
+def loadFrame(data_file, frame_number):
+    image = numpy.ascontiguousarray(numpy.transpose(data_file.loadAFrame(frame_number)), dtype = numpy.uint16)
+    return [image, image.shape[1], image.shape[0]]
+
+## loadSpots
+#
+# Load a spot counting results file.
+#
+# @param filename The name of the results file.
+#
+# @return [finder name, [image x, image y], counts, locations].
+#
+def loadSpots(filename):
+    with open(filename, "rb") as fp:
+        [magic, version, finder_id, frames, image_x, image_y] = struct.unpack(header_format, fp.read(header_size))
+        if (magic != "SPOT"):
+            raise IOError(filename + " is not a spot counting results file.")
+        counts = numpy.fromfile(fp, dtype = numpy.int32, count = frames)
+        locations = numpy.fromfile(fp, dtype = spotDataType())
+    return [finderBackends.finder_names[finder_id], [image_x, image_y], counts, locations]
+
+
+## BatchSpotCounter
+#
+# Distributes the frames of the movies over a pool of worker processes and
+# writes the results as they come back.
+#
+class BatchSpotCounter(object):
+
+    ## __init__
+    #
+    # @param finder_name The object finder to use (lmm, median or log).
+    # @param threshold The object finder threshold.
+    # @param processes (Optional) The number of processes, defaults to the number of CPUs.
+    # @param block_size (Optional) The number of frames in each block of work, defaults to 100.
+    #
+    def __init__(self, finder_name, threshold, processes = None, block_size = 100):
+        if not (finder_name in finderBackends.finder_names):
+            raise Exception("Unknown object finder " + finder_name)
+        self.block_size = block_size
+        self.finder_name = finder_name
+        self.processes = processes
+        self.threshold = threshold
+
+    ## analyze
+    #
+    # @param movie_names A list of movie file names.
+    #
+    # @return A list containing the total number of spots found in each movie.
+    #
+    def analyze(self, movie_names):
+
+        # Open the results files & create the blocks of work.
+        blocks = []
+        results = {}
+        for movie_name in movie_names:
+            data_file = datareader.reader(movie_name)
+            length = data_file.filmSize()[2]
+            [image, image_x, image_y] = loadFrame(data_file, 0)
+            results[movie_name] = SpotsFile(os.path.splitext(movie_name)[0] + "_spots.bin",
+                                            finderBackends.finder_names.index(self.finder_name),
+                                            length,
+                                            image_x,
+                                            image_y)
+            for first in range(0, length, self.block_size):
+                blocks.append([movie_name, first, min(first + self.block_size, length)])
+
+        # Analyze, imap() returns the blocks in order so the locations are written in frame order.
+        pool = multiprocessing.Pool(self.processes, initializeWorker, (self.finder_name, self.threshold))
+        try:
+            for [movie_name, first, counts, locations] in pool.imap(analyzeBlock, blocks):
+                results[movie_name].addBlock(first, counts, locations)
+        except:
+            pool.terminate()
+            raise
+        pool.close()
+        pool.join()
+
+        totals = []
+        for movie_name in movie_names:
+            totals.append(results[movie_name].close())
+        return totals
+
+
+## SpotsFile
+#
+# A spot counting results file.
+#
+class SpotsFile(object):
+
+    ## __init__
+    #
+    # @param filename The name of the results file.
+    # @param finder_id The index of the object finder in finderBackends.finder_names.
+    # @param frames The number of frames in the movie.
+    # @param image_x The size of the frames in x.
+    # @param image_y The size of the frames in y.
+    #
+    def __init__(self, filename, finder_id, frames, image_x, image_y):
+        self.counts = numpy.zeros(frames, dtype = numpy.int32)
+        self.fp = open(filename, "wb")
+        self.fp.write(struct.pack(header_format, "SPOT", 1, finder_id, frames, image_x, image_y))
+
+        # Counts are written when the file is closed.
+        self.counts.tofile(self.fp)
+
+    ## addBlock
+    #
+    # @param first The first frame of the block.
+    # @param counts The number of spots in each frame of the block.
+    # @param locations The spot locations in the block.
+    #
+    def addBlock(self, first, counts, locations):
+        self.counts[first:first + counts.size] = counts
+        locations.tofile(self.fp)
+
+    ## close
+    #
+    # @return The total number of spots.
+    #
+    def close(self):
+        self.fp.seek(header_size)
+        self.counts.tofile(self.fp)
+        self.fp.close()
+        return int(numpy.sum(self.counts))
+
+
+if (__name__ == "__main__"):
+
+    if (len(sys.argv) < 4):
+        print "usage: <finder (" + ", ".join(finderBackends.finder_names) + ")> <threshold> <movie> [<movie> ...]"
+        exit()
+
+    movie_names = sys.argv[3:]
+    counter = BatchSpotCounter(sys.argv[1], int(sys.argv[2]))
+
+    start_time = time.time()
+    totals = counter.analyze(movie_names)
+    elapsed_time = time.time() - start_time
+
+    total_frames = 0
+    for i, movie_name in enumerate(movie_names):
+        frames = datareader.reader(movie_name).filmSize()[2]
+        total_frames += frames
+        print movie_name, frames, "frames", totals[i], "spots"
+    print total_frames, "frames analyzed in {0:.2f} seconds ({1:.1f} FPS).".format(elapsed_time, total_frames/elapsed_time)
+
+
+#
+# The MIT License
+#
+# Copyright (c) 2015 Zhuang Lab, Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
@@ -12,6 +12,7 @@ from PyQt4 import QtCore
 import sc_library.hdebug as hdebug
 
 import camera.feeds as feeds
+import halLib.frameBenchmark as frameBenchmark
 
 class Camera(QtCore.QObject):
     cameraProperties = QtCore.pyqtSignal(object)
@@ -24,6 +25,7 @@ class Camera(QtCore.QObject):
         QtCore.QObject.__init__(self)
         
         self.acq_mode = None
+        self.benchmark = None
         self.cameras = []
         self.feed_controller = None
         self.filming = False
@@ -99,10 +101,10 @@ class Camera(QtCore.QObject):
                     if (self.acq_mode == "fixed_length") and feed.master:
                         if (feed.number <= self.frames_to_take):
                             if self.writer is not None:
-                                self.writer.saveFrame(feed)
+                                frameBenchmark.timeModule(self.benchmark, "writer", self.writer.saveFrame, feed)
                     else:
                         if self.writer is not None:
-                            self.writer.saveFrame(feed)
+                            frameBenchmark.timeModule(self.benchmark, "writer", self.writer.saveFrame, feed)
 
                     if (self.acq_mode == "fixed_length") and feed.master and (feed.number == self.frames_to_take):
                         reached_max_frames = True
@@ -149,6 +151,10 @@ class Camera(QtCore.QObject):
 
         self.feed_controller = feeds.newFeedController(self.cameras, self.parameters)
 
+    @hdebug.debug
+    def setBenchmark(self, benchmark):
+        self.benchmark = benchmark
+
     @hdebug.debug
     def startCamera(self):
         self.key += 1
@@ -0,0 +1,140 @@
+#!/usr/bin/python
+#
+## @file
+#
+# Simulated camera frames for the software (none) cameras. A pool of
+# frames is computed in advance so that generating frames never limits
+# how fast the camera can run. The frames contain blinking emitters on
+# a noisy background. They also contain a (slow) drift and periodic
+# focus changes.
+#
+# Drift is done without copying. Each frame in the pool is larger than
+# the camera frame and the camera frame is a (contiguous) slice of it
+# that starts at an offset set by the current drift.
+#
+# Hazen 10/15
+#
+
+import math
+import numpy
+
+
+## FrameSimulator
+#
+# Creates and stores the pool of simulated frames.
+#
+class FrameSimulator(object):
+
+    ## __init__
+    #
+    # @param x_size The frame size in x in pixels.
+    # @param y_size The frame size in y in pixels.
+    # @param background (Optional) The background level, defaults to 100.
+    # @param density (Optional) The number of emitter sites per 100 pixels, defaults to 1.0.
+    # @param drift (Optional) The drift in pixels per frame, defaults to 0.0.
+    # @param drift_range (Optional) The maximum drift in pixels, defaults to 10.
+    # @param focus (Optional) The fractional change in the PSF width over one cycle of the pool, defaults to 0.0.
+    # @param height (Optional) The peak height of an in focus emitter, defaults to 1000.
+    # @param on_fraction (Optional) The fraction of the emitters that are on in each frame, defaults to 0.05.
+    # @param pool_size (Optional) The number of frames in the pool, defaults to 16.
+    # @param seed (Optional) The random number generator seed, defaults to 0.
+    # @param sigma (Optional) The PSF sigma in pixels, defaults to 1.5.
+    #
+    def __init__(self, x_size, y_size, background = 100.0, density = 1.0, drift = 0.0, drift_range = 10, focus = 0.0, height = 1000.0, on_fraction = 0.05, pool_size = 16, seed = 0, sigma = 1.5):
+        self.drift = drift
+        self.drift_range = max(0, min(int(drift_range), x_size - 1, y_size - 1))
+        self.frame_size = x_size * y_size
+        self.pool = []
+        self.x_size = x_size
+        self.y_size = y_size
+
+        random_state = numpy.random.RandomState(seed)
+
+        # Emitter sites, these are the same for every frame.
+        pad_y = y_size + self.drift_range + 1
+        n_sites = int(density * x_size * pad_y/100.0)
+        site_x = random_state.uniform(0, x_size, n_sites)
+        site_y = random_state.uniform(0, pad_y, n_sites)
+
+        # Offsets of the pixels around each emitter.
+        r = int(math.ceil(4.0 * sigma * (1.0 + abs(focus))))
+        [dy, dx] = numpy.mgrid[-r:r+1, -r:r+1]
+        dx = dx.flatten()
+        dy = dy.flatten()
+
+        for i in range(pool_size):
+
+            # Blinking.
+            on = (random_state.uniform(size = n_sites) < on_fraction)
+            x = site_x[on]
+            y = site_y[on]
+
+            # Focus, the PSF width changes but the total signal does not.
+            i_sigma = sigma * (1.0 + focus * math.sin(2.0 * math.pi * float(i)/float(pool_size)))
+            i_height = height * (sigma * sigma)/(i_sigma * i_sigma)
+
+            ix = numpy.round(x).astype(numpy.int64)[:,None] + dx[None,:]
+            iy = numpy.round(y).astype(numpy.int64)[:,None] + dy[None,:]
+            ex = ix - x[:,None]
+            ey = iy - y[:,None]
+            values = i_height * numpy.exp(-(ex * ex + ey * ey)/(2.0 * i_sigma * i_sigma))
+            mask = (ix >= 0) & (ix < x_size) & (iy >= 0) & (iy < pad_y)
+            image = numpy.bincount(iy[mask] * x_size + ix[mask],
+                                   weights = values[mask],
+                                   minlength = x_size * pad_y)
+
+            # Shot noise.
+            image = random_state.poisson(image + background)
+            self.pool.append(numpy.minimum(image, 65535).astype(numpy.uint16))
+
+    ## getFrame
+    #
+    # @param frame_number The frame number.
+    #
+    # @return The frame (as a numpy.uint16 array of x_size * y_size elements).
+    #
+    def getFrame(self, frame_number):
+        offset = 0
+        if (self.drift_range > 0):
+
+            # The drift goes back and forth (a triangle wave) between 0 and drift_range.
+            d = (abs(self.drift) * frame_number) % (2 * self.drift_range)
+            if (d > self.drift_range):
+                d = 2 * self.drift_range - d
+            d = int(d)
+            offset = d * self.x_size + d
+
+        pool_frame = self.pool[frame_number % len(self.pool)]
+        return pool_frame[offset:offset + self.frame_size]
+
+    ## getPoolSize
+    #
+    # @return The number of frames in the pool.
+    #
+    def getPoolSize(self):
+        return len(self.pool)
+
+
+#
+# The MIT License
+#
+# Copyright (c) 2015 Zhuang Lab, Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
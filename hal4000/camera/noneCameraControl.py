@@ -6,10 +6,17 @@
 #
 # Hazen 09/15
 #
+# The frames come from a pool of simulated frames (see frameSimulator.py)
+# and are sent in batches at the rate set by the exposure time, so this
+# camera can also be used to test how fast HAL can go. Dropped frames and
+# timing jitter can be added to test how HAL handles these.
+#
+# Hazen 10/15
+#
 
-import ctypes
 import numpy
 from PyQt4 import QtCore
+import time
 
 # Debugging
 import sc_library.hdebug as hdebug
@@ -17,6 +24,7 @@ import sc_library.hdebug as hdebug
 import sc_library.parameters as params
 import camera.cameraControl as cameraControl
 import camera.frame as frame
+import camera.frameSimulator as frameSimulator
 
 ## ACameraControl
 #
@@ -36,10 +44,14 @@ class ACameraControl(cameraControl.CameraControl):
     def __init__(self, hardware, parameters, parent = None):
         cameraControl.CameraControl.__init__(self, hardware, parameters, parent)
         
-        self.fake_frame = 0
         self.fake_frame_size = [0,0]
+        self.frame_time = 0.1
+        self.frames_sent = 0
         self.parameters = parameters.get("camera1")
-        self.sleep_time = 100
+        self.random_state = numpy.random.RandomState()
+        self.simulator = None
+        self.simulator_size = None
+        self.start_time = None
 
         # Add None Camera specific parameters.
         self.parameters.add("max_intensity", params.ParameterInt("",
@@ -47,21 +59,57 @@ class ACameraControl(cameraControl.CameraControl):
                                                                  10000,
                                                                  is_mutable = False,
                                                                  is_saved = False))
-        self.parameters.add("x_start", params.ParameterRangeInt("X start pixel", "x_start", 1, 1, 512))
-        self.parameters.add("x_end", params.ParameterRangeInt("X end pixel", "x_end", 512, 1, 512))
-        self.parameters.add("y_start", params.ParameterRangeInt("Y start pixel", "y_start", 1, 1, 512))
-        self.parameters.add("y_end", params.ParameterRangeInt("Y end pixel", "y_end", 512, 1, 512))
+        self.parameters.add("x_start", params.ParameterRangeInt("X start pixel", "x_start", 1, 1, 2048))
+        self.parameters.add("x_end", params.ParameterRangeInt("X end pixel", "x_end", 512, 1, 2048))
+        self.parameters.add("y_start", params.ParameterRangeInt("Y start pixel", "y_start", 1, 1, 2048))
+        self.parameters.add("y_end", params.ParameterRangeInt("Y end pixel", "y_end", 512, 1, 2048))
         self.parameters.add("x_bin", params.ParameterRangeInt("Binning in X", "x_bin", 1, 1, 16))
         self.parameters.add("y_bin", params.ParameterRangeInt("Binning in Y", "y_bin", 1, 1, 16))
-        self.parameters.add("exposure_time", params.ParameterRangeFloat("Exposure time (seconds)", "exposure_time", 0.01, 0.01, 10.0))
-            
-        if hardware:
-            self.roll = hardware.get("roll")
-        else:
-            self.roll = 0
-            
+        self.parameters.add("exposure_time", params.ParameterRangeFloat("Exposure time (seconds)", "exposure_time", 0.01, 0.001, 10.0))
+
+        # Simulation settings, these are all optional.
+        #
+        # density - Emitter sites per 100 pixels.
+        # drift - Drift in pixels per frame.
+        # drift_range - Maximum drift in pixels.
+        # drop_rate - The fraction of the frames that are dropped.
+        # focus - Fractional change in the PSF width.
+        # jitter - Maximum extra delay in milliseconds between batches of frames.
+        # max_batch - Maximum number of frames in a batch, frames beyond this are dropped.
+        # on_fraction - Fraction of the emitters that are on in each frame.
+        # pool_size - Number of frames in the pool of simulated frames.
+        #
+        if not hardware:
+            hardware = params.StormXMLObject([])
+        self.density = hardware.get("density", 1.0)
+        self.drift = hardware.get("drift", 0.0)
+        self.drift_range = hardware.get("drift_range", 10)
+        self.drop_rate = hardware.get("drop_rate", 0.0)
+        self.focus = hardware.get("focus", 0.0)
+        self.jitter = hardware.get("jitter", 0)
+        self.max_batch = hardware.get("max_batch", 200)
+        self.on_fraction = hardware.get("on_fraction", 0.05)
+        self.pool_size = hardware.get("pool_size", 16)
+
         self.initCamera()
 
+    ## createSimulator
+    #
+    # Create the pool of simulated frames for the current frame size. This
+    # is called by the acquisition thread as it takes a while for large frames.
+    #
+    def createSimulator(self):
+        size = list(self.fake_frame_size)
+        self.simulator = frameSimulator.FrameSimulator(size[0],
+                                                       size[1],
+                                                       density = self.density,
+                                                       drift = self.drift,
+                                                       drift_range = self.drift_range,
+                                                       focus = self.focus,
+                                                       on_fraction = self.on_fraction,
+                                                       pool_size = self.pool_size)
+        self.simulator_size = size
+
     ## getAcquisitionTimings
     #
     # Returns how fast the camera is running.
@@ -72,8 +120,7 @@ class ACameraControl(cameraControl.CameraControl):
     #
     @hdebug.debug
     def getAcquisitionTimings(self, which_camera):
-        time = 0.001 * float(self.sleep_time)
-        return [time, time]
+        return [self.frame_time, self.frame_time]
 
     ## getProperties
     #
@@ -97,30 +144,23 @@ class ACameraControl(cameraControl.CameraControl):
 
     ## newParameters
     #
-    # Update the camera based on a new set of parameters. This creates
-    # a fake image that we recycle as the picture from the camera.
+    # Update the camera based on a new set of parameters. If the frame
+    # size has changed the pool of simulated frames is created again when
+    # the camera is next started (see run()).
     #
     # @param parameters A parameters object.
     #
     @hdebug.debug
     def newParameters(self, parameters):
         p = parameters.get("camera1")
-        if (p.get("exposure_time") > 0.010):
-            self.sleep_time = int(1000.0 * p.get("exposure_time"))
-        else:
-            self.sleep_time = 10
-            
+        self.frame_time = max(0.001, p.get("exposure_time"))
+
         size_x = (p.get("x_end") - p.get("x_start") + 1)/p.get("x_bin")
         size_y = (p.get("y_end") - p.get("y_start") + 1)/p.get("y_bin")
         p.set("x_pixels", size_x)
         p.set("y_pixels", size_y)
         self.fake_frame_size = [size_x, size_y]
-        fake_frame = ctypes.create_string_buffer(2 * size_x * size_y)
-        for i in range(size_x):
-            for j in range(size_y):
-                fake_frame[j*2*size_x + i*2] = chr(i % 128 + j % 128)
-        self.fake_frame = numpy.fromstring(fake_frame, dtype = numpy.uint16)
-        
+
         if not p.has("bytes_per_frame"):
             p.set("bytes_per_frame", 2 * size_x * size_y)
 
@@ -128,29 +168,69 @@ class ACameraControl(cameraControl.CameraControl):
 
     ## run
     #
-    # This thread generates frame objects from the emulated image, saves
-    # them if requested and broadcast them using the newData signal. It
-    # also signals when the end of fixed length film has been reached.
+    # This thread generates frame objects from the pool of simulated frames
+    # and broadcasts them using the newData signal. Like a real camera the
+    # frames are sent in batches, the size of the batch is however many
+    # frames should have been taken since the last batch.
     #
     def run(self):
         while(self.running):
+
+            # The pool of frames is created here, without the mutex, so
+            # that the GUI thread does not have to wait for it.
+            if self.acquire.amActive() and (self.simulator_size != self.fake_frame_size):
+                self.createSimulator()
+
             self.mutex.lock()
             if self.acquire.amActive() and self.got_camera:
-                aframe = frame.Frame(numpy.roll(self.fake_frame, int(self.frame_number * self.roll)),
-                                     self.frame_number,
-                                     self.fake_frame_size[0],
-                                     self.fake_frame_size[1],
-                                     "camera1", 
-                                     True)
-                self.frame_number += 1
+                if self.start_time is None:
+                    self.start_time = time.time()
+                    self.frames_sent = 0
+
+                n_frames = int((time.time() - self.start_time)/self.frame_time) - self.frames_sent
+
+                # The camera buffer overflowed.
+                if (n_frames > self.max_batch):
+                    self.frames_sent += n_frames - self.max_batch
+                    n_frames = self.max_batch
+
+                frames = []
+                for i in range(n_frames):
+                    self.frames_sent += 1
+                    if (self.drop_rate > 0.0) and (self.random_state.uniform() < self.drop_rate):
+                        continue
+                    frames.append(frame.Frame(self.simulator.getFrame(self.frames_sent),
+                                              self.frame_number,
+                                              self.fake_frame_size[0],
+                                              self.fake_frame_size[1],
+                                              "camera1",
+                                              True))
+                    self.frame_number += 1
 
                 # Emit new data signal.
-                self.newData.emit([aframe], self.key)
+                if (len(frames) > 0):
+                    self.newData.emit(frames, self.key)
             else:
                 self.acquire.idle()
+                self.start_time = None
 
             self.mutex.unlock()
-            self.msleep(self.sleep_time)
+
+            sleep_time = min(10, int(1000.0 * self.frame_time))
+            if (self.jitter > 0):
+                sleep_time += self.random_state.randint(0, self.jitter + 1)
+            self.msleep(sleep_time)
+
+    ## startCamera
+    #
+    # @param key The ID number to use for frames in the current acquisition.
+    #
+    @hdebug.debug
+    def startCamera(self, key):
+        self.mutex.lock()
+        self.start_time = None
+        self.mutex.unlock()
+        cameraControl.CameraControl.startCamera(self, key)
 
 #
 # The MIT License
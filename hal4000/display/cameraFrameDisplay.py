@@ -19,6 +19,7 @@ import sc_library.parameters as params
 
 # Camera Helper Modules
 import qtWidgets.qtColorGradient as qtColorGradient
+import qtWidgets.qtHistogram as qtHistogram
 import qtWidgets.qtRangeSlider as qtRangeSlider
 
 # Misc
@@ -51,6 +52,7 @@ class CameraFeedDisplay(QtGui.QFrame):
         QtGui.QFrame.__init__(self, parent)
 
         # General (alphabetically ordered).
+        self.auto_contrast = 0
         self.color_gradient = 0
         self.color_table = 0
         self.color_tables = colorTables.ColorTables("./colorTables/all_tables/")
@@ -63,6 +65,7 @@ class CameraFeedDisplay(QtGui.QFrame):
         self.max_intensity = parameters.get("max_intensity")
         self.parameters = parameters
         self.show_grid = 0
+        self.show_histogram = 0
         self.show_info = 1
         self.show_target = 0
         self.sync_value = 0
@@ -113,7 +116,9 @@ class CameraFeedDisplay(QtGui.QFrame):
         for color_name in self.color_tables.getColorTableNames():
             self.ui.colorComboBox.addItem(color_name[:-5])
 
+        self.ui.autoContrastAct = QtGui.QAction(self.tr("Auto Contrast"), self)
         self.ui.gridAct = QtGui.QAction(self.tr("Show Grid"), self)
+        self.ui.histogramAct = QtGui.QAction(self.tr("Show Histogram"), self)
         self.ui.infoAct = QtGui.QAction(self.tr("Hide Info"), self)
         self.ui.targetAct = QtGui.QAction(self.tr("Show Target"), self)
 
@@ -142,12 +147,19 @@ class CameraFeedDisplay(QtGui.QFrame):
         self.camera_widget = a_class(parameters, self.ui.cameraScrollArea)
         self.ui.cameraScrollArea.setWidget(self.camera_widget)
 
+        # Histogram, this is drawn on top of the camera display.
+        self.histogram = qtHistogram.QHistogram(self.ui.cameraScrollArea)
+        self.histogram.setGeometry(4, 4, 200, 80)
+        self.histogram.hide()
+
         self.camera_widget.intensityInfo.connect(self.handleIntensityInfo)
 
+        self.ui.autoContrastAct.triggered.connect(self.handleAutoContrast)
         self.ui.autoScaleButton.clicked.connect(self.handleAutoScale)
         self.ui.colorComboBox.currentIndexChanged[str].connect(self.handleColorTableChange)
         self.ui.feedComboBox.currentIndexChanged[str].connect(self.handleFeedChange)
         self.ui.gridAct.triggered.connect(self.handleGrid)
+        self.ui.histogramAct.triggered.connect(self.handleHistogram)
         self.ui.infoAct.triggered.connect(self.handleInfo)        
         self.ui.rangeSlider.doubleClick.connect(self.handleAutoScale)        
         self.ui.rangeSlider.rangeChanged.connect(self.handleRangeChange)
@@ -170,8 +182,22 @@ class CameraFeedDisplay(QtGui.QFrame):
         menu.addAction(self.ui.infoAct)
         menu.addAction(self.ui.targetAct)
         menu.addAction(self.ui.gridAct)
+        menu.addAction(self.ui.histogramAct)
+        menu.addAction(self.ui.autoContrastAct)
         menu.exec_(event.globalPos())
 
+    ## autoScale
+    #
+    # Set the display range based on the recent camera images.
+    #
+    def autoScale(self):
+        [scalemin, scalemax] = self.camera_widget.getAutoScale()
+        if scalemin < 0:
+            scalemin = 0
+        if scalemax > self.max_intensity:
+            scalemax = self.max_intensity
+        self.ui.rangeSlider.setValues([float(scalemin), float(scalemax)])
+
     ## displayFrame
     #
     # This is called every 1/10th of a second to update the frame that is displayed.
@@ -179,6 +205,12 @@ class CameraFeedDisplay(QtGui.QFrame):
     def displayFrame(self):
         if self.frame:
             self.camera_widget.updateImageWithFrame(self.frame)
+            if self.auto_contrast:
+                self.autoScale()
+            if self.show_histogram:
+                self.histogram.newHistogram(self.camera_widget.getHistogram(),
+                                            [self.getParameter("scalemin"), self.getParameter("scalemax")],
+                                            self.max_intensity)
             
     ## getParameter
     #
@@ -194,21 +226,31 @@ class CameraFeedDisplay(QtGui.QFrame):
     def getParameter(self, pname, default_value = None):
         return self.feed_controller.getFeedParameter(self.feed_name, pname, default_value)
 
+    ## handleAutoContrast
+    #
+    # Turn on / off automatically setting the display range for every frame.
+    #
+    # @param boolean Dummy parameter.
+    #
+    @hdebug.debug
+    def handleAutoContrast(self, boolean):
+        if self.auto_contrast:
+            self.auto_contrast = 0
+            self.ui.autoContrastAct.setText("Auto Contrast")
+        else:
+            self.auto_contrast = 1
+            self.ui.autoContrastAct.setText("Fixed Contrast")
+
     ## handleAutoScale
     #
-    # Set the image display range automatically based on the current frames
-    # minimum and maximum intensity.
+    # Set the image display range automatically based on the recent
+    # frames intensity distribution.
     #
     # @param bool Dummy parameter.
     #
     @hdebug.debug
     def handleAutoScale(self, bool):
-        [scalemin, scalemax] = self.camera_widget.getAutoScale()
-        if scalemin < 0:
-            scalemin = 0
-        if scalemax > self.max_intensity:
-            scalemax = self.max_intensity
-        self.ui.rangeSlider.setValues([float(scalemin), float(scalemax)])
+        self.autoScale()
 
     ## handleColorTableChange
     #
@@ -250,6 +292,23 @@ class CameraFeedDisplay(QtGui.QFrame):
             self.ui.gridAct.setText("Hide Grid")
         self.camera_widget.setShowGrid(self.show_grid)
 
+    ## handleHistogram
+    #
+    # Show or hide the histogram that is drawn on top of the camera display.
+    #
+    # @param boolean Dummy parameter.
+    #
+    @hdebug.debug
+    def handleHistogram(self, boolean):
+        if self.show_histogram:
+            self.show_histogram = 0
+            self.ui.histogramAct.setText("Show Histogram")
+            self.histogram.hide()
+        else:
+            self.show_histogram = 1
+            self.ui.histogramAct.setText("Hide Histogram")
+            self.histogram.show()
+
     ## handleInfo
     #
     # Handles telling the xCameraWidget to show or hide the
@@ -41,6 +41,8 @@ import sc_library.hdebug as hdebug
 import camera.control as control
 import camera.filmSettings as filmSettings
 import display.cameraDisplay as cameraDisplay
+import halLib.diskProbe as diskProbe
+import halLib.frameBenchmark as frameBenchmark
 import halLib.imagewriters as writers
 import halLib.halModule as halModule
 import qtWidgets.qtAppIcon as qtAppIcon
@@ -106,9 +108,11 @@ class Window(QtGui.QMainWindow):
         QtGui.QMainWindow.__init__(self, parent)
 
         # General (alphabetically ordered)
+        self.benchmark = None
         self.current_directory = False
         self.current_length = 0
         self.directory = False
+        self.disk_probe = diskProbe.DiskProbe()
         self.directory_test_mode = False
         self.filename = ""
         self.filming = False
@@ -178,6 +182,11 @@ class Window(QtGui.QMainWindow):
         self.camera.reachedMaxFrames.connect(self.stopFilm)
         self.camera.newFrames.connect(self.newFrames)
 
+        # Frame rate and module timing (for testing).
+        if hardware.get("benchmark", False):
+            self.benchmark = frameBenchmark.FrameBenchmark()
+            self.camera.setBenchmark(self.benchmark)
+
         #
         # Camera display.
         #
@@ -568,10 +577,29 @@ class Window(QtGui.QMainWindow):
                 message.addResponse("duration", num_frames * parameters.get("seconds_per_frame"))
                 mega_bytes_per_frame = parameters.get("camera1.bytes_per_frame") * 1.0/2**20 # Convert to megabytes.
                 message.addResponse("disk_usage", mega_bytes_per_frame * num_frames)
+
+                # Check that the disk can keep up, the first check in a directory takes a second or so.
+                [status, disk_message] = self.disk_probe.checkFilm(parameters.get("film.filetype"),
+                                                                   self.directory_test_mode,
+                                                                   parameters)
+                if (status == "error"):
+                    message.setError(True, disk_message)
+                elif (status == "warning"):
+                    message.addResponse("disk_warning", disk_message)
                 self.tcpComplete.emit(message)
 
             else: # Take movie.
 
+                # Refuse if the disk is known to be too slow.
+                [status, disk_message] = self.disk_probe.checkFilm(self.parameters.get("film.filetype"),
+                                                                   self.parameters.get("film.directory"),
+                                                                   self.parameters,
+                                                                   probe = False)
+                if (status == "error"):
+                    message.setError(True, disk_message)
+                    self.tcpComplete.emit(message)
+                    return
+
                 # Set filename.
                 self.ui.filenameLabel.setText(message.getData("name") + self.parameters.get("film.filetype"))
                 
@@ -654,12 +682,23 @@ class Window(QtGui.QMainWindow):
     # @param frames A list of frame objects.
     #
     def newFrames(self, frames):
+        benchmark = None
+        if self.filming:
+            benchmark = self.benchmark
+
         for frame in frames:
             if self.filming:
                 self.updateFramesForFilm(frame)
 
-            for module in self.modules:
-                module.newFrame(frame, self.filming)
+            if benchmark is None:
+                for module in self.modules:
+                    module.newFrame(frame, self.filming)
+            else:
+                if (frame.which_camera == "camera1"):
+                    benchmark.newFrames(1)
+                for module in self.modules:
+                    module_name = getattr(module, "hal_type", module.__class__.__name__)
+                    frameBenchmark.timeModule(benchmark, module_name, module.newFrame, frame, self.filming)
 
     ## newParameters
     #
@@ -886,6 +925,16 @@ class Window(QtGui.QMainWindow):
         else:
             save_film = True
 
+        # Warn if the disk is known to be too slow.
+        if save_film:
+            [status, disk_message] = self.disk_probe.checkFilm(str(self.ui.filetypeComboBox.currentText()),
+                                                               self.parameters.get("film.directory"),
+                                                               self.parameters,
+                                                               probe = False)
+            if (status != "ok"):
+                print "Warning:", disk_message
+                hdebug.logText("Warning: " + disk_message)
+
         self.writer = None
         self.ui.recordButton.setText("Stop")
         try:
@@ -918,6 +967,9 @@ class Window(QtGui.QMainWindow):
         # Disable parameters radio buttons.
         self.parameters_box.startFilm()
 
+        if self.benchmark is not None:
+            self.benchmark.start(self.parameters.get("seconds_per_frame"))
+
         # go...
         self.startCamera()
 
@@ -958,6 +1010,10 @@ class Window(QtGui.QMainWindow):
 
         # Stop the camera.
         self.stopCamera()
+        if self.benchmark is not None:
+            self.benchmark.stop()
+            self.benchmark.report()
+
         try:
             self.camera.stopFilm()
 
@@ -1015,6 +1071,9 @@ class Window(QtGui.QMainWindow):
 
                 length = self.writer.getFilmLength()
                 message.addResponse("length", length)
+
+                # The size of the movie on the disk, so that Dave can learn how much space movies take.
+                message.addResponse("disk_usage", self.writer.getDiskUsage())
                 
                 self.tcp_requested_movie = False
                 self.tcp_message = None
@@ -9,9 +9,16 @@
 #
 # Hazen 02/14
 #
+# The images are encoded and sent on their own thread (ImageSender)
+# so that a slow connection does not slow down HAL. Only the most
+# recent image is kept, and the image quality and the rate at which
+# new images are taken from the display adapt to the speed of the
+# connection.
+#
+# Hazen 10/15
+#
 
 import bluetooth
-from cStringIO import StringIO
 from PyQt4 import QtCore, QtGui
 import time
 import traceback
@@ -21,6 +28,264 @@ import sc_library.parameters as params
 
 import sc_library.hdebug as hdebug
 
+## ImageSender
+#
+# QThread for encoding and sending images to the bluetooth device.
+#
+class ImageSender(QtCore.QThread):
+    sendError = QtCore.pyqtSignal()
+
+    ## __init__
+    #
+    # @param default_image The QImage to send when there is no camera image.
+    # @param image_size (Optional) The size of the (square) images to send, defaults to 256.
+    # @param parent (Optional) The PyQt parent.
+    #
+    def __init__(self, default_image, image_size = 256, parent = None):
+        QtCore.QThread.__init__(self, parent)
+
+        self.bytes_per_second = None
+        self.client_sock = None
+        self.condition = QtCore.QWaitCondition()
+        self.default_image = default_image
+        self.frame_interval = 0.1
+        self.image = default_image
+        self.image_data = None
+        self.image_size = image_size
+        self.images_sent = 0
+        self.last_image_time = 0.0
+        self.max_quality = 80
+        self.min_frame_interval = 0.05
+        self.min_quality = 20
+        self.mutex = QtCore.QMutex()
+        self.quality = 50
+        self.running = True
+        self.send_requested = False
+        self.send_size = 0
+        self.send_start = None
+        self.start_time = time.time()
+        self.target_send_time = 0.2
+
+    ## encodeImage
+    #
+    # Rotate the image, center it in a square black image and JPEG encode it.
+    # The default image is encoded as is.
+    #
+    # @param image A QImage.
+    # @param image_size The size of the square image.
+    # @param quality The JPEG quality.
+    #
+    # @return The encoded image as a string.
+    #
+    def encodeImage(self, image, image_size, quality):
+        byte_array = QtCore.QByteArray()
+        buffer = QtCore.QBuffer(byte_array)
+        buffer.open(QtCore.QIODevice.WriteOnly)
+        if image is self.default_image:
+            image.save(buffer, "JPEG", quality = quality)
+            return byte_array.data()
+
+        square = QtGui.QImage(image_size, image_size, QtGui.QImage.Format_RGB32)
+        square.fill(QtGui.QColor(0, 0, 0).rgb())
+
+        # Figure out bounding rectangle to use.
+        size = image_size - 1
+        width = image.width()
+        height = image.height()
+        if (width >= height):
+            xi = 0
+            xf = size
+            ysize = int(float(size) * float(height) / float(width))
+            margin = (size - ysize)/2
+            yi = margin
+            yf = size - margin
+        else:
+            yi = 0
+            yf = size
+            xsize = int(float(size) * float(width) / float(height))
+            margin = (size - xsize)/2
+            xi = margin
+            xf = size - margin
+
+        # Draw (rotated) image.
+        painter = QtGui.QPainter(square)
+        painter.translate(image_size, 0)
+        painter.rotate(90)
+        painter.drawImage(QtCore.QRect(xi, yi, xf - xi, yf - yi), image, image.rect())
+        painter.end()
+
+        square.save(buffer, "JPEG", quality = quality)
+        return byte_array.data()
+
+    ## getImagesPerSecond
+    #
+    # @return The rate at which images have been sent since the connection was made.
+    #
+    def getImagesPerSecond(self):
+        self.mutex.lock()
+        images_per_second = float(self.images_sent)/float(time.time() - self.start_time)
+        self.mutex.unlock()
+        return images_per_second
+
+    ## getImageSize
+    #
+    # @return The size of the (square) images that are sent.
+    #
+    def getImageSize(self):
+        return self.image_size
+
+    ## newConnection
+    #
+    # @param client_sock The bluetooth socket to send images with.
+    #
+    def newConnection(self, client_sock):
+        self.mutex.lock()
+        self.bytes_per_second = None
+        self.client_sock = client_sock
+        self.image_data = None
+        self.images_sent = 0
+        self.send_requested = False
+        self.send_start = None
+        self.start_time = time.time()
+        self.mutex.unlock()
+
+    ## newImage
+    #
+    # Replaces the current image, the previous image is dropped if it was not sent.
+    #
+    # @param image A QImage.
+    #
+    def newImage(self, image):
+        self.mutex.lock()
+        self.image = image
+        self.image_data = None
+        self.last_image_time = time.time()
+        self.mutex.unlock()
+
+    ## requestSend
+    #
+    # Called when the device is ready for a new image.
+    #
+    def requestSend(self):
+        self.mutex.lock()
+
+        # The time from the start of the last send to this request is how long
+        # it took the device to get the image.
+        if self.send_start is not None:
+            self.updateRate(self.send_size, time.time() - self.send_start)
+            self.send_start = None
+
+        self.send_requested = True
+        self.condition.wakeAll()
+        self.mutex.unlock()
+
+    ## resetImage
+    #
+    # Go back to sending the default image.
+    #
+    def resetImage(self):
+        self.newImage(self.default_image)
+
+    ## run
+    #
+    # Wait for send requests, encode the current image (if it
+    # has not already been encoded) and send it.
+    #
+    def run(self):
+        while True:
+            self.mutex.lock()
+            while self.running and not self.send_requested:
+                self.condition.wait(self.mutex)
+            if not self.running:
+                self.mutex.unlock()
+                break
+            self.send_requested = False
+            client_sock = self.client_sock
+            image = self.image
+            image_data = self.image_data
+            image_size = self.image_size
+            quality = self.quality
+            self.mutex.unlock()
+
+            if image_data is None:
+                image_data = self.encodeImage(image, image_size, quality)
+                self.mutex.lock()
+                if self.image is image:
+                    self.image_data = image_data
+                self.mutex.unlock()
+
+            self.mutex.lock()
+            self.send_size = len(image_data)
+            self.send_start = time.time()
+            self.mutex.unlock()
+            try:
+                client_sock.send("image," + str(len(image_data)) + ",")
+                client_sock.send(image_data)
+            except:
+                self.sendError.emit()
+                continue
+
+            self.mutex.lock()
+            self.images_sent += 1
+            self.mutex.unlock()
+
+    ## setImageSize
+    #
+    # @param image_size The size of the (square) images to send.
+    #
+    def setImageSize(self, image_size):
+        self.mutex.lock()
+        self.image_size = image_size
+        self.image_data = None
+        self.mutex.unlock()
+
+    ## stop
+    #
+    # Stop the thread.
+    #
+    def stop(self):
+        self.mutex.lock()
+        self.running = False
+        self.condition.wakeAll()
+        self.mutex.unlock()
+        self.wait()
+
+    ## updateRate
+    #
+    # Update the estimate of the connection speed and adjust the image
+    # quality and frame rate to match. This is called with the mutex locked.
+    #
+    # @param n_bytes The size of the last image in bytes.
+    # @param elapsed How long it took to send it in seconds.
+    #
+    def updateRate(self, n_bytes, elapsed):
+        bytes_per_second = float(n_bytes)/max(elapsed, 0.001)
+        if self.bytes_per_second is None:
+            self.bytes_per_second = bytes_per_second
+        else:
+            self.bytes_per_second = 0.8 * self.bytes_per_second + 0.2 * bytes_per_second
+
+        # Lower the quality if images take too long to send, raise it if there is spare capacity.
+        send_time = float(n_bytes)/self.bytes_per_second
+        if (send_time > self.target_send_time) and (self.quality > self.min_quality):
+            self.quality -= 5
+        elif (send_time < 0.5 * self.target_send_time) and (self.quality < self.max_quality):
+            self.quality += 5
+
+        # There is no point in taking images from the display faster than they can be sent.
+        self.frame_interval = max(self.min_frame_interval, send_time)
+
+    ## wantsImage
+    #
+    # @return True if it is time to take a new image from the display.
+    #
+    def wantsImage(self):
+        self.mutex.lock()
+        wants_image = ((time.time() - self.last_image_time) >= self.frame_interval)
+        self.mutex.unlock()
+        return wants_image
+
+
 ## HalBluetooth
 #
 # QThread for communication with a bluetooth device.
@@ -58,8 +323,6 @@ class HalBluetooth(QtCore.QThread, halModule.HalModule):
         self.drag_x = 0.0
         self.drag_y = 0.0
         self.filming = False
-        self.image_is_new = True
-        self.images_sent = 0
         self.is_down = False
         self.is_drag = False
         self.lock_jump_size = 0.025
@@ -67,15 +330,15 @@ class HalBluetooth(QtCore.QThread, halModule.HalModule):
         self.mutex = QtCore.QMutex()
         self.send_pictures = hardware.get("send_pictures")
         self.show_camera = True
-        self.start_time = 0
         self.which_camera = "camera1"
 
         parameters.add("bluetooth.z_step", params.ParameterRangeFloat("Z step size in um",
                                                                       "z_step",
                                                                       0.025, 0.0, 1.0))
 
-        # Set current image to default.
-        self.current_image = self.default_image
+        # Images are encoded and sent by this thread.
+        self.image_sender = ImageSender(self.default_image, image_size = hardware.get("image_size", 256))
+        self.image_sender.sendError.connect(self.handleSendError)
 
         # Setup bluetooth socket.
         have_bluetooth = True
@@ -109,6 +372,7 @@ class HalBluetooth(QtCore.QThread, halModule.HalModule):
             # Connect signals.
             self.newData.connect(self.handleNewData)
 
+            self.image_sender.start(QtCore.QThread.LowPriority)
             self.start(QtCore.QThread.NormalPriority)
 
     ## addMessage
@@ -131,6 +395,7 @@ class HalBluetooth(QtCore.QThread, halModule.HalModule):
     # Stop the thread.
     #
     def cleanup(self):
+        self.image_sender.stop()
         self.quit()
 
     ## clickUpdate
@@ -271,8 +536,10 @@ class HalBluetooth(QtCore.QThread, halModule.HalModule):
                     self.addMessage("showgain,1")
                 else:
                     self.addMessage("showgain,0")
-                self.current_image = self.default_image
-                self.image_is_new = True
+                self.image_sender.resetImage()
+            elif ("display" in data):
+                [type, width, height] = data.split(",")
+                self.image_sender.setImageSize(max(128, min(1024, int(width), int(height))))
 
         # Messages are only sent up to the device when the device requests a new image
         # or acknowledges the receipt of a previous message.
@@ -291,35 +558,7 @@ class HalBluetooth(QtCore.QThread, halModule.HalModule):
 
             # If there are no remaining messages to send then send the new image.
             else:
-
-                #
-                # This comes from here:
-                #  http://stackoverflow.com/questions/13302524/pyqt-qpixmap-save-to-stringio
-                #
-                if (self.image_is_new):
-                    byte_array = QtCore.QByteArray()
-                    buffer = QtCore.QBuffer(byte_array)
-                    buffer.open(QtCore.QIODevice.WriteOnly)
-                    self.current_image.save(buffer, 'JPEG', quality = 50)
-                    #self.current_image.save(buffer, 'JPEG')
-                
-                    image_io = StringIO(byte_array)
-                    self.image_data = image_io.getvalue()
-                    self.image_data_len = len(self.image_data)
-                    self.image_is_new = False
-
-                try:
-                    self.client_sock.send("image," + str(self.image_data_len) + ",")
-                    self.client_sock.send(self.image_data)
-                except:
-                    self.mutex.lock()
-                    self.connected = False
-                    self.messages = []
-                    self.mutex.unlock()
-
-                self.mutex.lock()
-                self.images_sent += 1
-                self.mutex.unlock()
+                self.image_sender.requestSend()
 
     ## handleNewLockPixmap
     #
@@ -345,40 +584,26 @@ class HalBluetooth(QtCore.QThread, halModule.HalModule):
         if not self.send_pictures:
             return
         
-        # Create a pixmap & color it black.
-        self.current_image = QtGui.QPixmap(256, 256)
-        painter = QtGui.QPainter(self.current_image)
-        painter.setPen(QtGui.QColor(0, 0, 0))
-        painter.setBrush(QtGui.QBrush(QtGui.QColor(0, 0, 0)))
-        painter.drawRect(self.current_image.rect())
-
-        # Figure out bounding rectangle to use.
-        width = new_pixmap.width()
-        height = new_pixmap.height()
-        if (width >= height):
-            xi = 0
-            xf = 255
-            ysize = int(255.0 * float(height) / float(width))
-            margin = (255 - ysize)/2
-            yi = margin
-            yf = 255 - margin
-        else:
-            yi = 0
-            yf = 255
-            xsize = int(255.0 * float(width) / float(height))
-            margin = (255 - xsize)/2
-            xi = margin
-            xf = 255 - margin
-
-        # Draw (rotated) image in pixmap
-        painter.translate(256,0)
-        painter.rotate(90)
-        painter.drawPixmap(QtCore.QRect(xi, yi, xf - xi, yf - yi), new_pixmap, new_pixmap.rect())
-
-        # Close painter.
-        painter.end()
-
-        self.image_is_new = True
+        # Only take a new image when the image sender is ready for one. This
+        # is a fast (nearest neighbor) resize as it happens in the GUI thread,
+        # the rest of the work is done by the image sender.
+        if self.image_sender.wantsImage():
+            image_size = self.image_sender.getImageSize()
+            small_pixmap = new_pixmap.scaled(image_size,
+                                             image_size,
+                                             QtCore.Qt.KeepAspectRatio,
+                                             QtCore.Qt.FastTransformation)
+            self.image_sender.newImage(small_pixmap.toImage())
+
+    ## handleSendError
+    #
+    # The image sender could not send an image.
+    #
+    def handleSendError(self):
+        self.mutex.lock()
+        self.connected = False
+        self.messages = []
+        self.mutex.unlock()
 
     ## newParameters
     #
@@ -403,8 +628,7 @@ class HalBluetooth(QtCore.QThread, halModule.HalModule):
             self.client_sock = client_sock
             connected = True
             self.connected = True
-            self.images_sent = 0
-            self.start_time = time.time()
+            self.image_sender.newConnection(client_sock)
             
             # Send initial configuration information.
             if self.filming:
@@ -425,7 +649,7 @@ class HalBluetooth(QtCore.QThread, halModule.HalModule):
                     self.drag_gain = 1.0
                     self.messages = []
                     self.show_camera = True
-                    images_per_second = float(self.images_sent)/float(time.time() - self.start_time)
+                    images_per_second = self.image_sender.getImagesPerSecond()
                     hdebug.logText("Bluetooth: Disconnected")
                     hdebug.logText("Bluetooth: Sent {0:.2f} images per second.".format(images_per_second))
                     self.mutex.unlock()
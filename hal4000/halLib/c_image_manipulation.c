@@ -10,6 +10,10 @@
  *
  * Hazen 09/15
  *
+ * The rescale functions also build a histogram of the image.
+ *
+ * Hazen 10/15
+ *
  *
  * Compilation (windows):
  * gcc -c c_image_manipulation.c -O3
@@ -28,14 +32,15 @@
 
 /* function definitions */
 int compare(uint8_t*, uint8_t*, int);
-void rescaleImage000(uint8_t*, unsigned short *, int, int, int, int, int, double, int *, int *);
-void rescaleImage001(uint8_t*, unsigned short *, int, int, int, int, int, double, int *, int *);
-void rescaleImage010(uint8_t*, unsigned short *, int, int, int, int, int, double, int *, int *);
-void rescaleImage011(uint8_t*, unsigned short *, int, int, int, int, int, double, int *, int *);
-void rescaleImage100(uint8_t*, unsigned short *, int, int, int, int, int, double, int *, int *);
-void rescaleImage101(uint8_t*, unsigned short *, int, int, int, int, int, double, int *, int *);
-void rescaleImage110(uint8_t*, unsigned short *, int, int, int, int, int, double, int *, int *);
-void rescaleImage111(uint8_t*, unsigned short *, int, int, int, int, int, double, int *, int *);
+int histogramSize(void);
+void rescaleImage000(uint8_t*, unsigned short *, int, int, int, int, int, double, int *, int *, int *);
+void rescaleImage001(uint8_t*, unsigned short *, int, int, int, int, int, double, int *, int *, int *);
+void rescaleImage010(uint8_t*, unsigned short *, int, int, int, int, int, double, int *, int *, int *);
+void rescaleImage011(uint8_t*, unsigned short *, int, int, int, int, int, double, int *, int *, int *);
+void rescaleImage100(uint8_t*, unsigned short *, int, int, int, int, int, double, int *, int *, int *);
+void rescaleImage101(uint8_t*, unsigned short *, int, int, int, int, int, double, int *, int *, int *);
+void rescaleImage110(uint8_t*, unsigned short *, int, int, int, int, int, double, int *, int *, int *);
+void rescaleImage111(uint8_t*, unsigned short *, int, int, int, int, int, double, int *, int *, int *);
 
 /* 
  * Functions 
@@ -72,6 +77,15 @@ int compare(uint8_t* array1, uint8_t* array2, int n_values)
   return ndiff;
 }
 
+/* histogramSize
+ *
+ * @return The number of bins in the histogram (one per 16 bit value).
+ */
+int histogramSize(void)
+{
+  return 65536;
+}
+
 /* rescaleImage000
  *
  * Converts to thresholded 8 bit for Qt.
@@ -86,8 +100,10 @@ int compare(uint8_t* array1, uint8_t* array2, int n_values)
  * @param max_range The maximum value when rescaled.
  * @param image_min The minimum value in image.
  * @param image_max The maxiumum value in image.
+ * @param histogram Storage for the image histogram, histogramSize() bins, or
+ *    NULL. This is not zeroed, the counts for this image are added to it.
  */
-void rescaleImage000(uint8_t *scaled_image, unsigned short *image, int image_width, int image_height, int display_min, int display_max, int saturated, double max_range, int *image_min, int *image_max)
+void rescaleImage000(uint8_t *scaled_image, unsigned short *image, int image_width, int image_height, int display_min, int display_max, int saturated, double max_range, int *image_min, int *image_max, int *histogram)
 {
   int cur_min,cur_max,i,image_size;
   double min,scale,temp;
@@ -100,6 +116,10 @@ void rescaleImage000(uint8_t *scaled_image, unsigned short *image, int image_wid
   cur_max = image[0];
   for(i=0;i<image_size;i++){
 
+    if(histogram != NULL){
+      histogram[image[i]] += 1;
+    }
+
     if(image[i]<cur_min){
       cur_min = image[i];
     }
@@ -128,7 +148,7 @@ void rescaleImage000(uint8_t *scaled_image, unsigned short *image, int image_wid
 }
 
 /* Transpose */
-void rescaleImage001(uint8_t *scaled_image, unsigned short *image, int image_width, int image_height, int display_min, int display_max, int saturated, double max_range, int *image_min, int *image_max)
+void rescaleImage001(uint8_t *scaled_image, unsigned short *image, int image_width, int image_height, int display_min, int display_max, int saturated, double max_range, int *image_min, int *image_max, int *histogram)
 {
   int cur_min,cur_max,i,ij,j;
   double min,scale,temp;
@@ -143,6 +163,10 @@ void rescaleImage001(uint8_t *scaled_image, unsigned short *image, int image_wid
 
       ij = i*image_height + j;
       
+      if(histogram != NULL){
+        histogram[image[ij]] += 1;
+      }
+
       if(image[ij]<cur_min){
 	cur_min = image[ij];
       }
@@ -172,7 +196,7 @@ void rescaleImage001(uint8_t *scaled_image, unsigned short *image, int image_wid
 }
 
 /* Flip vertical */
-void rescaleImage010(uint8_t *scaled_image, unsigned short *image, int image_width, int image_height, int display_min, int display_max, int saturated, double max_range, int *image_min, int *image_max)
+void rescaleImage010(uint8_t *scaled_image, unsigned short *image, int image_width, int image_height, int display_min, int display_max, int saturated, double max_range, int *image_min, int *image_max, int *histogram)
 {
   int cur_min,cur_max,i,ij,j;
   double min,scale,temp;
@@ -187,6 +211,10 @@ void rescaleImage010(uint8_t *scaled_image, unsigned short *image, int image_wid
 
       ij = i*image_height + j;
       
+      if(histogram != NULL){
+        histogram[image[ij]] += 1;
+      }
+
       if(image[ij]<cur_min){
 	cur_min = image[ij];
       }
@@ -216,7 +244,7 @@ void rescaleImage010(uint8_t *scaled_image, unsigned short *image, int image_wid
 }
 
 /* Flip vertical, then transpose */
-void rescaleImage011(uint8_t *scaled_image, unsigned short *image, int image_width, int image_height, int display_min, int display_max, int saturated, double max_range, int *image_min, int *image_max)
+void rescaleImage011(uint8_t *scaled_image, unsigned short *image, int image_width, int image_height, int display_min, int display_max, int saturated, double max_range, int *image_min, int *image_max, int *histogram)
 {
   int cur_min,cur_max,i,ij,j;
   double min,scale,temp;
@@ -231,6 +259,10 @@ void rescaleImage011(uint8_t *scaled_image, unsigned short *image, int image_wid
 
       ij = i*image_height + j;
       
+      if(histogram != NULL){
+        histogram[image[ij]] += 1;
+      }
+
       if(image[ij]<cur_min){
 	cur_min = image[ij];
       }
@@ -260,7 +292,7 @@ void rescaleImage011(uint8_t *scaled_image, unsigned short *image, int image_wid
 }
 
 /* Flip horizontal */
-void rescaleImage100(uint8_t *scaled_image, unsigned short *image, int image_width, int image_height, int display_min, int display_max, int saturated, double max_range, int *image_min, int *image_max)
+void rescaleImage100(uint8_t *scaled_image, unsigned short *image, int image_width, int image_height, int display_min, int display_max, int saturated, double max_range, int *image_min, int *image_max, int *histogram)
 {
   int cur_min,cur_max,i,ij,j;
   double min,scale,temp;
@@ -275,6 +307,10 @@ void rescaleImage100(uint8_t *scaled_image, unsigned short *image, int image_wid
 
       ij = i*image_height + j;
       
+      if(histogram != NULL){
+        histogram[image[ij]] += 1;
+      }
+
       if(image[ij]<cur_min){
 	cur_min = image[ij];
       }
@@ -304,7 +340,7 @@ void rescaleImage100(uint8_t *scaled_image, unsigned short *image, int image_wid
 }
 
 /* Flip horizontal, then transpose */
-void rescaleImage101(uint8_t *scaled_image, unsigned short *image, int image_width, int image_height, int display_min, int display_max, int saturated, double max_range, int *image_min, int *image_max)
+void rescaleImage101(uint8_t *scaled_image, unsigned short *image, int image_width, int image_height, int display_min, int display_max, int saturated, double max_range, int *image_min, int *image_max, int *histogram)
 {
   int cur_min,cur_max,i,ij,j;
   double min,scale,temp;
@@ -319,6 +355,10 @@ void rescaleImage101(uint8_t *scaled_image, unsigned short *image, int image_wid
 
       ij = i*image_height + j;
       
+      if(histogram != NULL){
+        histogram[image[ij]] += 1;
+      }
+
       if(image[ij]<cur_min){
 	cur_min = image[ij];
       }
@@ -348,7 +388,7 @@ void rescaleImage101(uint8_t *scaled_image, unsigned short *image, int image_wid
 }
 
 /* Flip horizontal, then vertical */
-void rescaleImage110(uint8_t *scaled_image, unsigned short *image, int image_width, int image_height, int display_min, int display_max, int saturated, double max_range, int *image_min, int *image_max)
+void rescaleImage110(uint8_t *scaled_image, unsigned short *image, int image_width, int image_height, int display_min, int display_max, int saturated, double max_range, int *image_min, int *image_max, int *histogram)
 {
   int cur_min,cur_max,i,ij,j;
   double min,scale,temp;
@@ -363,6 +403,10 @@ void rescaleImage110(uint8_t *scaled_image, unsigned short *image, int image_wid
 
       ij = i*image_height + j;
       
+      if(histogram != NULL){
+        histogram[image[ij]] += 1;
+      }
+
       if(image[ij]<cur_min){
 	cur_min = image[ij];
       }
@@ -392,7 +436,7 @@ void rescaleImage110(uint8_t *scaled_image, unsigned short *image, int image_wid
 }
 
 /* Flip horizontal, then vertical, then tranpose */
-void rescaleImage111(uint8_t *scaled_image, unsigned short *image, int image_width, int image_height, int display_min, int display_max, int saturated, double max_range, int *image_min, int *image_max)
+void rescaleImage111(uint8_t *scaled_image, unsigned short *image, int image_width, int image_height, int display_min, int display_max, int saturated, double max_range, int *image_min, int *image_max, int *histogram)
 {
   int cur_min,cur_max,i,ij,j;
   double min,scale,temp;
@@ -407,6 +451,10 @@ void rescaleImage111(uint8_t *scaled_image, unsigned short *image, int image_wid
 
       ij = i*image_height + j;
       
+      if(histogram != NULL){
+        histogram[image[ij]] += 1;
+      }
+
       if(image[ij]<cur_min){
 	cur_min = image[ij];
       }
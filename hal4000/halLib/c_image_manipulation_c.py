@@ -8,6 +8,10 @@
 # to do the image scaling and type conversion was not fast enough.
 #
 # Hazen 09/15
+#
+# The image histogram is built in the same pass as the rescaling.
+#
+# Hazen 10/15
 # 
 
 import ctypes
@@ -23,6 +27,9 @@ if (directory == ""):
 else:
     directory += "/"
 
+# True if the library can build the image histogram.
+histogram_in_c = False
+
 try:
     if (sys.platform == "win32"):
         image_manip = ctypes.cdll.LoadLibrary(directory + "c_image_manipulation.dll")
@@ -45,6 +52,17 @@ try:
                             ctypes.c_double,
                             ctypes.c_void_p,
                             ctypes.c_void_p]
+
+    # Older versions of the library do not build the histogram. These
+    # are still used for rescaling, the histogram is done with numpy.
+    if hasattr(image_manip, "histogramSize"):
+        histogram_in_c = True
+
+        # The histogram is passed as a pointer so that it can be NULL.
+        rescale_fn_arg_types.append(ctypes.c_void_p)
+    else:
+        print "C image manipulation library is out of date, using numpy for the histogram. Please re-compile it."
+
     image_manip.rescaleImage000.argtypes = rescale_fn_arg_types
     image_manip.rescaleImage001.argtypes = rescale_fn_arg_types
     image_manip.rescaleImage010.argtypes = rescale_fn_arg_types
@@ -76,11 +94,19 @@ def compare(image1, image2):
     return image_manip.compare(image1, image2, image1.size)
 
 
+## histogramSize
+#
+# @return The number of bins in the image histogram.
+#
+def histogramSize():
+    return 65536
+
+
 ## rescaleImage
 #
 # This converts a uint16 image into a uint8 image based on the display
 # range. As a side effect it also returns the minimum and maximum values
-# in the image.
+# in the image and (optionally) the histogram of the image.
 #
 # @param image The original image as numpy.uint16 array.
 # @param flip_h Flip horizontal.
@@ -89,10 +115,16 @@ def compare(image1, image2):
 # @param display_range [image value that equals 0, image value that equals 255].
 # @param saturated_value The value above which the image has saturated the camera.
 # @param use_numpy (optional) Use numpy even if the C library exists, defaults to False.
+# @param histogram (optional) A contiguous numpy.int32 array of histogramSize() elements, this is filled with the histogram of the image. The histogram is not calculated if this is None.
 #
 # @return [numpy.uint8 image, original image minimum, original image maximum]
 #
-def rescaleImage(image, flip_h, flip_v, transpose, display_range, saturated_value, use_numpy = False):
+def rescaleImage(image, flip_h, flip_v, transpose, display_range, saturated_value, use_numpy = False, histogram = None):
+
+    if histogram is not None:
+        if (histogram.dtype != numpy.int32) or (histogram.size != histogramSize()) or not histogram.flags["C_CONTIGUOUS"]:
+            raise ValueError("histogram must be a contiguous numpy.int32 array with histogramSize() elements")
+        histogram.fill(0)
 
     # Create a string specifying the operations that will be performed on the image.
     op_code = ""
@@ -123,24 +155,35 @@ def rescaleImage(image, flip_h, flip_v, transpose, display_range, saturated_valu
         # Get the appropriate C function based on the op_code.
         image_fn = getattr(image_manip, "rescaleImage" + op_code)
 
-        image_fn(rescaled,
-                 image,
-                 image.shape[0],
-                 image.shape[1],
-                 display_range[0],
-                 display_range[1],
-                 saturated_value,
-                 max_range,
-                 ctypes.byref(image_min),
-                 ctypes.byref(image_max))
+        args = [rescaled,
+                image,
+                image.shape[0],
+                image.shape[1],
+                display_range[0],
+                display_range[1],
+                saturated_value,
+                max_range,
+                ctypes.byref(image_min),
+                ctypes.byref(image_max)]
+        if histogram_in_c:
+            if histogram is not None:
+                args.append(histogram.ctypes.data)
+            else:
+                args.append(None)
+        image_fn(*args)
 
         image_min = image_min.value
         image_max = image_max.value
 
+        if (histogram is not None) and not histogram_in_c:
+            histogram[:] = numpy.bincount(image.ravel(), minlength = histogramSize())
+
     # Fall back to using numpy.
     else:
         image_min = numpy.min(image)
         image_max = numpy.max(image)
+        if histogram is not None:
+            histogram[:] = numpy.bincount(image.ravel(), minlength = histogramSize())
             
         if flip_h:
             image = numpy.fliplr(image)
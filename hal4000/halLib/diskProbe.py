@@ -0,0 +1,277 @@
+#!/usr/bin/python
+#
+## @file
+#
+# Measures how fast each of the movie file formats can be saved in a
+# directory. Synthetic frames (see camera/frameSimulator.py) are saved
+# with the same file writers that HAL uses for films and the writer is
+# synced to the disk every few frames. The result is the sustained rate
+# (in MB of frame data per second) and the latency of the syncs.
+#
+# HAL uses this to warn about, or refuse, films whose data rate is more
+# than the disk can handle. The results are cached so each directory /
+# format / frame size combination is only measured once.
+#
+# Usage:
+#   python diskProbe.py directory [x size] [y size]
+#
+# Hazen 10/15
+#
+
+import glob
+import os
+import sys
+import time
+
+try:
+    import camera.frame as frame
+except ImportError:
+    sys.path.append("../")
+    import camera.frame as frame
+
+import camera.frameSimulator as frameSimulator
+import halLib.imagewriters as writers
+
+# Warn when the required rate is more than this fraction of the measured rate.
+warning_fraction = 0.8
+
+
+## percentile
+#
+# @param values A list of numbers.
+# @param fraction The percentile as a fraction (i.e. 0.5 is the median).
+#
+# @return The (nearest rank) percentile of the values.
+#
+def percentile(values, fraction):
+    if (len(values) == 0):
+        return 0.0
+    values = sorted(values)
+    index = int(round(fraction * (len(values) - 1)))
+    return values[index]
+
+## probeWriter
+#
+# Save synthetic frames with a file writer and time how long this takes.
+#
+# @param filetype The file format, e.g. ".dax".
+# @param directory The directory to test.
+# @param parameters A parameters object, this is used for the frame size and to create the writer.
+# @param max_time (Optional) How long to save frames for in seconds, defaults to 0.5.
+# @param max_frames (Optional) The maximum number of frames to save, defaults to 1000.
+# @param sync_every (Optional) How many frames to save between syncs, defaults to 10.
+#
+# @return A ProbeResult object.
+#
+def probeWriter(filetype, directory, parameters, max_time = 0.5, max_frames = 1000, sync_every = 10):
+    [x_pixels, y_pixels] = writers.getCameraSize(parameters, "camera1")
+    simulator = frameSimulator.FrameSimulator(x_pixels, y_pixels, pool_size = 2)
+    basename = os.path.join(directory, "hal_disk_probe_" + str(os.getpid()))
+
+    # The writer uses film.filetype to find the names of the .inf & .xml files.
+    probe_parameters = parameters.copy()
+    probe_parameters.set("film.filetype", filetype)
+
+    n_frames = 0
+    sync_times = []
+    writer = None
+    try:
+        start_time = time.time()
+        writer = writers.createFileWriter(filetype, basename, probe_parameters, ["camera1"])
+        while (n_frames < max_frames) and ((time.time() - start_time) < max_time):
+            writer.saveFrame(frame.Frame(simulator.getFrame(n_frames), n_frames, x_pixels, y_pixels, "camera1", True))
+            n_frames += 1
+            if ((n_frames % sync_every) == 0):
+                sync_start = time.time()
+                writer.sync()
+                sync_times.append(time.time() - sync_start)
+        writer.closeFile()
+        elapsed = time.time() - start_time
+    finally:
+
+        # The writer has to be closed and released before its files are removed,
+        # otherwise it will write the .inf file again when it is deleted.
+        if writer is not None:
+            if writer.is_open:
+                try:
+                    writer.closeFile()
+                except Exception:
+                    pass
+                writer.is_open = False
+            writer = None
+        for filename in glob.glob(basename + "*"):
+            os.remove(filename)
+
+    mega_bytes = 2.0 * x_pixels * y_pixels * n_frames/2**20
+    return ProbeResult(filetype, directory, mega_bytes/elapsed, sync_times)
+
+
+## DiskProbe
+#
+# Caches the probe results.
+#
+class DiskProbe(object):
+
+    ## __init__
+    #
+    def __init__(self):
+        self.results = {}
+
+    ## checkFilm
+    #
+    # Check whether a film can be saved fast enough.
+    #
+    # @param filetype The file format, e.g. ".dax".
+    # @param directory The directory the film will be saved in.
+    # @param parameters A parameters object.
+    # @param probe (Optional) Measure the disk if it has not been measured yet, defaults to True.
+    #
+    # @return [status, message], status is one of "ok", "warning" or "error".
+    #
+    def checkFilm(self, filetype, directory, parameters, probe = True):
+        try:
+            result = self.getResult(filetype, directory, parameters, probe)
+        except (IOError, OSError) as error:
+            return ["error", "could not save a test film in " + directory + ", " + str(error)]
+        if result is None:
+            return ["ok", "disk speed not measured"]
+
+        required = requiredRate(parameters)
+        message = "{0:s} requires {1:.1f} MB/s, {2:s} sustained {3:.1f} MB/s".format(filetype,
+                                                                                 required,
+                                                                                 directory,
+                                                                                 result.mb_per_second)
+        if (required > result.mb_per_second):
+            return ["error", message]
+        elif (required > warning_fraction * result.mb_per_second):
+            return ["warning", message]
+        else:
+            return ["ok", message]
+
+    ## getResult
+    #
+    # @param filetype The file format, e.g. ".dax".
+    # @param directory The directory to test.
+    # @param parameters A parameters object.
+    # @param probe (Optional) Measure the disk if it has not been measured yet, defaults to True.
+    #
+    # @return A ProbeResult object, or None if there is no result and probe is False.
+    #
+    def getResult(self, filetype, directory, parameters, probe = True):
+        key = (filetype, os.path.abspath(directory), tuple(writers.getCameraSize(parameters, "camera1")))
+        if not (key in self.results):
+            if not probe:
+                return None
+            self.results[key] = probeWriter(filetype, directory, parameters)
+        return self.results[key]
+
+
+## ProbeResult
+#
+# Stores the results of probing one file format in one directory.
+#
+class ProbeResult(object):
+
+    ## __init__
+    #
+    # @param filetype The file format.
+    # @param directory The directory.
+    # @param mb_per_second The sustained rate in MB of frame data per second.
+    # @param sync_times A list of how long each sync took (in seconds).
+    #
+    def __init__(self, filetype, directory, mb_per_second, sync_times):
+        self.directory = directory
+        self.filetype = filetype
+        self.mb_per_second = mb_per_second
+        self.sync_times = sync_times
+
+    ## getSyncLatency
+    #
+    # @param fraction The percentile as a fraction, e.g. 0.99.
+    #
+    # @return The sync latency percentile in milliseconds.
+    #
+    def getSyncLatency(self, fraction):
+        return 1000.0 * percentile(self.sync_times, fraction)
+
+    ## __str__
+    #
+    def __str__(self):
+        return "{0:>6s} {1:8.1f} MB/s, sync p50 {2:.1f} p90 {3:.1f} p99 {4:.1f} ms".format(self.filetype,
+                                                                                            self.mb_per_second,
+                                                                                            self.getSyncLatency(0.5),
+                                                                                            self.getSyncLatency(0.9),
+                                                                                            self.getSyncLatency(0.99))
+
+
+## requiredRate
+#
+# @param parameters A parameters object.
+#
+# @return The data rate of a film in MB per second.
+#
+def requiredRate(parameters):
+    mega_bytes_per_frame = parameters.get("camera1.bytes_per_frame") * 1.0/2**20
+    return mega_bytes_per_frame/parameters.get("seconds_per_frame")
+
+
+#
+# Testing
+#
+
+if (__name__ == "__main__"):
+    import sc_library.parameters as params
+
+    if (len(sys.argv) < 2):
+        print "usage: diskProbe.py directory [x size] [y size]"
+        exit()
+
+    x_size = 512
+    y_size = 512
+    if (len(sys.argv) > 3):
+        x_size = int(sys.argv[2])
+        y_size = int(sys.argv[3])
+
+    # The minimum that the file writers need (see imagewriters.writeInfFile).
+    parameters = params.StormXMLObject([])
+    parameters.set("setup_name", "none")
+    parameters.set("parameters_file", "none")
+    parameters.addSubSection("camera1")
+    parameters.set("camera1.x_pixels", x_size)
+    parameters.set("camera1.y_pixels", y_size)
+    parameters.set("camera1.x_bin", 1)
+    parameters.set("camera1.y_bin", 1)
+    parameters.set("camera1.bytes_per_frame", 2 * x_size * y_size)
+    parameters.set("camera1.source", "none")
+    parameters.addSubSection("film")
+    parameters.set("film.notes", "")
+    parameters.set("film.want_big_endian", False)
+
+    print "{0:d}x{1:d} frames in {2:s}".format(x_size, y_size, sys.argv[1])
+    for filetype in writers.availableFileFormats("single"):
+        print probeWriter(filetype, sys.argv[1], parameters, max_time = 5.0, max_frames = 10000)
+
+
+#
+# The MIT License
+#
+# Copyright (c) 2015 Zhuang Lab, Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
@@ -0,0 +1,161 @@
+#!/usr/bin/python
+#
+## @file
+#
+# Measures how well HAL keeps up with the camera. This records the rate
+# at which frames actually arrive, how many frames were expected but never
+# arrived (dropped) and how much time each module spends handling frames.
+#
+# It is enabled by adding <benchmark type="boolean">True</benchmark> to
+# the hardware XML file. The report is printed and logged at the end of
+# each film. This is most useful with the none camera (noneCameraControl)
+# which can be configured to run at up to 1000fps.
+#
+# Hazen 10/15
+#
+
+import time
+
+import sc_library.hdebug as hdebug
+
+
+## FrameBenchmark
+#
+# Keeps track of the frame rate and the time spent in each module.
+#
+class FrameBenchmark(object):
+
+    ## __init__
+    #
+    def __init__(self):
+        self.frame_time = None
+        self.frames = 0
+        self.module_names = []
+        self.module_times = {}
+        self.start_time = None
+        self.stop_time = None
+
+    ## addModuleTime
+    #
+    # @param module_name The name of the module.
+    # @param elapsed The time (in seconds) the module spent on the frame(s).
+    #
+    def addModuleTime(self, module_name, elapsed):
+        if not (module_name in self.module_times):
+            self.module_names.append(module_name)
+            self.module_times[module_name] = 0.0
+        self.module_times[module_name] += elapsed
+
+    ## getReport
+    #
+    # @return A string containing the benchmark results.
+    #
+    def getReport(self):
+        if (self.start_time is None) or (self.frames == 0):
+            return "Benchmark: no frames."
+
+        stop_time = self.stop_time
+        if stop_time is None:
+            stop_time = time.time()
+        elapsed = stop_time - self.start_time
+
+        report = "Benchmark: {0:d} frames in {1:.2f} seconds ({2:.1f} fps)".format(self.frames,
+                                                                                 elapsed,
+                                                                                 float(self.frames)/elapsed)
+        if self.frame_time is not None:
+            expected = int(elapsed/self.frame_time)
+            report += ", camera {0:.1f} fps, {1:d} frames dropped".format(1.0/self.frame_time,
+                                                                         max(0, expected - self.frames))
+        report += "\n"
+
+        total = 0.0
+        for name in self.module_names:
+            total += self.module_times[name]
+        for name in self.module_names:
+            module_time = self.module_times[name]
+            report += "  {0:30s} {1:8.3f} ms/frame {2:6.1f}%\n".format(name,
+                                                                       1000.0 * module_time/float(self.frames),
+                                                                       100.0 * module_time/elapsed)
+        report += "  {0:30s} {1:8.3f} ms/frame {2:6.1f}%".format("total",
+                                                                 1000.0 * total/float(self.frames),
+                                                                 100.0 * total/elapsed)
+        return report
+
+    ## newFrames
+    #
+    # Called when frames arrive from the camera.
+    #
+    # @param n_frames The number of new frames.
+    #
+    def newFrames(self, n_frames):
+        self.frames += n_frames
+
+    ## report
+    #
+    # Print and log the benchmark results.
+    #
+    def report(self):
+        report = self.getReport()
+        print report
+        hdebug.logText(report)
+
+    ## start
+    #
+    # Reset for a new film.
+    #
+    # @param frame_time The time between frames (in seconds) according to the camera.
+    #
+    def start(self, frame_time = None):
+        self.__init__()
+        self.frame_time = frame_time
+        self.start_time = time.time()
+
+    ## stop
+    #
+    # Stop the clock.
+    #
+    def stop(self):
+        self.stop_time = time.time()
+
+
+## timeModule
+#
+# Time how long it takes a module to do something.
+#
+# @param benchmark A FrameBenchmark object, or None.
+# @param module_name The name of the module.
+# @param fn The function to call.
+# @param args The arguments to the function.
+#
+def timeModule(benchmark, module_name, fn, *args):
+    if benchmark is None:
+        fn(*args)
+    else:
+        start_time = time.time()
+        fn(*args)
+        benchmark.addModuleTime(module_name, time.time() - start_time)
+
+
+#
+# The MIT License
+#
+# Copyright (c) 2015 Zhuang Lab, Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
@@ -9,9 +9,12 @@
 
 import copy
 import datetime
+import numpy
+import os
 import struct
 import tiffwriter
 
+import sc_library.chunkedmovie as chunkedmovie
 import sc_library.hgit as hgit
 import sc_library.parameters as params
 
@@ -28,9 +31,9 @@ software_version = hgit.getVersion()
 #
 def availableFileFormats(ui_mode):
     if (ui_mode == "dual"):
-        return [".dax", ".dcf", ".spe", ".tif"]
+        return [".dax", ".dcf", ".spe", ".tif", ".zax"]
     else:
-        return [".dax", ".spe", ".tif"]
+        return [".dax", ".spe", ".tif", ".zax"]
 
 ## createFileWriter
 #
@@ -53,6 +56,8 @@ def createFileWriter(filetype, filename, parameters, cameras):
         return SPEFile(filename, parameters, cameras)
     elif (filetype == ".tif"):
         return TIFFile(filename, parameters, cameras)
+    elif (filetype == ".zax"):
+        return ZaxFile(filename, parameters, cameras)
     else:
         print "Unknown output file format, defaulting to .dax"
         return DaxFile(filename, parameters, cameras)
@@ -247,6 +252,17 @@ class GenericFile:
 
         self.is_open = False
 
+    ## getDiskUsage()
+    #
+    # @return The size of the film files on the disk in mega-bytes.
+    #
+    def getDiskUsage(self):
+        total_size = 0.0
+        for filename in self.filenames:
+            if os.path.exists(filename):
+                total_size += os.path.getsize(filename) * 1.0/2**20
+        return total_size
+
     ## getFilmLength()
     #
     # @return The film's length in number of frames (per camera).
@@ -275,6 +291,15 @@ class GenericFile:
     def getSpotCounts(self):
         return self.parameters.get("acquisition.spot_counts")
 
+    ## sync
+    #
+    # Flush everything that has been saved so far to the disk.
+    #
+    def sync(self):
+        for fp in self.file_ptrs:
+            fp.flush()
+            os.fsync(fp.fileno())
+
     ## totalFilmSize
     #
     # @return The total size of the film taken so far in mega-bytes.    
@@ -492,6 +517,92 @@ class TIFFile(GenericFile):
             writer.close()
         GenericFile.closeFile(self)
 
+    ## sync
+    #
+    # Flush everything that has been saved so far to the disk.
+    #
+    def sync(self):
+        for writer in self.tif_writers:
+            writer.fp.flush()
+            os.fsync(writer.fp.fileno())
+
+
+## ZaxFile
+#
+# Compressed dax file writing class. The frames are saved in chunks
+# that are compressed on a pool of threads, see sc_library/chunkedmovie.py
+# for the details of the format.
+#
+class ZaxFile(GenericFile):
+
+    ## __init__
+    #
+    # @param filename The name of the movie file (without an extension).
+    # @param parameters A parameters object.
+    # @param cameras A python array of camera names, e.g. ["camera1"].
+    # @param chunk_frames (Optional) The number of frames in a chunk, defaults to 16.
+    #
+    def __init__(self, filename, parameters, cameras, chunk_frames = 16):
+        GenericFile.__init__(self, filename, parameters, cameras, "zax")
+
+        self.chunk_frames = chunk_frames
+        self.chunk_writers = []
+        self.chunks = []
+        self.frame_sizes = []
+        for i in range(len(self.file_ptrs)):
+            [x_pixels, y_pixels] = getCameraSize(parameters, self.feed_names[i])
+            self.chunk_writers.append(chunkedmovie.ChunkWriter(self.file_ptrs[i], x_pixels, y_pixels, chunk_frames = chunk_frames))
+            self.chunks.append(None)
+            self.frame_sizes.append(x_pixels * y_pixels)
+
+    ## closeFile
+    #
+    # Saves the last (partial) chunks, waits for the compression to finish,
+    # writes the chunk indexes and then closes the files.
+    #
+    def closeFile(self):
+        for i in range(len(self.chunk_writers)):
+            n_frames = self.number_frames[i] % self.chunk_frames
+            if (n_frames > 0):
+                self.chunk_writers[i].addChunk(self.chunks[i][:n_frames * self.frame_sizes[i]], n_frames)
+            self.chunk_writers[i].close()
+
+        GenericFile.closeFile(self)
+
+    ## sync
+    #
+    # Flush the chunks that have been compressed so far to the disk.
+    #
+    def sync(self):
+        for chunk_writer in self.chunk_writers:
+            chunk_writer.sync()
+
+    ## saveFrame
+    #
+    # The frame is copied into the current chunk, which is handed off to
+    # the compression threads once it is full.
+    #
+    # @param frame A frame object.
+    #
+    def saveFrame(self, frame):
+        if frame.which_camera in self.feed_names:
+            index = self.feed_names.index(frame.which_camera)
+            frame_size = self.frame_sizes[index]
+            if self.chunks[index] is None:
+                self.chunks[index] = numpy.empty(self.chunk_frames * frame_size, dtype = numpy.uint16)
+
+            i = self.number_frames[index] % self.chunk_frames
+            np_data = self.chunks[index][i * frame_size:(i + 1) * frame_size]
+            np_data[:] = frame.getData()
+            if self.parameters.get("film.want_big_endian"):
+                np_data.byteswap(True)
+            self.number_frames[index] += 1
+
+            if (i == (self.chunk_frames - 1)):
+                self.chunk_writers[index].addChunk(self.chunks[index], self.chunk_frames)
+                self.chunks[index] = None
+
+
 #
 # Testing
 # 
@@ -7,6 +7,7 @@
 # Hazen 04/14
 #
 
+import numpy
 from PyQt4 import QtCore
 
 import illumination.illuminationChannelUI as illuminationChannelUI
@@ -39,6 +40,7 @@ class Channel(QtCore.QObject):
         self.min_amplitude = 0.0
         self.name = channel.description
         self.parameters = False
+        self.scheduled = False
         self.shutter_data = []
         self.used_for_film = False
         self.was_on = False
@@ -208,7 +210,9 @@ class Channel(QtCore.QObject):
         self.parameters.get("default_power")[self.channel_id] = power
         self.channel_ui.updatePowerText(power_string)
 
-        if self.amplitude_modulation:
+        # While the hardware is following a power progression it sets
+        # the amplitude itself, the UI only displays it.
+        if self.amplitude_modulation and not self.scheduled:
             self.amplitude_modulation.setAmplitude(self.channel_id, new_power)
 
         if (self.channel_ui.isOn()):
@@ -337,6 +341,31 @@ class Channel(QtCore.QObject):
                 
         self.filming = True
 
+    ## startSchedule
+    #
+    # Have the hardware follow a power progression, if it can (i.e. it
+    # is buffered). Otherwise the progression only changes the power
+    # through the UI.
+    #
+    # @param frames A numpy array of the frames at which the power changes.
+    # @param powers A numpy array of the powers (0.0 - 1.0) at these frames.
+    # @param seconds_per_frame How many seconds it takes to acquire each frame.
+    #
+    def startSchedule(self, frames, powers, seconds_per_frame):
+        if self.bad_module or (not self.amplitude_modulation) or (not self.amplitude_modulation.isBuffered()):
+            return
+
+        # Convert to amplitudes, as the UI slider would.
+        amplitudes = numpy.round(powers * self.amplitude_range + self.min_amplitude).astype(numpy.int64)
+        amplitudes = numpy.clip(amplitudes, self.min_amplitude, self.max_amplitude)
+        changes = numpy.ones(amplitudes.size, dtype = numpy.bool)
+        changes[1:] = (amplitudes[1:] != amplitudes[:-1])
+        self.amplitude_modulation.startSchedule(self.channel_id,
+                                                frames[changes],
+                                                amplitudes[changes],
+                                                seconds_per_frame)
+        self.scheduled = True
+
     ## startLiveView
     #
     # Configure illumination for live view
@@ -364,6 +393,15 @@ class Channel(QtCore.QObject):
             self.channel_ui.stopFilm()
             self.channel_ui.setOnOff(self.was_on)
 
+    ## stopSchedule
+    #
+    # Stop following a power progression.
+    #
+    def stopSchedule(self):
+        if self.scheduled:
+            self.amplitude_modulation.stopSchedule(self.channel_id)
+            self.scheduled = False
+
     ## stopLiveView
     #
     # Cleanup illumination settings at the end of the live view
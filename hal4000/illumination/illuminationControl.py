@@ -169,11 +169,25 @@ class IlluminationControl(QtGui.QDialog, halModule.HalModule):
         for signal in signals:
             if (signal[1] == "setPower"):
                 signal[2].connect(self.remoteSetPower)
+            elif (signal[1] == "progressionSchedule"):
+                signal[2].connect(self.handleProgressionSchedule)
             elif (signal[1] == "incPower"):
                 signal[2].connect(self.remoteIncPower)
             elif (signal[1] == "commMessage"):
                 signal[2].connect(self.handleCommMessage)
 
+    ## getCommandLatencies
+    #
+    # @return A dictionary of the average command latency (in seconds) of the hardware modules that measure it, keyed by module name.
+    #
+    def getCommandLatencies(self):
+        latencies = {}
+        for name, instance in self.hardware_modules.iteritems():
+            latency = instance.getCommandLatency()
+            if latency is not None:
+                latencies[name] = latency
+        return latencies
+
     ## getSignals
     #
     # @return The signals this module provides.
@@ -204,6 +218,21 @@ class IlluminationControl(QtGui.QDialog, halModule.HalModule):
                                     message.getData("increment"))
             self.tcpMessage.emit(message)
 
+    ## handleProgressionSchedule
+    #
+    # Pass the power progression of the film to the channels. Channels
+    # that use buffered hardware will have the hardware follow the
+    # progression. This is called after startFilm.
+    #
+    # @param schedule A progressionControl.ProgressionSchedule object.
+    #
+    @hdebug.debug
+    def handleProgressionSchedule(self, schedule):
+        for i, channel in enumerate(self.channels):
+            if schedule.isActive(i):
+                [frames, powers] = schedule.getChannel(i)
+                channel.startSchedule(frames, powers, self.parameters.get("seconds_per_frame"))
+
     ## handleOk
     #
     # Hide the dialog box.
@@ -237,12 +266,19 @@ class IlluminationControl(QtGui.QDialog, halModule.HalModule):
     #
     # Handles new frames. If there is a open file and the frame
     # is a master frame then this calls QIlluminationControl's
-    # savePowers method.
+    # savePowers method. It also tells the buffered hardware modules
+    # which frame has been received, so that they can time any
+    # power progression that they are following.
     #
     # @param frame A camera.Frame object
     # @param filming True/False if we are currently filming.
     #
     def newFrame(self, frame, filming):
+        if filming and frame.master:
+            for name, instance in self.hardware_modules.iteritems():
+                if instance.isBuffered():
+                    instance.newFrame(frame.number)
+
         if self.fp and frame.master:
             str = "{0:d}".format(frame.number)
             for channel in self.channels:
@@ -398,6 +434,10 @@ class IlluminationControl(QtGui.QDialog, halModule.HalModule):
             self.fp.close()
             self.fp = False
 
+        # Stop any power progressions.
+        for channel in self.channels:
+            channel.stopSchedule()
+
         if self.running_shutters:
 
             # Stop hardware.
@@ -411,6 +451,15 @@ class IlluminationControl(QtGui.QDialog, halModule.HalModule):
 
             self.running_shutters = False
 
+        # Record how long the buffered hardware takes to act on commands.
+        latencies = self.getCommandLatencies()
+        if (len(latencies) > 0):
+            latency_string = ",".join(map(lambda x: "{0:s}:{1:.1f}".format(x[0], 1000.0 * x[1]), sorted(latencies.items())))
+            hdebug.logText("illumination command latency (ms) " + latency_string)
+            if film_writer:
+                film_writer.getParameters().add("acquisition.illumination_latency",
+                                                params.ParameterCustom("", "illumination_latency", latency_string, 1, False, True))
+
     ## updateSize
     #
     # Resize the dialog based on the size of the channels.
@@ -0,0 +1,270 @@
+#!/usr/bin/python
+#
+## @file
+#
+# A common interface to the different object finders so that the
+# spot counter (and the other analysis programs) can choose which
+# one to use. Each object finder also keeps track of how many
+# frames it has analyzed and how long that took.
+#
+# Hazen 10/15
+#
+
+import threading
+import time
+
+import objectFinder.lmmObjectFinder as lmmObjectFinder
+import objectFinder.logObjectFinder as logObjectFinder
+import objectFinder.medianObjectFinder as medianObjectFinder
+
+# The C libraries are loaded once, no matter how many finders are using them.
+lock = threading.Lock()
+users = {}
+
+
+## createFinder
+#
+# @param name The name of the object finder, one of finder_names.
+# @param parameters A parameters object (the "spotcounter" section).
+#
+# @return An ObjectFinder object.
+#
+def createFinder(name, parameters):
+    if not (name in finder_classes):
+        raise Exception("Unknown object finder " + name)
+    return finder_classes[name](parameters)
+
+
+## ObjectFinder
+#
+# The base class for the object finders. Sub-classes can override
+# find() if the object finder needs more than the threshold.
+#
+class ObjectFinder(object):
+
+    ## __init__
+    #
+    # @param name The name of the object finder.
+    # @param module The python module that interfaces with the C library.
+    # @param parameters A parameters object.
+    #
+    def __init__(self, name, module, parameters):
+        self.elapsed = 0.0
+        self.frames = 0
+        self.module = module
+        self.name = name
+        self.stats_lock = threading.Lock()
+        self.threshold = 0
+
+        lock.acquire()
+        if not (name in users):
+            users[name] = 0
+            module.initialize()
+        users[name] += 1
+        lock.release()
+
+        self.newParameters(parameters)
+
+    ## cleanup
+    #
+    # Called at shutdown. The C library is cleaned up when the last
+    # finder that is using it is cleaned up.
+    #
+    def cleanup(self):
+        lock.acquire()
+        if (self.name in users):
+            users[self.name] -= 1
+            if (users[self.name] == 0):
+                self.module.cleanup()
+                del users[self.name]
+        lock.release()
+
+    ## find
+    #
+    # Calls the findObjects() function of the module with the threshold.
+    #
+    # @param np_image The image as a numpy.uint16 array.
+    # @param image_x The size of the image in x in pixels.
+    # @param image_y The size of the image in y in pixels.
+    #
+    # @return [[peak x positions], [peak y positions], number of peaks].
+    #
+    def find(self, np_image, image_x, image_y):
+        return self.module.findObjects(np_image, image_x, image_y, self.threshold)
+
+    ## findObjects
+    #
+    # Find the objects in the image. This can be called from multiple threads.
+    #
+    # @param np_image The image as a numpy.uint16 array.
+    # @param image_x The size of the image in x in pixels.
+    # @param image_y The size of the image in y in pixels.
+    #
+    # @return [[peak x positions], [peak y positions], number of peaks].
+    #
+    def findObjects(self, np_image, image_x, image_y):
+        start_time = time.time()
+        result = self.find(np_image, image_x, image_y)
+        elapsed = time.time() - start_time
+
+        self.stats_lock.acquire()
+        self.elapsed += elapsed
+        self.frames += 1
+        self.stats_lock.release()
+        return result
+
+    ## getName
+    #
+    # @return The name of the object finder.
+    #
+    def getName(self):
+        return self.name
+
+    ## getThroughput
+    #
+    # @return [frames analyzed, frames per second (per thread)].
+    #
+    def getThroughput(self):
+        self.stats_lock.acquire()
+        frames = self.frames
+        elapsed = self.elapsed
+        self.stats_lock.release()
+        if (elapsed > 0.0):
+            return [frames, float(frames)/elapsed]
+        else:
+            return [frames, 0.0]
+
+    ## hasLocations
+    #
+    # @return True if the object finder returns the object locations as well as the counts.
+    #
+    def hasLocations(self):
+        return True
+
+    ## newParameters
+    #
+    # @param parameters A parameters object.
+    #
+    def newParameters(self, parameters):
+        self.threshold = parameters.get("threshold")
+
+    ## resetThroughput
+    #
+    # Reset the frame and time counters.
+    #
+    def resetThroughput(self):
+        self.stats_lock.acquire()
+        self.elapsed = 0.0
+        self.frames = 0
+        self.stats_lock.release()
+
+
+## LMMFinder
+#
+# Local maxima / first moment object finder.
+#
+class LMMFinder(ObjectFinder):
+
+    ## __init__
+    #
+    # @param parameters A parameters object.
+    #
+    def __init__(self, parameters):
+        ObjectFinder.__init__(self, "lmm", lmmObjectFinder, parameters)
+
+
+## LOGFinder
+#
+# Laplacian of Gaussian object counter.
+#
+class LOGFinder(ObjectFinder):
+
+    ## __init__
+    #
+    # @param parameters A parameters object.
+    #
+    def __init__(self, parameters):
+        ObjectFinder.__init__(self, "log", logObjectFinder, parameters)
+
+    ## hasLocations
+    #
+    # @return False.
+    #
+    def hasLocations(self):
+        return False
+
+    ## newParameters
+    #
+    # The filtered image has a very different scale from the camera image,
+    # so this object finder has its own threshold.
+    #
+    # @param parameters A parameters object.
+    #
+    def newParameters(self, parameters):
+        self.threshold = parameters.get("log_threshold", 20000)
+
+
+## MedianFinder
+#
+# Median background subtraction & threshold object finder.
+#
+class MedianFinder(ObjectFinder):
+
+    ## __init__
+    #
+    # @param parameters A parameters object.
+    #
+    def __init__(self, parameters):
+        self.cell_size = 32
+        ObjectFinder.__init__(self, "median", medianObjectFinder, parameters)
+
+    ## find
+    #
+    # @param np_image The image as a numpy.uint16 array.
+    # @param image_x The size of the image in x in pixels.
+    # @param image_y The size of the image in y in pixels.
+    #
+    # @return [[peak x positions], [peak y positions], number of peaks].
+    #
+    def find(self, np_image, image_x, image_y):
+        return self.module.findObjects(np_image, image_x, image_y, self.threshold, cell_size = self.cell_size)
+
+    ## newParameters
+    #
+    # @param parameters A parameters object.
+    #
+    def newParameters(self, parameters):
+        ObjectFinder.newParameters(self, parameters)
+        self.cell_size = parameters.get("cell_size", self.cell_size)
+
+
+finder_classes = {"lmm" : LMMFinder,
+                  "log" : LOGFinder,
+                  "median" : MedianFinder}
+
+finder_names = sorted(finder_classes.keys())
+
+
+#
+# The MIT License
+#
+# Copyright (c) 2015 Zhuang Lab, Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
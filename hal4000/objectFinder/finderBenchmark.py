@@ -0,0 +1,166 @@
+#!/usr/bin/python
+#
+## @file
+#
+# Benchmark for the object finders. Synthetic frames with a known
+# density of emitters are analyzed by each of the object finders
+# and the speed (frames per second) and recall (fraction of the
+# emitters that were found) is reported. The LOG finder does not
+# return locations and it counts pixels, not objects, so for it
+# only the ratio of the counts to the number of emitters is reported. This is useful for choosing
+# an object finder for a given labeling density.
+#
+# Usage:
+#   python finderBenchmark.py [frames per density] [image size]
+#
+# Hazen 10/15
+#
+
+# Add current storm-control directory to sys.path
+import imp
+imp.load_source("setPath", "../../sc_library/setPath.py")
+
+import numpy
+import sys
+
+try:
+    import objectFinder.finderBackends as finderBackends
+except ImportError:
+    sys.path.append("../")
+    import objectFinder.finderBackends as finderBackends
+
+import sc_library.parameters as params
+
+
+# Default object finder parameters.
+parameters = params.StormXMLObject([])
+parameters.set("cell_size", 32)
+parameters.set("log_threshold", 20000)
+parameters.set("threshold", 250)
+
+
+## findRecall
+#
+# @param x_true The true emitter x locations.
+# @param y_true The true emitter y locations.
+# @param x_found The x locations that the object finder found.
+# @param y_found The y locations that the object finder found.
+# @param max_distance (Optional) The maximum distance in pixels between a true and a found location, defaults to 1.5.
+#
+# @return The number of true emitters that have a found location within max_distance.
+#
+def findRecall(x_true, y_true, x_found, y_found, max_distance = 1.5):
+    if (x_found.size == 0) or (x_true.size == 0):
+        return 0
+    dx = x_true[:,None] - x_found[None,:]
+    dy = y_true[:,None] - y_found[None,:]
+    d2 = dx * dx + dy * dy
+    return int(numpy.sum(numpy.min(d2, axis = 1) < (max_distance * max_distance)))
+
+## syntheticFrame
+#
+# Creates a frame with gaussian emitters on a noisy background.
+#
+# @param image_x The size of the frame in x.
+# @param image_y The size of the frame in y.
+# @param n_emitters The number of emitters.
+# @param random_state A numpy.random.RandomState object.
+# @param background (Optional) The background level, defaults to 100.
+# @param height (Optional) The emitter peak height, defaults to 1000.
+# @param sigma (Optional) The emitter sigma in pixels, defaults to 1.3.
+#
+# @return [frame (as numpy.uint16), emitter x locations, emitter y locations]
+#
+def syntheticFrame(image_x, image_y, n_emitters, random_state, background = 100, height = 1000, sigma = 1.3):
+    image = background + numpy.sqrt(background) * random_state.normal(size = (image_y, image_x))
+
+    # Keep the emitters away from the edges, no finder can find these.
+    r = int(4 * sigma) + 1
+    edge = r + 1
+    x = random_state.uniform(edge, image_x - edge, n_emitters)
+    y = random_state.uniform(edge, image_y - edge, n_emitters)
+    [yy, xx] = numpy.mgrid[-r:r+1, -r:r+1]
+    for i in range(n_emitters):
+        ix = int(round(x[i]))
+        iy = int(round(y[i]))
+        dx = xx + ix - x[i]
+        dy = yy + iy - y[i]
+        image[iy-r:iy+r+1,ix-r:ix+r+1] += height * numpy.exp(-(dx * dx + dy * dy)/(2.0 * sigma * sigma))
+
+    image = numpy.clip(image, 0, 65535).astype(numpy.uint16)
+    return [image.flatten(), x, y]
+
+
+if (__name__ == "__main__"):
+
+    n_frames = 100
+    image_size = 256
+    if (len(sys.argv) > 1):
+        n_frames = int(sys.argv[1])
+    if (len(sys.argv) > 2):
+        image_size = int(sys.argv[2])
+
+    # Emitters per square micron for 160nm pixels.
+    densities = [0.05, 0.1, 0.2, 0.5, 1.0]
+    um2_per_frame = (image_size * 0.16) * (image_size * 0.16)
+
+    finders = []
+    for name in finderBackends.finder_names:
+        finders.append(finderBackends.createFinder(name, parameters))
+
+    print "{0:d} {1:d}x{1:d} frames per density".format(n_frames, image_size)
+    print "{0:>10s} {1:>10s} {2:>10s} {3:>10s} {4:>10s}".format("density", "finder", "FPS", "recall", "found")
+    for density in densities:
+        n_emitters = int(round(density * um2_per_frame))
+
+        # Create the frames, these are the same for every finder.
+        random_state = numpy.random.RandomState(1)
+        frames = []
+        for i in range(n_frames):
+            frames.append(syntheticFrame(image_size, image_size, n_emitters, random_state))
+
+        for finder in finders:
+            finder.resetThroughput()
+            found = 0
+            recalled = 0
+            for [image, x, y] in frames:
+                [x_found, y_found, spots] = finder.findObjects(image, image_size, image_size)
+                found += spots
+                if finder.hasLocations():
+                    recalled += findRecall(x, y, x_found[:spots], y_found[:spots])
+            [frames_analyzed, fps] = finder.getThroughput()
+
+            total = n_frames * n_emitters
+            if finder.hasLocations():
+                recall = "{0:.3f}".format(float(recalled)/float(total))
+            else:
+                recall = "-"
+            print "{0:10.2f} {1:>10s} {2:10.1f} {3:>10s} {4:10.3f}".format(density, finder.getName(), fps, recall, float(found)/float(total))
+
+    for finder in finders:
+        finder.cleanup()
+
+
+#
+# The MIT License
+#
+# Copyright (c) 2015 Zhuang Lab, Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
@@ -0,0 +1,136 @@
+#!/usr/bin/python
+#
+## @file
+#
+# Python interface to the LOGCounter object finder. This object finder
+# convolves the image with a Laplacian of Gaussian kernel and counts
+# the pixels where the result is above threshold.
+#
+# Note that this object finder only counts, it does not return the
+# object locations.
+#
+# Hazen 10/15
+#
+
+import ctypes
+import numpy
+from numpy.ctypeslib import ndpointer
+import os
+import sys
+
+kernel = None
+kernel_size = 0
+log_counter = False
+
+spot_size = 1.5
+
+## cleanup
+#
+# Called at program shutdown.
+#
+def cleanup():
+    global kernel
+    kernel = None
+
+## initialize
+#
+# Called at program start up to load the C library and create the kernel.
+#
+def initialize():
+    global kernel
+    global kernel_size
+    global log_counter
+
+    directory = os.path.dirname(__file__)
+    if (directory == ""):
+        directory = "./"
+    else:
+        directory += "/"
+
+    if (sys.platform == "win32"):
+        log_counter = ctypes.cdll.LoadLibrary(directory + "LOGCounter.dll")
+    else:
+        log_counter = ctypes.cdll.LoadLibrary(directory + "LOGCounter.so")
+
+    log_counter.kernelSize.argtypes = [ctypes.c_float]
+    log_counter.kernelSize.restype = ctypes.c_int
+    log_counter.createKernel.argtypes = [ndpointer(dtype=numpy.int32),
+                                         ctypes.c_float]
+    log_counter.countObjects.argtypes = [ndpointer(dtype=numpy.int16),
+                                         ndpointer(dtype=numpy.int32),
+                                         ctypes.c_int,
+                                         ctypes.c_int,
+                                         ctypes.c_int,
+                                         ctypes.c_int,
+                                         ctypes.c_int]
+    log_counter.countObjects.restype = ctypes.c_int
+
+    kernel_size = log_counter.kernelSize(spot_size)
+    kernel = numpy.zeros(kernel_size * kernel_size, dtype = numpy.int32)
+    log_counter.createKernel(kernel, spot_size)
+
+## findObjects
+#
+# Count the objects in the image.
+#
+# @param np_image The image as a numpy.uint16 array.
+# @param image_x The size of the image in x in pixels.
+# @param image_y The size of the image in y in pixels.
+# @param threshold The minimum value of the filtered image.
+#
+# @return [[], [], number of objects].
+#
+def findObjects(np_image, image_x, image_y, threshold):
+        np_image = numpy.ascontiguousarray(numpy.minimum(np_image, 32767), dtype = numpy.int16)
+        n = log_counter.countObjects(np_image,
+                                     kernel,
+                                     image_x,
+                                     image_y,
+                                     kernel_size,
+                                     threshold,
+                                     0)
+        return [numpy.zeros(0, dtype = numpy.float32), numpy.zeros(0, dtype = numpy.float32), n]
+
+
+# testing
+if __name__ == "__main__":
+
+    import time
+
+    initialize()
+
+    image_x = 1024
+    image_y = 1024
+    image = numpy.ones((image_x, image_y), dtype = numpy.uint16)
+
+    repeats = 10
+    start = time.time()
+    for i in range(repeats):
+        [x, y, n] = findObjects(image, image_x, image_y, 100)
+        print i, n
+    end = time.time()
+    print "Time to process an image: ", ((end - start)/repeats), " seconds"
+
+#
+# The MIT License
+#
+# Copyright (c) 2015 Zhuang Lab, Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
@@ -0,0 +1,146 @@
+#!/usr/bin/python
+#
+## @file
+#
+# Python interface to the MedianCounter object finder. This object finder
+# works by subtracting the median of each cell of the image, thresholding
+# and then finding the center of mass of the contiguous objects.
+#
+# Note that the maximum number of objects found per image is limited to 1000.
+#
+# Hazen 10/15
+#
+
+import ctypes
+import numpy
+from numpy.ctypeslib import ndpointer
+import os
+import sys
+
+median_counter = False
+
+max_locs = 1000
+
+## cleanup
+#
+# Called at program shutdown. This object finder does not allocate
+# anything in C, this is here for consistency with the other finders.
+#
+def cleanup():
+    pass
+
+## initialize
+#
+# Called at program start up to load the C library.
+#
+def initialize():
+    global median_counter
+
+    directory = os.path.dirname(__file__)
+    if (directory == ""):
+        directory = "./"
+    else:
+        directory += "/"
+
+    if (sys.platform == "win32"):
+        median_counter = ctypes.cdll.LoadLibrary(directory + "MedianCounter.dll")
+    else:
+        median_counter = ctypes.cdll.LoadLibrary(directory + "MedianCounter.so")
+
+    median_counter.number_and_loc_objects.argtypes = [ndpointer(dtype=numpy.int16),
+                                                      ctypes.c_int,
+                                                      ctypes.c_int,
+                                                      ctypes.c_int,
+                                                      ctypes.c_float,
+                                                      ndpointer(dtype=numpy.float32),
+                                                      ndpointer(dtype=numpy.float32),
+                                                      ctypes.c_void_p]
+
+## findObjects
+#
+# Find the objects in the image. The C code works on whole cells, so
+# the image is padded (with the edge values) to a multiple of the cell size.
+#
+# @param np_image The image as a numpy.uint16 array.
+# @param image_x The size of the image in x in pixels.
+# @param image_y The size of the image in y in pixels.
+# @param threshold The minimum height above the cell median for a pixel to be part of an object.
+# @param cell_size (Optional) The size of the cells for the median calculation, defaults to 32.
+#
+# @return [[peak x positions], [peak y positions], number of peaks].
+#
+def findObjects(np_image, image_x, image_y, threshold, cell_size = 32):
+        np_image = numpy.reshape(numpy.asarray(np_image, dtype = numpy.uint16), (image_y, image_x))
+        pad_x = (cell_size - (image_x % cell_size)) % cell_size
+        pad_y = (cell_size - (image_y % cell_size)) % cell_size
+        if (pad_x > 0) or (pad_y > 0):
+            np_image = numpy.pad(np_image, ((0, pad_y), (0, pad_x)), mode = "edge")
+
+        # The C code uses (signed) shorts.
+        np_image = numpy.ascontiguousarray(numpy.minimum(np_image, 32767), dtype = numpy.int16)
+
+        x = numpy.zeros((max_locs), dtype = numpy.float32)
+        y = numpy.zeros((max_locs), dtype = numpy.float32)
+        n = ctypes.c_int(max_locs)
+        median_counter.number_and_loc_objects(np_image,
+                                              image_x + pad_x,
+                                              image_y + pad_y,
+                                              cell_size,
+                                              threshold,
+                                              x,
+                                              y,
+                                              ctypes.byref(n))
+
+        # Remove objects in the padding.
+        if (pad_x > 0) or (pad_y > 0):
+            mask = (x[:n.value] < image_x) & (y[:n.value] < image_y)
+            n.value = int(numpy.sum(mask))
+            x[:n.value] = x[:mask.size][mask]
+            y[:n.value] = y[:mask.size][mask]
+
+        return [x, y, n.value]
+
+
+# testing
+if __name__ == "__main__":
+
+    import time
+
+    initialize()
+
+    image_x = 1024
+    image_y = 1024
+    image = numpy.ones((image_x, image_y), dtype = numpy.uint16)
+
+    repeats = 100
+    start = time.time()
+    for i in range(repeats):
+        [x, y, n] = findObjects(image, image_x, image_y, 100)
+        if ((i % 10) == 0):
+            print i, n
+    end = time.time()
+    print "Time to process an image: ", ((end - start)/repeats), " seconds"
+
+#
+# The MIT License
+#
+# Copyright (c) 2015 Zhuang Lab, Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
@@ -12,9 +12,16 @@
 # getting distracted by constantly having to adjust 
 # the laser powers.
 #
+# The progression is compiled into a ProgressionSchedule at the
+# start of the film. This is also sent to the illumination control
+# so that buffered illumination hardware can follow the progression
+# itself, independent of how busy the GUI is.
+#
 # Hazen 02/14
 #
 
+import math
+import numpy
 import os
 import sys
 from PyQt4 import QtCore, QtGui
@@ -29,6 +36,93 @@ import sc_library.hdebug as hdebug
 # UIs.
 import qtdesigner.progression_ui as progressionUi
 
+# Powers are not decreased below this value (the resolution of the spin boxes).
+min_power = 0.0001
+
+## makeSchedule
+#
+# Combine the progressions of the individual channels into a single schedule.
+#
+# @param active A list of True/False if the channel is part of the progression.
+# @param channel_frames A list of numpy arrays with the frames at which the channel power changes, starting with 0.
+# @param channel_powers A list of numpy arrays with the channel powers at these frames.
+#
+# @return A ProgressionSchedule object.
+#
+def makeSchedule(active, channel_frames, channel_powers):
+    frames = numpy.unique(numpy.concatenate(channel_frames))
+    powers = numpy.zeros((frames.size, len(active)))
+    for i in range(len(active)):
+        index = numpy.searchsorted(channel_frames[i], frames, side = "right") - 1
+        powers[:,i] = channel_powers[i][index]
+    return ProgressionSchedule(active, frames, powers)
+
+
+## ProgressionSchedule
+#
+# The power progression of a film. This only stores the frames at
+# which the power of at least one channel changes.
+#
+class ProgressionSchedule():
+
+    ## __init__
+    #
+    # @param active A list of True/False if the channel is part of the progression.
+    # @param frames A numpy array of the frames at which the powers change (increasing, starting with 0).
+    # @param powers A numpy array (frames x channels) of the channel powers at these frames.
+    #
+    def __init__(self, active, frames, powers):
+        self.active = active
+        self.frames = frames
+        self.index = 1
+        self.powers = powers
+
+        # Which channels change at each frame.
+        self.changed = numpy.zeros(powers.shape, dtype = numpy.bool)
+        self.changed[1:,:] = (powers[1:,:] != powers[:-1,:])
+        self.changed[:,numpy.logical_not(numpy.array(active, dtype = numpy.bool))] = False
+
+    ## getChannel
+    #
+    # @param channel The channel index.
+    #
+    # @return [frames, powers] for the frames at which the power of this channel changes.
+    #
+    def getChannel(self, channel):
+        mask = self.changed[:,channel].copy()
+        mask[0] = True
+        return [self.frames[mask], self.powers[mask,channel]]
+
+    ## getInitialPowers
+    #
+    # @return [active, powers] for the start of the film.
+    #
+    def getInitialPowers(self):
+        return [self.active, list(self.powers[0,:])]
+
+    ## isActive
+    #
+    # @param channel The channel index.
+    #
+    # @return True/False if the power of this channel changes during the film.
+    #
+    def isActive(self, channel):
+        return (channel < len(self.active)) and self.active[channel] and bool(numpy.any(self.changed[:,channel]))
+
+    ## newFrame
+    #
+    # @param frame_number The frame number of the current frame.
+    #
+    # @return A list of [channel, power] for the channels whose power has changed since the last call.
+    #
+    def newFrame(self, frame_number):
+        last = numpy.searchsorted(self.frames, frame_number, side = "right")
+        if (last <= self.index):
+            return []
+        changed = numpy.any(self.changed[self.index:last,:], axis = 0)
+        self.index = last
+        return map(lambda i: [i, float(self.powers[last-1,i])], numpy.nonzero(changed)[0])
+
 ## Channels
 #
 # Channels class which is specialized for various
@@ -48,21 +142,14 @@ class Channels():
         self.height = 40
         self.powers = []
 
-    ## newFrame
-    #
-    # Called when we get a new frame from the camera.
-    #
-    # @param frame_number The frame number of the frame.
-    #
-    def newFrame(self, frame_number):
-        pass
-
     ## startFilm
     #
     # Called at the start of a film.
     #
+    # @return A ProgressionSchedule object, or False.
+    #
     def startFilm(self):
-        pass
+        return False
 
     ## stopFilm
     #
@@ -140,6 +227,19 @@ class MathChannels(Channels):
 
         self.height = y
 
+    ## channelProgression
+    #
+    # This is specialized for the different types of progression.
+    #
+    # @param start The starting power.
+    # @param increment The increment setting.
+    # @param period The number of frames between increments.
+    #
+    # @return [frames, powers] at which the power of the channel changes.
+    #
+    def channelProgression(self, start, increment, period):
+        return [numpy.zeros(1, dtype = numpy.int64), numpy.array([start])]
+
     ## remoteSetChannel
     #
     # This is called by an external program to specify the
@@ -159,18 +259,27 @@ class MathChannels(Channels):
 
     ## startFilm
     #
-    # This is called when the filming starts. It returns the
-    # desired initial powers for the various channels.
+    # This is called when the filming starts. It compiles the
+    # progressions of all the channels into a schedule.
     #
-    # @return Returns an array of arrays containing the active channels and their initial powers.
+    # @return A ProgressionSchedule object.
     #
     def startFilm(self):
+        channel_frames = []
+        channel_powers = []
         for i, channel in enumerate(self.channels):
             self.which_checked[i] = False
             self.powers[i] = (float(channel[1].value()))
             if channel[0].isChecked():
                 self.which_checked[i] = True
-        return [self.which_checked, self.powers]
+                [frames, powers] = self.channelProgression(self.powers[i],
+                                                           float(channel[2].value()),
+                                                           channel[3].value())
+            else:
+                [frames, powers] = MathChannels.channelProgression(self, self.powers[i], 0.0, 1)
+            channel_frames.append(frames)
+            channel_powers.append(powers)
+        return makeSchedule(list(self.which_checked), channel_frames, channel_powers)
 
     ## stopFilm
     #
@@ -203,26 +312,23 @@ class LinearChannels(MathChannels):
         for channel in self.channels:
             channel[2].setMaximum(1.0)
 
-    ## newFrame
+    ## channelProgression
     #
-    # Called when we get a new frame from the camera. Returns the which
-    # channels (if any) need to have their power adjusted.
+    # The power is increased by increment every period frames
+    # until it reaches 1.0.
     #
-    # @param frame_number The frame number of the current frame.
+    # @param start The starting power.
+    # @param increment The amount to increase the power by.
+    # @param period The number of frames between increments.
     #
-    # @return Returns an array of arrays containing the active channels and how much to increment their power by.
+    # @return [frames, powers] at which the power of the channel changes.
     #
-    def newFrame(self, frame_number):
-        active = []
-        increment = []
-        for i, channel in enumerate(self.channels):
-            if self.which_checked[i] and ((frame_number % channel[3].value()) == 0):
-                active.append(True)
-                increment.append(float(channel[2].value()))
-            else:
-                active.append(False)
-                increment.append(float(channel[2].value()))
-        return [active, increment]
+    def channelProgression(self, start, increment, period):
+        steps = 0
+        if (increment > 0.0):
+            steps = max(int(math.ceil((1.0 - start)/increment)), 0)
+        k = numpy.arange(steps + 1)
+        return [k * period, numpy.clip(start + k * increment, 0.0, 1.0)]
 
 ## ExponentialChannels
 #
@@ -246,29 +352,27 @@ class ExponentialChannels(MathChannels):
             channel[2].setValue(1.05)
             channel[2].setMaximum(9.9)
 
-    ## newFrame
+    ## channelProgression
     #
-    # Called when we get a new frame from the camera. Returns the which
-    # channels (if any) need to have their power adjusted.
+    # The power is multiplied by factor every period frames until
+    # it reaches 1.0 (or min_power if factor is less than 1.0).
     #
-    # @param frame_number The frame number of the current frame.
+    # @param start The starting power.
+    # @param factor The amount to multiply the power by.
+    # @param period The number of frames between increments.
     #
-    # @return Returns an array of arrays containing the active channels and how much to increment their power by.
+    # @return [frames, powers] at which the power of the channel changes.
     #
-    def newFrame(self, frame_number):
-        active = []
-        increment = []
-        for i, channel in enumerate(self.channels):
-            if self.which_checked[i] and ((frame_number % channel[3].value()) == 0):
-                active.append(True)
-                new_power = float(channel[2].value()) * self.powers[i]
-                inc = new_power - self.powers[i]
-                increment.append(inc)
-                self.powers[i] = new_power
+    def channelProgression(self, start, factor, period):
+        steps = 0
+        if (start > 0.0) and (factor > 0.0) and (factor != 1.0):
+            if (factor > 1.0):
+                steps = int(math.ceil(math.log(1.0/start)/math.log(factor)))
             else:
-                active.append(False)
-                increment.append(float(channel[2].value()))
-        return [active, increment]
+                steps = int(math.floor(math.log(min_power/start)/math.log(factor)))
+            steps = max(steps, 0)
+        k = numpy.arange(steps + 1)
+        return [k * period, numpy.clip(start * factor ** k, 0.0, 1.0)]
 
 ## FileChannels
 #
@@ -284,92 +388,44 @@ class FileChannels(Channels):
     def __init__(self, parent):
         Channels.__init__(self, parent)
         self.active = []
+        self.schedule = False
         self.start_powers = []
-        self.file_ptr = False
-
-    ## getNextPowers
-    #
-    # Read and parse the next line of the powers file, or False 
-    # if we have reached the end of the file.
-    #
-    # @return Return an array containing the powers, or False.
-    #
-    def getNextPowers(self):
-        line = self.file_ptr.readline()
-        powers = False
-        if line:
-            powers = []
-            powers_text = line.split(" ")[1:]
-            for i in range(len(powers_text)):
-                powers.append(float(powers_text[i]))
-        return powers
 
     ## newFile
     #
-    # Open a powers file & read the first line to get the initial
-    # power values.
+    # Load a powers file. The first line is the header, the lines
+    # after this are the frame number and the power of each channel
+    # for frames 0, 1, 2, etc. Only the frames at which a power
+    # changes are kept.
+    #
+    # @param filename The name of the powers file.
     #
     def newFile(self, filename):
+        self.active = []
+        self.schedule = False
+        self.start_powers = []
         if os.path.exists(filename):
-            self.file_ptr = open(filename, "r")
-            self.file_ptr.readline()
-            self.active = []
-            self.start_powers = []
-            powers = self.getNextPowers()
-            if powers:
-                for power in powers:
-                    self.active.append(True)
-                    self.powers.append(power)
-                    self.start_powers.append(power)
-        else:
-            self.file_ptr = False
-
-    ## newFrame
-    #
-    # Called when we get a new frame from the camera. Returns the which
-    # channels (if any) need to have their power adjusted.
-    #
-    # @param frame_number The frame number of the current frame.
-    #
-    # @return Returns an array of arrays containing the active channels and how much to increment their power by.
-    #
-    def newFrame(self, frame_number):
-        if self.file_ptr:
-            powers = self.getNextPowers()
-            active = []
-            increment = []
-            if powers:
-                for i in range(len(powers)):
-                    if powers[i] != self.powers[i]:
-                        active.append(True)
-                        increment.append(powers[i] - self.powers[i])
-                        self.powers[i] = powers[i]
-                    else:
-                        active.append(False)
-                        increment.append(False)
-            return [active, increment]
-        else:
-            return [[], []]
+            data = numpy.loadtxt(filename, skiprows = 1, ndmin = 2)
+            if (data.shape[0] > 0):
+                powers = data[:,1:]
+                changes = numpy.ones(powers.shape[0], dtype = numpy.bool)
+                changes[1:] = numpy.any(powers[1:,:] != powers[:-1,:], axis = 1)
+                self.active = [True] * powers.shape[1]
+                self.start_powers = list(powers[0,:])
+                self.schedule = ProgressionSchedule(self.active,
+                                                    numpy.nonzero(changes)[0],
+                                                    powers[changes,:])
 
     ## startFilm
     #
-    # This is called when the filming starts. It returns the
-    # desired initial powers for the various channels. It also
-    # rewinds the file pointer to beginning of the powers file.
+    # This is called when the filming starts.
     #
-    # @return Returns an array of arrays containing the active channels and their initial powers.
+    # @return A ProgressionSchedule object, or False if there is no powers file.
     #
     def startFilm(self):
-        if self.file_ptr:
-            # reset file ptr
-            self.file_ptr.seek(0)
-            self.file_ptr.readline()
-            # reset internal power record
-            for i in range(len(self.start_powers)):
-                self.powers[i] = self.start_powers[i]
-            return [self.active, self.start_powers]
-        else:
-            return [[], []]
+        if self.schedule:
+            self.schedule.index = 1
+        return self.schedule
 
     ## stopFilm
     #
@@ -377,10 +433,7 @@ class FileChannels(Channels):
     # to their initial values.
     #
     def stopFilm(self):
-        if self.file_ptr:
-            return [self.active, self.start_powers]
-        else:
-            return [[], []]
+        return [self.active, self.start_powers]
 
 
 ## ProgressionControl
@@ -388,7 +441,7 @@ class FileChannels(Channels):
 # Progression control dialog box
 #
 class ProgressionControl(QtGui.QDialog, halModule.HalModule):
-    incPower = QtCore.pyqtSignal(int, float)
+    newSchedule = QtCore.pyqtSignal(object)
     setPower = QtCore.pyqtSignal(int, float)
     tcpComplete = QtCore.pyqtSignal(object)
     
@@ -410,6 +463,7 @@ class ProgressionControl(QtGui.QDialog, halModule.HalModule):
         self.linear_channels = False
         self.file_channels = False
         self.parameters = parameters
+        self.schedule = False
         self.use_was_checked = False
         self.which_checked = []
 
@@ -552,7 +606,7 @@ class ProgressionControl(QtGui.QDialog, halModule.HalModule):
     #
     @hdebug.debug
     def getSignals(self):
-        return [[self.hal_type, "incPower", self.incPower],
+        return [[self.hal_type, "progressionSchedule", self.newSchedule],
                 [self.hal_type, "setPower", self.setPower],
                 [self.hal_type, "tcpComplete", self.tcpComplete]]
 
@@ -629,21 +683,18 @@ class ProgressionControl(QtGui.QDialog, halModule.HalModule):
 
     ## newFrame
     #
-    # This is called when we get new frames from the camera. It
-    # calls the newFrame method of the active channels object.
-    # If this returns that power updates are necessary then it
-    # emits the appropriate progIncPower signals.
+    # This is called when we get new frames from the camera. If
+    # the schedule has power changes for this frame then it emits
+    # the appropriate setPower signals. These keep the illumination
+    # UI (and the recorded powers) in step with the progression.
     #
     # @param frame The current frame object.
     # @param filming True/False if we are currently filming.
     #
     def newFrame(self, frame, filming):
-        if filming and self.channels and frame.master:
-            if (frame.number > 0):
-                [active, increment] = self.channels.newFrame(frame.number)
-                for i in range(len(active)):
-                    if active[i]:
-                        self.incPower.emit(int(i), increment[i])
+        if filming and self.schedule and frame.master:
+            for [channel, power] in self.schedule.newFrame(frame.number):
+                self.setPower.emit(int(channel), power)
 
     ## newParameters
     #
@@ -693,21 +744,23 @@ class ProgressionControl(QtGui.QDialog, halModule.HalModule):
     def setInitialPower(self, active, power):
         for i in range(len(active)):
             if active[i]:
-                self.setPower.emit(int(i), power[i])
+                self.setPower.emit(int(i), float(power[i]))
 
     ## startFilm
     #
     # Called at the start of filming. If the progression dialog is
     # open and the use progressions check box is checked it figures 
     # out which tab is visible to determine which is the active channel
-    # object. Then it sets the intial powers as specified by the
-    # active channel.
+    # object. Then it compiles the schedule of the active channel
+    # object, sets the intial powers and sends the schedule to
+    # the illumination control.
     #
     # @param film_name The name of the film without any extensions, or False if the film is not being saved.
     # @param run_shutters True/False the shutters should be run or not.
     #
     def startFilm(self, film_name, run_shutters):
         self.channels = False
+        self.schedule = False
         if (self.isVisible() and self.parameters.get("progressions.use_progressions")):
             # determine which tab is active.
             if self.ui.linearTab.isVisible():
@@ -716,8 +769,11 @@ class ProgressionControl(QtGui.QDialog, halModule.HalModule):
                 self.channels = self.exp_channels
             elif self.ui.fileTab.isVisible():
                 self.channels = self.file_channels
-            [active, power] = self.channels.startFilm()
-            self.setInitialPower(active, power)
+            self.schedule = self.channels.startFilm()
+            if self.schedule:
+                [active, power] = self.schedule.getInitialPowers()
+                self.setInitialPower(active, power)
+                self.newSchedule.emit(self.schedule)
 
     ## stopFilm
     #
@@ -727,6 +783,7 @@ class ProgressionControl(QtGui.QDialog, halModule.HalModule):
     # @param film_writer The film writer object.
     #
     def stopFilm(self, film_writer):
+        self.schedule = False
         if self.channels:
             [active, power] = self.channels.stopFilm()
             self.setInitialPower(active, power)
@@ -52,6 +52,15 @@ class QCameraWidget(QtGui.QWidget):
         self.flip_vertical = parameters.get("flip_vertical")
         self.transpose = parameters.get("transpose")
 
+        # The histogram of the current frame is filled in by rescaleImage(). The
+        # auto-scale range comes from an exponential moving average of these
+        # histograms so that it does not jump around from frame to frame.
+        self.histogram = numpy.zeros(c_image.histogramSize(), dtype = numpy.int32)
+        self.histogram_average = None
+        self.histogram_decay = parameters.get("histogram_decay", 0.8)
+        self.histogram_percentiles = [parameters.get("autoscale_low", 0.1),
+                                      parameters.get("autoscale_high", 99.9)]
+
         self.image = False
         self.image_min = 0
         self.image_max = 1
@@ -135,13 +144,30 @@ class QCameraWidget(QtGui.QWidget):
     ## getAutoScale
     #
     # This returns the minimum and maximum values to use for automatically
-    # re-scaling the image based on the most recent camera data.
+    # re-scaling the image based on the recent camera data. These are the
+    # low and high percentiles of the averaged histogram.
     #
     # @return [camera data value to use as zero, camera data value to use as 255]
     #
     def getAutoScale(self):
-        margin = int(0.1 * float(self.image_max - self.image_min))
-        return [self.image_min - margin, self.image_max + margin]
+        if self.histogram_average is None:
+            margin = int(0.1 * float(self.image_max - self.image_min))
+            return [self.image_min - margin, self.image_max + margin]
+
+        cumulative = numpy.cumsum(self.histogram_average)
+        total = cumulative[-1]
+        [low, high] = numpy.searchsorted(cumulative,
+                                         [0.01 * self.histogram_percentiles[0] * total,
+                                          0.01 * self.histogram_percentiles[1] * total])
+        margin = int(0.1 * float(high - low))
+        return [int(low) - margin, int(high) + margin + 1]
+
+    ## getHistogram
+    #
+    # @return The exponential moving average of the image histograms (numpy.float64), or None if no images have been displayed.
+    #
+    def getHistogram(self):
+        return self.histogram_average
 
     ## getEventLocation
     #
@@ -276,6 +302,9 @@ class QCameraWidget(QtGui.QWidget):
         self.transpose = parameters.get("transpose")
         self.drag_multiplier = parameters.get("drag_multiplier", 1.0)
         self.max_intensity = parameters.get("max_intensity")
+        self.histogram_decay = parameters.get("histogram_decay", 0.8)
+        self.histogram_percentiles = [parameters.get("autoscale_low", 0.1),
+                                      parameters.get("autoscale_high", 99.9)]
 
         if "_sat.ctbl" in parameters.get("colortable"):
             self.display_saturated_pixels = True
@@ -296,6 +325,7 @@ class QCameraWidget(QtGui.QWidget):
     def newSize(self, new_size):
         self.x_size = new_size[0]
         self.y_size = new_size[1]
+        self.histogram_average = None
         self.calcFinalSize()
 
     ## paintEvent
@@ -409,6 +439,17 @@ class QCameraWidget(QtGui.QWidget):
         else:
             self.show_target = False
 
+    ## updateHistogram
+    #
+    # Add the histogram of the current frame to the moving average.
+    #
+    def updateHistogram(self):
+        if self.histogram_average is None:
+            self.histogram_average = self.histogram.astype(numpy.float64)
+        else:
+            self.histogram_average *= self.histogram_decay
+            self.histogram_average += (1.0 - self.histogram_decay) * self.histogram
+
     ## updateImageWithFrame
     #
     # This takes the image from the camera, scales it, resizes it and converts it
@@ -437,7 +478,9 @@ class QCameraWidget(QtGui.QWidget):
                                                                           self.flip_vertical,
                                                                           self.transpose,
                                                                           self.display_range,
-                                                                          max_intensity)
+                                                                          max_intensity,
+                                                                          histogram = self.histogram)
+            self.updateHistogram()
 
             # Create QImage & draw at final magnification.
             if self.transpose:
@@ -0,0 +1,113 @@
+#!/usr/bin/python
+#
+## @file
+#
+# Qt Widget for displaying the histogram of the camera image. This
+# is drawn on top of the camera display, so it is kept small and
+# (mostly) transparent.
+#
+# Hazen 10/15
+#
+
+from PyQt4 import QtCore, QtGui
+import numpy
+
+## QHistogram
+#
+# Draws the (log scaled) histogram of the camera image between 0 and
+# the maximum intensity, along with the current display range.
+#
+class QHistogram(QtGui.QWidget):
+
+    ## __init__
+    #
+    # @param parent (Optional) The PyQt parent of this object.
+    #
+    def __init__(self, parent = None):
+        QtGui.QWidget.__init__(self, parent)
+        self.setAttribute(QtCore.Qt.WA_TransparentForMouseEvents)
+
+        self.bins = None
+        self.display_range = [0, 1]
+        self.max_intensity = 1
+
+    ## newHistogram
+    #
+    # Re-bin the histogram to the width of the widget. Only the part
+    # of the histogram between 0 and the maximum intensity is shown.
+    #
+    # @param histogram A numpy array containing the number of pixels with each intensity value.
+    # @param display_range [minimum, maximum] of the display.
+    # @param max_intensity The maximum intensity value.
+    #
+    def newHistogram(self, histogram, display_range, max_intensity):
+        self.display_range = display_range
+        self.max_intensity = max(1, max_intensity)
+
+        if histogram is None:
+            self.bins = None
+        else:
+            n_bins = max(1, self.width() - 2)
+            edges = numpy.linspace(0, self.max_intensity + 1, n_bins + 1).astype(numpy.int64)
+            edges = numpy.unique(edges[:-1])
+            self.bins = numpy.log1p(numpy.add.reduceat(histogram[:self.max_intensity + 1], edges))
+            max_bin = numpy.max(self.bins)
+            if (max_bin > 0.0):
+                self.bins = self.bins/max_bin
+        self.update()
+
+    ## paintEvent
+    #
+    # @param event A PyQt paint event.
+    #
+    def paintEvent(self, event):
+        painter = QtGui.QPainter(self)
+        painter.fillRect(self.rect(), QtGui.QColor(0, 0, 0, 128))
+
+        if self.bins is None:
+            return
+
+        # Histogram.
+        height = self.height() - 2
+        x_scale = float(self.width() - 2)/float(self.bins.size)
+        polygon = QtGui.QPolygonF()
+        polygon.append(QtCore.QPointF(1.0, float(self.height() - 1)))
+        for i in range(self.bins.size):
+            y = float(self.height() - 1) - height * self.bins[i]
+            polygon.append(QtCore.QPointF(1.0 + i * x_scale, y))
+            polygon.append(QtCore.QPointF(1.0 + (i + 1) * x_scale, y))
+        polygon.append(QtCore.QPointF(float(self.width() - 1), float(self.height() - 1)))
+        painter.setPen(QtCore.Qt.NoPen)
+        painter.setBrush(QtGui.QColor(255, 255, 255, 160))
+        painter.drawPolygon(polygon)
+
+        # Display range.
+        painter.setPen(QtGui.QColor(255, 255, 0))
+        for value in self.display_range:
+            x = 1 + int((self.width() - 2) * float(value)/float(self.max_intensity))
+            painter.drawLine(x, 0, x, self.height())
+
+
+#
+# The MIT License
+#
+# Copyright (c) 2015 Zhuang Lab, Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
@@ -16,6 +16,8 @@ from PyQt4 import QtCore, QtGui
 import sys
 from xml.dom import minidom, Node
 
+import sc_hardware.baseClasses.commandThread as commandThread
+
 have_aotf = 1
 try:
     import crystalTechnologies.AOTF as AOTF
@@ -30,18 +32,6 @@ except:
     print "failed to load coherent.cube405"
     have_cube = 0
 
-#
-# Remove AOTF settings that apply to the current channel. This way
-# when you move the slider and generate 100 events only the last
-# one gets acted on, but pending events for other channels are not lost.
-#
-def removeChannelDuplicates(queue, channel):
-    final_queue = []
-    for item in queue:
-        if item[1] == channel: continue
-        final_queue.append(item)
-    return final_queue
-
 #
 # Channel settings object, created based on the XML descriptor file
 #
@@ -236,13 +226,10 @@ class QChannel():
 # through this thread to avoid two processes trying 
 # to talk to the laser at the same time.
 #
-class QCubeThread(QtCore.QThread):
+class QCubeThread(commandThread.CommandThread):
     def __init__(self, parent = None):
-        QtCore.QThread.__init__(self, parent)
-        self.buffer = []
-        self.buffer_mutex = QtCore.QMutex()
+        commandThread.CommandThread.__init__(self, parent)
         self.cube_mutex = QtCore.QMutex()
-        self.running = 1
 
         global have_cube
         if have_cube:
@@ -253,22 +240,8 @@ class QCubeThread(QtCore.QThread):
         else:
             self.cube = 0
 
-    def run(self):
-        while (self.running):
-            self.buffer_mutex.lock()
-            if len(self.buffer) > 0:
-                [on, amplitude] = self.buffer.pop()
-                self.buffer = []
-                self.buffer_mutex.unlock()
-                self.setAmplitude(on, amplitude)
-            else:
-                self.buffer_mutex.unlock()
-            self.msleep(10)
-
     def addRequest(self, on, amplitude):
-        self.buffer_mutex.lock()
-        self.buffer.append([on, amplitude])
-        self.buffer_mutex.unlock()
+        self.addCommand("cube", [on, amplitude])
 
     def analogModulationOff(self):
         self.cube_mutex.lock()
@@ -282,6 +255,11 @@ class QCubeThread(QtCore.QThread):
             self.cube.setExtControl(1)
         self.cube_mutex.unlock()
 
+    def handleCommands(self, commands):
+        if "cube" in commands:
+            [on, amplitude] = commands["cube"]
+            self.setAmplitude(on, amplitude)
+
     def setAmplitude(self, on, amplitude):
         self.cube_mutex.lock()
         if self.cube:
@@ -297,7 +275,7 @@ class QCubeThread(QtCore.QThread):
         self.cube_mutex.unlock()
 
     def stopThread(self):
-        self.running = 0
+        commandThread.CommandThread.stopThread(self)
         if self.cube:
             self.cube.shutDown()
 
@@ -306,21 +284,19 @@ class QCubeThread(QtCore.QThread):
 #
 # This "buffers" communication with the AOTF, which doesn't
 # respond very quickly to requests. It sends the most recent request
-# and discards any backlog of older requests. It is necessary to
-# keep the slider moving "smoothly" when the user tries to drag it
-# up and down w/ the AOTF on.
+# for each channel and discards any backlog of older requests. It is
+# necessary to keep the slider moving "smoothly" when the user tries
+# to drag it up and down w/ the AOTF on. The requests for different
+# channels are sent to the AOTF together.
 #
 # All communication with AOTF should go through this thread to avoid
 # two processes trying to talk to the AOTF at the same time.
 #
 
-class QAOTFThread(QtCore.QThread):
+class QAOTFThread(commandThread.CommandThread):
     def __init__(self, parent = None):
-        QtCore.QThread.__init__(self, parent)
-        self.buffer = []
-        self.buffer_mutex = QtCore.QMutex()
+        commandThread.CommandThread.__init__(self, parent)
         self.aotf_mutex = QtCore.QMutex()
-        self.running = 1
 
         # connect to the AOTF
         global have_aotf
@@ -331,22 +307,8 @@ class QAOTFThread(QtCore.QThread):
         else:
             self.aotf = 0
 
-    def run(self):
-        while (self.running):
-            self.buffer_mutex.lock()
-            if len(self.buffer) > 0:
-                [on, channel, amplitude] = self.buffer.pop()
-                self.buffer = removeChannelDuplicates(self.buffer, channel)
-                self.buffer_mutex.unlock()
-                self.setAmplitude(on, channel, amplitude)
-            else:
-                self.buffer_mutex.unlock()
-            self.msleep(10)
-
     def addRequest(self, on, channel, amplitude):
-        self.buffer_mutex.lock()
-        self.buffer.append([on, channel, amplitude])
-        self.buffer_mutex.unlock()
+        self.addCommand(channel, [on, amplitude])
 
     def analogModulationOff(self):
         self.aotf_mutex.lock()
@@ -369,6 +331,16 @@ class QAOTFThread(QtCore.QThread):
                 self.aotf.fskOff(channel)
         self.aotf_mutex.unlock()
 
+    def handleCommands(self, commands):
+        amplitudes = []
+        for channel in sorted(commands):
+            [on, amplitude] = commands[channel]
+            if on:
+                amplitudes.append([channel, amplitude])
+            else:
+                amplitudes.append([channel, 0])
+        self.setAmplitudes(amplitudes)
+
     def setAmplitude(self, on, channel, amplitude):
         self.aotf_mutex.lock()
         if self.aotf:
@@ -384,6 +356,16 @@ class QAOTFThread(QtCore.QThread):
                 print "\t", channel, 0
         self.aotf_mutex.unlock()
 
+    def setAmplitudes(self, amplitudes):
+        self.aotf_mutex.lock()
+        if self.aotf:
+            self.aotf.setAmplitudes(amplitudes)
+        else:
+            print "AOTF:"
+            for [channel, amplitude] in amplitudes:
+                print "\t", channel, amplitude
+        self.aotf_mutex.unlock()
+
     def setFrequencies(self, channel, frequencies):
         self.aotf_mutex.lock()
         if self.aotf:
@@ -397,10 +379,10 @@ class QAOTFThread(QtCore.QThread):
         self.aotf_mutex.unlock()
 
     def stopThread(self):
+        commandThread.CommandThread.stopThread(self)
         if self.aotf:
             self.aotf.shutDown()
             self.aotf = 0
-        self.running = 0
 
 
 # Power control widget
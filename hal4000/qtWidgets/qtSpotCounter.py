@@ -12,11 +12,11 @@ from PyQt4 import QtCore, QtGui
 
 
 try:
-    import objectFinder.lmmObjectFinder as lmmObjectFinder
+    import objectFinder.finderBackends as finderBackends
 except ImportError:
     import sys
     sys.path.append("../")
-    import objectFinder.lmmObjectFinder as lmmObjectFinder
+    import objectFinder.finderBackends as finderBackends
 
 
 ## QObjectCounterThread
@@ -28,39 +28,31 @@ class QObjectCounterThread(QtCore.QThread):
 
     ## __init__
     #
-    # @param parameters A parameters object.
     # @param index The index of the thread (an integer).
     # @param parent (Optional) The PyQt parent of this object.
     #
-    def __init__(self, parameters, index, parent = None):
+    def __init__(self, index, parent = None):
         QtCore.QThread.__init__(self, parent)
 
+        self.finder = False
         self.frame = False
         self.mutex = QtCore.QMutex()
         self.running = True
         self.thread_index = index
-        self.threshold = parameters.get("threshold")
 
     ## newImage
     #
     # A new image for this thread to analyze.
     #
     # @param frame A frame object.
+    # @param finder The finderBackends.ObjectFinder to use to analyze the frame.
     #
-    def newImage(self, frame):
+    def newImage(self, frame, finder):
         self.mutex.lock()
+        self.finder = finder
         self.frame = frame
         self.mutex.unlock()
 
-    ## newParameters
-    #
-    # @param parameters A parameters object.
-    #
-    def newParameters(self, parameters):
-        self.mutex.lock()
-        self.threshold = parameters.get("threshold")
-        self.mutex.unlock()
-
     ## run
     #
     # The thread loop.
@@ -69,10 +61,9 @@ class QObjectCounterThread(QtCore.QThread):
          while (self.running):
              self.mutex.lock()
              if self.frame:
-                 [x_locs, y_locs, spots] = lmmObjectFinder.findObjects(self.frame.getData(),
-                                                                       self.frame.image_x,
-                                                                       self.frame.image_y,
-                                                                       self.threshold)
+                 [x_locs, y_locs, spots] = self.finder.findObjects(self.frame.getData(),
+                                                                   self.frame.image_x,
+                                                                   self.frame.image_y)
                  self.imageProcessed.emit(self.thread_index,
                                           self.frame.which_camera,
                                           self.frame.number,
@@ -102,24 +93,28 @@ class QObjectCounter(QtGui.QWidget):
     ## __init__
     #
     # @param parameters A parameters object.
-    # @param number_threads The number of object finding threads to start.
+    # @param number_cameras (Optional) The number of cameras, defaults to 1.
+    # @param number_threads (Optional) The number of object finding threads to start, defaults to 16.
     # @param parent (Optional) The PyQt parent of this object.
     #
-    def __init__(self, parameters, number_threads = 16, parent = None):
+    def __init__(self, parameters, number_cameras = 1, number_threads = 16, parent = None):
         QtGui.QWidget.__init__(self, parent)
 
         self.dropped = 0
+        self.number_cameras = number_cameras
         self.number_threads = number_threads
         self.total = 0
 
-        # Initialize object finder.
-        lmmObjectFinder.initialize()
+        # Initialize object finders, one for each camera.
+        self.finders = {}
+        self.retired_finders = []
+        self.newParameters(parameters)
 
         # Initialize threads.
         self.idle = []
         self.threads = []
         for i in range(self.number_threads):
-            self.threads.append(QObjectCounterThread(parameters, i))
+            self.threads.append(QObjectCounterThread(i))
             self.idle.append(True)
             
         for thread in self.threads:
@@ -138,9 +133,13 @@ class QObjectCounter(QtGui.QWidget):
         if frame:
             i = 0
             not_found = True
+            if frame.which_camera in self.finders:
+                finder = self.finders[frame.which_camera]
+            else:
+                finder = self.finders["camera1"]
             while (i < self.number_threads) and not_found:
                 if self.idle[i]:
-                    self.threads[i].newImage(frame)
+                    self.threads[i].newImage(frame, finder)
                     self.idle[i] = False
                     not_found = False
                 i += 1
@@ -149,11 +148,22 @@ class QObjectCounter(QtGui.QWidget):
 
     ## newParameters
     #
+    # The object finder for each camera is specified by the cameraN_finder
+    # parameter. Object finders that are no longer used are not cleaned up
+    # until shutdown as a thread could still be using them.
+    #
     # @param parameters A parameters object.
     #
     def newParameters(self, parameters):
-        for thread in self.threads:
-            thread.newParameters(parameters)
+        for i in range(self.number_cameras):
+            camera = "camera" + str(i+1)
+            finder_name = parameters.get(camera + "_finder", "lmm")
+            if (camera in self.finders) and (self.finders[camera].getName() == finder_name):
+                self.finders[camera].newParameters(parameters)
+            else:
+                if (camera in self.finders):
+                    self.retired_finders.append(self.finders[camera])
+                self.finders[camera] = finderBackends.createFinder(finder_name, parameters)
 
     ## returnResults
     #
@@ -177,18 +187,24 @@ class QObjectCounter(QtGui.QWidget):
 
     ## shutDown
     #
-    # Call the cleanup function of the object finder C code.
     # Stop all the threads.
+    # Call the cleanup function of the object finders.
     # Print how many images were analyzed and how many were dropped.
     #
     def shutDown(self):
-        # Object finder cleanup.
-        lmmObjectFinder.cleanup()
-
         # Thread cleanup.
         for thread in self.threads:
             thread.stopThread()
             thread.wait()
+
+        # Object finder cleanup.
+        for camera in sorted(self.finders.keys()):
+            finder = self.finders[camera]
+            [frames, fps] = finder.getThroughput()
+            print "Spot counter", camera, finder.getName(), "analyzed", frames, "images at {0:.1f} images per second (per thread)".format(fps)
+            finder.cleanup()
+        for finder in self.retired_finders:
+            finder.cleanup()
         print "Spot counter dropped", self.dropped, "images out of", self.total, "total images"
 
 
@@ -37,6 +37,9 @@ class Ui_Dialog(object):
         self.okButton = QtGui.QPushButton(Dialog)
         self.okButton.setGeometry(QtCore.QRect(360, 290, 75, 24))
         self.okButton.setObjectName(_fromUtf8("okButton"))
+        self.stopButton = QtGui.QPushButton(Dialog)
+        self.stopButton.setGeometry(QtCore.QRect(360, 260, 75, 24))
+        self.stopButton.setObjectName(_fromUtf8("stopButton"))
         self.leftSButton = QtGui.QPushButton(Dialog)
         self.leftSButton.setGeometry(QtCore.QRect(136, 131, 52, 66))
         self.leftSButton.setText(_fromUtf8(""))
@@ -143,6 +146,7 @@ class Ui_Dialog(object):
     def retranslateUi(self, Dialog):
         Dialog.setWindowTitle(_translate("Dialog", "HAL-4000 Stage Control", None))
         self.okButton.setText(_translate("Dialog", "Ok", None))
+        self.stopButton.setText(_translate("Dialog", "Stop", None))
         self.posGroupBox.setTitle(_translate("Dialog", "Current Position", None))
         self.yposLabel.setText(_translate("Dialog", "Y (um):", None))
         self.xposLabel.setText(_translate("Dialog", "X (um):", None))
@@ -10,6 +10,7 @@
 # Hazen 08/13
 #
 
+import numpy
 import sys
 from PyQt4 import QtCore, QtGui
 import sip
@@ -25,6 +26,7 @@ import camera.feeds as feeds
 import sc_library.hdebug as hdebug
 
 # The module that actually does the analysis.
+import objectFinder.finderBackends as finderBackends
 import qtWidgets.qtSpotCounter as qtSpotCounter
 
 
@@ -152,7 +154,10 @@ class OfflineDriver(QtCore.QObject):
         
 ## QSpotGraph
 #
-# Spot Count Graphing Widget.
+# Spot Count Graphing Widget. The counts are stored in a ring buffer
+# (indexed by frame number) and the graph is drawn into a pixmap. When
+# a new count arrives only the part of the graph around that point is
+# redrawn.
 #
 class QSpotGraph(QtGui.QWidget):
 
@@ -168,6 +173,7 @@ class QSpotGraph(QtGui.QWidget):
     #
     def __init__(self, x_size, y_size, y_min, y_max, parent = None):
         QtGui.QWidget.__init__(self, parent)
+        self.buffer = QtGui.QPixmap(x_size, y_size)
         self.range = y_max - y_min
         self.x_size = x_size
         self.y_size = y_size
@@ -184,9 +190,8 @@ class QSpotGraph(QtGui.QWidget):
         if self.points_per_cycle > 1:
             self.cycle = self.x_scale * float(self.points_per_cycle)
 
-        self.data = []
-        for i in range(self.x_points):
-            self.data.append(0)
+        self.data = numpy.zeros(self.x_points)
+        self.redraw()
 
     ## changeYRange
     #
@@ -199,36 +204,22 @@ class QSpotGraph(QtGui.QWidget):
         if y_max:
             self.y_max = y_max
         self.range = self.y_max - self.y_min
+        self.redraw()
 
-    ## newColors
+    ## drawGraph
     #
-    # @param colors The colors to use for the points in the graph. This is based on the values specified in the shutter file.
-    # @param total_points The total number of points in x.
+    # Draws (part of) the graph into the pixmap.
     #
-    def newColors(self, colors, total_points):
-        self.colors = colors
-        self.points_per_cycle = len(colors)
-        self.x_points = total_points
-
-        self.x_scale = float(self.x_size)/float(self.x_points)
-        self.cycle = 0
-        if self.points_per_cycle > 1:
-            self.cycle = self.x_scale * float(self.points_per_cycle)
-
-        self.data = []
-        for i in range(self.x_points):
-            self.data.append(0)
-
-        self.update()
-
-    ## paintEvent
+    # @param first The index of the first point to draw.
+    # @param last The index of the last point to draw.
+    # @param clip_rect (Optional) A QRect to restrict the drawing to.
     #
-    # Redraw the graph.
-    #
-    # @param event A PyQt event object.
-    #
-    def paintEvent(self, event):
-        painter = QtGui.QPainter(self)
+    def drawGraph(self, first, last, clip_rect = None):
+        painter = QtGui.QPainter(self.buffer)
+        if clip_rect is not None:
+            painter.setClipRect(clip_rect)
+        first = max(first, 0)
+        last = min(last, self.x_points - 1)
 
         # Background
         color = QtGui.QColor(255, 255, 255)
@@ -254,53 +245,105 @@ class QSpotGraph(QtGui.QWidget):
                 painter.drawLine(0, iy, self.x_size, iy)
                 y += self.y_scale
 
-        if (len(self.data)>0):
-            # Lines
-            painter.setPen(QtGui.QColor(0, 0, 0))
-            x1 = int(self.x_scale * float(0))
-            y1 = self.y_size - int((self.data[0] - self.y_min)/self.range * float(self.y_size))
-            for i in range(len(self.data)-1):
-                x2 = int(self.x_scale * float(i+1))
-                y2 = self.y_size - int((self.data[i+1] - self.y_min)/self.range * float(self.y_size))
-                painter.drawLine(x1, y1, x2, y2)
-                x1 = x2
-                y1 = y2
-
-            # Points
-            for i in range(len(self.data)):
-                color = self.colors[i % self.points_per_cycle]
-                qtcolor = 0
-                if color:
-                    qtcolor = QtGui.QColor(color[0], color[1], color[2])
-                else:
-                    qtcolor = QtGui.QColor(255, 255, 255)
-                painter.setPen(QtGui.QColor(0, 0, 0))
-#                painter.setPen(QtGui.QPen(QtGui.QColor(0, 0, 0),0))
-                painter.setBrush(qtcolor)
-
-                x = int(self.x_scale * float(i))
-                y = self.y_size - int((self.data[i] - self.y_min)/self.range * float(self.y_size))
-                if y < 0:
-                    y = 0
-                if y > self.y_size:
-                    y = self.y_size
-                painter.drawEllipse(x - 2, y - 2, 4, 4)
+        # Lines
+        painter.setPen(QtGui.QColor(0, 0, 0))
+        for i in range(first, last):
+            painter.drawLine(self.xPosition(i), self.yPosition(i), self.xPosition(i+1), self.yPosition(i+1))
+
+        # Points
+        for i in range(first, last + 1):
+            color = self.colors[i % self.points_per_cycle]
+            if color:
+                qtcolor = QtGui.QColor(color[0], color[1], color[2])
+            else:
+                qtcolor = QtGui.QColor(255, 255, 255)
+            painter.setBrush(qtcolor)
+
+            y = min(max(self.yPosition(i), 0), self.y_size)
+            painter.drawEllipse(self.xPosition(i) - 2, y - 2, 4, 4)
+
+    ## newColors
+    #
+    # @param colors The colors to use for the points in the graph. This is based on the values specified in the shutter file.
+    # @param total_points The total number of points in x.
+    #
+    def newColors(self, colors, total_points):
+        self.colors = colors
+        self.points_per_cycle = len(colors)
+        self.x_points = total_points
+
+        self.x_scale = float(self.x_size)/float(self.x_points)
+        self.cycle = 0
+        if self.points_per_cycle > 1:
+            self.cycle = self.x_scale * float(self.points_per_cycle)
+
+        self.data = numpy.zeros(self.x_points)
+        self.redraw()
+
+    ## paintEvent
+    #
+    # Copy the graph to the display.
+    #
+    # @param event A PyQt event object.
+    #
+    def paintEvent(self, event):
+        painter = QtGui.QPainter(self)
+        painter.drawPixmap(event.rect(), self.buffer, event.rect())
+
+    ## redraw
+    #
+    # Redraw the entire graph.
+    #
+    def redraw(self):
+        self.drawGraph(0, self.x_points - 1)
+        self.update()
 
     ## updateGraph
     #
-    # Updates the graph given a frame number and the number of spots in the frame.
+    # Updates the graph given a frame number and the number of spots in the frame. Only
+    # the region between the previous and the next point is redrawn.
     #
     # @param frame_index The frame number.
     # @param spots The number of spots in the frame.
     #
     def updateGraph(self, frame_index, spots):
-        self.data[frame_index % self.x_points] = spots
-        self.update()
+        index = frame_index % self.x_points
+        self.data[index] = spots
+
+        x_start = self.xPosition(index - 1) - 3
+        x_stop = self.xPosition(index + 1) + 3
+        if (index == 0):
+            x_start = 0
+        if (index == (self.x_points - 1)):
+            x_stop = self.x_size
+        rect = QtCore.QRect(x_start, 0, x_stop - x_start, self.y_size + 1)
+        self.drawGraph(index - 2, index + 2, clip_rect = rect)
+        self.update(rect)
+
+    ## xPosition
+    #
+    # @param index The index of a point.
+    #
+    # @return The x position of the point in the graph.
+    #
+    def xPosition(self, index):
+        return int(self.x_scale * float(index))
+
+    ## yPosition
+    #
+    # @param index The index of a point.
+    #
+    # @return The y position of the point in the graph.
+    #
+    def yPosition(self, index):
+        return self.y_size - int((self.data[index] - self.y_min)/self.range * float(self.y_size))
+
 
-        
 ## QImageGraph
 #
-# STORM image display widget.
+# STORM image display widget. The localizations are accumulated in a
+# numpy array, which is only converted to a QImage when the widget is
+# repainted.
 #
 class QImageGraph(QtGui.QWidget):
 
@@ -315,7 +358,6 @@ class QImageGraph(QtGui.QWidget):
     def __init__(self, x_size, y_size, parent = None):
         QtGui.QWidget.__init__(self, parent)
 
-        self.buffer = QtGui.QPixmap(x_size, y_size)
         self.flip_horizontal = False
         self.flip_vertical = False
         self.transpose = False
@@ -324,6 +366,14 @@ class QImageGraph(QtGui.QWidget):
         self.x_size = x_size
         self.y_size = y_size
 
+        # Each localization blends in 5/255 of its color (same as drawing
+        # a point with a QColor whose alpha is 5).
+        self.alpha = 5.0/255.0
+        self.image = numpy.zeros((x_size * y_size, 3), dtype = numpy.float32)
+        self.image_changed = True
+        self.q_image = None
+        self.rgb_data = None
+
         self.colors = [False]
         self.points_per_cycle = len(self.colors)
         self.scale_bar_len = 1
@@ -336,13 +386,22 @@ class QImageGraph(QtGui.QWidget):
     # Resets the image to black.
     #
     def blank(self):
-        painter = QtGui.QPainter(self.buffer)
-        color = QtGui.QColor(0, 0, 0)
-        painter.setPen(color)
-        painter.setBrush(color)
-        painter.drawRect(0, 0, self.x_size, self.y_size)
+        self.image[:,:] = 0.0
+        self.image_changed = True
         self.update()
 
+    ## getQImage
+    #
+    # @return The image as a QImage.
+    #
+    def getQImage(self):
+        if self.image_changed:
+            rgb = numpy.minimum(self.image + 0.5, 255.0).astype(numpy.uint32)
+            self.rgb_data = (rgb[:,0] << 16) | (rgb[:,1] << 8) | rgb[:,2] | 0xff000000
+            self.q_image = QtGui.QImage(self.rgb_data.data, self.x_size, self.y_size, QtGui.QImage.Format_RGB32)
+            self.image_changed = False
+        return self.q_image
+
     ## newColors
     #
     # Set new colors
@@ -390,27 +449,28 @@ class QImageGraph(QtGui.QWidget):
     # @param event A PyQt event object.
     #
     def paintEvent(self, event):
+        painter = QtGui.QPainter(self)
+        painter.drawImage(0, 0, self.getQImage())
+
         # Draw the scale bar.
-        painter = QtGui.QPainter(self.buffer)
         painter.setPen(QtGui.QColor(255, 255, 255))
         painter.setBrush(QtGui.QColor(255, 255, 255))
         painter.drawRect(5, 5, 5 + self.scale_bar_len, 5)
 
-        # Mirror as necessary.
-        #self.image = self.image.mirrored(self.flip_horizontal, self.flip_vertical)
-            
-        # Transfer to display.
-        painter = QtGui.QPainter(self)
-        painter.drawPixmap(0, 0, self.buffer)
-
     ## saveImage
     #
-    # Saves the image in a file.
+    # Saves the image (with the scale bar) in a file.
     #
     # @param filename The name of the file to save the image in.
     #
     def saveImage(self, filename):
-        self.buffer.save(filename, "PNG", -1)
+        q_image = self.getQImage().copy()
+        painter = QtGui.QPainter(q_image)
+        painter.setPen(QtGui.QColor(255, 255, 255))
+        painter.setBrush(QtGui.QColor(255, 255, 255))
+        painter.drawRect(5, 5, 5 + self.scale_bar_len, 5)
+        painter.end()
+        q_image.save(filename, "PNG", -1)
 
     ## updateImage
     #
@@ -422,22 +482,23 @@ class QImageGraph(QtGui.QWidget):
     # @param spots The number of objects.
     #
     def updateImage(self, index, x_locs, y_locs, spots):
-        painter = QtGui.QPainter(self.buffer)
         color = self.colors[index % self.points_per_cycle]
-        if color:
-            qtcolor = QtGui.QColor(color[0], color[1], color[2], 5)
-            painter.setPen(qtcolor)
-            for i in range(spots):
-                ix = int(self.p_scale * x_locs[i])
-                iy = int(self.p_scale * y_locs[i])
-                if self.flip_horizontal:
-                    ix = self.x_end - ix
-                if self.flip_vertical:
-                    iy = self.y_end - iy
-                if self.transpose:
-                    [ix, iy] = [iy, ix]
-                #print ix, x_locs[i], iy, y_locs[i]
-                painter.drawPoint(ix, iy)
+        if color and (spots > 0):
+            ix = (self.p_scale * numpy.asarray(x_locs[:spots])).astype(numpy.int32)
+            iy = (self.p_scale * numpy.asarray(y_locs[:spots])).astype(numpy.int32)
+            if self.flip_horizontal:
+                ix = self.x_end - ix
+            if self.flip_vertical:
+                iy = self.y_end - iy
+            if self.transpose:
+                [ix, iy] = [iy, ix]
+            mask = (ix >= 0) & (ix < self.x_size) & (iy >= 0) & (iy < self.y_size)
+
+            # Blend in the color, taking into account multiple objects in the same pixel.
+            [pixels, counts] = numpy.unique(iy[mask] * self.x_size + ix[mask], return_counts = True)
+            remaining = numpy.power(1.0 - self.alpha, counts).astype(numpy.float32)[:,None]
+            self.image[pixels] = self.image[pixels] * remaining + numpy.array(color, dtype = numpy.float32) * (1.0 - remaining)
+            self.image_changed = True
             self.update()
 
             
@@ -481,11 +542,21 @@ class SpotCounter(QtGui.QDialog, halModule.HalModule):
         #        objective.
         #
         spotc_params = self.parameters.addSubSection("spotcounter")
+        for i in range(self.number_cameras):
+            camera = "camera" + str(i+1)
+            spotc_params.add(camera + "_finder", params.ParameterSetString("Object finder for " + camera,
+                                                                           camera + "_finder",
+                                                                           "lmm",
+                                                                           finderBackends.finder_names))
+
         spotc_params.add("cell_size", params.ParameterRangeInt("Cell size for background subtraction",
                                                                "cell_size", 32, 8, 128,
                                                                is_mutable = False,
                                                                is_saved = False))
         
+        spotc_params.add("log_threshold", params.ParameterRangeInt("Spot detection threshold for the LOG object finder",
+                                                                   "log_threshold", 20000, 1, 1000000))
+
         spotc_params.add("max_spots", params.ParameterRangeInt("Maximum counts for the spotcounter graph",
                                                                "max_spots", 500, 0, 1000,
                                                                is_mutable = False,
@@ -519,7 +590,8 @@ class SpotCounter(QtGui.QDialog, halModule.HalModule):
                              Counter(self.ui.countsLabel3, self.ui.countsLabel4)]
 
         # Setup spot counter.
-        self.spot_counter = qtSpotCounter.QObjectCounter(parameters.get("spotcounter"))
+        self.spot_counter = qtSpotCounter.QObjectCounter(parameters.get("spotcounter"),
+                                                         number_cameras = self.number_cameras)
         self.spot_counter.imageProcessed.connect(self.updateCounts)
 
         # Setup spot counts graph(s).
@@ -724,16 +796,19 @@ class SpotCounter(QtGui.QDialog, halModule.HalModule):
     # @param spots The total number of spots that were found.
     #
     def updateCounts(self, which_camera, frame_number, x_locs, y_locs, spots):
+
+        # Not all of the object finders return locations.
+        locs = min(spots, len(x_locs))
         if (which_camera == "camera1"):
             self.spot_graphs[0].updateGraph(frame_number, spots)
             if self.filming:
                 self.counters[0].updateCounts(spots)
-                self.image_graphs[0].updateImage(frame_number, x_locs, y_locs, spots)
+                self.image_graphs[0].updateImage(frame_number, x_locs, y_locs, locs)
         elif (which_camera == "camera2"):
             self.spot_graphs[1].updateGraph(frame_number, spots)
             if self.filming:
                 self.counters[1].updateCounts(spots)
-                self.image_graphs[1].updateImage(frame_number, x_locs, y_locs, spots)
+                self.image_graphs[1].updateImage(frame_number, x_locs, y_locs, locs)
 
         self.imageProcessed.emit(which_camera, frame_number, spots)
 
@@ -11,6 +11,8 @@ from PyQt4 import QtCore
 
 import sc_library.parameters as params
 
+import sc_hardware.baseClasses.stageHardware as stageHardware
+
 # stage control thread
 import stagecontrol.stageThread as stageThread
 
@@ -20,7 +22,7 @@ import stagecontrol.stageControl as stageControl
 #
 # Dummy stage class
 #
-class Stage():
+class Stage(stageHardware.StageHardware):
     def __init__(self, parent = None):
         self.x = 0.0
         self.y = 0.0
@@ -8,6 +8,7 @@
 #
 
 import math
+import time
 
 from PyQt4 import QtCore, QtGui
 
@@ -170,6 +171,9 @@ class StageControl(QtGui.QDialog, halModule.HalModule):
         self.directory = ""
         self.drag_start_x = 0
         self.drag_start_y = 0
+        self.move_settle_start = None
+        self.move_start = None
+        self.move_target = None
         self.move_timer = QtCore.QTimer()
         self.stage_x = 0
         self.stage_y = 0
@@ -185,6 +189,21 @@ class StageControl(QtGui.QDialog, halModule.HalModule):
         parameters.add("stage.large_step_size", params.ParameterRangeFloat("Large step size",
                                                                            "large_step_size",
                                                                            25.0, 1.0, 500.0))
+
+        parameters.add("stage.move_settle_time", params.ParameterRangeFloat("Time the stage must be in position at the end of a move (s)",
+                                                                            "move_settle_time",
+                                                                            0.05, 0.0, 2.0))
+        self.move_settle_time = parameters.get("stage.move_settle_time")
+
+        parameters.add("stage.move_timeout", params.ParameterRangeFloat("Extra time to wait for a move before giving up (s)",
+                                                                        "move_timeout",
+                                                                        2.0, 0.1, 60.0))
+        self.move_timeout = parameters.get("stage.move_timeout")
+
+        parameters.add("stage.move_tolerance", params.ParameterRangeFloat("Distance from the target that counts as arrived (um)",
+                                                                          "move_tolerance",
+                                                                          1.0, 0.01, 100.0))
+        self.move_tolerance = parameters.get("stage.move_tolerance")
         
         parameters.add("stage.small_step_size", params.ParameterRangeFloat("Small step size",
                                                                            "small_step_size",
@@ -247,6 +266,7 @@ class StageControl(QtGui.QDialog, halModule.HalModule):
         self.ui.loadButton.clicked.connect(self.handleLoad)
         self.ui.saveButton.clicked.connect(self.handleSave)
         self.ui.saveComboBox.activated.connect(self.handleSaveIndexChange)
+        self.ui.stopButton.clicked.connect(self.handleStop)
         self.ui.zeroButton.clicked.connect(self.zero)
 
         # set modeless
@@ -349,7 +369,14 @@ class StageControl(QtGui.QDialog, halModule.HalModule):
     @hdebug.debug
     def handleCommMessage(self, message):
 
-        if (message.getType() == "Move Stage"):
+        # Stop the stage if Dave aborts a move.
+        if (message.getType() == "Abort Movie"):
+            if (self.move_target is not None):
+                self.halt()
+                self.tcp_message.addResponse("aborted", True)
+                self.moveComplete()
+
+        elif (message.getType() == "Move Stage"):
             x_pos = message.getData("stage_x")
             y_pos = message.getData("stage_y")
             if message.isTest():
@@ -360,13 +387,20 @@ class StageControl(QtGui.QDialog, halModule.HalModule):
                 self.tcpComplete.emit(message) 
             else:
                 self.tcp_message = message
+                self.move_settle_start = None
+                self.move_start = time.time()
+                self.move_target = [x_pos, y_pos]
+                if self.stage:
+                    self.stage.trackMove(True)
                 self.moveAbsolute(x_pos, y_pos)
 
-                # Based on stage speed, calculate how long the move will take.
+                # The move is over when the stage reports that it is at the target
+                # position (see handleUpdatePosition()). As a fallback, give up if
+                # the move takes much longer than expected based on the stage speed.
                 dx = x_pos - self.stage_x
                 dy = y_pos - self.stage_y
                 dd = math.sqrt(dx*dx + dy*dy)
-                move_time = int(dd/self.stage_speed) + 1000
+                move_time = int(dd/self.stage_speed + 1000.0 * self.move_timeout)
 
                 self.move_timer.setInterval(move_time)
                 self.move_timer.start()
@@ -451,12 +485,17 @@ class StageControl(QtGui.QDialog, halModule.HalModule):
 
     ## handleMoveTimer
     #
-    # When the move timer times out we assume that the stage has
-    # reached the desired position.
+    # When the move timer times out the stage never reported that it
+    # reached the target position, assume that it did anyway.
     #
     @hdebug.debug
     def handleMoveTimer(self):
-        self.tcpComplete.emit(self.tcp_message)
+        if self.move_target is not None:
+            hdebug.logText("Stage: move to {0:.2f}, {1:.2f} timed out at {2:.2f}, {3:.2f}".format(self.move_target[0],
+                                                                                                  self.move_target[1],
+                                                                                                  self.stage_x,
+                                                                                                  self.stage_y))
+            self.moveComplete()
 
     ## handleOk
     #
@@ -468,6 +507,16 @@ class StageControl(QtGui.QDialog, halModule.HalModule):
     def handleOk(self, bool):
         self.hide()
 
+    ## handleStop
+    #
+    # Stop the stage.
+    #
+    # @param bool Dummy parameter.
+    #
+    @hdebug.debug
+    def handleStop(self, bool):
+        self.halt()
+
     ## handleUpdatePosition
     #
     # @param stage_x The stage position in x in microns.
@@ -481,6 +530,18 @@ class StageControl(QtGui.QDialog, halModule.HalModule):
         self.ui.xposText.setText("%.3f" % self.stage_x)
         self.ui.yposText.setText("%.3f" % self.stage_y)
 
+        # Check if the stage has arrived (and stayed) at the target of a TCP move.
+        if self.move_target is not None:
+            dx = self.stage_x - self.move_target[0]
+            dy = self.stage_y - self.move_target[1]
+            if ((dx*dx + dy*dy) <= (self.move_tolerance * self.move_tolerance)):
+                if self.move_settle_start is None:
+                    self.move_settle_start = time.time()
+                if ((time.time() - self.move_settle_start) >= self.move_settle_time):
+                    self.moveComplete()
+            else:
+                self.move_settle_start = None
+
     ## handleQuit
     #
     # Close the window.
@@ -523,6 +584,14 @@ class StageControl(QtGui.QDialog, halModule.HalModule):
             self.ui.xmoveDoubleSpinBox.setValue(xvar.toDouble()[0])
             self.ui.ymoveDoubleSpinBox.setValue(yvar.toDouble()[0])
 
+    ## halt
+    #
+    # Stop the stage, this also discards any moves that have not been sent yet.
+    #
+    def halt(self):
+        if self.stage:
+            self.stage.halt()
+
     ## jog
     #
     # Tell the stage to move at a certain speed.
@@ -535,6 +604,19 @@ class StageControl(QtGui.QDialog, halModule.HalModule):
             [tx, ty] = self.translator.translate(x_speed, y_speed)
             self.stage.jog(tx, ty)
 
+    ## moveComplete
+    #
+    # Called at the end of a TCP move, this adds the time that the
+    # move took to the response.
+    #
+    def moveComplete(self):
+        self.move_timer.stop()
+        if self.stage:
+            self.stage.trackMove(False)
+        self.tcp_message.addResponse("move_time", time.time() - self.move_start)
+        self.move_target = None
+        self.tcpComplete.emit(self.tcp_message)
+
     ## moveRelative
     #
     # Move relative to the current position.
@@ -566,6 +648,9 @@ class StageControl(QtGui.QDialog, halModule.HalModule):
     @hdebug.debug    
     def newParameters(self, parameters):
         self.directory = parameters.get("film.directory")
+        self.move_settle_time = parameters.get("stage.move_settle_time")
+        self.move_timeout = parameters.get("stage.move_timeout")
+        self.move_tolerance = parameters.get("stage.move_tolerance")
         self.translator.newParameters(parameters)
         for button in self.motion_buttons:
             button.setStepSize(parameters.get("stage.small_step_size"), parameters.get("stage.large_step_size"))
@@ -7,21 +7,32 @@
 #
 # Hazen 03/14
 #
+# Pending moves are collapsed (see sc_hardware.baseClasses.stageHardware)
+# and the thread sleeps until it has something to do, instead of polling.
+#
+# Hazen 10/15
+#
+
+import time
 
 from PyQt4 import QtCore
 
+import sc_hardware.baseClasses.stageHardware as stageHardware
+
 ## QStageThread
 #
 # QThread for communication with a motorized stage.
 #
 # This is necessary for position updates as otherwise the periodic 
 # communication with the (slow) stage will cause the whole UI to 
-# behave a bit jerkily. The time resolution of update events for
-# this thread is only nominal, getting the desired responsiveness
-# will like take some setup specific tuning of the move and
-# position update frequencies.
+# behave a bit jerkily. Move requests are buffered, only the most
+# recent target of each type of move is sent to the stage and a halt
+# is always sent first. The stage position is queried at a fixed
+# rate by this thread and published with the updatePosition signal.
 #
-# The motorized stage class must provide the following methods:
+# The motorized stage class should be a sub-class of 
+# sc_hardware.baseClasses.stageHardware.StageHardware, or 
+# provide the following methods:
 #
 # getSpeed()
 #   Returns what to use for the stage_speed parameter.
@@ -35,6 +46,9 @@ from PyQt4 import QtCore
 # goRelative(dx, dy)
 #   Change position by dx in x, dy in y (in um).
 #
+# halt() (Optional)
+#   Stop any motion.
+#
 # jog(sx, sy)
 #   Jog at a speed given by sx, sy in um/second
 #
@@ -60,38 +74,53 @@ class QStageThread(QtCore.QThread):
 
     ## __init__
     #
-    # Note: The time resolution of update requests is nominally 5ms. However
-    #   due to OS issues, it is probably not actually any thing like this..
-    #
     # @param stage A stage (hardware) control object.
-    # @param move_update_freq Update frequency for move commands in units of 5ms.
-    # @param pos_update_freq Frequency of stage position inquiries in units of 5ms
+    # @param move_update_freq Minimum time between move commands in units of 5ms.
+    # @param pos_update_freq Time between stage position inquiries in units of 5ms
+    # @param move_pos_update_freq (Optional) Time between stage position inquiries while a move is being tracked, defaults to 10.
     # @param parent (Optional) The PyQt parent of this object.
     #
-    def __init__(self, stage, move_update_freq = 1, pos_update_freq = 100, parent = None):
+    def __init__(self, stage, move_update_freq = 1, pos_update_freq = 100, move_pos_update_freq = 10, parent = None):
         QtCore.QThread.__init__(self, parent)
+        self.commands = stageHardware.StageCommandBuffer()
         self.locked_out = False
-        self.motion_buffer = []
-        self.move_update_freq = move_update_freq
-        self.pos_update_freq = pos_update_freq
+        self.move_interval = 0.005 * move_update_freq
+        self.move_pos_interval = 0.005 * move_pos_update_freq
+        self.next_move_time = 0.0
+        self.next_pos_time = 0.0
+        self.pos_interval = 0.005 * pos_update_freq
         self.stage = stage
- 
+        self.tracking_move = False
+
+        # command_mutex protects the command buffer, mutex protects the stage.
+        self.command_mutex = QtCore.QMutex()
+        self.command_wait = QtCore.QWaitCondition()
         self.mutex = QtCore.QMutex()
         self.running = self.stage.getStatus()
 
+    ## addCommand
+    #
+    # Add a command to the buffer and wake up the thread.
+    #
+    # @param command The name of a StageCommandBuffer method.
+    # @param args The arguments to this method.
+    #
+    def addCommand(self, command, *args):
+        self.command_mutex.lock()
+        getattr(self.commands, command)(*args)
+        self.command_wait.wakeAll()
+        self.command_mutex.unlock()
+
     ## dragMove
     #
     # This handles "drag" motion events, such as those that are 
-    # generated by cameraDisplay. These need to be buffered so 
-    # that the stage does not get overwhelmed.
+    # generated by cameraDisplay.
     #
     # @param x the x position in um.
     # @param y the y position in um.
     #
     def dragMove(self, x, y):
-        self.mutex.lock()
-        self.motion_buffer = ["drag", x, y]
-        self.mutex.unlock()
+        self.addCommand("addAbsolute", x, y)
 
     ## getSpeed
     #
@@ -109,15 +138,11 @@ class QStageThread(QtCore.QThread):
 
     ## goAbsolute
     #
-    # This type of move is unbuffered.
-    #
     # @param x The x position in um.
     # @param y The y position in um.
     #
     def goAbsolute(self, x, y):
-        self.mutex.lock()
-        self.stage.goAbsolute(x, y)
-        self.mutex.unlock()
+        self.addCommand("addAbsolute", x, y)
 
     ## goRelative
     #
@@ -125,9 +150,15 @@ class QStageThread(QtCore.QThread):
     # @param dy The y displacement in um.
     #
     def goRelative(self, dx, dy):
-        self.mutex.lock()
-        self.motion_buffer = ["mover", dx, dy]
-        self.mutex.unlock()
+        self.addCommand("addRelative", dx, dy)
+
+    ## halt
+    #
+    # Stop the stage. This discards any pending moves and
+    # is sent to the stage ahead of everything else.
+    #
+    def halt(self):
+        self.addCommand("addHalt")
 
     ## jog
     #
@@ -138,9 +169,7 @@ class QStageThread(QtCore.QThread):
     # @param y_speed The speed to move in y.
     #
     def jog(self, x_speed, y_speed):
-        self.mutex.lock()
-        self.motion_buffer = ["jog", x_speed, y_speed]
-        self.mutex.unlock()
+        self.addCommand("addJog", x_speed, y_speed)
 
     ## lockout
     #
@@ -155,36 +184,59 @@ class QStageThread(QtCore.QThread):
 
     ## run
     #
-    # The stage control thread. Jogs the stage, if requested, and gets
-    # the current stage position.
+    # The stage control thread. Sends the buffered commands to the
+    # stage and gets the current stage position. Between these it
+    # sleeps until the next position update is due or until a new
+    # command arrives.
     #
     def run(self):
-        counter = 0
         while self.running:
-            self.mutex.lock()
-            if ((counter % self.move_update_freq) == 0):
-                if (len(self.motion_buffer) > 0):
-                    [type, mx, my] = self.motion_buffer
-                    if (type == "jog"):
-                        self.stage.jog(mx, my)
-                    elif (type == "mover"):
-                        self.stage.goRelative(mx, my)
-                    elif (type == "drag"):
+
+            # Wait for something to do.
+            self.command_mutex.lock()
+            wake_time = self.next_pos_time
+            if self.commands.hasCommands():
+                if self.commands.isUrgent():
+                    wake_time = 0.0
+                else:
+                    wake_time = min(wake_time, self.next_move_time)
+            wait_ms = int(1000.0 * (wake_time - time.time()))
+            if (wait_ms > 0):
+                self.command_wait.wait(self.command_mutex, wait_ms)
+
+            commands = []
+            now = time.time()
+            if self.commands.hasCommands() and (self.commands.isUrgent() or (now >= self.next_move_time)):
+                commands = self.commands.takeCommands()
+                self.next_move_time = now + self.move_interval
+            self.command_mutex.unlock()
+
+            # Send commands.
+            if (len(commands) > 0):
+                self.mutex.lock()
+                for [command, mx, my] in commands:
+                    if (command == "halt"):
+                        if hasattr(self.stage, "halt"):
+                            self.stage.halt()
+                    elif (command == "goAbsolute"):
                         self.stage.goAbsolute(mx, my)
-                    else:
-                        print "QStageThread: unknown type", type
-                    self.motion_buffer = []
+                    elif (command == "goRelative"):
+                        self.stage.goRelative(mx, my)
+                    elif (command == "jog"):
+                        self.stage.jog(mx, my)
+                self.mutex.unlock()
 
-            if ((counter % self.pos_update_freq) == 0):
+            # Publish position.
+            now = time.time()
+            if (now >= self.next_pos_time):
+                self.mutex.lock()
                 position = self.stage.position()
+                self.mutex.unlock()
                 self.updatePosition.emit(*position)
-
-            counter += 1
-            if (counter == 200):
-                counter = 0
-
-            self.mutex.unlock()
-            self.msleep(5)
+                if self.tracking_move:
+                    self.next_pos_time = now + self.move_pos_interval
+                else:
+                    self.next_pos_time = now + self.pos_interval
 
     ## setVelocity
     #
@@ -201,10 +253,28 @@ class QStageThread(QtCore.QThread):
     # Stop the thread & close the connection to the stage.
     #
     def shutDown(self):
+        self.command_mutex.lock()
         self.running = 0
+        self.command_wait.wakeAll()
+        self.command_mutex.unlock()
         self.wait()
         self.stage.shutDown()
 
+    ## trackMove
+    #
+    # While a move is being tracked the stage position is checked
+    # more frequently so that the end of the move is found quickly.
+    #
+    # @param flag True/False track a move.
+    #
+    def trackMove(self, flag):
+        self.command_mutex.lock()
+        self.tracking_move = flag
+        if flag:
+            self.next_pos_time = min(self.next_pos_time, time.time() + self.move_pos_interval)
+            self.command_wait.wakeAll()
+        self.command_mutex.unlock()
+
     ## zero
     #
     # Set the current position as the new stage zero.
@@ -12,6 +12,7 @@ import time
 
 import sc_library.hdebug as hdebug
 
+import sc_hardware.baseClasses.stageHardware as stageHardware
 import sc_hardware.serial.RS232 as RS232
 
 
@@ -19,7 +20,7 @@ import sc_hardware.serial.RS232 as RS232
 #
 # Applied Scientific Instrumentation MS2000 RS232 interface class.
 #
-class MS2000(RS232.RS232):
+class MS2000(RS232.RS232, stageHardware.StageHardware):
 
     ## __init__
     #
@@ -76,6 +77,14 @@ class MS2000(RS232.RS232):
             Y = y * self.um_to_unit
             self.commWithResp("R X=" + str(X) + " Y=" + str(Y))
 
+    ## halt
+    #
+    # Stop the stage.
+    #
+    def halt(self):
+        if self.live:
+            self.commWithResp("HALT")
+
     ## jog
     #
     # @param x_speed Speed to jog the stage in x in um/s.
@@ -0,0 +1,181 @@
+#!/usr/bin/python
+#
+## @file
+#
+# A base class for threads that buffer the communication with
+# (slow) hardware such as lasers and AOTFs.
+#
+# Hazen 10/15
+#
+
+import time
+
+from PyQt4 import QtCore
+
+## CommandThread
+#
+# Commands are stored by channel and only the most recent command
+# for each channel is kept. This way when you move a slider and
+# generate 100 events only the last one gets acted on, but pending
+# commands for other channels are not lost. The thread sleeps until
+# it gets a command (or until the time returned by nextWakeTime()),
+# then all the pending commands are passed to handleCommands() at
+# once, so that sub-classes can send them to the hardware together.
+#
+# The command latency is the time from a command being added to
+# the hardware having finished with it. Commands that the sub-class
+# did not send to the hardware are not included.
+#
+class CommandThread(QtCore.QThread):
+
+    ## __init__
+    #
+    # @param parent (Optional) The PyQt parent of this object.
+    # @param latency_weight (Optional) The weight of a new measurement in the average command latency, defaults to 0.2.
+    #
+    def __init__(self, parent = None, latency_weight = 0.2):
+        QtCore.QThread.__init__(self, parent)
+
+        self.command_latency = None
+        self.command_mutex = QtCore.QMutex()
+        self.command_wait = QtCore.QWaitCondition()
+        self.commands = {}
+        self.latency_weight = latency_weight
+        self.running = True
+
+    ## addCommand
+    #
+    # Add a command, this replaces any pending command for the same channel.
+    #
+    # @param channel The channel.
+    # @param value The command value.
+    #
+    def addCommand(self, channel, value):
+        self.command_mutex.lock()
+        self.commands[channel] = [value, time.time()]
+        self.command_wait.wakeAll()
+        self.command_mutex.unlock()
+
+    ## getCommandLatency
+    #
+    # @return The (weighted) average command latency in seconds, or None if there have not been any commands.
+    #
+    def getCommandLatency(self):
+        self.command_mutex.lock()
+        latency = self.command_latency
+        self.command_mutex.unlock()
+        return latency
+
+    ## handleCommands
+    #
+    # This should be over-ridden by sub-classes. It is also called
+    # (with no commands) when the thread wakes up at the time
+    # returned by nextWakeTime().
+    #
+    # @param commands A dictionary of command values keyed by channel.
+    #
+    # @return A list of the channels whose commands were sent to the hardware, or None if they all were.
+    #
+    def handleCommands(self, commands):
+        pass
+
+    ## nextWakeTime
+    #
+    # Sub-classes can over-ride this to have the thread wake up at a
+    # particular time. This is called with command_mutex locked.
+    #
+    # @return The time (as returned by time.time()) to wake up at, or None.
+    #
+    def nextWakeTime(self):
+        return None
+
+    ## run
+    #
+    # Waits for commands, then passes all the pending commands
+    # to handleCommands().
+    #
+    def run(self):
+        while self.running:
+
+            # Wait for something to do.
+            self.command_mutex.lock()
+            if (len(self.commands) == 0) and self.running:
+                wake_time = self.nextWakeTime()
+                if wake_time is None:
+                    self.command_wait.wait(self.command_mutex)
+                else:
+                    wait_time = wake_time - time.time()
+                    if (wait_time > 0.0):
+                        self.command_wait.wait(self.command_mutex, int(1000.0 * wait_time) + 1)
+            commands = self.commands
+            self.commands = {}
+            self.command_mutex.unlock()
+
+            if not self.running:
+                break
+
+            values = {}
+            for channel in commands:
+                values[channel] = commands[channel][0]
+            sent = self.handleCommands(values)
+            if sent is None:
+                sent = commands.keys()
+
+            # Update the command latency.
+            sent = filter(lambda x: x in commands, sent)
+            if (len(sent) > 0):
+                done_time = time.time()
+                self.command_mutex.lock()
+                for channel in sent:
+                    latency = done_time - commands[channel][1]
+                    if self.command_latency is None:
+                        self.command_latency = latency
+                    else:
+                        self.command_latency += self.latency_weight * (latency - self.command_latency)
+                self.command_mutex.unlock()
+
+    ## stopThread
+    #
+    # Stop the thread and wait for it to finish.
+    #
+    def stopThread(self):
+        self.command_mutex.lock()
+        self.running = False
+        self.command_wait.wakeAll()
+        self.command_mutex.unlock()
+        self.wait()
+
+    ## wakeUp
+    #
+    # Wake up the thread, for example because the time returned
+    # by nextWakeTime() has changed.
+    #
+    def wakeUp(self):
+        self.command_mutex.lock()
+        self.command_wait.wakeAll()
+        self.command_mutex.unlock()
+
+
+#
+# The MIT License
+#
+# Copyright (c) 2015 Zhuang Lab, Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
@@ -10,31 +10,12 @@
 # Hazen 04/14
 #
 
-from PyQt4 import QtCore
-
-#
-# Helper functions.
-#
+import numpy
+import time
 
-## removeChannelDuplicates
-#
-# Remove settings that apply to the current channel. This way
-# when you move the slider and generate 100 events only the last
-# one gets acted on, but pending events for other channels are not lost.
-#
-# @param queue A python array of [on, channel, amplitude].
-# @param channel All items in queue that have this channel value will be removed.
-#
-# @return The original array with all items from channel removed.
-#
-def removeChannelDuplicates(queue, channel):
-    final_queue = []
-    for item in queue:
-        if (item[0] == channel):
-            continue
-        final_queue.append(item)
-    return final_queue
+from PyQt4 import QtCore
 
+import sc_hardware.baseClasses.commandThread as commandThread
 
 #
 # Base Class.
@@ -67,6 +48,13 @@ class IlluminationHardware(object):
     def cleanup(self):
         pass
 
+    ## getCommandLatency
+    #
+    # @return The average time in seconds that the hardware takes to act on a command, or None if this is not measured.
+    #
+    def getCommandLatency(self):
+        return None
+
     ## getStatus
     #
     # @return True/False if the device this module talks to is working properly.
@@ -95,6 +83,15 @@ class IlluminationHardware(object):
     def isBuffered(self):
         return self.is_buffered
 
+    ## newFrame
+    #
+    # Called when a (master) frame is received while filming.
+    #
+    # @param frame_number The frame number.
+    #
+    def newFrame(self, frame_number):
+        pass
+
     ## startFilm
     #
     # Called at the start of filming (when shutters are active).
@@ -196,9 +193,22 @@ class AmplitudeModulation(IlluminationHardware):
 
 ## BufferedAmplitudeModulation
 #
-# The base class for buffered amplitude hardware modules.
+# The base class for buffered amplitude hardware modules. The
+# communication with the hardware is handled by a CommandThread,
+# so only the most recent amplitude of each channel is sent.
+#
+# These can also follow a schedule of amplitude changes (a power
+# progression) during a film. The frame at which each change is due
+# is converted to a time using the film frame rate. The time of
+# frame 0 is estimated from the times at which the frames are
+# received (the earliest estimate is used, as frames can only be
+# received late), so the changes happen on time even if the frames
+# are received late because the GUI is busy. If the estimate from
+# a frame is more than one frame later than the earliest estimate
+# the real frame period is probably longer than the expected one,
+# so the estimate is started again from this frame.
 #
-class BufferedAmplitudeModulation(QtCore.QThread, AmplitudeModulation):
+class BufferedAmplitudeModulation(commandThread.CommandThread, AmplitudeModulation):
 
     ## __init__
     #
@@ -206,22 +216,21 @@ class BufferedAmplitudeModulation(QtCore.QThread, AmplitudeModulation):
     # @param parent The PyQt parent of this object.
     #
     def __init__(self, parameters, parent):
-        QtCore.QThread.__init__(self, parent)
+        commandThread.CommandThread.__init__(self, parent)
         AmplitudeModulation.__init__(self, parameters, parent)
         
-        self.command_buffer = []
-        self.buffer_mutex = QtCore.QMutex()
         self.device_mutex = QtCore.QMutex()
         self.is_buffered = True
-        self.running = True
+        self.schedule_start_time = None
+        self.schedules = {}
+        self.seconds_per_frame = 1.0
 
     ## cleanup
     #
-    # Stop the command queue thread.
+    # Stop the command thread.
     #
     def cleanup(self):
-        self.running = False
-        self.wait()
+        self.stopThread()
 
     ## deviceSetAmplitude
     #
@@ -233,23 +242,85 @@ class BufferedAmplitudeModulation(QtCore.QThread, AmplitudeModulation):
         print "deviceSetAmplitude should have been over-ridden.."
         self.device_mutex.unlock()
 
-    ## run
+    ## deviceSetAmplitudes
+    #
+    # Sub-classes can over-ride this if the hardware can set the
+    # amplitudes of several channels in a single transaction.
+    #
+    # @param amplitudes A python array of [channel, amplitude].
+    #
+    # @return A list of the channels that were set, or None if they all were.
+    #
+    def deviceSetAmplitudes(self, amplitudes):
+        for [channel, amplitude] in amplitudes:
+            self.deviceSetAmplitude(channel, amplitude)
+        return None
+
+    ## handleCommands
     #
-    # Pops the most recent command request off the queue, removes
-    # any duplicates of this request from the queue and executes
-    # the request. Sleeps for 10ms between queue checks.
+    # Send the new amplitudes, and any scheduled amplitude changes
+    # that are due, to the hardware.
     #
-    def run(self):
-        while (self.running):
-            self.buffer_mutex.lock()
-            if (len(self.command_buffer) > 0):
-                [channel, amplitude] = self.command_buffer.pop()
-                self.command_buffer = removeChannelDuplicates(self.command_buffer, channel)
-                self.buffer_mutex.unlock()
-                self.deviceSetAmplitude(channel, amplitude)
-            else:
-                self.buffer_mutex.unlock()
-            self.msleep(10)
+    # @param commands A dictionary of amplitudes keyed by channel.
+    #
+    # @return A list of the channels that were set, or None if they all were.
+    #
+    def handleCommands(self, commands):
+        amplitudes = dict(commands)
+        amplitudes.update(self.scheduledAmplitudes())
+        if (len(amplitudes) > 0):
+            return self.deviceSetAmplitudes(sorted(amplitudes.items()))
+        return None
+
+    ## newFrame
+    #
+    # Update the estimate of the time of frame 0.
+    #
+    # @param frame_number The frame number.
+    #
+    def newFrame(self, frame_number):
+        self.command_mutex.lock()
+        if (len(self.schedules) > 0):
+            start_time = time.time() - frame_number * self.seconds_per_frame
+            drift = None
+            if self.schedule_start_time is not None:
+                drift = start_time - self.schedule_start_time
+            if (drift is None) or (drift < 0.0) or (drift > self.seconds_per_frame):
+                self.schedule_start_time = start_time
+                self.command_wait.wakeAll()
+        self.command_mutex.unlock()
+
+    ## nextWakeTime
+    #
+    # @return The time at which the next scheduled amplitude change is due, or None.
+    #
+    def nextWakeTime(self):
+        wake_time = None
+        if (self.schedule_start_time is not None):
+            for [frames, amplitudes, index] in self.schedules.values():
+                if (index < frames.size):
+                    due_time = self.schedule_start_time + frames[index] * self.seconds_per_frame
+                    if (wake_time is None) or (due_time < wake_time):
+                        wake_time = due_time
+        return wake_time
+
+    ## scheduledAmplitudes
+    #
+    # @return A dictionary of the scheduled amplitude changes that are due, keyed by channel.
+    #
+    def scheduledAmplitudes(self):
+        amplitudes = {}
+        self.command_mutex.lock()
+        if (self.schedule_start_time is not None):
+            frame = (time.time() - self.schedule_start_time)/self.seconds_per_frame
+            for channel, schedule in self.schedules.iteritems():
+                [frames, channel_amplitudes, index] = schedule
+                last = numpy.searchsorted(frames, frame, side = "right")
+                if (last > index):
+                    amplitudes[channel] = int(channel_amplitudes[last-1])
+                    schedule[2] = last
+        self.command_mutex.unlock()
+        return amplitudes
 
     ## setAmplitude
     #
@@ -259,9 +330,38 @@ class BufferedAmplitudeModulation(QtCore.QThread, AmplitudeModulation):
     # @param amplitude The channel amplitude.
     #
     def setAmplitude(self, channel, amplitude):
-        self.buffer_mutex.lock()
-        self.command_buffer.append([channel, amplitude])
-        self.buffer_mutex.unlock()
+        self.addCommand(channel, amplitude)
+
+    ## startSchedule
+    #
+    # Start following a schedule of amplitude changes. The amplitude at
+    # frame 0 is expected to have been set already.
+    #
+    # @param channel The channel.
+    # @param frames A numpy array of the frames at which the amplitude changes.
+    # @param amplitudes A numpy array of the amplitudes at these frames.
+    # @param seconds_per_frame How many seconds it takes to acquire each frame.
+    #
+    def startSchedule(self, channel, frames, amplitudes, seconds_per_frame):
+        self.command_mutex.lock()
+        self.seconds_per_frame = seconds_per_frame
+        self.schedules[channel] = [frames, amplitudes, numpy.searchsorted(frames, 0, side = "right")]
+        self.command_wait.wakeAll()
+        self.command_mutex.unlock()
+
+    ## stopSchedule
+    #
+    # Stop following the schedule of a channel.
+    #
+    # @param channel The channel.
+    #
+    def stopSchedule(self, channel):
+        self.command_mutex.lock()
+        if channel in self.schedules:
+            del self.schedules[channel]
+        if (len(self.schedules) == 0):
+            self.schedule_start_time = None
+        self.command_mutex.unlock()
 
 
 ## DaqModulation
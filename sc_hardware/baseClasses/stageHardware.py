@@ -0,0 +1,222 @@
+#!/usr/bin/python
+#
+## @file
+#
+# This file contains the base class for motorized XY stages and
+# the command buffer that HAL's stage thread uses to decide what
+# to send to the stage next.
+#
+# Stages are usually connected by slow serial links. Mouse drags
+# and the joystick can generate commands much faster than these
+# links can handle, so only the most recent command of each type
+# is kept and a halt always goes first.
+#
+# Hazen 10/15
+#
+
+import sc_library.parameters as params
+
+
+## StageCommandBuffer
+#
+# Collapses pending stage commands. Only the most recent absolute
+# move and the most recent jog are kept. Relative moves are added
+# together, unless they are followed by an absolute move, which
+# replaces them. A halt clears all of the pending moves.
+#
+class StageCommandBuffer(object):
+
+    ## __init__
+    #
+    def __init__(self):
+        self.clear()
+
+    ## addAbsolute
+    #
+    # @param x The x position in um.
+    # @param y The y position in um.
+    #
+    def addAbsolute(self, x, y):
+        self.absolute = [x, y]
+        self.relative = None
+        self.addOrder("goAbsolute")
+
+    ## addJog
+    #
+    # @param x_speed The speed to move in x.
+    # @param y_speed The speed to move in y.
+    #
+    def addJog(self, x_speed, y_speed):
+        self.jog = [x_speed, y_speed]
+        self.addOrder("jog")
+
+    ## addHalt
+    #
+    def addHalt(self):
+        self.clear()
+        self.halt = True
+
+    ## addOrder
+    #
+    # Record that a command was (most recently) added.
+    #
+    # @param command The command name.
+    #
+    def addOrder(self, command):
+        if command in self.order:
+            self.order.remove(command)
+        self.order.append(command)
+
+    ## addRelative
+    #
+    # @param dx The x displacement in um.
+    # @param dy The y displacement in um.
+    #
+    def addRelative(self, dx, dy):
+        if self.relative is None:
+            self.relative = [dx, dy]
+        else:
+            self.relative = [self.relative[0] + dx, self.relative[1] + dy]
+        self.addOrder("goRelative")
+
+    ## clear
+    #
+    def clear(self):
+        self.absolute = None
+        self.halt = False
+        self.jog = None
+        self.order = []
+        self.relative = None
+
+    ## hasCommands
+    #
+    # @return True if there are commands waiting to be sent.
+    #
+    def hasCommands(self):
+        return self.halt or (self.absolute is not None) or (self.jog is not None) or (self.relative is not None)
+
+    ## isUrgent
+    #
+    # @return True if the next command should be sent immediately, i.e. it is a halt or a jog that stops the stage.
+    #
+    def isUrgent(self):
+        if self.halt:
+            return True
+        if (self.jog is not None) and (self.jog[0] == 0.0) and (self.jog[1] == 0.0):
+            return True
+        return False
+
+    ## takeCommands
+    #
+    # A halt is always first, the other commands are in the order
+    # in which they were (most recently) added.
+    #
+    # @return A list of [command, x, y] in the order they should be sent. This empties the buffer.
+    #
+    def takeCommands(self):
+        commands = []
+        if self.halt:
+            commands.append(["halt", 0.0, 0.0])
+        for command in self.order:
+            if (command == "goAbsolute") and (self.absolute is not None):
+                commands.append(["goAbsolute"] + self.absolute)
+            elif (command == "goRelative") and (self.relative is not None):
+                commands.append(["goRelative"] + self.relative)
+            elif (command == "jog"):
+                commands.append(["jog"] + self.jog)
+        self.clear()
+        return commands
+
+
+## StageHardware
+#
+# The base class for motorized XY stages. Sub-classes must provide:
+#
+# goAbsolute(x, y)
+#   Go to position x, y (in um)
+#
+# goRelative(dx, dy)
+#   Change position by dx in x, dy in y (in um).
+#
+# position()
+#   Returns [x, y, z] stage position (in um).
+#
+# setVelocity(vx, vy)
+#   Set maximum stage velocity in x and y.
+#
+# zero()
+#   Define the current position as zero.
+#
+# And should provide halt() if the stage can stop in the middle of a move.
+#
+class StageHardware(object):
+
+    ## getSpeed
+    #
+    # @return What to use for the stage_speed parameter.
+    #
+    def getSpeed(self):
+        return params.ParameterRangeFloat("Stage speed in AU",
+                                          "stage_speed",
+                                          1.0, 0.01, 100.0)
+
+    ## getStatus
+    #
+    # @return True/False if the stage is alive and running.
+    #
+    def getStatus(self):
+        return self.live
+
+    ## halt
+    #
+    # Stop any motion.
+    #
+    def halt(self):
+        pass
+
+    ## jog
+    #
+    # @param x_speed Speed the stage should be moving at in x in um/s.
+    # @param y_speed Speed the stage should be moving at in y in um/s.
+    #
+    def jog(self, x_speed, y_speed):
+        pass
+
+    ## joystickOnOff
+    #
+    # @param on True/False enable/disable the stage joystick.
+    #
+    def joystickOnOff(self, on):
+        pass
+
+    ## shutDown
+    #
+    # Cleanup prior to the program quitting.
+    #
+    def shutDown(self):
+        pass
+
+
+#
+# The MIT License
+#
+# Copyright (c) 2015 Zhuang Lab, Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
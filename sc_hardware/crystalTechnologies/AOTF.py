@@ -194,20 +194,43 @@ class AOTF(object):
     def reset(self):
         self._sendCmd("dds Reset")
 
-    ## setAmplitude
-    #
-    # Sets amplitude of the specified channel.
+    ## amplitudeCmd
     #
     # @param channel The channel to set.
     # @param amplitude The desired amplitude value.
     #
-    def setAmplitude(self, channel, amplitude):
+    # @return The command to set the amplitude of the specified channel.
+    #
+    def amplitudeCmd(self, channel, amplitude):
         assert channel >= 0, "setAmplitude: channel out of range " + str(channel)
         assert channel < 8, "setAmplitude: channel out of range " + str(channel)
         assert amplitude >= 0, "setAmplitude: amplitude out of range " + str(amplitude)
         assert amplitude <= 16383, "setAmplitude: amplitude out of range " + str(amplitude)
-        cmd = "dds a " + str(channel) + " " + str(amplitude)
-        self._sendCmd(cmd)
+        return "dds a " + str(channel) + " " + str(amplitude)
+
+    ## setAmplitude
+    #
+    # Sets amplitude of the specified channel.
+    #
+    # @param channel The channel to set.
+    # @param amplitude The desired amplitude value.
+    #
+    def setAmplitude(self, channel, amplitude):
+        self._sendCmd(self.amplitudeCmd(channel, amplitude))
+
+    ## setAmplitudes
+    #
+    # Sets the amplitudes of several channels. The commands are sent
+    # together so that we only have to wait for one response.
+    #
+    # @param amplitudes A python array of [channel, amplitude].
+    #
+    def setAmplitudes(self, amplitudes):
+        cmds = []
+        for [channel, amplitude] in amplitudes:
+            cmds.append(self.amplitudeCmd(channel, amplitude))
+        if (len(cmds) > 0):
+            self._sendCmd("\n".join(cmds))
 
     ## setChannel
     #
@@ -417,7 +440,10 @@ class AOTFTelnet(AOTF):
             #print("sent", cmd)
             self.aotf_conn.write(cmd + "\n")
             #resp = self.aotf_conn.read_until("\r\n* ", self.timeout)
-            resp = self.aotf_conn.read_until("* ", self.timeout)
+            # There is a prompt for each command (line) that was sent.
+            resp = ""
+            for i in range(cmd.count("\n") + 1):
+                resp += self.aotf_conn.read_until("* ", self.timeout)
             #print("got", resp)
             return resp
         else:
@@ -86,6 +86,27 @@ class CrystalTechAOTF(illuminationHardware.BufferedAmplitudeModulation):
             self.aotf.setAmplitude(aotf_channel, amplitude)
             self.device_mutex.unlock()
 
+    ## deviceSetAmplitudes
+    #
+    # Set the amplitudes of several channels with a single AOTF command.
+    #
+    # @param amplitudes A python array of [channel_id, amplitude].
+    #
+    # @return A list of the channel ids that were set, the channels that are off are skipped.
+    #
+    def deviceSetAmplitudes(self, amplitudes):
+        aotf_amplitudes = []
+        channel_ids = []
+        for [channel_id, amplitude] in amplitudes:
+            if self.amplitude_on[channel_id]:
+                aotf_amplitudes.append([self.channel_parameters[channel_id].channel, amplitude])
+                channel_ids.append(channel_id)
+        if (len(aotf_amplitudes) > 0):
+            self.device_mutex.lock()
+            self.aotf.setAmplitudes(aotf_amplitudes)
+            self.device_mutex.unlock()
+        return channel_ids
+
     ## initialize
     #
     # This is called by each of the channels that wants to use this module.
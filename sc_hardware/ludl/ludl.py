@@ -14,11 +14,13 @@ import sys
 
 import sc_library.parameters as params
 
+import sc_hardware.baseClasses.stageHardware as stageHardware
+
 ## Ludl
 #
 # Encapsulates control of a XY Ludl stage, communicating through serial.
 #
-class Ludl(object):
+class Ludl(stageHardware.StageHardware):
 
     ## __init__
     #
@@ -66,6 +68,13 @@ class Ludl(object):
         newy = str(int(round(dy * self.um_to_unit)))
         self._command("Movrel x=" + newx + ",y="+newy)
 
+    ## halt
+    #
+    # Stop the stage.
+    #
+    def halt(self):
+        self._command("Halt")
+
     ## info
     #
     # @return Some information about the stage.
@@ -14,6 +14,7 @@ import time
 import sc_library.hdebug as hdebug
 import sc_library.parameters as params
 
+import sc_hardware.baseClasses.stageHardware as stageHardware
 import sc_hardware.serial.RS232 as RS232
 
 
@@ -34,7 +35,7 @@ instantiated = 0
 #
 # Marzhauser RS232 interface class.
 #
-class MarzhauserRS232(RS232.RS232):
+class MarzhauserRS232(RS232.RS232, stageHardware.StageHardware):
 
     ## __init__
     #
@@ -101,6 +102,14 @@ class MarzhauserRS232(RS232.RS232):
             Y = y * self.um_to_unit
             self.commWithResp("!mor " + str(X) + " " + str(Y) + " 0")
 
+    ## halt
+    #
+    # Stop the stage.
+    #
+    def halt(self):
+        if self.live:
+            self.commWithResp("!a")
+
     ## jog
     #
     # @param x_speed Speed to jog the stage in x in um/s.
@@ -170,7 +179,7 @@ class MarzhauserRS232(RS232.RS232):
 #
 # Marzhauser DLL interface class.
 #
-class MarzhauserDLL(object):
+class MarzhauserDLL(stageHardware.StageHardware):
 
     ## __init__
     #
@@ -237,6 +246,14 @@ class MarzhauserDLL(object):
             dZA = ctypes.c_double(0.0)
             tango.LSX_MoveRel(self.LSID, dX, dY, dZA, dZA, self.wait)
 
+    ## halt
+    #
+    # Stop the stage.
+    #
+    def halt(self):
+        if self.good:
+            tango.LSX_StopAxes(self.LSID)
+
     ## jog
     #
     # @param x_speed Speed to jog the stage in x in um/s.
@@ -11,6 +11,7 @@ import time
 
 import sc_library.parameters as params
 
+import sc_hardware.baseClasses.stageHardware as stageHardware
 import sc_hardware.nationalInstruments.nicontrol as nicontrol
 import sc_hardware.serial.RS232 as RS232
 
@@ -19,7 +20,7 @@ import sc_hardware.serial.RS232 as RS232
 # Encapsulates control of a XY Prior stage, possibly with piezo Z control & a filter wheel.
 # Communication occurs by RS-232.
 #
-class Prior(RS232.RS232):
+class Prior(RS232.RS232, stageHardware.StageHardware):
 
     ## __init__
     #
@@ -38,7 +39,7 @@ class Prior(RS232.RS232):
         # RS232 stuff
         RS232.RS232.__init__(self, port, timeout, baudrate, "\r", wait_time)
         try:
-            test = self.commWithResp("?")
+            test = self.commWithResp("?", end_of_response = "END\r")
         except:
             self.live = False
         if not self.live:
@@ -55,7 +56,7 @@ class Prior(RS232.RS232):
     # @return The response to the command.
     #
     def _command(self, command):
-        response = self.commWithResp(command)
+        response = self.commWithResp(command, end_of_response = "\r")
         if response:
             return response.split("\r")
 
@@ -148,12 +149,21 @@ class Prior(RS232.RS232):
         self.sendCommand("GR " + str(dx * self.um_to_unit) + "," + str(dy * self.um_to_unit))
         self.waitResponse()
 
+    ## halt
+    #
+    # Stop the stage.
+    #
+    def halt(self):
+        self._command("I")
+
     ## info
     #
     # @return Some information about the stage.
     #
     def info(self):
-        return self._command("?")
+        response = self.commWithResp("?", end_of_response = "END\r")
+        if response:
+            return response.split("\r")
 
     ## jog
     #
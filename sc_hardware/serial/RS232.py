@@ -8,29 +8,162 @@
 #
 
 import serial
+import threading
 import time
 
+## RS232Reader
+#
+# Reads from the port in a background thread so that responses can be
+# returned as soon as they arrive instead of after a fixed delay.
+#
+class RS232Reader(threading.Thread):
+
+    ## __init__
+    #
+    # @param tty A serial.Serial object.
+    #
+    def __init__(self, tty):
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+        self.buffer = ""
+        self.condition = threading.Condition()
+        self.last_data = time.time()
+        self.running = True
+        self.tty = tty
+
+    ## clear
+    #
+    # Discard any data that has been read but not yet returned.
+    #
+    def clear(self):
+        with self.condition:
+            self.buffer = ""
+
+    ## readAll
+    #
+    # Wait until the port has been quiet for quiet_time then return
+    # everything that has been read.
+    #
+    # @param quiet_time How long the port needs to be quiet (in seconds).
+    #
+    # @return The data that was read (possibly "").
+    #
+    def readAll(self, quiet_time):
+        with self.condition:
+            while self.running:
+                remaining = self.last_data + quiet_time - time.time()
+                if (remaining <= 0.0):
+                    break
+                self.condition.wait(remaining)
+            response = self.buffer
+            self.buffer = ""
+            return response
+
+    ## readUntil
+    #
+    # Wait for the end of a response, or until timeout seconds have elapsed.
+    #
+    # @param end_of_response The character(s) that mark the end of the response.
+    # @param timeout How long to wait for the response (in seconds).
+    # @param quiet_time (Optional) If this is greater than zero, keep reading until the port has been quiet for this long.
+    #
+    # @return [response, True/False the end of the response was found].
+    #
+    def readUntil(self, end_of_response, timeout, quiet_time = 0.0):
+        deadline = time.time() + timeout
+        with self.condition:
+            index = self.buffer.find(end_of_response)
+            while (index == -1) and self.running:
+                remaining = deadline - time.time()
+                if (remaining <= 0.0):
+                    break
+                self.condition.wait(remaining)
+                index = self.buffer.find(end_of_response)
+
+            # Timed out, return whatever we got.
+            if (index == -1):
+                response = self.buffer
+                self.buffer = ""
+                return [response, False]
+
+            # Found it, wait for the rest of a multi-line response.
+            if (quiet_time > 0.0):
+                return [self.readAll(quiet_time), True]
+
+            index += len(end_of_response)
+            response = self.buffer[:index]
+            self.buffer = self.buffer[index:]
+            return [response, True]
+
+    ## run
+    #
+    def run(self):
+        while self.running:
+            try:
+                data = self.tty.read(max(1, self.tty.inWaiting()))
+            except Exception as e:
+                # Errors are expected when the port is closed while stopping.
+                if self.running:
+                    print "RS232 Reader Error:", type(e), str(e)
+                data = ""
+                self.running = False
+
+            with self.condition:
+                if (len(data) > 0):
+                    self.buffer += data
+                    self.last_data = time.time()
+                self.condition.notifyAll()
+
+    ## stop
+    #
+    # Stop the thread, this interrupts a blocking read if the
+    # version of pySerial supports it.
+    #
+    def stop(self):
+        self.running = False
+        if hasattr(self.tty, "cancel_read"):
+            self.tty.cancel_read()
+        self.join(1.0)
+
+
 ## RS232
 #
 # The basic RS-232 communication object which is used by all the objects
 # that communicate with their associated hardware using RS-232.
 #
+# Responses are collected by a RS232Reader thread, methods that wait for a
+# response return as soon as the end of the response has arrived.
+#
 class RS232(object):
 
     ## __init__
     #
     # @param port The port for RS-232 communication, e.g. "COM4".
-    # @param timeout The time out value for communication.
+    # @param timeout The time out value for communication (this is the read time out of the reader thread).
     # @param baudrate The RS-232 communication speed, e.g. 9800.
     # @param end_of_line What character(s) are used to indicate the end of a line.
     # @param wait_time How long to wait between polling events before it is decided that there is no new data available on the port.
+    # @param kwds (Optional) Any additional serial.Serial parameters, e.g. parity.
     #
-    def __init__(self, port, timeout, baudrate, end_of_line, wait_time):
+    def __init__(self, port, timeout, baudrate, end_of_line, wait_time, **kwds):
+        self.lock = threading.RLock()
+        self.reader = None
         try:
-            self.tty = serial.Serial(port, baudrate, timeout = timeout)
+            self.tty = serial.Serial(port, baudrate, timeout = timeout, **kwds)
             self.tty.flush()
             self.end_of_line = end_of_line
             self.wait_time = wait_time
+
+            # How long the port has to be quiet before a multi-line response
+            # is considered complete, this is roughly 5 characters.
+            self.quiet_time = 50.0/float(baudrate)
+
+            # How long to wait for a response that might never come.
+            self.response_timeout = 10 * self.wait_time
+
+            self.reader = RS232Reader(self.tty)
+            self.reader.start()
             self.live = True
             time.sleep(self.wait_time)
         except Exception as e:
@@ -42,22 +175,51 @@ class RS232(object):
     # Send a command and wait (a little) for a response.
     #
     # @param command The command to send (as a string).
+    # @param end_of_response (Optional) The expected character(s) at the end of the response string. If this is not specified the response can be multiple lines.
     #
     # @return The response from the hardware (if any).
     #
-    def commWithResp(self, command):
-        self.tty.flush()
-        self.tty.write(command + self.end_of_line)
-        time.sleep(10 * self.wait_time)
-        response = ""
-        response_len = self.tty.inWaiting()
-        while response_len:
-            response += self.tty.read(response_len)
-            time.sleep(self.wait_time)
-            response_len = self.tty.inWaiting()
+    def commWithResp(self, command, end_of_response = None):
+        with self.lock:
+            # Discard anything left over from earlier commands.
+            self.reader.clear()
+            self.tty.write(command + self.end_of_line)
+            if end_of_response is None:
+                [response, found] = self.reader.readUntil(self.end_of_line,
+                                                          self.response_timeout,
+                                                          quiet_time = self.quiet_time)
+            else:
+                [response, found] = self.reader.readUntil(end_of_response,
+                                                          self.response_timeout)
         if len(response) > 0:
             return response
 
+    ## commWithRespPipelined
+    #
+    # Send several commands at once and then collect one response per command.
+    # This is a lot faster than waiting for each response in turn, but only
+    # works with hardware that can queue commands.
+    #
+    # @param commands A list of commands to send.
+    # @param end_of_response (Optional) The expected character(s) at the end of each response, defaults to end_of_line.
+    #
+    # @return A list of the responses (None if there was no response).
+    #
+    def commWithRespPipelined(self, commands, end_of_response = None):
+        if end_of_response is None:
+            end_of_response = self.end_of_line
+        responses = []
+        with self.lock:
+            self.reader.clear()
+            self.tty.write("".join(map(lambda x: x + self.end_of_line, commands)))
+            for command in commands:
+                [response, found] = self.reader.readUntil(end_of_response, self.response_timeout)
+                if found:
+                    responses.append(response)
+                else:
+                    responses.append(None)
+        return responses
+
     ## getResponse
     #
     # Wait (a little) for a response.
@@ -65,12 +227,7 @@ class RS232(object):
     # @return The response from the hardware (if any).
     #
     def getResponse(self):
-        response = ""
-        response_len = self.tty.inWaiting()
-        while response_len:
-            response += self.tty.read(response_len)
-            time.sleep(self.wait_time)
-            response_len = self.tty.inWaiting()
+        response = self.reader.readAll(self.wait_time)
         if len(response) > 0:
             return response
 
@@ -86,8 +243,8 @@ class RS232(object):
     # @param command The command to send to the hardware.
     #
     def sendCommand(self, command):
-        self.tty.flush()
-        self.tty.write(command + self.end_of_line)
+        with self.lock:
+            self.tty.write(command + self.end_of_line)
 
     ## shutDown
     #
@@ -95,6 +252,8 @@ class RS232(object):
     #
     def shutDown(self):
         if self.live and hasattr(self, "tty"):
+            self.reader.stop()
+            self.tty.close()
             del(self.tty)
 
     ## waitResponse
@@ -106,23 +265,17 @@ class RS232(object):
     # first end_of_line character.
     #
     # @param end_of_response (Optional) The expected character(s) at the end of the response string, defaults to end_of_line.
-    # @param max_attempts (Optional) How many cycles of polling to undertake before giving up, defaults to 200.
+    # @param max_attempts (Optional) How many wait_time periods to wait before giving up, defaults to 200.
     #
     # @return The response from the hardware (if any).
     #
     def waitResponse(self, end_of_response = False, max_attempts = 200):
         if not end_of_response:
             end_of_response = str(self.end_of_line)
-        attempts = 0
-        response = ""
-        index = -1
-        while (index == -1) and (attempts < max_attempts):
-            response_len = self.tty.inWaiting()
-            if response_len > 0:
-                response += self.tty.read(response_len)
-            time.sleep(self.wait_time)
-            index = response.find(end_of_response)
-            attempts += 1
+        with self.lock:
+            [response, found] = self.reader.readUntil(end_of_response, max_attempts * self.wait_time)
+            if found:
+                response += self.reader.readAll(0.0)
         return response
 
 
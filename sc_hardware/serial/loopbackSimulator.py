@@ -0,0 +1,303 @@
+#!/usr/bin/python
+#
+## @file
+#
+# Simulated RS-232 hardware for testing without the hardware. The
+# simulator is connected to one end of a pseudo-terminal and the
+# hardware class is pointed at the other end, e.g.
+#
+#   simulator = LoopbackSimulator(PriorDevice())
+#   stage = prior.Prior(port = simulator.getPortName())
+#
+# Pseudo-terminals are only available on Linux / OS-X.
+#
+# Hazen 10/15
+#
+
+import os
+import pty
+import select
+import threading
+import time
+import tty
+
+
+## Device
+#
+# Base class for simulated devices.
+#
+class Device(object):
+
+    ## __init__
+    #
+    # @param end_of_line The character(s) that mark the end of a command.
+    # @param latency (Optional) How long the device takes to respond to a command in seconds, defaults to 0.001.
+    #
+    def __init__(self, end_of_line, latency = 0.001):
+        self.end_of_line = end_of_line
+        self.latency = latency
+
+    ## respond
+    #
+    # @param command The command (without the end of line character(s)).
+    #
+    # @return The response to the command (or None).
+    #
+    def respond(self, command):
+        return None
+
+
+## HamiltonDevice
+#
+# A simulated chain of Hamilton MVP valves.
+#
+class HamiltonDevice(Device):
+
+    ## __init__
+    #
+    # @param num_valves (Optional) The number of valves in the chain, defaults to 2.
+    # @param move_time (Optional) How long it takes to change ports in seconds, defaults to 0.5.
+    #
+    def __init__(self, num_valves = 2, move_time = 0.5):
+        Device.__init__(self, "\r")
+        self.acknowledge = "\x06"
+        self.carriage_return = "\x13"
+        self.negative_acknowledge = "\x21"
+        self.move_time = move_time
+        self.num_valves = num_valves
+
+        self.move_done = []
+        self.ports = []
+        for i in range(self.num_valves):
+            self.move_done.append(0.0)
+            self.ports.append(1)
+
+    ## respond
+    #
+    # The response format is the one that HamiltonMVP.inquireAndRespond() expects.
+    #
+    # @param command The command (without the end of line character(s)).
+    #
+    # @return The response to the command (or None).
+    #
+    def respond(self, command):
+        if (command == "1a"):
+            return None
+
+        valve_ID = ord(command[0]) - 97
+        if (valve_ID < 0) or (valve_ID >= self.num_valves):
+            return None
+        command = command[1:]
+
+        reply = None
+        if (command == "LXR"):
+            self.ports[valve_ID] = 1
+            self.move_done[valve_ID] = time.time() + self.move_time
+        elif (command == "LQT"):
+            reply = "2"
+        elif (command == "LQP"):
+            reply = str(self.ports[valve_ID])
+        elif (command == "F"):
+            if (time.time() > self.move_done[valve_ID]):
+                reply = "Y"
+            else:
+                reply = "N"
+        elif (command == "G"):
+            reply = "N"
+        elif (command[:2] == "LP") and (command[-1] == "R"):
+            self.ports[valve_ID] = int(command[3:-1])
+            self.move_done[valve_ID] = time.time() + self.move_time
+        else:
+            return self.negative_acknowledge + self.carriage_return
+
+        if reply is None:
+            return self.acknowledge + self.carriage_return
+        else:
+            return self.acknowledge + reply + self.carriage_return
+
+
+## PriorDevice
+#
+# A simulated Prior XY stage (with a filter wheel).
+#
+class PriorDevice(Device):
+
+    ## __init__
+    #
+    # @param speed (Optional) The stage speed in um / second, defaults to 10000.0.
+    #
+    def __init__(self, speed = 10000.0):
+        Device.__init__(self, "\r")
+        self.filter = 1
+        self.move_done = 0.0
+        self.speed = speed
+        self.x = 0
+        self.y = 0
+        self.z = 0
+
+    ## moveTo
+    #
+    # @param x The x position to move to.
+    # @param y The y position to move to.
+    #
+    def moveTo(self, x, y):
+        distance = max(abs(x - self.x), abs(y - self.y))
+        self.move_done = time.time() + distance/self.speed
+        self.x = x
+        self.y = y
+
+    ## respond
+    #
+    # @param command The command (without the end of line character(s)).
+    #
+    # @return The response to the command (or None).
+    #
+    def respond(self, command):
+        if (command == "?"):
+            return "PROSCAN INFORMATION\rSIMULATED STAGE\rEND\r"
+        elif (command == "$"):
+            if (time.time() < self.move_done):
+                return "3\r"
+            return "0\r"
+        elif (command == "P"):
+            return "{0:d},{1:d},{2:d}\r".format(self.x, self.y, self.z)
+        elif (command == "P 0,0,0"):
+            self.x = 0
+            self.y = 0
+            self.z = 0
+            return "0\r"
+        elif (command[:2] == "G "):
+            [x, y] = map(lambda v: int(round(float(v))), command[2:].split(","))
+            self.moveTo(x, y)
+            return "R\r"
+        elif (command[:3] == "GR "):
+            [dx, dy] = map(lambda v: int(round(float(v))), command[3:].split(","))
+            self.moveTo(self.x + dx, self.y + dy)
+            return "R\r"
+        elif (command == "7,1,F"):
+            return str(self.filter) + "\r"
+        elif (command[:4] == "7,1,"):
+            self.filter = int(command[4:])
+            return "R\r"
+        else:
+            return "0\r"
+
+
+## LoopbackSimulator
+#
+# Connects a simulated device to a pseudo-terminal. Commands are handled
+# in the order that they are received, so this also works for pipelined
+# commands.
+#
+class LoopbackSimulator(threading.Thread):
+
+    ## __init__
+    #
+    # @param device A Device object.
+    #
+    def __init__(self, device):
+        threading.Thread.__init__(self)
+        self.daemon = True
+
+        self.device = device
+        self.running = True
+
+        [self.master, self.slave] = pty.openpty()
+        tty.setraw(self.slave)
+        self.port_name = os.ttyname(self.slave)
+        self.start()
+
+    ## getPortName
+    #
+    # @return The name of the port that the hardware class should use.
+    #
+    def getPortName(self):
+        return self.port_name
+
+    ## run
+    #
+    def run(self):
+        eol = self.device.end_of_line
+        buffer = ""
+        while self.running:
+            [ready, w, x] = select.select([self.master], [], [], 0.1)
+            if not ready:
+                continue
+            try:
+                data = os.read(self.master, 1024)
+            except OSError:
+                break
+            buffer += data
+            index = buffer.find(eol)
+            while (index != -1):
+                command = buffer[:index]
+                buffer = buffer[index + len(eol):]
+                response = self.device.respond(command)
+                if response is not None:
+                    time.sleep(self.device.latency)
+                    os.write(self.master, response)
+                index = buffer.find(eol)
+
+    ## stop
+    #
+    def stop(self):
+        self.running = False
+        self.join()
+        os.close(self.slave)
+        os.close(self.master)
+
+
+#
+# Testing
+#
+
+if __name__ == "__main__":
+
+    import sc_hardware.prior.prior as prior
+
+    simulator = LoopbackSimulator(PriorDevice())
+    stage = prior.Prior(port = simulator.getPortName())
+    print stage.info()
+
+    # Round trip latency.
+    n_reps = 100
+    start_time = time.time()
+    for i in range(n_reps):
+        stage.position()
+    print "position() round trip: {0:.2f}ms".format(1000.0 * (time.time() - start_time)/n_reps)
+
+    start_time = time.time()
+    for i in range(n_reps):
+        stage.commWithRespPipelined(["P", "$"])
+    print "pipelined position & status: {0:.2f}ms".format(1000.0 * (time.time() - start_time)/n_reps)
+
+    stage.goAbsolute(1000, 1000)
+    print stage.position(), stage.active()
+
+    stage.shutDown()
+    simulator.stop()
+
+
+#
+# The MIT License
+#
+# Copyright (c) 2015 Zhuang Lab, Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
@@ -0,0 +1,113 @@
+#!/usr/bin/python
+#
+## @file
+#
+# Tests of the RS232 class using the loopback simulator. These need
+# pseudo-terminals so they only run on Linux / OS-X.
+#
+# python -m unittest sc_hardware.serial.test_RS232
+#
+# Hazen 10/15
+#
+
+import time
+import unittest
+
+import sc_hardware.serial.loopbackSimulator as loopbackSimulator
+import sc_hardware.serial.RS232 as RS232
+
+
+## RS232TestCase
+#
+# Connects a RS232 object to a simulated Prior stage.
+#
+class RS232TestCase(unittest.TestCase):
+
+    timeout = 1.0
+
+    def setUp(self):
+        self.device = loopbackSimulator.PriorDevice()
+        self.simulator = loopbackSimulator.LoopbackSimulator(self.device)
+        self.port = RS232.RS232(self.simulator.getPortName(), self.timeout, 9600, "\r", 0.02)
+        self.assertTrue(self.port.getStatus())
+
+    def tearDown(self):
+        self.port.shutDown()
+        self.simulator.stop()
+
+    def test_comm_with_resp(self):
+        self.assertEqual(self.port.commWithResp("P", end_of_response = "\r"), "0,0,0\r")
+
+    def test_multi_line_response(self):
+        self.assertEqual(self.port.commWithResp("?"), "PROSCAN INFORMATION\rSIMULATED STAGE\rEND\r")
+
+    def test_pipelined(self):
+        self.port.commWithResp("G 100,200", end_of_response = "\r")
+        self.assertEqual(self.port.commWithRespPipelined(["P", "7,1,F", "P"]),
+                         ["100,200,0\r", "1\r", "100,200,0\r"])
+
+    def test_stale_response_discarded(self):
+        # The response to this command is never read.
+        self.port.sendCommand("7,1,F")
+        time.sleep(0.1)
+        self.assertEqual(self.port.commWithResp("P", end_of_response = "\r"), "0,0,0\r")
+        self.port.sendCommand("7,1,F")
+        time.sleep(0.1)
+        self.assertEqual(self.port.commWithRespPipelined(["P"]), ["0,0,0\r"])
+
+    def test_round_trip_latency(self):
+        start_time = time.time()
+        for i in range(20):
+            self.port.commWithResp("P", end_of_response = "\r")
+        self.assertTrue((time.time() - start_time)/20.0 < 10 * self.port.wait_time)
+
+    def test_no_response(self):
+        self.device.respond = lambda command: None
+        start_time = time.time()
+        self.assertEqual(self.port.commWithResp("P", end_of_response = "\r"), None)
+        self.assertTrue((time.time() - start_time) >= self.port.response_timeout)
+
+
+## RS232BlockingTestCase
+#
+# No read time out, the reader thread blocks until there is data.
+#
+class RS232BlockingTestCase(RS232TestCase):
+
+    timeout = None
+
+    def test_shut_down(self):
+        start_time = time.time()
+        self.port.shutDown()
+        self.assertTrue((time.time() - start_time) < 0.5)
+        self.assertFalse(self.port.reader.isAlive())
+        self.port.live = False
+
+
+if __name__ == "__main__":
+    unittest.main()
+
+
+#
+# The MIT License
+#
+# Copyright (c) 2015 Zhuang Lab, Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
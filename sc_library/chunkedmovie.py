@@ -0,0 +1,328 @@
+#!/usr/bin/python
+#
+## @file
+#
+# The compressed, chunked movie format (.zax). The frames are saved in
+# chunks of (usually) 16 frames, each chunk is byte-shuffled and then
+# compressed independently of the others. STORM movies are mostly dark
+# background so they compress well, which reduces both the disk space
+# and the disk bandwidth that is needed to save them.
+#
+# The file layout is:
+#
+#  1. A 32 byte header (see header_format).
+#  2. The chunks, each with a 16 byte chunk header (see chunk_format)
+#     followed by the compressed data. Chunks are not necessarily in
+#     order as they are written by whichever compression thread
+#     finishes first.
+#  3. The index, one index_format record per chunk, in order.
+#  4. A 16 byte trailer (see trailer_format).
+#
+# The index is written when the file is closed. If it is missing (for
+# example because HAL crashed) the reader rebuilds it by scanning the
+# chunk headers.
+#
+# If the blosc module is available it is used for compression (lz4 with
+# the blosc shuffle filter). Otherwise the data is shuffled with numpy
+# and compressed with zlib. The codec is recorded in the header so the
+# reader always knows how to decompress a file.
+#
+# Hazen 10/15
+#
+
+import numpy
+import os
+import Queue
+import struct
+import threading
+import zlib
+
+try:
+    import blosc
+except ImportError:
+    blosc = None
+
+codec_zlib = 0
+codec_blosc = 1
+
+magic = "ZAX1"
+index_magic = "ZIDX"
+
+# magic, version, codec, x pixels, y pixels, frames per chunk, bytes per pixel, (padding).
+header_format = "<4sHHIIIH10x"
+header_size = struct.calcsize(header_format)
+
+# chunk number, number of frames, compressed size, (padding).
+chunk_format = "<IIQ"
+chunk_size = struct.calcsize(chunk_format)
+
+# offset of the chunk (data), compressed size, number of frames.
+index_format = "<QQI"
+index_size = struct.calcsize(index_format)
+
+# index offset, number of chunks, index magic.
+trailer_format = "<QI4s"
+trailer_size = struct.calcsize(trailer_format)
+
+
+## ChunkedMovieException
+#
+# Chunked movie exception.
+#
+class ChunkedMovieException(Exception):
+    pass
+
+
+## compressChunk
+#
+# @param np_data A numpy.uint16 array.
+# @param codec The codec to use.
+#
+# @return The compressed data as a string.
+#
+def compressChunk(np_data, codec):
+    if (codec == codec_blosc):
+        return blosc.compress(np_data.tostring(),
+                              typesize = np_data.itemsize,
+                              clevel = 5,
+                              shuffle = blosc.SHUFFLE,
+                              cname = "lz4")
+    else:
+        shuffled = numpy.ascontiguousarray(np_data.view(numpy.uint8).reshape(-1, np_data.itemsize).transpose())
+        return zlib.compress(shuffled.tostring(), 1)
+
+## decompressChunk
+#
+# @param data The compressed data as a string.
+# @param codec The codec that was used to compress the data.
+# @param dtype The numpy type of the data.
+#
+# @return A numpy array containing the data.
+#
+def decompressChunk(data, codec, dtype):
+    itemsize = numpy.dtype(dtype).itemsize
+    if (codec == codec_blosc):
+        if blosc is None:
+            raise ChunkedMovieException("The blosc module is needed to read this file.")
+        return numpy.fromstring(blosc.decompress(data), dtype = dtype)
+    elif (codec == codec_zlib):
+        shuffled = numpy.fromstring(zlib.decompress(data), dtype = numpy.uint8)
+        return numpy.ascontiguousarray(shuffled.reshape(itemsize, -1).transpose()).view(dtype).flatten()
+    else:
+        raise ChunkedMovieException("Unknown codec " + str(codec))
+
+## defaultCodec
+#
+# @return The best codec that is available.
+#
+def defaultCodec():
+    if blosc is not None:
+        return codec_blosc
+    else:
+        return codec_zlib
+
+## readHeader
+#
+# @param fp A file pointer.
+#
+# @return [codec, x pixels, y pixels, frames per chunk, bytes per pixel].
+#
+def readHeader(fp):
+    fp.seek(0)
+    data = fp.read(header_size)
+    if (len(data) != header_size):
+        raise ChunkedMovieException("File is too short.")
+    [file_magic, version, codec, x_pixels, y_pixels, chunk_frames, bytes_per_pixel] = struct.unpack(header_format, data)
+    if (file_magic != magic):
+        raise ChunkedMovieException("Not a chunked movie file.")
+    return [codec, x_pixels, y_pixels, chunk_frames, bytes_per_pixel]
+
+## readIndex
+#
+# @param fp A file pointer.
+#
+# @return A list of [offset, compressed size, number of frames], one for each chunk.
+#
+def readIndex(fp):
+
+    # Try the index at the end of the file.
+    fp.seek(0, 2)
+    file_size = fp.tell()
+    if (file_size >= (header_size + trailer_size)):
+        fp.seek(file_size - trailer_size)
+        [index_offset, n_chunks, file_magic] = struct.unpack(trailer_format, fp.read(trailer_size))
+        if (file_magic == index_magic) and ((index_offset + n_chunks * index_size + trailer_size) == file_size):
+            fp.seek(index_offset)
+            data = fp.read(n_chunks * index_size)
+            index = []
+            for i in range(n_chunks):
+                index.append(list(struct.unpack_from(index_format, data, i * index_size)))
+            return index
+
+    # No index, rebuild it from the chunk headers.
+    return scanChunks(fp, file_size)
+
+## scanChunks
+#
+# Build the index by reading the chunk headers.
+#
+# @param fp A file pointer.
+# @param file_size The size of the file in bytes.
+#
+# @return A list of [offset, compressed size, number of frames], one for each chunk.
+#
+def scanChunks(fp, file_size):
+    chunks = {}
+    offset = header_size
+    while ((offset + chunk_size) <= file_size):
+        fp.seek(offset)
+        [chunk_number, n_frames, compressed_size] = struct.unpack(chunk_format, fp.read(chunk_size))
+        if ((offset + chunk_size + compressed_size) > file_size):
+            break
+        chunks[chunk_number] = [offset + chunk_size, compressed_size, n_frames]
+        offset += chunk_size + compressed_size
+
+    # Only keep the chunks up to the first one that is missing.
+    index = []
+    while (len(index) in chunks):
+        index.append(chunks[len(index)])
+    return index
+
+
+## ChunkWriter
+#
+# Compresses and writes chunks of frames on a pool of threads. This
+# does not copy the frame data, so it is up to the caller to not
+# change a chunk after it has been given to the writer.
+#
+class ChunkWriter(object):
+
+    ## __init__
+    #
+    # @param fp A file pointer, this should be opened in "wb" mode.
+    # @param x_pixels The frame size in x.
+    # @param y_pixels The frame size in y.
+    # @param chunk_frames (Optional) The (maximum) number of frames in a chunk, defaults to 16.
+    # @param codec (Optional) The codec to use, defaults to the best available.
+    # @param n_threads (Optional) The number of compression threads, defaults to 4.
+    #
+    def __init__(self, fp, x_pixels, y_pixels, chunk_frames = 16, codec = None, n_threads = 4):
+        self.chunks = {}
+        self.codec = codec
+        self.error = None
+        self.file_lock = threading.Lock()
+        self.fp = fp
+        self.n_chunks = 0
+        self.queue = Queue.Queue(2 * n_threads)
+        self.threads = []
+
+        if self.codec is None:
+            self.codec = defaultCodec()
+
+        self.fp.write(struct.pack(header_format, magic, 1, self.codec, x_pixels, y_pixels, chunk_frames, 2))
+
+        for i in range(n_threads):
+            thread = threading.Thread(target = self.compressChunks)
+            thread.daemon = True
+            thread.start()
+            self.threads.append(thread)
+
+    ## addChunk
+    #
+    # This blocks if the compression threads are not keeping up.
+    #
+    # @param np_data A numpy array containing one or more frames.
+    # @param n_frames The number of frames in np_data.
+    #
+    def addChunk(self, np_data, n_frames):
+        self.checkError()
+        self.queue.put([self.n_chunks, n_frames, np_data])
+        self.n_chunks += 1
+
+    ## checkError
+    #
+    # Raise the exception (if any) that occured in a compression thread.
+    #
+    def checkError(self):
+        if self.error is not None:
+            raise ChunkedMovieException("Compression thread failed: " + str(self.error))
+
+    ## close
+    #
+    # Wait for the compression threads to finish and write the index.
+    # This does not close the file pointer.
+    #
+    def close(self):
+        for thread in self.threads:
+            self.queue.put(None)
+        for thread in self.threads:
+            thread.join()
+        self.threads = []
+        self.checkError()
+
+        index_offset = self.fp.tell()
+        for i in range(self.n_chunks):
+            self.fp.write(struct.pack(index_format, *self.chunks[i]))
+        self.fp.write(struct.pack(trailer_format, index_offset, self.n_chunks, index_magic))
+
+    ## compressChunks
+    #
+    # The compression thread.
+    #
+    def compressChunks(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                break
+            if self.error is not None:
+                continue
+            [chunk_number, n_frames, np_data] = item
+            try:
+                data = compressChunk(np_data, self.codec)
+                self.file_lock.acquire()
+                try:
+                    self.fp.write(struct.pack(chunk_format, chunk_number, n_frames, len(data)))
+                    offset = self.fp.tell()
+                    self.fp.write(data)
+                    self.chunks[chunk_number] = [offset, len(data), n_frames]
+                finally:
+                    self.file_lock.release()
+            except Exception as exception:
+                self.error = exception
+
+    ## sync
+    #
+    # Flush the chunks that have been written so far to the disk.
+    #
+    def sync(self):
+        self.file_lock.acquire()
+        try:
+            self.fp.flush()
+            os.fsync(self.fp.fileno())
+        finally:
+            self.file_lock.release()
+
+
+#
+# The MIT License
+#
+# Copyright (c) 2015 Zhuang Lab, Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
@@ -12,6 +12,7 @@ import os
 from PIL import Image
 import re
 
+import sc_library.chunkedmovie as chunkedmovie
 import sc_library.parameters as parameters
 
 #
@@ -28,17 +29,17 @@ def infToXmlObject(filename):
     xml.set("faked_xml", True)
     
     # Add acquisition sub-object.
-    xml.set("acquisition", parameters.StormXMLObject([]))
+    xml.addSubSection("acquisition")
     xml.set("acquisition.camera", "camera1")
     
     # Add camera1 sub-object.
-    xml.set("camera1", parameters.StormXMLObject([]))
+    xml.addSubSection("camera1")
 
     # Add film sub-object.
-    xml.set("film", parameters.StormXMLObject([]))
+    xml.addSubSection("film")
     
     # Add mosaic sub-object.
-    xml.set("mosaic", parameters.StormXMLObject([]))
+    xml.addSubSection("mosaic")
 
     # Figure out movie type.
     no_ext_name = os.path.splitext(filename)[0]
@@ -48,8 +49,10 @@ def infToXmlObject(filename):
         xml.set("film.filetype", ".spe")
     elif os.path.exists(no_ext_name + ".tif"):
         xml.set("film.filetype", ".tif")
+    elif os.path.exists(no_ext_name + ".zax"):
+        xml.set("film.filetype", ".zax")
     else:
-        raise IOError("only .dax, .spe and .tif are supported (case sensitive..)")        
+        raise IOError("only .dax, .spe, .tif and .zax are supported (case sensitive..)")        
         
     # Extract the movie information from the associated inf file.
     size_re = re.compile(r'frame dimensions = ([\d]+) x ([\d]+)')
@@ -130,9 +133,11 @@ def reader(filename):
         return SpeReader(filename, xml)
     elif (file_type == ".tif"): 
         return TifReader(filename, xml)
+    elif (file_type == ".zax"):
+        return ZaxReader(filename, xml)
     else:
         print file_type, "is not a recognized file type"
-    raise IOError("only .dax, .spe and .tif are supported (case sensitive..)")
+    raise IOError("only .dax, .spe, .tif and .zax are supported (case sensitive..)")
 
 
 #
@@ -292,6 +297,50 @@ class TifReader(DataReader):
         return image_data
 
 
+#
+# Compressed dax reader class. The frames are stored in compressed
+# chunks, see chunkedmovie.py. The most recently used chunk is kept
+# so reading the frames in order only decompresses each chunk once.
+#
+class ZaxReader(DataReader):
+
+    # zax specific initialization
+    def __init__(self, filename, xml):
+        DataReader.__init__(self, filename, xml)
+
+        self.bigendian = self.xml.get("film.want_big_endian")
+        self.cached_chunk = None
+        self.cached_data = None
+
+        # open the zax file
+        self.fileptr = open(filename, "rb")
+        [self.codec, self.image_width, self.image_height, self.chunk_frames, bytes_per_pixel] = chunkedmovie.readHeader(self.fileptr)
+        self.index = chunkedmovie.readIndex(self.fileptr)
+
+        self.number_frames = 0
+        for chunk in self.index:
+            self.number_frames += chunk[2]
+
+    # load a frame & return it as a numpy array
+    def loadAFrame(self, frame_number):
+        if self.fileptr:
+            self.checkFrameNumber(frame_number)
+            chunk_number = frame_number / self.chunk_frames
+            if (chunk_number != self.cached_chunk):
+                [offset, compressed_size, n_frames] = self.index[chunk_number]
+                self.fileptr.seek(offset)
+                self.cached_data = chunkedmovie.decompressChunk(self.fileptr.read(compressed_size), self.codec, numpy.int16)
+                self.cached_chunk = chunk_number
+
+            frame_size = self.image_height * self.image_width
+            i = frame_number % self.chunk_frames
+            image_data = self.cached_data[i * frame_size:(i + 1) * frame_size].copy()
+            image_data = numpy.transpose(numpy.reshape(image_data, [self.image_width, self.image_height]))
+            if self.bigendian:
+                image_data.byteswap(True)
+            return image_data
+
+
 #
 # The MIT License
 #
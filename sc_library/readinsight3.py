@@ -0,0 +1,264 @@
+#!/usr/bin/python
+#
+## @file
+#
+# Memory mapped reader for Insight3 format localization (.bin) files.
+#
+# The localizations are never loaded as a whole, instead they are
+# accessed through a numpy.memmap. A per frame index is built (once)
+# the first time it is needed so that the localizations in a given
+# frame can be retrieved without having to search the entire file.
+#
+# Hazen 10/15
+#
+
+import numpy
+import struct
+
+# The size of the file header in bytes.
+header_size = 16
+
+## i3DataType
+#
+# @return A numpy data type to use for reading Insight3 format files.
+#
+def i3DataType():
+    return numpy.dtype([('x', numpy.float32),   # original x location
+                        ('y', numpy.float32),   # original y location
+                        ('xc', numpy.float32),  # drift corrected x location
+                        ('yc', numpy.float32),  # drift corrected y location
+                        ('h', numpy.float32),   # fit height
+                        ('a', numpy.float32),   # fit area
+                        ('w', numpy.float32),   # fit width
+                        ('phi', numpy.float32), # fit angle (for unconstrained elliptical gaussian)
+                        ('ax', numpy.float32),  # peak aspect ratio
+                        ('bg', numpy.float32),  # fit background
+                        ('i', numpy.float32),   # sum - baseline for pixels included in the peak
+                        ('c', numpy.int32),     # peak category ([0..9] for STORM images)
+                        ('fi', numpy.int32),    # fit iterations
+                        ('fr', numpy.int32),    # frame
+                        ('tl', numpy.int32),    # track length
+                        ('lk', numpy.int32),    # link (id of the next molecule in the trace)
+                        ('z', numpy.float32),   # original z coordinate
+                        ('zc', numpy.float32)]) # drift corrected z coordinate
+
+## readHeader
+#
+# @param fp A file pointer.
+#
+# @return [# frames, # localizations, file version, file status]
+#
+def readHeader(fp):
+    [version, frames, status, molecules] = struct.unpack("4siii", fp.read(header_size))
+    return [frames, molecules, version, status]
+
+
+## I3Reader
+#
+# Insight3 file reader. Frame numbers are as they are in the file,
+# i.e. the first frame is frame 1.
+#
+class I3Reader(object):
+
+    ## __init__
+    #
+    # @param filename The name of the Insight3 file.
+    # @param chunk_size (Optional) The number of localizations to process at a time when streaming through the file, defaults to 1000000.
+    #
+    def __init__(self, filename, chunk_size = 1000000):
+        self.chunk_size = chunk_size
+        self.filename = filename
+
+        # The frame index, created by buildIndex().
+        self.frame_order = None
+        self.frame_starts = None
+
+        with open(filename, "rb") as fp:
+            [self.frames, self.molecules, self.version, self.status] = readHeader(fp)
+
+        # Some files are truncated (i.e. analysis was still in progress).
+        n_records = (self.fileSize() - header_size)/i3DataType().itemsize
+        if (self.molecules > n_records):
+            print "Warning", filename, "only contains", n_records, "of", self.molecules, "localizations"
+            self.molecules = n_records
+
+        if (self.molecules > 0):
+            self.data = numpy.memmap(filename,
+                                     dtype = i3DataType(),
+                                     mode = "r",
+                                     offset = header_size,
+                                     shape = (self.molecules,))
+        else:
+            self.data = numpy.zeros(0, dtype = i3DataType())
+
+    ## buildIndex
+    #
+    # Creates the per frame index. This only needs the frame numbers
+    # of the localizations, which are read in chunks. Insight3 files are normally
+    # in frame order, in which case the index is just the offset of
+    # the first localization in each frame. Otherwise the localizations
+    # are also (stably) sorted by frame.
+    #
+    def buildIndex(self):
+        if self.frame_starts is not None:
+            return
+
+        # Pass 1, find the range of frame numbers & check the ordering.
+        max_frame = self.frames
+        is_sorted = True
+        last = None
+        for start in range(0, self.molecules, self.chunk_size):
+            fr = self.data['fr'][start:start + self.chunk_size]
+            max_frame = max(max_frame, int(fr.max()))
+            if is_sorted:
+                if (last is not None) and (fr[0] < last):
+                    is_sorted = False
+                elif numpy.any(fr[1:] < fr[:-1]):
+                    is_sorted = False
+                last = fr[-1]
+
+        # Pass 2, count the localizations in each frame.
+        counts = numpy.zeros(max_frame + 2, dtype = numpy.int64)
+        for start in range(0, self.molecules, self.chunk_size):
+            fr = numpy.clip(self.data['fr'][start:start + self.chunk_size], 0, max_frame + 1)
+            counts += numpy.bincount(fr, minlength = counts.size)
+
+        self.frame_starts = numpy.zeros(counts.size + 1, dtype = numpy.int64)
+        self.frame_starts[1:] = numpy.cumsum(counts)
+        if not is_sorted:
+            self.frame_order = numpy.argsort(self.data['fr'], kind = "mergesort")
+
+    ## close
+    #
+    # Close the memory map.
+    #
+    def close(self):
+        self.data = None
+        self.frame_order = None
+
+    ## fileSize
+    #
+    # @return The size of the file in bytes.
+    #
+    def fileSize(self):
+        with open(self.filename, "rb") as fp:
+            fp.seek(0, 2)
+            return fp.tell()
+
+    ## getData
+    #
+    # @return All the localizations as a (memory mapped) numpy array.
+    #
+    def getData(self):
+        return self.data
+
+    ## getFiltered
+    #
+    # Returns the localizations for which the filter function returns True. This
+    # streams through the file, so only the selected localizations are loaded.
+    #
+    # @param filter_fn A function that takes a chunk of localizations and returns a boolean mask.
+    #
+    # @return A numpy array containing the selected localizations.
+    #
+    def getFiltered(self, filter_fn):
+        selected = []
+        for chunk in self.iterChunks():
+            selected.append(chunk[filter_fn(chunk)])
+        if (len(selected) == 0):
+            return numpy.zeros(0, dtype = i3DataType())
+        return numpy.concatenate(selected)
+
+    ## getFrame
+    #
+    # This is O(1) once the index has been built. If the file is
+    # in frame order the result is a view into the memory map.
+    #
+    # @param frame The frame number.
+    #
+    # @return The localizations in the frame.
+    #
+    def getFrame(self, frame):
+        self.buildIndex()
+        if (frame < 0) or (frame >= (self.frame_starts.size - 2)):
+            return self.data[0:0]
+        start = self.frame_starts[frame]
+        stop = self.frame_starts[frame + 1]
+        if self.frame_order is None:
+            return self.data[start:stop]
+        else:
+            return self.data[self.frame_order[start:stop]]
+
+    ## getFrameCounts
+    #
+    # @return A numpy array containing the number of localizations in each frame.
+    #
+    def getFrameCounts(self):
+        self.buildIndex()
+        return numpy.diff(self.frame_starts)[:-1]
+
+    ## getNumberFrames
+    #
+    # @return The number of frames (as specified by the header).
+    #
+    def getNumberFrames(self):
+        return self.frames
+
+    ## getNumberMolecules
+    #
+    # @return The number of localizations in the file.
+    #
+    def getNumberMolecules(self):
+        return self.molecules
+
+    ## iterChunks
+    #
+    # @param chunk_size (Optional) The number of localizations in each chunk.
+    #
+    # @return A generator of (memory mapped) localization arrays.
+    #
+    def iterChunks(self, chunk_size = None):
+        if chunk_size is None:
+            chunk_size = self.chunk_size
+        for start in range(0, self.molecules, chunk_size):
+            yield self.data[start:start + chunk_size]
+
+    ## iterFrames
+    #
+    # @param first (Optional) The first frame, defaults to 1.
+    # @param last (Optional) The last frame, defaults to the last frame in the file.
+    #
+    # @return A generator of [frame number, localizations] for the frames that have localizations.
+    #
+    def iterFrames(self, first = 1, last = None):
+        self.buildIndex()
+        if last is None:
+            last = self.frame_starts.size - 3
+        for frame in range(first, last + 1):
+            if (self.frame_starts[frame + 1] > self.frame_starts[frame]):
+                yield [frame, self.getFrame(frame)]
+
+
+#
+# The MIT License
+#
+# Copyright (c) 2015 Zhuang Lab, Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
@@ -0,0 +1,406 @@
+#!/usr/bin/python
+#
+## @file
+#
+# Orders a set of capture positions so that the stage spends
+# as little time as possible moving between them.
+#
+# The ordering is found using a nearest neighbor tour that is
+# then improved with 2-opt. Moves are costed with a simple
+# stage model that has a separate speed for each axis, a
+# settle time and a penalty for reversing direction on an
+# axis (backlash, this is a problem with Prior stages).
+#
+# Hazen 10/15
+#
+
+import math
+
+import coord
+
+## StageModel
+#
+# A simple model of how long it takes the stage to move.
+#
+class StageModel(object):
+
+    ## __init__
+    #
+    # @param x_speed Stage speed in x in um/second.
+    # @param y_speed Stage speed in y in um/second.
+    # @param settle_time The time the stage needs to settle after a move in seconds.
+    # @param backlash_time The extra time in seconds for reversing direction on an axis.
+    #
+    def __init__(self, x_speed = 1000.0, y_speed = 1000.0, settle_time = 0.1, backlash_time = 0.0):
+        self.backlash_time = backlash_time
+        self.settle_time = settle_time
+        self.x_speed = x_speed
+        self.y_speed = y_speed
+
+    ## axisTime
+    #
+    # @param dx The distance to move in x in microns.
+    # @param dy The distance to move in y in microns.
+    #
+    # @return The time to travel dx, dy. The axis move simultaneously.
+    #
+    def axisTime(self, dx, dy):
+        return max(abs(dx)/self.x_speed, abs(dy)/self.y_speed)
+
+    ## moveTime
+    #
+    # @param start [x, y] start position in microns.
+    # @param end [x, y] end position in microns.
+    # @param last_dir [x direction, y direction] of the previous move (-1, 0 or 1), or None.
+    #
+    # @return [time in seconds, [x direction, y direction] of this move]
+    #
+    def moveTime(self, start, end, last_dir = None):
+        dx = end[0] - start[0]
+        dy = end[1] - start[1]
+        new_dir = [sign(dx), sign(dy)]
+        if (dx == 0.0) and (dy == 0.0):
+            return [0.0, last_dir]
+
+        time = self.axisTime(dx, dy) + self.settle_time
+        if last_dir is not None:
+            for i in range(2):
+                if (new_dir[i] != 0) and (last_dir[i] != 0) and (new_dir[i] != last_dir[i]):
+                    time += self.backlash_time
+                    break
+
+        # Axis that did not move keep their last direction.
+        if last_dir is not None:
+            for i in range(2):
+                if (new_dir[i] == 0):
+                    new_dir[i] = last_dir[i]
+        return [time, new_dir]
+
+
+## createStageModel
+#
+# Create a StageModel from a parameters object. Any parameters
+# that are not specified are given default values.
+#
+# @param parameters A parameters object.
+#
+# @return A StageModel object.
+#
+def createStageModel(parameters):
+    return StageModel(x_speed = parameters.get("stage_x_speed", 1000.0),
+                      y_speed = parameters.get("stage_y_speed", 1000.0),
+                      settle_time = parameters.get("stage_settle_time", 0.1),
+                      backlash_time = parameters.get("stage_backlash_time", 0.0))
+
+## distance
+#
+# @param p1 [x, y] of the first point.
+# @param p2 [x, y] of the second point.
+#
+# @return The euclidean distance between p1 and p2.
+#
+def distance(p1, p2):
+    return math.sqrt((p1[0] - p2[0]) * (p1[0] - p2[0]) + (p1[1] - p2[1]) * (p1[1] - p2[1]))
+
+## nearestNeighbor
+#
+# Create a tour starting at start_index using the nearest neighbor heuristic.
+#
+# @param points A list of [x, y] positions.
+# @param model A StageModel object.
+# @param start_index The index of the first point in the tour.
+#
+# @return A list of indexes into points.
+#
+def nearestNeighbor(points, model, start_index):
+    remaining = range(len(points))
+    remaining.remove(start_index)
+    order = [start_index]
+    while (len(remaining) > 0):
+        current = points[order[-1]]
+        best = remaining[0]
+        best_time = None
+        for i in remaining:
+            time = model.axisTime(points[i][0] - current[0], points[i][1] - current[1])
+            if (best_time is None) or (time < best_time):
+                best = i
+                best_time = time
+        order.append(best)
+        remaining.remove(best)
+    return order
+
+## orderPictureList
+#
+# Re-order a picture list of the form used by steve.Window.takePictures(),
+# i.e. [coord.Point, [tx, ty], [tx, ty], .., coord.Point, [tx, ty], ..].
+# Each coord.Point starts a group and the [tx, ty] offsets that follow
+# it are relative to that point in units of tiles. The point at the
+# start of each group is always taken first, the offsets in the
+# group and the groups themselves are re-ordered.
+#
+# @param picture_list The list of pictures to take.
+# @param model A StageModel object.
+# @param tile_size [x size, y size] of a tile in microns.
+# @param serpentine (Optional) Constrain the path within a group to a serpentine, defaults to False.
+#
+# @return [re-ordered picture_list, total travel in microns, estimated move time in seconds].
+#
+def orderPictureList(picture_list, model, tile_size, serpentine = False):
+
+    # Split into groups.
+    groups = []
+    for item in picture_list:
+        if isinstance(item, coord.Point):
+            groups.append([item])
+        elif (len(groups) > 0):
+            groups[-1].append(item)
+    if (len(groups) == 0):
+        return [picture_list, 0.0, 0.0]
+
+    # Order the tiles in each group.
+    ordered = []
+    for group in groups:
+        center = group[0].getUm()
+        points = [center]
+        for [tx, ty] in group[1:]:
+            points.append([center[0] + tile_size[0] * tx, center[1] + tile_size[1] * ty])
+        order = planPath(points, model, start_index = 0, serpentine = serpentine)
+        ordered.append([[group[0]] + [group[i] for i in order[1:]],
+                        [points[i] for i in order]])
+
+    # Order the groups, keeping the first group first.
+    order = planPath([group[1][0] for group in ordered], model, start_index = 0)
+
+    new_list = []
+    all_points = []
+    for i in order:
+        new_list.extend(ordered[i][0])
+        all_points.extend(ordered[i][1])
+    [travel, time] = pathTime(all_points, range(len(all_points)), model)
+    return [new_list, travel, time]
+
+## pathTime
+#
+# @param points A list of [x, y] positions.
+# @param order The order in which to visit the points.
+# @param model A StageModel object.
+# @param start (Optional) [x, y] position of the stage before the first move.
+#
+# @return [total travel in microns, total move time in seconds].
+#
+def pathTime(points, order, model, start = None):
+    if (len(order) == 0):
+        return [0.0, 0.0]
+    if start is None:
+        last = points[order[0]]
+    else:
+        last = start
+    last_dir = None
+    travel = 0.0
+    total_time = 0.0
+    for i in order:
+        travel += distance(last, points[i])
+        [time, last_dir] = model.moveTime(last, points[i], last_dir)
+        total_time += time
+        last = points[i]
+    return [travel, total_time]
+
+## planPath
+#
+# Find a fast order in which to visit points.
+#
+# @param points A list of [x, y] positions in microns.
+# @param model A StageModel object.
+# @param start_index (Optional) The index of a point that must be visited first, defaults to None.
+# @param serpentine (Optional) Constrain the path to a row by row serpentine, defaults to False.
+#
+# @return A list of indexes into points.
+#
+def planPath(points, model, start_index = None, serpentine = False):
+    if (len(points) < 3):
+        return range(len(points))
+
+    if serpentine:
+        return serpentinePath(points, model, start_index)
+
+    # Without a fixed start, try starting from each of the 'corner' points.
+    if start_index is None:
+        starts = []
+        for key in [lambda p: p[0], lambda p: p[1], lambda p: p[0] + p[1], lambda p: p[0] - p[1]]:
+            values = map(key, points)
+            for index in [values.index(min(values)), values.index(max(values))]:
+                if not (index in starts):
+                    starts.append(index)
+    else:
+        starts = [start_index]
+
+    # Try nearest neighbor from every allowed start, then improve the best one.
+    best_order = None
+    best_time = None
+    for start in starts:
+        order = nearestNeighbor(points, model, start)
+        time = pathTime(points, order, model)[1]
+        if (best_time is None) or (time < best_time):
+            best_order = order
+            best_time = time
+    best_order = twoOpt(points, best_order, model, fixed_start = (start_index is not None))
+
+    # Never do worse than the original order.
+    if (pathTime(points, best_order, model)[1] < pathTime(points, range(len(points)), model)[1]):
+        return best_order
+    else:
+        return range(len(points))
+
+## serpentinePath
+#
+# Visit the points row by row (or column by column), alternating
+# the direction of travel in each row. The serpentine can start
+# from any of the corners of the grid in either orientation, the
+# fastest of these is returned.
+#
+# @param points A list of [x, y] positions in microns.
+# @param model A StageModel object.
+# @param start_index (Optional) The index of a point that must be visited first. The serpentine of the other points then starts from the corner that is fastest to reach from this point.
+#
+# @return A list of indexes into points.
+#
+def serpentinePath(points, model, start_index = None):
+    indexes = range(len(points))
+    start = None
+    if start_index is not None:
+        indexes.remove(start_index)
+        start = points[start_index]
+
+    def rowOrder(major, minor, flip):
+        tolerance = 0.5 * minimumSpacing([points[i][major] for i in indexes])
+        rows = []
+        for i in sorted(indexes, key = lambda i: (points[i][major], points[i][minor])):
+            if (len(rows) > 0) and (abs(points[i][major] - points[rows[-1][0]][major]) <= tolerance):
+                rows[-1].append(i)
+            else:
+                rows.append([i])
+        order = []
+        for j, row in enumerate(rows):
+            row.sort(key = lambda i: points[i][minor])
+            if ((j % 2) == flip):
+                row.reverse()
+            order.extend(row)
+        return order
+
+    best_order = None
+    best_time = None
+    for major in [1, 0]:
+        for flip in [1, 0]:
+            order = rowOrder(major, 1 - major, flip)
+            for candidate in [order, list(reversed(order))]:
+                time = pathTime(points, candidate, model, start = start)[1]
+                if (best_time is None) or (time < best_time):
+                    best_order = candidate
+                    best_time = time
+
+    if start_index is not None:
+        best_order.insert(0, start_index)
+    return best_order
+
+## minimumSpacing
+#
+# @param values A list of coordinates.
+#
+# @return The smallest non-zero difference between the sorted values, or 1.0.
+#
+def minimumSpacing(values):
+    values = sorted(values)
+    spacing = None
+    for i in range(len(values) - 1):
+        diff = values[i+1] - values[i]
+        if (diff > 1.0e-6) and ((spacing is None) or (diff < spacing)):
+            spacing = diff
+    if spacing is None:
+        return 1.0
+    return spacing
+
+## sign
+#
+# @param value A number.
+#
+# @return -1, 0 or 1 depending on the sign of value.
+#
+def sign(value):
+    if (value > 0.0):
+        return 1
+    elif (value < 0.0):
+        return -1
+    return 0
+
+## twoOpt
+#
+# Improve a tour by reversing segments while this reduces the move time.
+# Each reversal is evaluated from the change in the per-axis travel time
+# of the (at most) two moves that it changes, so a pass is O(n^2). The
+# full model (including backlash) is only used to check the final order.
+#
+# @param points A list of [x, y] positions in microns.
+# @param order The starting order.
+# @param model A StageModel object.
+# @param fixed_start (Optional) Don't move the first point, defaults to False.
+# @param max_passes (Optional) The maximum number of improvement passes, defaults to 20.
+#
+# @return The improved order.
+#
+def twoOpt(points, order, model, fixed_start = False, max_passes = 20):
+
+    def cost(a, b):
+        return model.axisTime(points[b][0] - points[a][0], points[b][1] - points[a][1])
+
+    original = list(order)
+    order = list(order)
+    n = len(order)
+    first = 1 if fixed_start else 0
+    improved = True
+    passes = 0
+    while improved and (passes < max_passes):
+        improved = False
+        passes += 1
+        for i in range(first, n - 1):
+            for j in range(i + 1, n):
+                # Reverse order[i:j+1]. This is an open path so the
+                # ends only have one neighbor.
+                delta = 0.0
+                if (i > 0):
+                    delta += cost(order[i-1], order[j]) - cost(order[i-1], order[i])
+                if (j < (n - 1)):
+                    delta += cost(order[i], order[j+1]) - cost(order[j], order[j+1])
+                if (delta < -1.0e-9):
+                    order[i:j+1] = order[i:j+1][::-1]
+                    improved = True
+
+    # The backlash penalty is not part of the evaluation above.
+    if (pathTime(points, order, model)[1] < pathTime(points, original, model)[1]):
+        return order
+    else:
+        return original
+
+
+#
+# The MIT License
+#
+# Copyright (c) 2015 Zhuang Lab, Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#
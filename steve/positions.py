@@ -10,6 +10,7 @@
 from PyQt4 import QtCore, QtGui
 
 import coord
+import pathPlanner
 
 ## PositionItem
 #
@@ -165,6 +166,15 @@ class PositionListModel(QtCore.QAbstractListModel):
         self.updateTitle()
         return a_scene_position_item
 
+    ## reorderPositions
+    #
+    # @param order A list of indexes specifying the new order of the positions.
+    #
+    def reorderPositions(self, order):
+        self.layoutAboutToBeChanged.emit()
+        self.positions = [self.positions[i] for i in order]
+        self.layoutChanged.emit()
+
     ## rowCount
     #
     # @param parent (Optional) Defaults to QtCore.QModelIndex.
@@ -200,6 +210,7 @@ class PositionListModel(QtCore.QAbstractListModel):
 # The position list view, this is what the user actually interacts with.
 #
 class Positions(QtGui.QListView):
+    pathOptimized = QtCore.pyqtSignal(int, float, float)
 
     ## __init__
     #
@@ -212,6 +223,7 @@ class Positions(QtGui.QListView):
 
         self.plist_model = PositionListModel(parent)
         self.scene = scene
+        self.stage_model = pathPlanner.createStageModel(parameters)
         self.step_size = parameters.get("step_size")
 
         PositionItem.deselected_pen.setWidth(parameters.get("pen_width"))
@@ -262,6 +274,8 @@ class Positions(QtGui.QListView):
             self.plist_model.movePosition(self.currentIndex(), -self.step_size, 0.0)
         elif (which_key == QtCore.Qt.Key_D):
             self.plist_model.movePosition(self.currentIndex(), self.step_size, 0.0)
+        elif (which_key == QtCore.Qt.Key_O):
+            self.optimizeOrder()
         else:
             QtGui.QListView.keyPressEvent(self, event)
 
@@ -295,6 +309,21 @@ class Positions(QtGui.QListView):
             [x, y] = line.split(",")
             self.addPosition(coord.Point(float(x), float(y), "um"))
 
+    ## optimizeOrder
+    #
+    # Re-order the positions to minimize the time the stage spends
+    # moving between them. The first position stays first.
+    #
+    # @return [total travel in microns, estimated move time in seconds].
+    #
+    def optimizeOrder(self):
+        points = map(lambda x: x.a_point.getUm(), self.plist_model.getPositionItems())
+        order = pathPlanner.planPath(points, self.stage_model, start_index = 0)
+        self.plist_model.reorderPositions(order)
+        [travel, move_time] = pathPlanner.pathTime(points, order, self.stage_model)
+        self.pathOptimized.emit(len(points), travel, move_time)
+        return [travel, move_time]
+
     ## saveToMosaicFile
     #
     # Save the current position items into a mosaic file.
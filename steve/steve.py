@@ -27,6 +27,7 @@ import qtRegexFileDialog
 # Graphics
 import mosaicView
 import objectives
+import pathPlanner
 import positions
 import sections
 
@@ -64,8 +65,10 @@ class Window(QtGui.QMainWindow):
         self.picture_queue = []
         self.regexp_str = ""
         self.requested_stage_pos = False
+        self.stage_model = pathPlanner.createStageModel(parameters)
         self.stage_tracking_timer = QtCore.QTimer(self)
         self.taking_pictures = False
+        self.tile_size = [parameters.get("tile_size", 50.0), parameters.get("tile_size", 50.0)]
         self.snapshot_directory = self.parameters.get("directory")
         self.spin_boxes = []
         self.stage_tracking_timer.setInterval(500)
@@ -109,6 +112,7 @@ class Window(QtGui.QMainWindow):
         layout.addWidget(self.positions)
         self.ui.positionsFrame.setLayout(layout)
         self.positions.show()
+        self.positions.pathOptimized.connect(self.handlePathOptimized)
 
         # Initialize sections.
         self.sections = sections.Sections(parameters,
@@ -188,6 +192,8 @@ class Window(QtGui.QMainWindow):
         self.current_offset = coord.Point(x_offset, y_offset, "um")
         self.view.addImage(image, objective, magnification, self.current_offset)
         self.view.setCrosshairPosition(image.x_pix, image.y_pix)
+        self.tile_size = [0.95 * float(image.width) * coord.Point.pixels_to_um / magnification,
+                          0.95 * float(image.height) * coord.Point.pixels_to_um / magnification]
         if (len(self.picture_queue) > 0):
             next_item = self.picture_queue[0]
             if (type(next_item) == type(coord.Point(0,0,"um"))):
@@ -473,7 +479,7 @@ class Window(QtGui.QMainWindow):
         # Open custom dialog to select files and frame number
         [filenames, frame_num, file_filter] = qtRegexFileDialog.regexGetFileNames(directory = self.parameters.get("directory"),
                                                                                   regex = self.regexp_str,
-                                                                                  extensions = ["*.dax", "*.tif", "*.spe"])
+                                                                                  extensions = ["*.dax", "*.tif", "*.spe", "*.zax"])
         if (filenames is not None) and (len(filenames) > 0):
             print "Found " + str(len(filenames)) + " files matching " + str(file_filter) + " in " + os.path.dirname(filenames[0])
             print "Loading frame: " + str(frame_num)
@@ -542,6 +548,20 @@ class Window(QtGui.QMainWindow):
     def handleOtherComplete(self):
         self.comm.commDisconnect()
 
+    ## handlePathOptimized
+    #
+    # Shows the estimated stage travel after the positions are re-ordered.
+    #
+    # @param number The number of positions.
+    # @param travel The estimated travel in microns.
+    # @param move_time The estimated move time in seconds.
+    #
+    @hdebug.debug
+    def handlePathOptimized(self, number, travel, move_time):
+        self.ui.statusbar.showMessage("{0:d} positions, estimated travel {1:.1f}um, {2:.1f}s".format(number,
+                                                                                                   travel,
+                                                                                                   move_time))
+
     ## handleSavePositions
     #
     # Handles the save positions action.
@@ -786,6 +806,16 @@ class Window(QtGui.QMainWindow):
         if self.taking_pictures:
             self.picture_queue = []
         else:
+            # Re-order to minimize the stage travel time.
+            if self.parameters.get("optimize_path", 1):
+                [picture_list, travel, move_time] = pathPlanner.orderPictureList(picture_list,
+                                                                                 self.stage_model,
+                                                                                 self.tile_size,
+                                                                                 self.parameters.get("serpentine_path", 0))
+                self.ui.statusbar.showMessage("{0:d} pictures, estimated travel {1:.1f}um, {2:.1f}s".format(len(picture_list),
+                                                                                                             travel,
+                                                                                                             move_time))
+
             # Set center point
             point = picture_list[0]
             self.setCenter(point)
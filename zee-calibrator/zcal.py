@@ -7,14 +7,19 @@
 # Hazen 07/14
 #
 
+import imp
 import math
+import multiprocessing
 import numpy
 import numpy.lib.recfunctions
 import os
 import re
 import scipy
 import scipy.optimize
-import struct
+
+imp.load_source("setPath", "../sc_library/setPath.py")
+
+import sc_library.readinsight3 as readinsight3
 
 #
 # different power z calibration functions
@@ -94,45 +99,97 @@ zcalibs = [zcalib0, zcalib1, zcalib2, zcalib3, zcalib4]
 
 
 #
-# insight3 file reading
+# z coordinate determination
+#
+
+## findZ
+#
+# Determines the z coordinates from the x and y widths. A table of the
+# (square root of the) calibration curves is calculated once, then each
+# localization is matched against the table in a window around its
+# initial z estimate. The best match is refined with a few (vectorized)
+# Newton steps.
+#
+# @param wx_fit The wx calibration curve parameters.
+# @param wy_fit The wy calibration curve parameters.
+# @param fit_power The calibration curve function index.
+# @param quick_z The linear wx - wy to z conversion to use for the initial z estimate.
+# @param wx The localization widths in x.
+# @param wy The localization widths in y.
+# @param window (Optional) The size of the search window in nm, defaults to 200.
+# @param chunk_size (Optional) How many localizations to handle at once, defaults to 10000.
+#
+# @return [molecule z location, fit error]
 #
+def findZ(wx_fit, wy_fit, fit_power, quick_z, wx, wy, window = 200, chunk_size = 10000):
+    zcalibs_fn = zcalibs[fit_power]
+
+    def D2(z, swx, swy):
+        tx = swx - numpy.sqrt(zcalibs_fn(wx_fit, z))
+        ty = swy - numpy.sqrt(zcalibs_fn(wy_fit, z))
+        return tx * tx + ty * ty
+
+    # roughly estimate z
+    n_vals = wx.shape[0]
+    qz = numpy.clip(quick_z[0] * (wx - wy) + quick_z[1], -1000.0, 1000.0)
+    if (n_vals == 0):
+        return [numpy.zeros(0), numpy.zeros(0)]
+
+    # table of the calibration curves at 1nm intervals.
+    z_min = numpy.floor(numpy.min(qz)) - window - 1
+    z_max = numpy.ceil(numpy.max(qz)) + window + 1
+    table_z = numpy.arange(z_min, z_max + 0.5, 1.0)
+    table_swx = numpy.sqrt(zcalibs_fn(wx_fit, table_z))
+    table_swy = numpy.sqrt(zcalibs_fn(wy_fit, table_z))
+
+    offsets = numpy.arange(-window, window + 1)
+    rz = numpy.zeros(n_vals)
+    for start in range(0, n_vals, chunk_size):
+        end = min(start + chunk_size, n_vals)
+        swx = numpy.sqrt(wx[start:end])
+        swy = numpy.sqrt(wy[start:end])
+
+        # find the closest table entry in the window.
+        index = numpy.round(qz[start:end] - z_min).astype(numpy.int64)
+        index = index[:,None] + offsets[None,:]
+        tx = swx[:,None] - table_swx[index]
+        ty = swy[:,None] - table_swy[index]
+        best = numpy.argmin(tx * tx + ty * ty, axis = 1)
+        rz[start:end] = table_z[index[numpy.arange(end - start), best]]
+
+        # refine.
+        h = 0.01
+        z = rz[start:end]
+        for i in range(3):
+            d0 = D2(z, swx, swy)
+            dp = D2(z + h, swx, swy)
+            dm = D2(z - h, swx, swy)
+            d1 = (dp - dm)/(2.0 * h)
+            d2 = (dp - 2.0 * d0 + dm)/(h * h)
+            step = numpy.zeros(z.size)
+            good = (d2 > 0.0)
+            step[good] = numpy.clip(-d1[good]/d2[good], -1.0, 1.0)
+            z = z + step
+        rz[start:end] = z
+
+    err = numpy.sqrt(D2(rz, numpy.sqrt(wx), numpy.sqrt(wy)))
+    return [rz, err]
 
-## getV
+## findZStar
 #
-# Helper function for reading binary header data.
+# findZ() for use with multiprocessing.Pool.map().
 #
-# @param fp A file pointer.
-# @param format A string defining the data format.
-# @param size An integer specifying how many bytes to read.
+# @param args The arguments to findZ().
 #
-# @return The unpacked value from the file.
+# @return [molecule z location, fit error]
 #
-def getV(fp, format, size):
-    return struct.unpack(format, fp.read(size))[0]
+def findZStar(args):
+    return findZ(*args)
+
 
-## i3DataType
 #
-# @return A numpy data type to use for reading Insight3 format files.
+# insight3 file reading
 #
-def i3DataType():
-    return numpy.dtype([('x', numpy.float32),   # original x location
-                        ('y', numpy.float32),   # original y location
-                        ('xc', numpy.float32),  # drift corrected x location
-                        ('yc', numpy.float32),  # drift corrected y location
-                        ('h', numpy.float32),   # fit height
-                        ('a', numpy.float32),   # fit area
-                        ('w', numpy.float32),   # fit width
-                        ('phi', numpy.float32), # fit angle (for unconstrained elliptical gaussian)
-                        ('ax', numpy.float32),  # peak aspect ratio
-                        ('bg', numpy.float32),  # fit background
-                        ('i', numpy.float32),   # sum - baseline for pixels included in the peak
-                        ('c', numpy.int32),     # peak category ([0..9] for STORM images)
-                        ('fi', numpy.int32),    # fit iterations
-                        ('fr', numpy.int32),    # frame
-                        ('tl', numpy.int32),    # track length
-                        ('lk', numpy.int32),    # link (id of the next molecule in the trace)
-                        ('z', numpy.float32),   # original z coordinate
-                        ('zc', numpy.float32)]) # drift corrected z coordinate
 
 ## maskData
 #
@@ -145,7 +202,7 @@ def i3DataType():
 # @return An i3data data structure containing only the localizations where mask was true.
 #
 def maskData(i3data, mask):
-    new_i3data = numpy.zeros(mask.sum(), dtype = i3DataType())
+    new_i3data = numpy.zeros(mask.sum(), dtype = readinsight3.i3DataType())
     for field in i3data.dtype.names:
         new_i3data[field] = i3data[field][mask]
     return new_i3data
@@ -163,46 +220,24 @@ def posSet(i3data, field, value):
     setI3Field(i3data, field, value)
     setI3Field(i3data, field + 'c', value)
 
-## readHeader
-#
-# @param fp A file pointer.
-#
-# @return [# frames, # localizations, file version, file status]
-#
-def readHeader(fp):
-    version = getV(fp, "4s", 4)
-    frames = getV(fp, "i", 4)
-    status = getV(fp, "i", 4)
-    molecules = getV(fp, "i", 4)
-    if 0:
-        print "Version:", version
-        print "Frames:", frames
-        print "Status:", status
-        print "Molecules:", molecules
-        print ""
-    return [frames, molecules, version, status]
-
 ## readI3File
 #
 # Read the data from an Insight3 format file.
 #
 # @param filename The filename of the file including the path.
 # @param nm_per_pixel The number of nm per pixel.
+# @param minimum_intensity (Optional) Only load localizations brighter than this.
 #
 # @return The localization data.
 #
-def readI3File(filename, nm_per_pixel):
+def readI3File(filename, nm_per_pixel, minimum_intensity = None):
     print "nm_per_pixel", nm_per_pixel
-    fp = open(filename, "rb")
-
-    # Read header
-    [frames, molecules, version, status] = readHeader(fp)
-
-    # Read molecule info
-    data = numpy.fromfile(fp, dtype = i3DataType())
-    data = data[:][0:molecules]
-    fp.close()
-
+    i3_reader = readinsight3.I3Reader(filename)
+    if minimum_intensity is None:
+        data = numpy.array(i3_reader.getData())
+    else:
+        data = i3_reader.getFiltered(lambda chunk: (chunk['i'] > minimum_intensity))
+    i3_reader.close()
     return data
 
 #    return [data,
@@ -222,10 +257,11 @@ def readI3File(filename, nm_per_pixel):
 class ZCalibration():
 
     # Initialize
-    def __init__(self, filename, fit_power, minimum_intensity, nm_per_pixel):
+    def __init__(self, filename, fit_power, minimum_intensity, nm_per_pixel, processes = 1):
         self.filename = filename
         self.fit_power = fit_power
         self.nm_per_pixel = nm_per_pixel
+        self.processes = processes
 
         # state variables
         self.edge_loc = 0
@@ -470,8 +506,7 @@ class ZCalibration():
     # @param minimum_intensity The minimum intensity
     #
     def loadMolecules(self, filename, minimum_intensity):
-        self.i3_data = readI3File(filename, self.nm_per_pixel)
-        self.i3_data = maskData(self.i3_data, (self.i3_data['i'] > minimum_intensity))
+        self.i3_data = readI3File(filename, self.nm_per_pixel, minimum_intensity)
         self.i3_data['fr'] -= 1
         self.wx = numpy.sqrt(self.i3_data['w']*self.i3_data['w']/self.i3_data['ax'])/self.nm_per_pixel
         self.wy = numpy.sqrt(self.i3_data['w']*self.i3_data['w']*self.i3_data['ax'])/self.nm_per_pixel
@@ -486,30 +521,22 @@ class ZCalibration():
     # @return [molecule z location, fit error]
     #
     def objectZCoords(self, wx, wy):
-
-        # roughly estimate z
-        qz = self.quick_z[0] * (wx - wy) + self.quick_z[1]
-
-        # figure out appropriate z function
-        global zcalibs
-        zcalibs_fn = zcalibs[self.fit_power]
-
-        # optimize function
-        def D(z, wx_m, wy_m):
-            wx_c = zcalibs_fn(self.wx_fit, z)
-            wy_c = zcalibs_fn(self.wy_fit, z)
-            tx = numpy.sqrt(wx_m) - numpy.sqrt(wx_c)
-            ty = numpy.sqrt(wy_m) - numpy.sqrt(wy_c)
-            err = numpy.sqrt(tx * tx + ty * ty)
-            return err
-        
         n_vals = wx.shape[0]
-        rz = numpy.zeros((n_vals)) # "real" z, determined only from the moments
-        for i in range(n_vals):
-            zo = self.quick_z[0] * (wx[i] - wy[i]) + self.quick_z[1]
-            rz[i] = scipy.optimize.brent(D, args = (wx[i], wy[i]), brack = [zo - 100.0, zo + 100.0])
-
-        err = numpy.zeros(wx.shape[0])
+        if (self.processes < 2) or (n_vals < 100000):
+            return findZ(self.wx_fit, self.wy_fit, self.fit_power, self.quick_z, wx, wy)
+
+        # split the localizations between several processes.
+        bounds = numpy.linspace(0, n_vals, self.processes + 1).astype(numpy.int64)
+        args = []
+        for i in range(self.processes):
+            args.append([self.wx_fit, self.wy_fit, self.fit_power, self.quick_z,
+                         wx[bounds[i]:bounds[i+1]], wy[bounds[i]:bounds[i+1]]])
+        pool = multiprocessing.Pool(self.processes)
+        results = pool.map(findZStar, args)
+        pool.close()
+        pool.join()
+        rz = numpy.concatenate(map(lambda x: x[0], results))
+        err = numpy.concatenate(map(lambda x: x[1], results))
         return [rz, err]
 
     ## saveCalibration
@@ -534,40 +561,40 @@ class ZCalibration():
     # @return [x, y, wx, wy, sz] Of the localizations in the correct frames and widths that were not too far from the mean.
     #
     def selectObjects(self, mask):
-        i3_x = self.i3_data['x']
-        i3_y = self.i3_data['y']
-        i3_wx = self.wx
-        i3_wy = self.wy
-
-        x = numpy.array(())
-        y = numpy.array(())
-        sz = numpy.array(()) # i.e. z as determined by the nominal stage position and sample tilt.
-        wx = numpy.array(())
-        wy = numpy.array(())
-        for i in range(self.frames):
-            if mask[i]:
-                
-                f_mask = (self.i3_data['fr'] == i)
-                _x = i3_x[f_mask]
-                _y = i3_y[f_mask]
-                _wx = i3_wx[f_mask]
-                _wy = i3_wy[f_mask]
-
-                max_err = 1.5
-                mwx = scipy.mean(_wx)
-                swx = scipy.std(_wx)
-                mwy = scipy.mean(_wy)
-                swy = scipy.std(_wy)
-                w_mask = (_wx > (mwx - max_err *swx)) & (_wx < (mwx + max_err * swx)) & \
-                    (_wy > (mwy - max_err *swy)) & (_wy < (mwy + max_err * swy)) & \
-                    ((_wx * _wy) > 2.2)
-                    
-                x = numpy.concatenate((x, numpy.ascontiguousarray(_x[w_mask])), 0)
-                y = numpy.concatenate((y, numpy.ascontiguousarray(_y[w_mask])), 0)
-                wx = numpy.concatenate((wx, numpy.ascontiguousarray(_wx[w_mask])), 0)
-                wy = numpy.concatenate((wy, numpy.ascontiguousarray(_wy[w_mask])), 0)
-                tz = self.getFrameZnm(i) + (self.tilt[0] + self.tilt[1] * _x[w_mask] + self.tilt[2] * _y[w_mask])
-                sz = numpy.concatenate((sz, numpy.ascontiguousarray(tz)), 0)
+
+        # sort the localizations by frame (keeping the original order in each frame).
+        fr = self.i3_data['fr']
+        in_range = (fr >= 0) & (fr < self.frames)
+        order = numpy.argsort(fr[in_range], kind = "mergesort")
+        fr = fr[in_range][order]
+        i3_x = self.i3_data['x'][in_range][order].astype(numpy.float64)
+        i3_y = self.i3_data['y'][in_range][order].astype(numpy.float64)
+        i3_wx = self.wx[in_range][order].astype(numpy.float64)
+        i3_wy = self.wy[in_range][order].astype(numpy.float64)
+
+        # per frame mean and standard deviation of the widths.
+        counts = numpy.bincount(fr, minlength = self.frames).astype(numpy.float64)
+        counts[(counts == 0)] = 1.0
+        def frameStats(w):
+            mean = numpy.bincount(fr, weights = w, minlength = self.frames)/counts
+            dw = w - mean[fr]
+            std = numpy.sqrt(numpy.bincount(fr, weights = dw * dw, minlength = self.frames)/counts)
+            return [mean[fr], std[fr]]
+
+        max_err = 1.5
+        [mwx, swx] = frameStats(i3_wx)
+        [mwy, swy] = frameStats(i3_wy)
+        w_mask = (i3_wx > (mwx - max_err *swx)) & (i3_wx < (mwx + max_err * swx)) & \
+            (i3_wy > (mwy - max_err *swy)) & (i3_wy < (mwy + max_err * swy)) & \
+            ((i3_wx * i3_wy) > 2.2) & \
+            (numpy.asarray(mask)[fr] != 0)
+
+        fr = fr[w_mask]
+        x = i3_x[w_mask]
+        y = i3_y[w_mask]
+        wx = i3_wx[w_mask]
+        wy = i3_wy[w_mask]
+        sz = self.getFrameZnm(fr) + (self.tilt[0] + self.tilt[1] * x + self.tilt[2] * y) # i.e. z as determined by the nominal stage position and sample tilt.
 
         if self.z_offset != None:
             sz -= self.z_offset
@@ -0,0 +1,231 @@
+#!/usr/bin/python
+#
+## @file
+#
+# Timing comparison of the z calibration localization selection
+# and z determination on a synthetic calibration movie. The
+# reference versions are the original per frame loop and per
+# localization scipy.optimize.brent() implementations.
+#
+# Hazen 10/15
+#
+
+import numpy
+import os
+import scipy
+import scipy.optimize
+import struct
+import sys
+import tempfile
+import time
+
+import zcal
+
+import sc_library.readinsight3 as readinsight3
+
+## brentZCoords
+#
+# The original z determination, one localization at a time.
+#
+# @param z_calib A zcal.ZCalibration object.
+# @param wx The localization widths in x.
+# @param wy The localization widths in y.
+#
+# @return The z coordinates.
+#
+def brentZCoords(z_calib, wx, wy):
+    zcalibs_fn = zcal.zcalibs[z_calib.fit_power]
+
+    def D(z, wx_m, wy_m):
+        wx_c = zcalibs_fn(z_calib.wx_fit, z)
+        wy_c = zcalibs_fn(z_calib.wy_fit, z)
+        tx = numpy.sqrt(wx_m) - numpy.sqrt(wx_c)
+        ty = numpy.sqrt(wy_m) - numpy.sqrt(wy_c)
+        return numpy.sqrt(tx * tx + ty * ty)
+
+    rz = numpy.zeros(wx.shape[0])
+    for i in range(wx.shape[0]):
+        zo = z_calib.quick_z[0] * (wx[i] - wy[i]) + z_calib.quick_z[1]
+        rz[i] = scipy.optimize.brent(D, args = (wx[i], wy[i]), brack = [zo - 100.0, zo + 100.0])
+    return rz
+
+## loopSelectObjects
+#
+# The original localization selection, one frame at a time.
+#
+# @param z_calib A zcal.ZCalibration object.
+# @param mask A numpy mask with True in the frames that we want to analyze.
+#
+# @return [x, y, wx, wy, sz]
+#
+def loopSelectObjects(z_calib, mask):
+    i3_data = z_calib.i3_data
+    x = numpy.array(())
+    y = numpy.array(())
+    sz = numpy.array(())
+    wx = numpy.array(())
+    wy = numpy.array(())
+    for i in range(z_calib.frames):
+        if mask[i]:
+            f_mask = (i3_data['fr'] == i)
+            _x = i3_data['x'][f_mask]
+            _y = i3_data['y'][f_mask]
+            _wx = z_calib.wx[f_mask]
+            _wy = z_calib.wy[f_mask]
+
+            max_err = 1.5
+            mwx = scipy.mean(_wx)
+            swx = scipy.std(_wx)
+            mwy = scipy.mean(_wy)
+            swy = scipy.std(_wy)
+            w_mask = (_wx > (mwx - max_err *swx)) & (_wx < (mwx + max_err * swx)) & \
+                (_wy > (mwy - max_err *swy)) & (_wy < (mwy + max_err * swy)) & \
+                ((_wx * _wy) > 2.2)
+
+            x = numpy.concatenate((x, _x[w_mask]), 0)
+            y = numpy.concatenate((y, _y[w_mask]), 0)
+            wx = numpy.concatenate((wx, _wx[w_mask]), 0)
+            wy = numpy.concatenate((wy, _wy[w_mask]), 0)
+            tz = z_calib.getFrameZnm(i) + (z_calib.tilt[0] + z_calib.tilt[1] * _x[w_mask] + z_calib.tilt[2] * _y[w_mask])
+            sz = numpy.concatenate((sz, tz), 0)
+
+    if z_calib.z_offset != None:
+        sz -= z_calib.z_offset
+        z_mask = (sz > -400.0) & (sz < 400.0)
+        return [x[z_mask], y[z_mask], wx[z_mask], wy[z_mask], sz[z_mask]]
+    return [x, y, wx, wy, sz]
+
+## makeSyntheticData
+#
+# Create a synthetic calibration movie localization (.bin) file and the
+# corresponding offset (.off) file.
+#
+# @param basename The name of the files (without extension).
+# @param n_frames The number of frames in the z scan.
+# @param n_per_frame The number of localizations per frame.
+# @param nm_per_pixel The pixel size.
+#
+# @return The name of the localization file.
+#
+def makeSyntheticData(basename, n_frames, n_per_frame, nm_per_pixel):
+    numpy.random.seed(0)
+
+    # Stage positions (um), stationary, then a jump and a slow scan, then a jump back.
+    n_static = 20
+    stage = numpy.concatenate((numpy.zeros(n_static),
+                               numpy.linspace(-0.6, 0.6, n_frames),
+                               numpy.zeros(n_static)))
+    offset = 0.5 * stage + 0.01
+    total_frames = stage.size
+
+    frames = []
+    for i in range(total_frames):
+        fr = numpy.zeros(n_per_frame, dtype = numpy.int32) + i + 1
+        frames.append(fr)
+    fr = numpy.concatenate(frames)
+    z = 1000.0 * stage[fr - 1]
+
+    wx = zcal.zcalib0([2.0, -250.0, 400.0], z) * (1.0 + 0.05 * numpy.random.normal(size = z.size))
+    wy = zcal.zcalib0([2.0, 250.0, 400.0], z) * (1.0 + 0.05 * numpy.random.normal(size = z.size))
+
+    data = numpy.zeros(fr.size, dtype = readinsight3.i3DataType())
+    data['x'] = 256.0 * numpy.random.uniform(size = fr.size)
+    data['y'] = 256.0 * numpy.random.uniform(size = fr.size)
+    data['xc'] = data['x']
+    data['yc'] = data['y']
+    data['w'] = nm_per_pixel * numpy.sqrt(wx * wy)
+    data['ax'] = wy/wx
+    data['i'] = 5000.0
+    data['h'] = 1000.0
+    data['fr'] = fr
+
+    bin_name = basename + "_mlist.bin"
+    with open(bin_name, "wb") as fp:
+        fp.write(struct.pack("4siii", "M425", total_frames, 6, fr.size))
+        data.tofile(fp)
+
+    with open(basename + ".off", "w") as fp:
+        fp.write("frame offset power stage-z\n")
+        for i in range(total_frames):
+            fp.write("{0:d} {1:.6f} 1.0 {2:.6f}\n".format(i, offset[i], stage[i]))
+
+    return bin_name
+
+
+if (__name__ == "__main__"):
+
+    n_frames = 400
+    n_per_frame = 500
+    if (len(sys.argv) > 1):
+        n_frames = int(sys.argv[1])
+    if (len(sys.argv) > 2):
+        n_per_frame = int(sys.argv[2])
+
+    nm_per_pixel = 160.0
+    basename = os.path.join(tempfile.mkdtemp(), "zcal_timing")
+    bin_name = makeSyntheticData(basename, n_frames, n_per_frame, nm_per_pixel)
+
+    z_calib = zcal.ZCalibration(bin_name, 0, 100.0, nm_per_pixel)
+    z_calib.stageCalibration(bin_name)
+    z_calib.fitDefocusing()
+    mask = (z_calib.mask != 0)
+    print "Localizations:", z_calib.i3_data.size
+
+    # Localization selection.
+    start = time.time()
+    [x1, y1, wx1, wy1, sz1] = loopSelectObjects(z_calib, mask)
+    loop_time = time.time() - start
+
+    start = time.time()
+    [x2, y2, wx2, wy2, sz2] = z_calib.selectObjects(mask)
+    vector_time = time.time() - start
+
+    print "selectObjects:"
+    print "  per frame loop: {0:.3f}s, single pass: {1:.3f}s".format(loop_time, vector_time)
+    # The per frame statistics are calculated with different precision, so
+    # localizations right at the edge of the cut-off can differ.
+    print "  selected", sz1.size, sz2.size, "mean sz difference {0:.3g}nm".format(numpy.mean(sz1) - numpy.mean(sz2))
+
+    # Z determination, brent is slow so only a subset is timed.
+    n_brent = min(5000, wx2.size)
+    start = time.time()
+    rz1 = brentZCoords(z_calib, wx2[:n_brent], wy2[:n_brent])
+    brent_time = (time.time() - start) * wx2.size/n_brent
+
+    start = time.time()
+    [rz2, err] = z_calib.objectZCoords(wx2, wy2)
+    table_time = time.time() - start
+
+    z_calib.processes = 4
+    start = time.time()
+    [rz3, err] = z_calib.objectZCoords(wx2, wy2)
+    parallel_time = time.time() - start
+
+    print "objectZCoords:"
+    print "  brent (estimated): {0:.3f}s, table: {1:.3f}s, table (4 processes): {2:.3f}s".format(brent_time, table_time, parallel_time)
+    print "  max z difference {0:.3g}nm".format(numpy.max(numpy.abs(rz1 - rz2[:n_brent])))
+
+
+#
+# The MIT License
+#
+# Copyright (c) 2015 Zhuang Lab, Harvard University
+#
+# Permission is hereby granted, free of charge, to any person obtaining a copy
+# of this software and associated documentation files (the "Software"), to deal
+# in the Software without restriction, including without limitation the rights
+# to use, copy, modify, merge, publish, distribute, sublicense, and/or sell
+# copies of the Software, and to permit persons to whom the Software is
+# furnished to do so, subject to the following conditions:
+#
+# The above copyright notice and this permission notice shall be included in
+# all copies or substantial portions of the Software.
+#
+# THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+# IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY,
+# FITNESS FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE
+# AUTHORS OR COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER
+# LIABILITY, WHETHER IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM,
+# OUT OF OR IN CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN
+# THE SOFTWARE.
+#